@@ -3,10 +3,11 @@ from flask_cors import CORS
 from flask_sqlalchemy import SQLAlchemy
 from flask_jwt_extended import JWTManager
 from flask_migrate import Migrate
+from app.services.db_routing import RoutingSession
 import os
 
-# Initialize extensions
-db = SQLAlchemy()
+# Initialize extensions (the session routes eligible reads to replicas)
+db = SQLAlchemy(session_options={'class_': RoutingSession})
 jwt = JWTManager()
 migrate = Migrate()
 
@@ -21,14 +22,86 @@ def create_app(config_name=None):
     from config import config
     app.config.from_object(config[config_name])
     
+    # Connection pool options (instrumented pool, statement timeout, PgBouncer mode)
+    from app.services.db_pool import configure_engine_options, instrument_engine
+    
+    configure_engine_options(app.config)
+    
+    # Read replicas become binds the routing session can send SELECTs to
+    from app.services.db_routing import create_replica_router, replica_bind_keys
+    
+    app.config['SQLALCHEMY_BINDS'] = {
+        **(app.config.get('SQLALCHEMY_BINDS') or {}),
+        **replica_bind_keys(app.config.get('SQLALCHEMY_REPLICA_URIS') or [])
+    }
+    
     # Initialize extensions with app
     db.init_app(app)
+    with app.app_context():
+        instrument_engine(db.engine, app.config)
     jwt.init_app(app)
     migrate.init_app(app, db)
     
     # Configure CORS
     CORS(app, origins=app.config['CORS_ORIGINS'])
     
+    # Configure response cache
+    from app.services.cache import create_response_cache
+    
+    response_cache = create_response_cache(app.config)
+    if response_cache is not None:
+        app.extensions['response_cache'] = response_cache
+    
+    # Replica routing; read-your-writes marks are shared when the cache backend is a key-value server
+    from app.services.cache import KeyValueCache, LRUCache
+    
+    shared = response_cache is not None and isinstance(response_cache.backend, KeyValueCache)
+    with app.app_context():
+        replica_router = create_replica_router(
+            app, db, response_cache.backend if shared else LRUCache(max_entries=10000)
+        )
+    if replica_router is not None:
+        app.extensions['replica_router'] = replica_router
+    
+    # Version counters backing ETags on catalog endpoints
+    from app.services.etags import DatabaseVersionStore
+    
+    app.extensions['resource_versions'] = DatabaseVersionStore()
+    
+    # Background ingestion of product views
+    from app.services.view_ingestion import create_view_ingestor
+    
+    if app.config.get('VIEW_TRACKING_ENABLED', True):
+        app.extensions['view_ingestor'] = create_view_ingestor(app)
+    
+    # Write-behind buffer for shared rollup counters
+    from app.services.counter_buffer import create_counter_buffer
+    
+    app.extensions['counter_buffer'] = create_counter_buffer(app)
+    
+    # Write-behind buffer for search history
+    from app.services.search_tracking import create_search_history_writer
+    
+    app.extensions['search_history_writer'] = create_search_history_writer(app)
+    
+    # Password hashing policy and its bounded worker pool
+    from app.services.passwords import create_password_hasher
+    
+    app.extensions['password_hasher'] = create_password_hasher(app.config)
+    
+    # Refresh rotation and revocation checks behind a Bloom filter
+    from app.services.tokens import create_token_service, register_token_callbacks
+    
+    app.extensions['token_service'] = create_token_service(app.config)
+    register_token_callbacks(jwt)
+    
+    # Semantic search index and the content-addressed LLM insight cache
+    from app.services.semantic_search import create_semantic_index
+    from app.services.insights import create_insight_service
+    
+    app.extensions['semantic_index'] = create_semantic_index(app)
+    app.extensions['insight_service'] = create_insight_service(app.config)
+    
     # Register blueprints
     from app.blueprints.auth import auth_bp
     from app.blueprints.users import users_bp
@@ -36,6 +109,9 @@ def create_app(config_name=None):
     from app.blueprints.reviews import reviews_bp
     from app.blueprints.analytics import analytics_bp
     from app.blueprints.ai import ai_bp
+    from app.blueprints.orders import orders_bp
+    from app.blueprints.search import search_bp
+    from app.blueprints.diagnostics import diagnostics_bp
     
     app.register_blueprint(auth_bp, url_prefix='/api/auth')
     app.register_blueprint(users_bp, url_prefix='/api/users')
@@ -43,6 +119,29 @@ def create_app(config_name=None):
     app.register_blueprint(reviews_bp, url_prefix='/api/reviews')
     app.register_blueprint(analytics_bp, url_prefix='/api/analytics')
     app.register_blueprint(ai_bp, url_prefix='/api/ai')
+    app.register_blueprint(orders_bp, url_prefix='/api/orders')
+    app.register_blueprint(search_bp, url_prefix='/api/search')
+    app.register_blueprint(diagnostics_bp, url_prefix='/api/diagnostics')
+    
+    # Register CLI commands
+    from app.services.ratings import reconcile_ratings_command
+    from app.services.producer_stats import rebuild_producer_stats_command
+    from app.services.analytics_store import backfill_analytics_command, compact_analytics_command
+    from app.services.passwords import benchmark_password_hash_command
+    from app.services.geo import backfill_geo_tiles_command
+    from app.services.predictions import score_predictions_command
+    from app.services.recommendations import refresh_recommendations_command
+    from app.services.semantic_search import build_embedding_index_command
+    
+    app.cli.add_command(reconcile_ratings_command)
+    app.cli.add_command(rebuild_producer_stats_command)
+    app.cli.add_command(backfill_analytics_command)
+    app.cli.add_command(compact_analytics_command)
+    app.cli.add_command(benchmark_password_hash_command)
+    app.cli.add_command(backfill_geo_tiles_command)
+    app.cli.add_command(score_predictions_command)
+    app.cli.add_command(refresh_recommendations_command)
+    app.cli.add_command(build_embedding_index_command)
     
     # Error handlers
     @app.errorhandler(400)
@@ -0,0 +1,88 @@
+from functools import wraps
+from flask import Blueprint, request, jsonify
+from flask_jwt_extended import jwt_required, get_jwt_identity
+from app import db
+from app.models.product import Product
+from app.utils.decorators import require_admin
+from app.services.cache import cached_response
+from app.services.db_routing import replica_reads
+from app.services.insights import InsightUnavailable, get_insight_service, product_insight_messages
+from app.services.predictions import PREDICTION_TYPES, latest_predictions
+from app.services.user_cache import current_role
+
+ai_bp = Blueprint('ai', __name__)
+
+def require_self_or_admin(f):
+    """Only the user named in the URL or an admin (checked before the response cache)"""
+    @wraps(f)
+    @jwt_required()
+    def decorated_function(user_id, *args, **kwargs):
+        if user_id != get_jwt_identity() and current_role() != 'admin':
+            return jsonify({'error': 'You can only view your own predictions'}), 403
+        return f(user_id, *args, **kwargs)
+    return decorated_function
+
+@ai_bp.route('/predictions/<user_id>', methods=['GET'])
+@replica_reads
+@require_self_or_admin
+@cached_response('ai:predictions', tags=['ai_predictions'])
+def get_predictions(user_id):
+    """Get the latest demand trend and price predictions of a producer's products (?type=&product_id=)"""
+    prediction_type = request.args.get('type')
+    if prediction_type is not None and prediction_type not in PREDICTION_TYPES:
+        return jsonify({'error': f"type must be one of: {', '.join(PREDICTION_TYPES)}"}), 400
+    if prediction_type == 'client_potential':
+        return jsonify({'error': 'Client potential scores are only available to admins'}), 403
+    
+    predictions = latest_predictions(
+        user_id=user_id,
+        prediction_type=prediction_type,
+        product_id=request.args.get('product_id'),
+        exclude_types=['client_potential']
+    )
+    
+    return jsonify({
+        'predictions': [prediction.to_dict() for prediction in predictions],
+        'count': len(predictions)
+    }), 200
+
+@ai_bp.route('/client-potential', methods=['GET'])
+@replica_reads
+@require_admin
+@cached_response('ai:client-potential', tags=['ai_predictions'], defaults={'limit': '50'})
+def get_client_potential():
+    """Get consumers ranked by their latest probability of ordering (admin only)"""
+    limit = min(max(request.args.get('limit', 50, type=int) or 50, 1), 500)
+    segment = request.args.get('segment')
+    
+    predictions = latest_predictions(prediction_type='client_potential')
+    if segment:
+        predictions = [prediction for prediction in predictions if prediction.prediction_data.get('segment') == segment]
+    predictions.sort(key=lambda prediction: prediction.prediction_data.get('probability', 0), reverse=True)
+    
+    return jsonify({
+        'consumers': [prediction.to_dict() for prediction in predictions[:limit]],
+        'total': len(predictions)
+    }), 200
+
+@ai_bp.route('/insights/products/<product_id>', methods=['GET'])
+@jwt_required()
+def get_product_insight(product_id):
+    """Get LLM advice on a product from its data and latest predictions (owner or admin)
+    
+    Identical prompts are answered from the insight cache without calling the provider.
+    """
+    product = db.session.get(Product, product_id)
+    if not product:
+        return jsonify({'error': 'Product not found'}), 404
+    if product.producer_id != get_jwt_identity() and current_role() != 'admin':
+        return jsonify({'error': 'You can only view insights on your own products'}), 403
+    
+    service = get_insight_service()
+    predictions = latest_predictions(user_id=product.producer_id, product_id=product_id)
+    try:
+        insight, cached = service.generate(product_insight_messages(product, predictions), temperature=0)
+    except InsightUnavailable as e:
+        return jsonify({'error': str(e)}), 503
+    
+    return jsonify({'product_id': product_id, 'insight': insight, 'cached': cached, 'model': service.model}), 200
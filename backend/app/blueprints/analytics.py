@@ -0,0 +1,169 @@
+from flask import Blueprint, request, jsonify, current_app
+from flask_jwt_extended import jwt_required, get_jwt_identity
+from datetime import datetime, timedelta
+from app import db
+from app.models.favorite import Favorite
+from app.models.producer_stat import ProducerStat, ProducerDailyStat
+from app.models.product import Product
+from app.utils.decorators import require_admin
+from app.utils.streaming import ndjson_response, stream_query, wants_ndjson
+from app.services.cache import cached_response
+from app.services.db_routing import replica_reads
+from app.services.analytics_store import parse_timeseries_args, query_timeseries
+from app.services.geo import DEMAND_METRICS, parse_heatmap_args, query_heatmap
+from app.services.platform_metrics import get_admin_metrics
+from app.services.producer_stats import STAT_FIELDS, daily_point, summarize
+from app.services.product_trending import get_trending_engine
+from app.services.user_cache import current_role
+
+analytics_bp = Blueprint('analytics', __name__)
+
+@analytics_bp.route('/producer/<producer_id>/stats', methods=['GET'])
+@replica_reads
+@jwt_required()
+def get_producer_stats(producer_id):
+    """Get a producer's dashboard totals and daily series from the rollup tables
+    
+    With Accept: application/x-ndjson the summary, each day and the products
+    (the whole catalog unless products_limit is given) are streamed as
+    'summary', 'daily' and 'product' lines.
+    """
+    current_user_id = get_jwt_identity()
+    if producer_id != current_user_id:
+        if current_role() != 'admin':
+            return jsonify({'error': 'You can only view your own statistics'}), 403
+    
+    days = min(max(request.args.get('days', 30, type=int) or 30, 1), 365)
+    products_limit = min(max(request.args.get('products_limit', 5, type=int) or 0, 0), 50)
+    
+    # Totals: one primary-key lookup
+    stat = ProducerStat.query.get(producer_id)
+    totals = {field: getattr(stat, field) for field in STAT_FIELDS} if stat else dict.fromkeys(STAT_FIELDS, 0)
+    
+    # Daily series: one range scan over the producer's buckets, zero-filled
+    end = datetime.utcnow().date()
+    start = end - timedelta(days=days - 1)
+    buckets = {
+        bucket.day: {field: getattr(bucket, field) for field in STAT_FIELDS}
+        for bucket in ProducerDailyStat.query.filter(
+            ProducerDailyStat.producer_id == producer_id,
+            ProducerDailyStat.day >= start,
+            ProducerDailyStat.day <= end
+        )
+    }
+    daily = [
+        daily_point(start + timedelta(days=offset), buckets.get(start + timedelta(days=offset), dict.fromkeys(STAT_FIELDS, 0)))
+        for offset in range(days)
+    ]
+    
+    if wants_ndjson():
+        statement = db.select(Product).filter_by(producer_id=producer_id).order_by(
+            Product.created_at.desc(), Product.id.desc()
+        )
+        if 'products_limit' in request.args:
+            statement = statement.limit(max(request.args.get('products_limit', 0, type=int) or 0, 0))
+        return ndjson_response(_producer_stats_lines(producer_id, totals, daily, statement))
+    
+    # Only the most recent products, not the whole catalog
+    recent = Product.query.filter_by(producer_id=producer_id).order_by(
+        Product.created_at.desc(), Product.id.desc()
+    ).limit(products_limit).all() if products_limit else []
+    
+    return jsonify({
+        'producer_id': producer_id,
+        **summarize(totals),
+        'daily': daily,
+        'products': Product.to_dict_many(recent)
+    }), 200
+
+def _producer_stats_lines(producer_id, totals, daily, statement):
+    """NDJSON records of the producer stats response"""
+    yield {'type': 'summary', 'producer_id': producer_id, **summarize(totals)}
+    for point in daily:
+        yield {'type': 'daily', **point}
+    for chunk in stream_query(statement):
+        for product in Product.to_dict_many(chunk):
+            yield {'type': 'product', **product}
+
+@analytics_bp.route('/admin/overview', methods=['GET'])
+@replica_reads
+@require_admin
+def get_admin_overview():
+    """Get platform totals and distributions from the live admin counters"""
+    metrics = get_admin_metrics()
+    return jsonify({**metrics.overview(), 'reconciled_at': metrics.reconciled_at}), 200
+
+@analytics_bp.route('/timeseries', methods=['GET'])
+@replica_reads
+@jwt_required()
+def get_timeseries():
+    """Get a metric per time bucket, optionally split by product, producer, category or region"""
+    try:
+        params = parse_timeseries_args(request.args)
+    except ValueError as error:
+        return jsonify({'error': str(error)}), 400
+    
+    # Producers may chart their own series; everything else is admin-only
+    current_user_id = get_jwt_identity()
+    if not (params['by'] == 'producer' and params['key'] == current_user_id):
+        if current_role() != 'admin':
+            return jsonify({'error': 'Admin access required'}), 403
+    
+    return jsonify(query_timeseries(params)), 200
+
+@analytics_bp.route('/heatmap', methods=['GET'])
+@replica_reads
+@jwt_required()
+def get_heatmap():
+    """Get a metric aggregated into map cells within a bounding box (?bbox=west,south,east,north&zoom=&metric=)"""
+    try:
+        params = parse_heatmap_args(request.args)
+    except ValueError as error:
+        return jsonify({'error': str(error)}), 400
+    
+    # Where producers and products are is public; where demand comes from is not
+    if params['metric'] in DEMAND_METRICS and current_role() not in ('producer', 'admin'):
+        return jsonify({'error': 'Producer or admin access required'}), 403
+    
+    return jsonify(query_heatmap(params)), 200
+
+@analytics_bp.route('/products/trending', methods=['GET'])
+@replica_reads
+@cached_response('analytics:trending', tags=['trending'], ttl=30, defaults={'k': '10'})
+def get_trending_products():
+    """Get the top-k trending products, optionally within a category"""
+    category = request.args.get('category') or None
+    k = request.args.get('k', 10, type=int)
+    max_k = current_app.config.get('TRENDING_MAX_K', 100)
+    if k is None or k < 1:
+        return jsonify({'error': 'k must be a positive integer'}), 400
+    k = min(k, max_k)
+    
+    ranked = get_trending_engine().top(k, category=category)
+    scores = dict(ranked)
+    
+    # Only the k ranked products are loaded and serialized
+    products = {product.id: product for product in Product.query.filter(Product.id.in_(list(scores)))} if scores else {}
+    favorites_counts = dict(
+        db.session.query(Favorite.product_id, db.func.count(Favorite.id))
+        .filter(Favorite.product_id.in_(list(products)))
+        .group_by(Favorite.product_id)
+    ) if products else {}
+    
+    ordered = [products[product_id] for product_id, _ in ranked if product_id in products]
+    trending_products = [
+        {
+            **data,
+            'trending_score': round(scores[data['id']], 4),
+            'favorites_count': favorites_counts.get(data['id'], 0),
+            'reviews_count': data['rating_count']
+        }
+        for data in Product.to_dict_many(ordered, include_producer=True)
+    ]
+    
+    return jsonify({
+        'trending_products': trending_products,
+        'count': len(trending_products),
+        'category': category,
+        'k': k
+    }), 200
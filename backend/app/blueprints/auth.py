@@ -1,9 +1,13 @@
 from flask import Blueprint, request, jsonify
-from flask_jwt_extended import create_access_token, jwt_required, get_jwt_identity
+from flask_jwt_extended import get_jwt, get_jwt_identity, jwt_required
 from app import db
 from app.models.user import User
 from app.utils.validators import validate_email, validate_password
 from app.utils.decorators import validate_json
+from app.services.db_routing import replica_reads
+from app.services.passwords import PasswordHasherBusy
+from app.services.tokens import get_token_service
+from app.services.user_cache import load_user, resolve_current_user, token_claims
 import re
 
 auth_bp = Blueprint('auth', __name__)
@@ -52,15 +56,21 @@ def register():
         db.session.add(user)
         db.session.commit()
         
-        # Create access token
-        access_token = create_access_token(identity=user.id)
+        # Create access and refresh tokens
+        tokens = get_token_service().issue(user.id, token_claims(user))
         
         return jsonify({
             'message': 'User registered successfully',
-            'access_token': access_token,
+            **tokens,
             'user': user.to_dict()
         }), 201
         
+    except PasswordHasherBusy:
+        db.session.rollback()
+        response = jsonify({'error': 'Server busy, please retry'})
+        response.headers['Retry-After'] = '1'
+        return response, 503
+        
     except Exception as e:
         db.session.rollback()
         return jsonify({'error': 'Registration failed'}), 500
@@ -74,27 +84,42 @@ def login():
     # Find user by email
     user = User.query.filter_by(email=data['email']).first()
     
-    if not user or not user.check_password(data['password']):
+    try:
+        valid = user is not None and user.check_password(data['password'])
+    except PasswordHasherBusy:
+        response = jsonify({'error': 'Too many logins in progress, please retry'})
+        response.headers['Retry-After'] = '1'
+        return response, 503
+    
+    if not valid:
         return jsonify({'error': 'Invalid email or password'}), 401
     
     if not user.is_active:
         return jsonify({'error': 'Account is deactivated'}), 401
     
-    # Create access token
-    access_token = create_access_token(identity=user.id)
+    # Upgrade hashes made under an older algorithm or cost while the password is at hand
+    if user.password_needs_rehash():
+        try:
+            user.set_password(data['password'])
+            db.session.commit()
+        except PasswordHasherBusy:
+            pass  # Retried on a later login
+    
+    # Create access and refresh tokens
+    tokens = get_token_service().issue(user.id, token_claims(user))
     
     return jsonify({
         'message': 'Login successful',
-        'access_token': access_token,
+        **tokens,
         'user': user.to_dict()
     }), 200
 
 @auth_bp.route('/me', methods=['GET'])
+@replica_reads
 @jwt_required()
 def get_current_user():
     """Get current user information"""
-    current_user_id = get_jwt_identity()
-    user = User.query.get(current_user_id)
+    user = resolve_current_user()
     
     if not user:
         return jsonify({'error': 'User not found'}), 404
@@ -102,25 +127,28 @@ def get_current_user():
     return jsonify({'user': user.to_dict()}), 200
 
 @auth_bp.route('/refresh', methods=['POST'])
-@jwt_required()
+@jwt_required(refresh=True)
 def refresh():
-    """Refresh JWT token"""
-    current_user_id = get_jwt_identity()
-    user = User.query.get(current_user_id)
+    """Exchange a refresh token for a new access/refresh pair (the old refresh token is revoked)"""
+    user = load_user(get_jwt_identity())
     
     if not user or not user.is_active:
         return jsonify({'error': 'Invalid user'}), 401
     
-    # Create new access token
-    access_token = create_access_token(identity=user.id)
+    # Rotate, putting the current role in the new access token
+    tokens = get_token_service().rotate(get_jwt(), user.id, token_claims(user))
+    if tokens is None:
+        return jsonify({'error': 'Refresh token already used; session revoked'}), 401
     
     return jsonify({
-        'access_token': access_token,
+        **tokens,
         'user': user.to_dict()
     }), 200
 
 @auth_bp.route('/logout', methods=['POST'])
-@jwt_required()
+@jwt_required(verify_type=False)
 def logout():
-    """Logout user (client-side token removal)"""
+    """Logout user, revoking the presented token and every token of its session"""
+    get_token_service().revoke_session(get_jwt())
+    
     return jsonify({'message': 'Logout successful'}), 200
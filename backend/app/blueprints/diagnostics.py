@@ -0,0 +1,108 @@
+from flask import Blueprint, jsonify
+from app.services.cache import get_response_cache
+from app.services.counter_buffer import get_counter_buffer
+from app.services.db_pool import get_pool_stats
+from app.services.db_routing import get_replica_router
+from app.services.geo import grid_stats
+from app.services.insights import get_insight_service
+from app.services.passwords import get_password_hasher
+from app.services.platform_metrics import admin_metrics
+from app.services.search_tracking import get_search_history_writer
+from app.services.semantic_search import get_semantic_index
+from app.services.tokens import get_token_service
+from app.services.user_cache import user_cache
+from app.services.view_ingestion import get_view_ingestor
+from app.utils.decorators import require_admin
+
+diagnostics_bp = Blueprint('diagnostics', __name__)
+
+@diagnostics_bp.before_request
+@require_admin
+def require_admin_caller():
+    """Diagnostics expose cache keys, token and pool internals, so every route is admin-only"""
+
+@diagnostics_bp.route('/cache', methods=['GET'])
+def cache_stats():
+    """Get response cache hit/miss metrics"""
+    cache = get_response_cache()
+    if cache is None:
+        return jsonify({'enabled': False}), 200
+    
+    return jsonify({'enabled': True, **cache.stats()}), 200
+
+@diagnostics_bp.route('/views', methods=['GET'])
+def view_ingestion_stats():
+    """Get view ingestion queue depth, throughput and drop counters"""
+    ingestor = get_view_ingestor()
+    if ingestor is None:
+        return jsonify({'enabled': False}), 200
+    
+    return jsonify({'enabled': True, **ingestor.stats()}), 200
+
+@diagnostics_bp.route('/search-history', methods=['GET'])
+def search_history_stats():
+    """Get search history buffer size and coalescing counters"""
+    writer = get_search_history_writer()
+    if writer is None:
+        return jsonify({'enabled': False}), 200
+    
+    return jsonify({'enabled': True, **writer.stats()}), 200
+
+@diagnostics_bp.route('/counters', methods=['GET'])
+def counter_buffer_stats():
+    """Get buffered rollup counter keys and flush counters"""
+    buffer = get_counter_buffer()
+    if buffer is None:
+        return jsonify({'enabled': False}), 200
+    
+    return jsonify({'enabled': True, **buffer.stats()}), 200
+
+@diagnostics_bp.route('/admin-metrics', methods=['GET'])
+def admin_metrics_stats():
+    """Get admin counter reconciliation and drift counters"""
+    return jsonify(admin_metrics.stats()), 200
+
+@diagnostics_bp.route('/user-cache', methods=['GET'])
+def user_cache_stats():
+    """Get authenticated user cache hit/miss counters"""
+    return jsonify(user_cache.stats()), 200
+
+@diagnostics_bp.route('/password-hasher', methods=['GET'])
+def password_hasher_stats():
+    """Get password hashing pool throughput and rejection counters"""
+    return jsonify(get_password_hasher().stats()), 200
+
+@diagnostics_bp.route('/tokens', methods=['GET'])
+def token_stats():
+    """Get token verification latency and revocation filter counters"""
+    return jsonify(get_token_service().stats()), 200
+
+@diagnostics_bp.route('/db-pool', methods=['GET'])
+def db_pool_stats():
+    """Get connection pool occupancy, waiting callers and acquisition time"""
+    return jsonify(get_pool_stats()), 200
+
+@diagnostics_bp.route('/db-routing', methods=['GET'])
+def db_routing_stats():
+    """Get replica health, lag and how reads were routed"""
+    router = get_replica_router()
+    if router is None:
+        return jsonify({'enabled': False}), 200
+    
+    return jsonify({'enabled': True, **router.stats()}), 200
+
+@diagnostics_bp.route('/geo', methods=['GET'])
+def geo_stats():
+    """Get the nearest-producer grid size and rebuild count"""
+    return jsonify(grid_stats()), 200
+
+@diagnostics_bp.route('/semantic-search', methods=['GET'])
+def semantic_search_stats():
+    """Get the semantic index build, delta size and search count"""
+    return jsonify(get_semantic_index().describe()), 200
+
+@diagnostics_bp.route('/insights', methods=['GET'])
+def insight_stats():
+    """Get insight cache hits, generations and provider failures"""
+    service = get_insight_service()
+    return jsonify({'enabled': service.enabled, 'model': service.model, **service.stats}), 200
@@ -0,0 +1,96 @@
+from flask import Blueprint, request, jsonify
+from flask_jwt_extended import jwt_required, get_jwt_identity
+from app import db
+from app.models.order import Order
+from app.utils.decorators import require_role
+from app.services.db_routing import replica_reads
+from app.services.orders import CANCELLABLE_STATUSES, OrderError, cancel_order, place_orders
+from app.services.user_cache import current_role
+
+orders_bp = Blueprint('orders', __name__)
+
+@orders_bp.route('', methods=['POST'])
+@require_role(['consumer', 'admin'])
+def create_orders():
+    """Place a cart: stock is reserved atomically and one order is created per producer"""
+    data = request.get_json(silent=True) or {}
+    shipping_address = data.get('shipping_address')
+    if not isinstance(shipping_address, str) or not shipping_address.strip():
+        return jsonify({'error': 'shipping_address is required'}), 400
+    
+    try:
+        orders = place_orders(get_jwt_identity(), data.get('items'), shipping_address.strip(), data.get('notes'))
+    except OrderError as e:
+        return jsonify({'error': str(e), 'details': e.details}), e.status
+    
+    return jsonify({
+        'message': 'Order placed successfully',
+        'orders': [order.to_dict(include_items=True) for order in orders],
+        'total_amount': float(sum(order.total_amount for order in orders))
+    }), 201
+
+@orders_bp.route('', methods=['GET'])
+@replica_reads
+@jwt_required()
+def get_orders():
+    """List the orders a user placed (consumers) or received (producers), newest first"""
+    current_user_id = get_jwt_identity()
+    role = current_role()
+    status = request.args.get('status')
+    
+    statement = db.select(Order)
+    if role == 'producer':
+        statement = statement.filter(Order.producer_id == current_user_id)
+    elif role != 'admin':
+        statement = statement.filter(Order.consumer_id == current_user_id)
+    if status:
+        statement = statement.filter(Order.status == status)
+    statement = statement.order_by(Order.created_at.desc(), Order.id.desc())
+    
+    page = request.args.get('page', 1, type=int)
+    per_page = min(request.args.get('per_page', 20, type=int), 100)
+    pagination = db.paginate(statement, page=page, per_page=per_page, error_out=False)
+    
+    return jsonify({
+        'orders': [order.to_dict() for order in pagination.items],
+        'total': pagination.total,
+        'page': page,
+        'per_page': per_page,
+        'pages': pagination.pages
+    }), 200
+
+def _order_for_party(order_id, current_user_id):
+    """The order if the user placed or received it (or is an admin), else an error response"""
+    order = db.session.get(Order, order_id)
+    if not order:
+        return None, (jsonify({'error': 'Order not found'}), 404)
+    if current_user_id not in (order.consumer_id, order.producer_id) and current_role() != 'admin':
+        return None, (jsonify({'error': 'You can only view your own orders'}), 403)
+    return order, None
+
+@orders_bp.route('/<order_id>', methods=['GET'])
+@jwt_required()
+def get_order(order_id):
+    """Get an order with its items (its consumer, its producer or an admin)"""
+    order, error = _order_for_party(order_id, get_jwt_identity())
+    if error:
+        return error
+    
+    return jsonify(order.to_dict(include_items=True)), 200
+
+@orders_bp.route('/<order_id>/cancel', methods=['POST'])
+@jwt_required()
+def cancel(order_id):
+    """Cancel an order and restock its items (consumers while pending; producers and admins until shipped)"""
+    current_user_id = get_jwt_identity()
+    order, error = _order_for_party(order_id, current_user_id)
+    if error:
+        return error
+    
+    allowed = {'pending'} if current_user_id == order.consumer_id and current_role() != 'admin' else CANCELLABLE_STATUSES
+    try:
+        cancel_order(order, allowed)
+    except OrderError as e:
+        return jsonify({'error': str(e)}), e.status
+    
+    return jsonify({'message': 'Order cancelled', 'order': order.to_dict(include_items=True)}), 200
@@ -1,15 +1,31 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, Response, current_app, request, jsonify, stream_with_context
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from app import db
 from app.models.product import Product
-from app.models.user import User
-from app.utils.decorators import validate_json, require_role
+from app.utils.decorators import validate_json, require_role, optional_jwt_identity
 from app.utils.validators import validate_price, validate_stock_quantity
+from app.utils.streaming import ndjson_response, stream_query, wants_ndjson
+from app.utils.pagination import CURSOR_SORTS, is_cursor_request, get_cursor_params, keyset_paginate, apply_sort
+from app.services.cache import cached_response
+from app.services.db_routing import replica_reads
+from app.services.etags import conditional_response
+from app.services.product_bulk import ProductImport, detect_format, export_rows
+from app.services.product_search import get_product_index, index_product, unindex_product
+from app.services.view_ingestion import track_product_view
+from app.services.product_trending import record_product_view
+from app.services.recommendations import similar_products
+from app.services.semantic_search import hybrid_search
+from app.services.user_cache import current_role
+from werkzeug.exceptions import RequestEntityTooLarge
 import uuid
 
 products_bp = Blueprint('products', __name__)
 
 @products_bp.route('', methods=['GET'])
+@replica_reads
+@conditional_response('products:list', tags=['products'], cache_control='public, no-cache',
+                      defaults={'page': '1', 'per_page': '10'})
+@cached_response('products:list', tags=['products'], defaults={'page': '1', 'per_page': '10'})
 def get_products():
     """Get all products with optional filtering"""
     # Get query parameters for filtering and search
@@ -18,20 +34,13 @@ def get_products():
     producer_id = request.args.get('producer_id')
     min_price = request.args.get('min_price', type=float)
     max_price = request.args.get('max_price', type=float)
+    sort = request.args.get('sort', '')
     page = request.args.get('page', 1, type=int)
     per_page = request.args.get('per_page', 10, type=int)
     
     # Build query
     query = Product.query.filter_by(is_available=True)
     
-    if search:
-        query = query.filter(
-            db.or_(
-                Product.name.ilike(f'%{search}%'),
-                Product.description.ilike(f'%{search}%')
-            )
-        )
-    
     if category:
         query = query.filter(Product.category == category)
     
@@ -44,15 +53,44 @@ def get_products():
     if max_price is not None:
         query = query.filter(Product.price <= max_price)
     
+    ranked_ids = None
+    if search:
+        # Resolve the search terms through the inverted index instead of ILIKE scans;
+        # the best SEARCH_MAX_RESULTS matches that pass the filters are paginated
+        ranked_ids = _filter_ranked_ids(query, search, current_app.config.get('SEARCH_MAX_RESULTS', 1000))
+        query = query.filter(Product.id.in_(ranked_ids) if ranked_ids else db.false())
+    
+    if is_cursor_request(request.args):
+        return _cursor_page(query)
+    
+    if ranked_ids is not None and sort == 'relevance':
+        # ranked_ids are filtered and ordered by BM25 score; load only the requested page
+        page_ids = ranked_ids[(page - 1) * per_page:page * per_page]
+        page_products = {p.id: p for p in Product.query.filter(Product.id.in_(page_ids))} if page_ids else {}
+        
+        products = Product.to_dict_many(
+            [page_products[doc_id] for doc_id in page_ids if doc_id in page_products],
+            include_producer=True
+        )
+        total = len(ranked_ids)
+        
+        return jsonify({
+            'products': products,
+            'total': total,
+            'page': page,
+            'per_page': per_page,
+            'pages': (total + per_page - 1) // per_page
+        }), 200
+    
+    if sort in CURSOR_SORTS:
+        query = apply_sort(query, Product, sort)
+    
     # Pagination
     pagination = query.paginate(
         page=page, per_page=per_page, error_out=False
     )
     
-    products = []
-    for product in pagination.items:
-        product_dict = product.to_dict(include_producer=True)
-        products.append(product_dict)
+    products = Product.to_dict_many(pagination.items, include_producer=True)
     
     return jsonify({
         'products': products,
@@ -104,6 +142,7 @@ def create_product():
         
         db.session.add(product)
         db.session.commit()
+        index_product(product)
         
         return jsonify({
             'message': 'Product created successfully',
@@ -115,6 +154,11 @@ def create_product():
         return jsonify({'error': 'Failed to create product'}), 500
 
 @products_bp.route('/<product_id>', methods=['GET'])
+@replica_reads
+@track_product_view(get_user_id=optional_jwt_identity, on_view=record_product_view)
+@conditional_response('products:detail', tags=lambda product_id: [f'product:{product_id}', 'profiles'],
+                      cache_control='public, no-cache')
+@cached_response('products:detail', tags=lambda product_id: [f'product:{product_id}', 'profiles'])
 def get_product(product_id):
     """Get a specific product by ID"""
     product = Product.query.get(product_id)
@@ -123,9 +167,28 @@ def get_product(product_id):
         return jsonify({'error': 'Product not found'}), 404
     
     return jsonify({
-        'product': product.to_dict(include_producer=True, include_reviews=True)
+        'product': Product.to_dict_many([product], include_producer=True, include_reviews=True)[0]
     }), 200
 
+@products_bp.route('/<product_id>/similar', methods=['GET'])
+@replica_reads
+@cached_response('products:similar', tags=['recommendations', 'products'], defaults={'limit': '10'})
+def get_similar_products(product_id):
+    """Get the products most often viewed, favorited or ordered by the same users (precomputed)"""
+    limit = min(max(request.args.get('limit', 10, type=int) or 10, 1), current_app.config.get('RECOMMENDATION_TOP_N', 20))
+    
+    similar = similar_products(product_id, limit)
+    if not similar and db.session.get(Product, product_id) is None:
+        return jsonify({'error': 'Product not found'}), 404
+    
+    scores = {product.id: score for product, score in similar}
+    products = [
+        {**data, 'similarity': round(scores[data['id']], 4)}
+        for data in Product.to_dict_many([product for product, _ in similar], include_producer=True)
+    ]
+    
+    return jsonify({'products': products, 'count': len(products)}), 200
+
 @products_bp.route('/<product_id>', methods=['PUT'])
 @jwt_required()
 @validate_json(['name', 'description', 'category', 'price'])
@@ -140,11 +203,7 @@ def update_product(product_id):
         return jsonify({'error': 'Product not found'}), 404
     
     # Check ownership or admin role
-    current_user = User.query.get(current_user_id)
-    if not current_user:
-        return jsonify({'error': 'User not found'}), 404
-    
-    if product.producer_id != current_user_id and not current_user.is_admin():
+    if product.producer_id != current_user_id and current_role() != 'admin':
         return jsonify({'error': 'You can only edit your own products'}), 403
     
     # Validate price
@@ -176,6 +235,7 @@ def update_product(product_id):
         product.expiry_date = data.get('expiry_date', product.expiry_date)
         
         db.session.commit()
+        index_product(product)
         
         return jsonify({
             'message': 'Product updated successfully',
@@ -198,16 +258,13 @@ def delete_product(product_id):
         return jsonify({'error': 'Product not found'}), 404
     
     # Check ownership or admin role
-    current_user = User.query.get(current_user_id)
-    if not current_user:
-        return jsonify({'error': 'User not found'}), 404
-    
-    if product.producer_id != current_user_id and not current_user.is_admin():
+    if product.producer_id != current_user_id and current_role() != 'admin':
         return jsonify({'error': 'You can only delete your own products'}), 403
     
     try:
         db.session.delete(product)
         db.session.commit()
+        unindex_product(product_id)
         
         return jsonify({'message': 'Product deleted successfully'}), 200
         
@@ -216,6 +273,9 @@ def delete_product(product_id):
         return jsonify({'error': 'Failed to delete product'}), 500
 
 @products_bp.route('/categories', methods=['GET'])
+@replica_reads
+@conditional_response('products:categories', tags=['products'], cache_control='public, max-age=300')
+@cached_response('products:categories', tags=['products'])
 def get_categories():
     """Get all product categories"""
     categories = db.session.query(Product.category).distinct().all()
@@ -223,13 +283,58 @@ def get_categories():
     
     return jsonify({'categories': category_list}), 200
 
+@products_bp.route('/search', methods=['GET'])
+@replica_reads
+@cached_response('products:search', tags=['products'], ttl=30, defaults={'mode': 'hybrid', 'limit': '20'})
+def search_products():
+    """Search products by meaning and keywords (?q=&mode=hybrid|semantic|keyword&category=&limit=20)"""
+    query = (request.args.get('q') or '').strip()
+    if not query:
+        return jsonify({'error': 'q is required'}), 400
+    mode = request.args.get('mode', 'hybrid')
+    if mode not in ('hybrid', 'semantic', 'keyword'):
+        return jsonify({'error': 'mode must be hybrid, semantic or keyword'}), 400
+    limit = min(max(request.args.get('limit', 20, type=int) or 20, 1), 100)
+    category = request.args.get('category')
+    
+    ranked = hybrid_search(query, limit, mode=mode)
+    
+    # Filters apply to the ranked candidates; only the returned page is serialized
+    statement = db.select(Product).filter(Product.id.in_([result['id'] for result in ranked]), Product.is_available.is_(True))
+    if category:
+        statement = statement.filter(Product.category == category)
+    products = {product.id: product for product in db.session.scalars(statement)} if ranked else {}
+    results = [result for result in ranked if result['id'] in products][:limit]
+    
+    relevance = {result['id']: result for result in results}
+    items = [
+        {
+            **data,
+            'relevance': {field: round(relevance[data['id']][field], 4) for field in ('score', 'semantic', 'keyword')}
+        }
+        for data in Product.to_dict_many([products[result['id']] for result in results], include_producer=True)
+    ]
+    
+    return jsonify({'products': items, 'count': len(items), 'query': query, 'mode': mode}), 200
+
 @products_bp.route('/my-products', methods=['GET'])
+@replica_reads
 @jwt_required()
 @require_role(['producer', 'admin'])
 def get_my_products():
-    """Get current user's products"""
+    """Get current user's products (all of them as NDJSON with Accept: application/x-ndjson)"""
     current_user_id = get_jwt_identity()
     
+    if wants_ndjson():
+        statement = db.select(Product).filter_by(producer_id=current_user_id).order_by(
+            Product.created_at.desc(), Product.id.desc()
+        )
+        return ndjson_response(
+            product
+            for chunk in stream_query(statement)
+            for product in Product.to_dict_many(chunk, include_producer=True, include_reviews=True)
+        )
+    
     # Get query parameters
     page = request.args.get('page', 1, type=int)
     per_page = request.args.get('per_page', 10, type=int)
@@ -237,15 +342,16 @@ def get_my_products():
     # Query user's products
     query = Product.query.filter_by(producer_id=current_user_id)
     
+    if is_cursor_request(request.args):
+        return _cursor_page(query, include_reviews=True)
+    
     # Pagination
     pagination = query.paginate(
         page=page, per_page=per_page, error_out=False
     )
     
-    products = []
-    for product in pagination.items:
-        product_dict = product.to_dict(include_producer=True, include_reviews=True)
-        products.append(product_dict)
+    # Producers, reviews and rating aggregates are loaded for the whole page at once
+    products = Product.to_dict_many(pagination.items, include_producer=True, include_reviews=True)
     
     return jsonify({
         'products': products,
@@ -254,3 +360,112 @@ def get_my_products():
         'per_page': per_page,
         'pages': pagination.pages
     }), 200
+
+@products_bp.route('/import', methods=['POST'])
+@jwt_required()
+@require_role(['producer', 'admin'])
+def bulk_import_products():
+    """Create or update products from a CSV or NDJSON upload (producers and admins only)
+    
+    The body is either the file itself (Content-Type text/csv or
+    application/x-ndjson) or a multipart form with a 'file' field. Rows are
+    read as they arrive and saved in batches; invalid rows are skipped and
+    reported with their line number.
+    """
+    current_user_id = get_jwt_identity()
+    max_length = current_app.config.get('MAX_CONTENT_LENGTH')
+    
+    if max_length and request.content_length and request.content_length > max_length:
+        return jsonify({'error': f'Upload exceeds the {max_length} byte limit'}), 413
+    
+    if request.mimetype == 'multipart/form-data':
+        upload = request.files.get('file')
+        if upload is None:
+            return jsonify({'error': "Missing 'file' upload"}), 400
+        fmt = detect_format(upload.mimetype, upload.filename)
+        stream = upload.stream
+    else:
+        fmt = detect_format(request.mimetype)
+        stream = request.stream
+    
+    if fmt is None:
+        return jsonify({'error': 'Upload must be CSV (text/csv) or NDJSON (application/x-ndjson)'}), 415
+    
+    job = ProductImport(
+        current_user_id,
+        batch_size=current_app.config.get('PRODUCT_IMPORT_BATCH_SIZE', 500),
+        max_errors=current_app.config.get('PRODUCT_IMPORT_MAX_ERRORS', 1000)
+    )
+    try:
+        result = job.run(stream, fmt)
+    except RequestEntityTooLarge:
+        # Batches saved before the limit was reached stay saved
+        return jsonify({
+            'error': f'Upload exceeds the {max_length} byte limit; rows after the last saved batch were not imported',
+            **job.summary()
+        }), 413
+    
+    return jsonify({'message': 'Import finished', **result}), 200
+
+@products_bp.route('/export', methods=['GET'])
+@replica_reads
+@jwt_required()
+@require_role(['producer', 'admin'])
+def export_products():
+    """Stream the current user's catalog as CSV or NDJSON (?format=csv|ndjson)
+    
+    Admins may export another producer's catalog with ?producer_id=.
+    """
+    fmt = request.args.get('format', 'csv')
+    if fmt not in ('csv', 'ndjson'):
+        return jsonify({'error': 'format must be csv or ndjson'}), 400
+    
+    producer_id = get_jwt_identity()
+    if request.args.get('producer_id') and current_role() == 'admin':
+        producer_id = request.args['producer_id']
+    
+    rows = export_rows(producer_id, fmt, chunk_size=current_app.config.get('PRODUCT_EXPORT_CHUNK_SIZE', 500))
+    response = Response(
+        stream_with_context(rows),
+        mimetype='text/csv' if fmt == 'csv' else 'application/x-ndjson'
+    )
+    response.headers['Content-Disposition'] = f'attachment; filename="products-{producer_id}.{fmt}"'
+    return response
+
+def _cursor_page(query, include_reviews=False):
+    """Keyset-paginated response for ?cursor=&limit= requests"""
+    try:
+        sort, cursor, limit = get_cursor_params(request.args)
+        items, next_cursor = keyset_paginate(query, Product, sort, cursor, limit)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    response = {
+        'products': Product.to_dict_many(items, include_producer=True, include_reviews=include_reviews),
+        'next_cursor': next_cursor,
+        'limit': limit,
+        'sort': sort
+    }
+    
+    # Counting is a separate full scan, so it is only done on request
+    if request.args.get('include_total', '').lower() in ('1', 'true'):
+        response['total'] = query.order_by(None).count()
+    
+    return jsonify(response), 200
+
+def _filter_ranked_ids(query, search, limit):
+    """Ids of the best-ranked search matches passing the query's filters, at most limit of them
+    
+    Candidates are checked against the filters limit ids at a time, walking down the
+    ranking until limit of them pass, so a filtered search is not cut short by matches
+    the filters reject.
+    """
+    ranked = [doc_id for doc_id, _ in get_product_index().search(search)]
+    matching = []
+    for start in range(0, len(ranked), limit):
+        candidates = ranked[start:start + limit]
+        passing = {row[0] for row in query.filter(Product.id.in_(candidates)).with_entities(Product.id)}
+        matching.extend(doc_id for doc_id in candidates if doc_id in passing)
+        if len(matching) >= limit:
+            break
+    return matching[:limit]
@@ -0,0 +1,99 @@
+import itertools
+from flask import Blueprint, request, jsonify
+from flask_jwt_extended import jwt_required, get_jwt_identity
+from app import db
+from app.models.search_history import SearchHistory, SearchQueryStat
+from app.services.search_tracking import get_search_history_writer
+from app.services.user_cache import current_role
+from app.utils.decorators import optional_jwt_identity
+from app.utils.streaming import ndjson_response, stream_query, wants_ndjson
+
+search_bp = Blueprint('search', __name__)
+
+@search_bp.route('', methods=['POST'])
+def track_search():
+    """Record a search (buffered and written in bulk)"""
+    data = request.get_json(silent=True) or {}
+    query = data.get('query')
+    if not isinstance(query, str) or not query.strip():
+        return jsonify({'error': 'Query is required'}), 400
+    
+    results_count = data.get('results_count', 0)
+    if not isinstance(results_count, int) or results_count < 0:
+        return jsonify({'error': 'results_count must be a non-negative integer'}), 400
+    
+    writer = get_search_history_writer()
+    accepted = writer.record(
+        query,
+        user_id=optional_jwt_identity(),
+        client_key=request.remote_addr,
+        filters=data.get('filters') or {},
+        results_count=results_count
+    ) if writer else False
+    
+    return jsonify({'message': 'Search tracked successfully', 'accepted': accepted}), 202
+
+@search_bp.route('/history/<user_id>', methods=['GET'])
+@jwt_required()
+def get_search_history(user_id):
+    """Get a user's distinct searches, most recent first (own history or admin)
+    
+    With Accept: application/x-ndjson every search is streamed, one per line.
+    """
+    current_user_id = get_jwt_identity()
+    if user_id != current_user_id:
+        if current_role() != 'admin':
+            return jsonify({'error': 'You can only view your own search history'}), 403
+    
+    # Searches still buffered by the writer come first so results are read-your-writes
+    writer = get_search_history_writer()
+    pending = writer.pending_for(user_id) if writer else []
+    pending_queries = {entry['normalized_query'] for entry in pending}
+    pending = [{
+        **entry,
+        'created_at': entry['created_at'].isoformat(),
+        'last_searched_at': entry['last_searched_at'].isoformat()
+    } for entry in pending]
+    
+    if wants_ndjson():
+        # The whole history unless a limit is given
+        limit = request.args.get('limit', type=int)
+        statement = db.select(SearchHistory).filter_by(user_id=user_id).order_by(
+            SearchHistory.last_searched_at.desc()
+        )
+        if limit is not None:
+            limit = max(limit, 0)
+            statement = statement.limit(limit + len(pending_queries))
+        return ndjson_response(_history_lines(pending, pending_queries, statement, limit))
+    
+    limit = min(request.args.get('limit', 20, type=int) or 20, 100)
+    
+    stored = SearchHistory.query.filter_by(user_id=user_id).order_by(
+        SearchHistory.last_searched_at.desc()
+    ).limit(limit + len(pending_queries))
+    
+    searches = pending + [search.to_dict() for search in stored if search.normalized_query not in pending_queries]
+    searches = searches[:limit]
+    
+    return jsonify({'searches': searches, 'count': len(searches)}), 200
+
+def _history_lines(pending, pending_queries, statement, limit=None):
+    """NDJSON records of a search history: buffered searches, then stored ones"""
+    records = itertools.chain(pending, (
+        search.to_dict()
+        for chunk in stream_query(statement)
+        for search in chunk
+        if search.normalized_query not in pending_queries
+    ))
+    return itertools.islice(records, limit) if limit is not None else records
+
+@search_bp.route('/popular', methods=['GET'])
+def get_popular_searches():
+    """Get the most frequent search queries"""
+    limit = min(request.args.get('limit', 10, type=int) or 10, 100)
+    
+    stats = SearchQueryStat.query.order_by(
+        SearchQueryStat.search_count.desc(), SearchQueryStat.last_searched_at.desc()
+    ).limit(limit)
+    
+    return jsonify({'queries': [stat.to_dict() for stat in stats]}), 200
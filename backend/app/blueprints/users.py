@@ -0,0 +1,117 @@
+from flask import Blueprint, request, jsonify, current_app
+from app import db
+from app.models.product import Product
+from app.models.user import User
+from flask_jwt_extended import jwt_required, get_jwt_identity
+from app.utils.decorators import require_admin, optional_jwt_identity
+from app.utils.streaming import ndjson_response, stream_query, wants_ndjson
+from app.services.db_routing import replica_reads
+from app.services.geo import location, nearest_producers
+from app.services.recommendations import user_recommendations
+from app.services.user_cache import current_role
+
+users_bp = Blueprint('users', __name__)
+
+# Fields anyone may see on a user's profile
+PUBLIC_FIELDS = ['id', 'username', 'first_name', 'last_name', 'role', 'city', 'region', 'country',
+                 'is_verified', 'created_at']
+
+@users_bp.route('', methods=['GET'])
+@replica_reads
+@require_admin
+def get_users():
+    """List users (admin only), optionally filtered by role, region or active state
+    
+    With Accept: application/x-ndjson every matching user is streamed, one
+    per line, instead of a page.
+    """
+    role = request.args.get('role')
+    region = request.args.get('region')
+    is_active = request.args.get('is_active')
+    
+    statement = db.select(User)
+    if role:
+        statement = statement.filter(User.role == role)
+    if region:
+        statement = statement.filter(User.region == region)
+    if is_active is not None:
+        statement = statement.filter(User.is_active == (is_active.lower() in ('1', 'true', 'yes')))
+    statement = statement.order_by(User.created_at.desc(), User.id.desc())
+    
+    if wants_ndjson():
+        return ndjson_response(user.to_dict() for chunk in stream_query(statement) for user in chunk)
+    
+    page = request.args.get('page', 1, type=int)
+    per_page = min(request.args.get('per_page', 20, type=int), 100)
+    pagination = db.paginate(statement, page=page, per_page=per_page, error_out=False)
+    
+    return jsonify({
+        'users': [user.to_dict() for user in pagination.items],
+        'total': pagination.total,
+        'page': page,
+        'per_page': per_page,
+        'pages': pagination.pages
+    }), 200
+
+@users_bp.route('/producers/nearest', methods=['GET'])
+@replica_reads
+def get_nearest_producers():
+    """Get the producers closest to a point (?lat=&lon=&k=10&radius_km=)"""
+    point = location(request.args.get('lat', type=float), request.args.get('lon', type=float))
+    if point is None:
+        return jsonify({'error': 'lat and lon must be valid coordinates'}), 400
+    
+    k = min(max(request.args.get('k', 10, type=int) or 10, 1), current_app.config.get('GEO_NEAREST_MAX_K', 50))
+    radius_km = request.args.get('radius_km', type=float)
+    if radius_km is not None and radius_km <= 0:
+        return jsonify({'error': 'radius_km must be positive'}), 400
+    
+    nearest = nearest_producers(point, k=k, radius_km=radius_km)
+    
+    # Profiles of all the matches with one query
+    users = {user.id: user for user in User.query.filter(User.id.in_([producer_id for producer_id, _ in nearest]))}
+    producers = []
+    for producer_id, distance in nearest:
+        if producer_id not in users:
+            continue  # Deleted since the grid was refreshed
+        data = users[producer_id].to_dict()
+        producers.append({
+            **{field: data[field] for field in PUBLIC_FIELDS + ['latitude', 'longitude']},
+            'distance_km': round(distance, 3)
+        })
+    
+    return jsonify({'producers': producers, 'count': len(producers)}), 200
+
+@users_bp.route('/<user_id>', methods=['GET'])
+@replica_reads
+def get_user(user_id):
+    """Get a user's profile (contact details only for the user themselves or an admin)"""
+    user = db.session.get(User, user_id)
+    if not user:
+        return jsonify({'error': 'User not found'}), 404
+    
+    data = user.to_dict()
+    current_user_id = optional_jwt_identity()
+    if current_user_id != user_id and (current_user_id is None or current_role() != 'admin'):
+        data = {field: data[field] for field in PUBLIC_FIELDS}
+    
+    return jsonify(data), 200
+
+@users_bp.route('/<user_id>/recommendations', methods=['GET'])
+@replica_reads
+@jwt_required()
+def get_user_recommendations(user_id):
+    """Get products similar to those a user viewed, favorited or ordered (the user or an admin)"""
+    if user_id != get_jwt_identity() and current_role() != 'admin':
+        return jsonify({'error': 'You can only view your own recommendations'}), 403
+    
+    limit = min(max(request.args.get('limit', 10, type=int) or 10, 1), 50)
+    recommended = user_recommendations(user_id, limit)
+    
+    scores = {product.id: score for product, score in recommended}
+    products = [
+        {**data, 'score': round(scores[data['id']], 4)}
+        for data in Product.to_dict_many([product for product, _ in recommended], include_producer=True)
+    ]
+    
+    return jsonify({'products': products, 'count': len(products)}), 200
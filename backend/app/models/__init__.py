@@ -2,11 +2,18 @@ from .user import User
 from .product import Product
 from .review import Review
 from .favorite import Favorite
-from .search_history import SearchHistory
-from .product_view import ProductView
+from .search_history import SearchHistory, SearchQueryStat
+from .product_view import ProductView, ProductViewCount
 from .order import Order, OrderItem
 from .ai_prediction import AIPrediction
 from .moderation_log import ModerationLog
+from .resource_version import ResourceVersion
+from .producer_stat import ProducerStat, ProducerDailyStat
+from .analytics_bucket import AnalyticsBucket
+from .revoked_token import RevokedToken
+from .geo_tile import GeoTile
+from .product_similarity import ProductSimilarity
+from .llm_insight import LLMInsight
 
 __all__ = [
     'User',
@@ -14,9 +21,19 @@ __all__ = [
     'Review',
     'Favorite',
     'SearchHistory',
+    'SearchQueryStat',
     'ProductView',
+    'ProductViewCount',
     'Order',
     'OrderItem',
     'AIPrediction',
-    'ModerationLog'
+    'ModerationLog',
+    'ResourceVersion',
+    'ProducerStat',
+    'ProducerDailyStat',
+    'AnalyticsBucket',
+    'RevokedToken',
+    'GeoTile',
+    'ProductSimilarity',
+    'LLMInsight'
 ]
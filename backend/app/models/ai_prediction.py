@@ -14,6 +14,11 @@ class AIPrediction(db.Model):
     confidence_score = db.Column(db.Numeric(3, 2), nullable=False)  # 0.00 to 1.00
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
+    __table_args__ = (
+        db.Index('idx_ai_predictions_user_type', 'user_id', 'prediction_type', 'created_at'),
+        db.Index('idx_ai_predictions_type', 'prediction_type', 'created_at'),
+    )
+    
     def to_dict(self):
         """Convert AI prediction to dictionary"""
         return {
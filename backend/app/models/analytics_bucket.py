@@ -0,0 +1,30 @@
+from app import db
+
+class AnalyticsBucket(db.Model):
+    """Pre-aggregated value of a metric for one dimension key and time bucket"""
+    __tablename__ = 'analytics_buckets'
+    
+    metric = db.Column(db.String(20), primary_key=True)  # views, favorites, orders, revenue, searches
+    granularity = db.Column(db.String(10), primary_key=True)  # hour, day, month
+    dimension = db.Column(db.String(20), primary_key=True)  # all, product, producer, category, region
+    dimension_key = db.Column(db.String(100), primary_key=True)  # '' for dimension 'all'
+    bucket_start = db.Column(db.DateTime, primary_key=True)  # UTC start of the bucket
+    value = db.Column(db.Numeric(14, 2), nullable=False, default=0)
+    
+    __table_args__ = (
+        db.Index('idx_analytics_buckets_range', 'metric', 'granularity', 'dimension', 'bucket_start'),
+    )
+    
+    def to_dict(self):
+        """Convert analytics bucket to dictionary"""
+        return {
+            'metric': self.metric,
+            'granularity': self.granularity,
+            'dimension': self.dimension,
+            'key': self.dimension_key,
+            'bucket_start': self.bucket_start.isoformat(),
+            'value': float(self.value or 0)
+        }
+    
+    def __repr__(self):
+        return f'<AnalyticsBucket {self.metric} {self.granularity} {self.dimension}={self.dimension_key} {self.bucket_start}>'
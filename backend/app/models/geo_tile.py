@@ -0,0 +1,24 @@
+from app import db
+
+class GeoTile(db.Model):
+    """Pre-aggregated count of a metric within one map tile at one zoom level"""
+    __tablename__ = 'geo_tiles'
+    
+    metric = db.Column(db.String(20), primary_key=True)  # producers, products, views, favorites, orders
+    zoom = db.Column(db.SmallInteger, primary_key=True)  # Web Mercator (slippy map) zoom level
+    tile_x = db.Column(db.Integer, primary_key=True)
+    tile_y = db.Column(db.Integer, primary_key=True)
+    value = db.Column(db.Integer, nullable=False, default=0)
+    
+    def to_dict(self):
+        """Convert geo tile to dictionary"""
+        return {
+            'metric': self.metric,
+            'zoom': self.zoom,
+            'x': self.tile_x,
+            'y': self.tile_y,
+            'value': self.value
+        }
+    
+    def __repr__(self):
+        return f'<GeoTile {self.metric} {self.zoom}/{self.tile_x}/{self.tile_y}={self.value}>'
@@ -0,0 +1,27 @@
+from app import db
+from datetime import datetime
+
+class LLMInsight(db.Model):
+    """Cached LLM completion keyed by a hash of the model, prompt and parameters"""
+    __tablename__ = 'llm_insights'
+    
+    content_hash = db.Column(db.String(64), primary_key=True)  # SHA-256 hex of the canonical request
+    model = db.Column(db.String(100), nullable=False)
+    status = db.Column(db.String(10), nullable=False, default='pending')  # pending (being generated), ready
+    response = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    completed_at = db.Column(db.DateTime)
+    
+    def to_dict(self):
+        """Convert LLM insight to dictionary"""
+        return {
+            'content_hash': self.content_hash,
+            'model': self.model,
+            'status': self.status,
+            'response': self.response,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'completed_at': self.completed_at.isoformat() if self.completed_at else None
+        }
+    
+    def __repr__(self):
+        return f'<LLMInsight {self.content_hash[:12]} {self.status}>'
@@ -11,7 +11,8 @@ class Order(db.Model):
     producer_id = db.Column(db.String(36), db.ForeignKey('users.id'), nullable=False)
     total_amount = db.Column(db.Numeric(10, 2), nullable=False)
     currency = db.Column(db.String(3), default='MAD')
-    status = db.Column(db.String(20), default='pending')  # pending, confirmed, shipped, delivered, cancelled
+    # active_history keeps previous values available to the admin metrics events
+    status = db.column_property(db.Column(db.String(20), default='pending'), active_history=True)  # pending, confirmed, shipped, delivered, cancelled
     shipping_address = db.Column(db.Text, nullable=False)
     notes = db.Column(db.Text)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
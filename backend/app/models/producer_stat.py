@@ -0,0 +1,66 @@
+from app import db
+from datetime import datetime
+
+class ProducerStat(db.Model):
+    """Materialized per-producer totals, maintained incrementally on writes"""
+    __tablename__ = 'producer_stats'
+    
+    producer_id = db.Column(db.String(36), db.ForeignKey('users.id', ondelete='CASCADE'), primary_key=True)
+    product_count = db.Column(db.Integer, nullable=False, default=0)
+    view_count = db.Column(db.BigInteger, nullable=False, default=0)
+    favorite_count = db.Column(db.Integer, nullable=False, default=0)
+    review_count = db.Column(db.Integer, nullable=False, default=0)
+    rating_sum = db.Column(db.Integer, nullable=False, default=0)
+    rating_count = db.Column(db.Integer, nullable=False, default=0)
+    order_count = db.Column(db.Integer, nullable=False, default=0)
+    revenue = db.Column(db.Numeric(12, 2), nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    def to_dict(self):
+        """Convert producer stat to dictionary"""
+        return {
+            'producer_id': self.producer_id,
+            'total_products': self.product_count,
+            'total_views': self.view_count,
+            'total_favorites': self.favorite_count,
+            'total_reviews': self.review_count,
+            'average_rating': round(self.rating_sum / self.rating_count, 2) if self.rating_count else 0,
+            'total_orders': self.order_count,
+            'total_revenue': float(self.revenue or 0),
+            'updated_at': self.updated_at.isoformat() if self.updated_at else None
+        }
+    
+    def __repr__(self):
+        return f'<ProducerStat {self.producer_id}>'
+
+class ProducerDailyStat(db.Model):
+    """Net change of a producer's counters during one UTC day"""
+    __tablename__ = 'producer_daily_stats'
+    
+    producer_id = db.Column(db.String(36), db.ForeignKey('users.id', ondelete='CASCADE'), primary_key=True)
+    day = db.Column(db.Date, primary_key=True)
+    product_count = db.Column(db.Integer, nullable=False, default=0)
+    view_count = db.Column(db.BigInteger, nullable=False, default=0)
+    favorite_count = db.Column(db.Integer, nullable=False, default=0)
+    review_count = db.Column(db.Integer, nullable=False, default=0)
+    rating_sum = db.Column(db.Integer, nullable=False, default=0)
+    rating_count = db.Column(db.Integer, nullable=False, default=0)
+    order_count = db.Column(db.Integer, nullable=False, default=0)
+    revenue = db.Column(db.Numeric(12, 2), nullable=False, default=0)
+    
+    def to_dict(self):
+        """Convert producer daily stat to dictionary"""
+        return {
+            'day': self.day.isoformat(),
+            'products': self.product_count,
+            'views': self.view_count,
+            'favorites': self.favorite_count,
+            'reviews': self.review_count,
+            'rating_sum': self.rating_sum,
+            'rating_count': self.rating_count,
+            'orders': self.order_count,
+            'revenue': float(self.revenue or 0)
+        }
+    
+    def __repr__(self):
+        return f'<ProducerDailyStat {self.producer_id} {self.day}>'
@@ -10,7 +10,8 @@ class Product(db.Model):
     producer_id = db.Column(db.String(36), db.ForeignKey('users.id'), nullable=False)
     name = db.Column(db.String(100), nullable=False)
     description = db.Column(db.Text, nullable=False)
-    category = db.Column(db.String(50), nullable=False)
+    # active_history keeps previous values available to the admin metrics events
+    category = db.column_property(db.Column(db.String(50), nullable=False), active_history=True)
     subcategory = db.Column(db.String(50))
     price = db.Column(db.Numeric(10, 2), nullable=False)
     currency = db.Column(db.String(3), default='MAD')
@@ -19,23 +20,48 @@ class Product(db.Model):
     min_order_quantity = db.Column(db.Integer, default=1)
     max_order_quantity = db.Column(db.Integer)
     images = db.Column(db.JSON, default=list)  # List of image URLs
-    tags = db.Column(db.ARRAY(db.String), default=list)
+    tags = db.Column(db.ARRAY(db.String).with_variant(db.JSON, 'sqlite'), default=list)  # JSON under the SQLite test database
     is_organic = db.Column(db.Boolean, default=False)
-    is_available = db.Column(db.Boolean, default=True)
+    is_available = db.column_property(db.Column(db.Boolean, default=True), active_history=True)
     harvest_date = db.Column(db.Date)
     expiry_date = db.Column(db.Date)
+    
+    # Denormalized rating aggregates over non-flagged reviews, maintained by Review events
+    rating_sum = db.Column(db.Integer, default=0, server_default='0', nullable=False)
+    rating_count = db.Column(db.Integer, default=0, server_default='0', nullable=False)
+    rating_average = db.Column(db.Float, default=0, server_default='0', nullable=False)
+    rating_1_count = db.Column(db.Integer, default=0, server_default='0', nullable=False)
+    rating_2_count = db.Column(db.Integer, default=0, server_default='0', nullable=False)
+    rating_3_count = db.Column(db.Integer, default=0, server_default='0', nullable=False)
+    rating_4_count = db.Column(db.Integer, default=0, server_default='0', nullable=False)
+    rating_5_count = db.Column(db.Integer, default=0, server_default='0', nullable=False)
+    
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
+    # Composite indexes backing keyset (cursor) pagination
+    __table_args__ = (
+        db.Index('idx_products_created_at_id', 'created_at', 'id'),
+        db.Index('idx_products_price_id', 'price', 'id'),
+        db.Index('idx_products_rating_average_id', 'rating_average', 'id'),
+    )
+    
     # Relationships
     reviews = db.relationship('Review', backref='product', lazy='dynamic', cascade='all, delete-orphan')
     favorites = db.relationship('Favorite', backref='product', lazy='dynamic', cascade='all, delete-orphan')
     product_views = db.relationship('ProductView', backref='product', lazy='dynamic', cascade='all, delete-orphan')
+    view_counter = db.relationship('ProductViewCount', uselist=False, cascade='all, delete-orphan')
     order_items = db.relationship('OrderItem', backref='product', lazy='dynamic', cascade='all, delete-orphan')
     ai_predictions = db.relationship('AIPrediction', backref='product', lazy='dynamic', cascade='all, delete-orphan')
     
-    def to_dict(self, include_reviews=False, include_producer=False):
-        """Convert product to dictionary"""
+    def to_dict(self, include_reviews=False, include_producer=False, preloaded=None):
+        """Convert product to dictionary
+        
+        preloaded may carry 'producer', 'reviews' and 'view_count' loaded in
+        bulk by to_dict_many() so no per-product queries are issued;
+        view_count is only included when preloaded.
+        """
+        preloaded = preloaded or {}
         data = {
             'id': self.id,
             'producer_id': self.producer_id,
@@ -55,37 +81,92 @@ class Product(db.Model):
             'is_available': self.is_available,
             'harvest_date': self.harvest_date.isoformat() if self.harvest_date else None,
             'expiry_date': self.expiry_date.isoformat() if self.expiry_date else None,
+            'average_rating': self.get_average_rating(),
+            'rating_count': self.rating_count or 0,
+            'rating_histogram': self.get_rating_histogram(),
             'created_at': self.created_at.isoformat() if self.created_at else None,
             'updated_at': self.updated_at.isoformat() if self.updated_at else None
         }
         
-        if include_producer and self.producer:
-            data['producer'] = {
-                'id': self.producer.id,
-                'username': self.producer.username,
-                'first_name': self.producer.first_name,
-                'last_name': self.producer.last_name,
-                'city': self.producer.city,
-                'region': self.producer.region
-            }
+        # Only serializers going through to_dict_many() load view counts (in one query)
+        if 'view_count' in preloaded:
+            data['view_count'] = preloaded['view_count']
+        
+        if include_producer:
+            producer = preloaded['producer'] if 'producer' in preloaded else self.producer
+            if producer:
+                data['producer'] = {
+                    'id': producer.id,
+                    'username': producer.username,
+                    'first_name': producer.first_name,
+                    'last_name': producer.last_name,
+                    'city': producer.city,
+                    'region': producer.region
+                }
         
         if include_reviews:
-            data['reviews'] = [review.to_dict() for review in self.reviews]
-            data['average_rating'] = self.get_average_rating()
-            data['review_count'] = self.reviews.count()
+            reviews = preloaded['reviews'] if 'reviews' in preloaded else self.reviews
+            data['reviews'] = [review.to_dict() for review in reviews]
+            data['review_count'] = self.get_review_count()
         
         return data
     
+    @classmethod
+    def to_dict_many(cls, products, include_reviews=False, include_producer=False):
+        """Convert a page of products to dictionaries with a fixed number of queries"""
+        from app.models.user import User
+        from app.models.review import Review
+        from app.models.product_view import ProductViewCount
+        
+        products = list(products)
+        if not products:
+            return []
+        
+        product_ids = [product.id for product in products]
+        preloaded = {product_id: {'view_count': 0} for product_id in product_ids}
+        
+        view_counts = ProductViewCount.query.with_entities(
+            ProductViewCount.product_id, ProductViewCount.view_count
+        ).filter(ProductViewCount.product_id.in_(product_ids))
+        for product_id, view_count in view_counts:
+            preloaded[product_id]['view_count'] = view_count
+        
+        if include_producer:
+            producer_ids = {product.producer_id for product in products}
+            producers = {user.id: user for user in User.query.filter(User.id.in_(producer_ids))}
+            for product in products:
+                preloaded[product.id]['producer'] = producers.get(product.producer_id)
+        
+        if include_reviews:
+            # Rating aggregates are stored on the product, so only the review rows are loaded
+            for product_id in product_ids:
+                preloaded[product_id]['reviews'] = []
+            
+            for review in Review.query.filter(Review.product_id.in_(product_ids)).order_by(Review.created_at):
+                preloaded[review.product_id]['reviews'].append(review)
+        
+        return [
+            product.to_dict(include_reviews=include_reviews, include_producer=include_producer, preloaded=preloaded[product.id])
+            for product in products
+        ]
+    
     def get_average_rating(self):
-        """Calculate average rating from reviews"""
-        reviews = self.reviews.filter_by(is_flagged=False).all()
-        if not reviews:
+        """Get average rating of non-flagged reviews from the stored aggregates"""
+        if not self.rating_count:
             return 0
-        return sum(review.rating for review in reviews) / len(reviews)
+        return self.rating_sum / self.rating_count
     
     def get_review_count(self):
         """Get total number of non-flagged reviews"""
-        return self.reviews.filter_by(is_flagged=False).count()
+        return self.rating_count or 0
+    
+    def get_view_count(self):
+        """Get the rolled-up number of views (recent views may still be queued)"""
+        return self.view_counter.view_count if self.view_counter else 0
+    
+    def get_rating_histogram(self):
+        """Get the number of non-flagged reviews per star"""
+        return {str(star): getattr(self, f'rating_{star}_count') or 0 for star in range(1, 6)}
     
     def is_in_stock(self):
         """Check if product is in stock"""
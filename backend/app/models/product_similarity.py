@@ -0,0 +1,29 @@
+from app import db
+
+class ProductSimilarity(db.Model):
+    """Precomputed neighbor of a product for item-to-item recommendations"""
+    __tablename__ = 'product_similarities'
+    
+    product_id = db.Column(db.String(36), db.ForeignKey('products.id', ondelete='CASCADE'), primary_key=True)
+    similar_product_id = db.Column(db.String(36), db.ForeignKey('products.id', ondelete='CASCADE'), primary_key=True)
+    rank = db.Column(db.SmallInteger, nullable=False)  # 1 = most similar
+    score = db.Column(db.Float, nullable=False)  # Cosine similarity of the weighted interaction vectors
+    computed_at = db.Column(db.DateTime, nullable=False)
+    
+    __table_args__ = (
+        db.Index('idx_product_similarities_rank', 'product_id', 'rank'),
+        db.Index('idx_product_similarities_similar', 'similar_product_id'),
+    )
+    
+    def to_dict(self):
+        """Convert product similarity to dictionary"""
+        return {
+            'product_id': self.product_id,
+            'similar_product_id': self.similar_product_id,
+            'rank': self.rank,
+            'score': round(self.score, 4),
+            'computed_at': self.computed_at.isoformat() if self.computed_at else None
+        }
+    
+    def __repr__(self):
+        return f'<ProductSimilarity {self.product_id} -> {self.similar_product_id} #{self.rank}>'
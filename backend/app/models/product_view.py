@@ -26,3 +26,22 @@ class ProductView(db.Model):
     
     def __repr__(self):
         return f'<ProductView {self.id} - Product {self.product_id}>'
+
+class ProductViewCount(db.Model):
+    """Per-product view total rolled up from product_views by the view ingestor"""
+    __tablename__ = 'product_view_counts'
+    
+    product_id = db.Column(db.String(36), db.ForeignKey('products.id', ondelete='CASCADE'), primary_key=True)
+    view_count = db.Column(db.BigInteger, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    def to_dict(self):
+        """Convert product view count to dictionary"""
+        return {
+            'product_id': self.product_id,
+            'view_count': self.view_count,
+            'updated_at': self.updated_at.isoformat() if self.updated_at else None
+        }
+    
+    def __repr__(self):
+        return f'<ProductViewCount {self.product_id} - {self.view_count}>'
@@ -0,0 +1,21 @@
+from app import db
+from datetime import datetime
+
+class ResourceVersion(db.Model):
+    """Version counter per cache scope, used to build ETags"""
+    __tablename__ = 'resource_versions'
+    
+    scope = db.Column(db.String(100), primary_key=True)  # products, product:<id>, trending
+    version = db.Column(db.BigInteger, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    def to_dict(self):
+        """Convert resource version to dictionary"""
+        return {
+            'scope': self.scope,
+            'version': self.version,
+            'updated_at': self.updated_at.isoformat() if self.updated_at else None
+        }
+    
+    def __repr__(self):
+        return f'<ResourceVersion {self.scope} v{self.version}>'
@@ -1,4 +1,7 @@
 from app import db
+from app.models.product import Product
+from sqlalchemy import event
+from sqlalchemy.orm.attributes import get_history
 from datetime import datetime
 import uuid
 
@@ -7,13 +10,14 @@ class Review(db.Model):
     __tablename__ = 'reviews'
     
     id = db.Column(db.String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
-    product_id = db.Column(db.String(36), db.ForeignKey('products.id'), nullable=False)
+    # active_history keeps the previous value available to the rating aggregate events
+    product_id = db.column_property(db.Column(db.String(36), db.ForeignKey('products.id'), nullable=False), active_history=True)
     user_id = db.Column(db.String(36), db.ForeignKey('users.id'), nullable=False)
-    rating = db.Column(db.Integer, nullable=False)  # 1-5 stars
+    rating = db.column_property(db.Column(db.Integer, nullable=False), active_history=True)  # 1-5 stars
     title = db.Column(db.String(100))
     comment = db.Column(db.Text)
     is_verified_purchase = db.Column(db.Boolean, default=False)
-    is_flagged = db.Column(db.Boolean, default=False)
+    is_flagged = db.column_property(db.Column(db.Boolean, default=False), active_history=True)
     flag_reason = db.Column(db.Text)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
@@ -61,3 +65,55 @@ class Review(db.Model):
     
     def __repr__(self):
         return f'<Review {self.id} for Product {self.product_id}>'
+
+
+def _previous_value(review, attribute):
+    """Value of an attribute before the current flush"""
+    history = get_history(review, attribute)
+    if history.deleted:
+        return history.deleted[0]
+    if history.unchanged:
+        return history.unchanged[0]
+    return getattr(review, attribute)
+
+def _apply_rating(connection, product_id, rating, is_flagged, sign):
+    """Add (sign=1) or remove (sign=-1) one review from its product's rating aggregates"""
+    if product_id is None or rating is None or is_flagged:
+        return
+    
+    rating = int(rating)
+    products = Product.__table__
+    star_column = products.c[f'rating_{rating}_count']
+    new_count = products.c.rating_count + sign
+    new_sum = products.c.rating_sum + sign * rating
+    
+    # SET expressions all read the pre-update row, so this is a single atomic update
+    connection.execute(
+        products.update()
+        .where(products.c.id == product_id)
+        .values({
+            products.c.rating_sum: new_sum,
+            products.c.rating_count: new_count,
+            star_column: star_column + sign,
+            products.c.rating_average: db.case(
+                (new_count > 0, db.cast(new_sum, db.Float) / new_count),
+                else_=0
+            )
+        })
+    )
+
+@event.listens_for(Review, 'after_insert')
+def _review_inserted(mapper, connection, review):
+    _apply_rating(connection, review.product_id, review.rating, review.is_flagged, 1)
+
+@event.listens_for(Review, 'after_update')
+def _review_updated(mapper, connection, review):
+    previous = tuple(_previous_value(review, name) for name in ('product_id', 'rating', 'is_flagged'))
+    current = (review.product_id, review.rating, review.is_flagged)
+    if previous != current:
+        _apply_rating(connection, *previous, -1)
+        _apply_rating(connection, *current, 1)
+
+@event.listens_for(Review, 'before_delete')
+def _review_deleted(mapper, connection, review):
+    _apply_rating(connection, *(_previous_value(review, name) for name in ('product_id', 'rating', 'is_flagged')), -1)
@@ -0,0 +1,30 @@
+from app import db
+from datetime import datetime
+
+class RevokedToken(db.Model):
+    """Revoked token id or token family, kept until the tokens it covers expire"""
+    __tablename__ = 'revoked_tokens'
+    
+    key = db.Column(db.String(80), primary_key=True)  # jti:<jti> or family:<family id>
+    user_id = db.Column(db.String(36), nullable=True)
+    reason = db.Column(db.String(20), nullable=False)  # logout, rotated, reuse
+    expires_at = db.Column(db.DateTime, nullable=False)
+    revoked_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    
+    __table_args__ = (
+        db.Index('idx_revoked_tokens_expires', 'expires_at'),
+        db.Index('idx_revoked_tokens_revoked', 'revoked_at'),
+    )
+    
+    def to_dict(self):
+        """Convert revoked token to dictionary"""
+        return {
+            'key': self.key,
+            'user_id': self.user_id,
+            'reason': self.reason,
+            'expires_at': self.expires_at.isoformat() if self.expires_at else None,
+            'revoked_at': self.revoked_at.isoformat() if self.revoked_at else None
+        }
+    
+    def __repr__(self):
+        return f'<RevokedToken {self.key} ({self.reason})>'
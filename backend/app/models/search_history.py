@@ -3,15 +3,27 @@ from datetime import datetime
 import uuid
 
 class SearchHistory(db.Model):
-    """Search history model for tracking user searches"""
+    """Search history model for tracking user searches
+    
+    One row per user and normalized query; repeated searches bump search_count
+    and last_searched_at instead of adding rows.
+    """
     __tablename__ = 'search_history'
     
     id = db.Column(db.String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
     user_id = db.Column(db.String(36), db.ForeignKey('users.id'), nullable=True)  # Nullable for anonymous searches
     search_query = db.Column(db.String(255), nullable=False)
+    normalized_query = db.Column(db.String(255), nullable=False)
     filters = db.Column(db.JSON, default=dict)  # Store search filters as JSON
     results_count = db.Column(db.Integer, default=0)
+    search_count = db.Column(db.Integer, default=1, server_default='1', nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    last_searched_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    __table_args__ = (
+        db.UniqueConstraint('user_id', 'normalized_query', name='uq_search_history_user_query'),
+        db.Index('idx_search_history_user_last_searched', 'user_id', 'last_searched_at'),
+    )
     
     def to_dict(self):
         """Convert search history to dictionary"""
@@ -21,8 +33,37 @@ class SearchHistory(db.Model):
             'search_query': self.search_query,
             'filters': self.filters or {},
             'results_count': self.results_count,
-            'created_at': self.created_at.isoformat() if self.created_at else None
+            'search_count': self.search_count,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'last_searched_at': self.last_searched_at.isoformat() if self.last_searched_at else None
         }
     
     def __repr__(self):
         return f'<SearchHistory {self.id} - Query: {self.search_query}>'
+
+class SearchQueryStat(db.Model):
+    """Aggregated frequency of a normalized search query across all users"""
+    __tablename__ = 'search_query_stats'
+    
+    normalized_query = db.Column(db.String(255), primary_key=True)
+    search_query = db.Column(db.String(255), nullable=False)  # Most recent spelling
+    search_count = db.Column(db.BigInteger, default=0, nullable=False)
+    results_count = db.Column(db.Integer, default=0)  # Results of the most recent search
+    last_searched_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    __table_args__ = (
+        db.Index('idx_search_query_stats_count', 'search_count'),
+    )
+    
+    def to_dict(self):
+        """Convert search query stat to dictionary"""
+        return {
+            'query': self.search_query,
+            'normalized_query': self.normalized_query,
+            'search_count': self.search_count,
+            'results_count': self.results_count,
+            'last_searched_at': self.last_searched_at.isoformat() if self.last_searched_at else None
+        }
+    
+    def __repr__(self):
+        return f'<SearchQueryStat {self.normalized_query} x{self.search_count}>'
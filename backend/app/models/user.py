@@ -1,5 +1,4 @@
 from app import db
-from werkzeug.security import generate_password_hash, check_password_hash
 from datetime import datetime
 import uuid
 
@@ -13,14 +12,16 @@ class User(db.Model):
     password_hash = db.Column(db.String(255), nullable=False)
     first_name = db.Column(db.String(50), nullable=False)
     last_name = db.Column(db.String(50), nullable=False)
-    role = db.Column(db.String(20), nullable=False)  # producer, consumer, admin
+    # active_history keeps previous values available to the admin metrics events
+    role = db.column_property(db.Column(db.String(20), nullable=False), active_history=True)  # producer, consumer, admin
     phone = db.Column(db.String(20))
     address = db.Column(db.Text)
     city = db.Column(db.String(50))
-    region = db.Column(db.String(50))
+    region = db.column_property(db.Column(db.String(50)), active_history=True)
     country = db.Column(db.String(50), default='Morocco')
-    latitude = db.Column(db.Float)
-    longitude = db.Column(db.Float)
+    # active_history keeps previous locations available to the geo tile events
+    latitude = db.column_property(db.Column(db.Float), active_history=True)
+    longitude = db.column_property(db.Column(db.Float), active_history=True)
     is_active = db.Column(db.Boolean, default=True)
     is_verified = db.Column(db.Boolean, default=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
@@ -38,12 +39,19 @@ class User(db.Model):
     moderation_logs = db.relationship('ModerationLog', backref='moderator', lazy='dynamic', cascade='all, delete-orphan')
     
     def set_password(self, password):
-        """Hash and set password"""
-        self.password_hash = generate_password_hash(password)
+        """Hash and set password under the configured hashing policy"""
+        from app.services.passwords import get_password_hasher
+        self.password_hash = get_password_hasher().hash(password)
     
     def check_password(self, password):
-        """Check password against hash"""
-        return check_password_hash(self.password_hash, password)
+        """Check password against hash (may raise PasswordHasherBusy under load)"""
+        from app.services.passwords import get_password_hasher
+        return get_password_hasher().verify(self.password_hash, password)
+    
+    def password_needs_rehash(self):
+        """Check if the stored hash predates the current hashing policy"""
+        from app.services.passwords import get_password_hasher
+        return get_password_hasher().needs_rehash(self.password_hash)
     
     def to_dict(self, include_sensitive=False):
         """Convert user to dictionary"""
@@ -0,0 +1,148 @@
+"""
+Live platform counters for the admin overview
+
+The admin dashboard shows distributions (users by role and region, products
+by category and availability, reviews flagged or not, orders by status) and a
+few totals. Instead of counting tables on every request, AdminMetrics keeps
+these counters in memory: writes report (dimension, key, delta) changes as
+they commit, and the whole state is periodically replaced by a reconciliation
+pass so drift from writes made elsewhere (other workers, bulk SQL) is bounded.
+Reading the overview then costs O(number of distinct keys), independent of
+table sizes.
+"""
+
+import threading
+import time
+from collections import Counter
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+# Distribution dimensions and the single-key totals
+DIMENSIONS = (
+    'users_by_role', 'users_by_region',
+    'products_by_category', 'products_by_availability',
+    'reviews_by_status', 'orders_by_status',
+    'favorites', 'searches'
+)
+
+TOTAL = 'total'  # Key of the single-key dimensions
+
+Change = Tuple[str, Any, int]
+
+
+def user_keys(role: Optional[str], region: Optional[str]) -> List[Tuple[str, str]]:
+    """Counter keys of a user (rows without a role count as consumers)"""
+    return [('users_by_role', role or 'consumer'), ('users_by_region', region or 'unknown')]
+
+
+def product_keys(category: Optional[str], is_available: Optional[bool]) -> List[Tuple[str, str]]:
+    """Counter keys of a product"""
+    return [
+        ('products_by_category', category or 'uncategorized'),
+        ('products_by_availability', 'available' if is_available else 'unavailable')
+    ]
+
+
+def review_keys(is_flagged: Optional[bool]) -> List[Tuple[str, str]]:
+    """Counter keys of a review"""
+    return [('reviews_by_status', 'flagged' if is_flagged else 'unflagged')]
+
+
+def order_keys(status: Optional[str]) -> List[Tuple[str, str]]:
+    """Counter keys of an order"""
+    return [('orders_by_status', status or 'pending')]
+
+
+def changes_for(keys: Iterable[Tuple[str, str]], delta: int) -> List[Change]:
+    """(dimension, key, delta) changes adding (1) or removing (-1) an entity"""
+    return [(dimension, key, delta) for dimension, key in keys]
+
+
+def moved(previous: Iterable[Tuple[str, str]], current: Iterable[Tuple[str, str]]) -> List[Change]:
+    """Changes moving an entity from its previous keys to its current ones"""
+    previous, current = list(previous), list(current)
+    return [
+        change
+        for before, after in zip(previous, current) if before != after
+        for change in ((before[0], before[1], -1), (after[0], after[1], 1))
+    ]
+
+
+class AdminMetrics:
+    """Thread-safe counters per dimension and key"""
+
+    def __init__(self, clock=time.time):
+        self.clock = clock
+        self._lock = threading.Lock()
+        self._counts: Dict[str, Counter] = {dimension: Counter() for dimension in DIMENSIONS}
+        self._applied = 0
+        self._reconciliations = 0
+        self._last_drift = 0
+        self.reconciled_at: Optional[float] = None
+
+    def apply(self, changes: Iterable[Change]):
+        """Add (dimension, key, delta) changes, dropping keys that reach zero"""
+        with self._lock:
+            for dimension, key, delta in changes:
+                counts = self._counts[dimension]
+                counts[key] += delta
+                if counts[key] == 0:
+                    del counts[key]
+                self._applied += 1
+
+    def add(self, dimension: str, delta: int, key: Any = TOTAL):
+        """Add to a single counter"""
+        self.apply([(dimension, key, delta)])
+
+    def replace(self, counts: Dict[str, Dict[Any, int]]):
+        """Reset every counter from a reconciliation pass, recording how far they had drifted"""
+        fresh = {dimension: Counter({key: value for key, value in counts.get(dimension, {}).items() if value})
+                 for dimension in DIMENSIONS}
+        with self._lock:
+            self._last_drift = sum(
+                abs(fresh[dimension][key] - self._counts[dimension][key])
+                for dimension in DIMENSIONS
+                for key in set(fresh[dimension]) | set(self._counts[dimension])
+            )
+            self._counts = fresh
+            self._reconciliations += 1
+            self.reconciled_at = self.clock()
+
+    def counts(self, dimension: str) -> Dict[Any, int]:
+        """Counts per key of a dimension"""
+        with self._lock:
+            return dict(self._counts[dimension])
+
+    def total(self, dimension: str) -> int:
+        """Sum over every key of a dimension"""
+        with self._lock:
+            return sum(self._counts[dimension].values())
+
+    def overview(self) -> Dict[str, Any]:
+        """Admin dashboard payload"""
+        with self._lock:
+            counts = {dimension: dict(values) for dimension, values in self._counts.items()}
+        return {
+            'total_users': sum(counts['users_by_role'].values()),
+            'total_products': sum(counts['products_by_category'].values()),
+            'total_reviews': sum(counts['reviews_by_status'].values()),
+            'total_favorites': counts['favorites'].get(TOTAL, 0),
+            'total_searches': counts['searches'].get(TOTAL, 0),
+            'total_orders': sum(counts['orders_by_status'].values()),
+            'role_distribution': counts['users_by_role'],
+            'region_distribution': counts['users_by_region'],
+            'category_distribution': counts['products_by_category'],
+            'availability_distribution': counts['products_by_availability'],
+            'review_status_distribution': counts['reviews_by_status'],
+            'order_status_distribution': counts['orders_by_status']
+        }
+
+    def stats(self) -> Dict[str, Any]:
+        """Reconciliation counters"""
+        with self._lock:
+            return {
+                'changes_applied': self._applied,
+                'reconciliations': self._reconciliations,
+                'last_drift': self._last_drift,
+                'reconciled_at': self.reconciled_at,
+                'keys': sum(len(values) for values in self._counts.values())
+            }
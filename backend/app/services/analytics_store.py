@@ -0,0 +1,489 @@
+"""
+Time-bucketed analytics store
+
+Charts read pre-aggregated buckets from analytics_buckets instead of grouping
+raw rows by date. Every event adds its value to the hour, day and month bucket
+of each dimension it belongs to:
+- views and favorites: all, product, producer, category and region
+- orders and revenue: all, producer and region
+- searches: all and region
+
+Product events use the product's category and producer at the time of the
+event and the producer's region; searches use the searching user's region.
+
+A session after_flush listener turns favorites and orders into bucket deltas
+and stages them with the counter buffer, which writes them shortly after the
+transaction commits: every order and favorite increments the metric-wide
+buckets, and doing so inline would serialize all of them on those rows. The
+view ingestor and search history sink, already off the request path, add
+their batches through record_view_batch() and record_search_batch(). Hourly
+and daily buckets older than their retention are dropped by compact-analytics
+(monthly buckets are kept), and backfill-analytics rebuilds the whole store
+from the raw tables.
+"""
+
+from collections import defaultdict
+from datetime import datetime, timedelta
+from decimal import Decimal
+from typing import Any, Dict, List, Optional, Tuple
+
+import click
+from flask import current_app, has_app_context
+from flask.cli import with_appcontext
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from sqlalchemy.orm.attributes import get_history
+
+from app.services.counter_buffer import stage
+from app.services.producer_stats import EXCLUDED_ORDER_STATUSES
+from app.utils.upsert import upsert_increments
+
+GRANULARITIES = ('hour', 'day', 'month')
+
+ALL = 'all'  # Dimension of the metric-wide series, keyed by ''
+
+METRIC_DIMENSIONS = {
+    'views': (ALL, 'product', 'producer', 'category', 'region'),
+    'favorites': (ALL, 'product', 'producer', 'category', 'region'),
+    'orders': (ALL, 'producer', 'region'),
+    'revenue': (ALL, 'producer', 'region'),
+    'searches': (ALL, 'region')
+}
+
+# Default window of a query without 'from'
+DEFAULT_SPANS = {'hour': timedelta(hours=48), 'day': timedelta(days=30), 'month': timedelta(days=365)}
+
+# Default retention of the fine-grained buckets (None keeps them forever)
+DEFAULT_RETENTION_DAYS = {'hour': 14, 'day': 730, 'month': None}
+
+MAX_POINTS = 1000
+
+Key = Tuple[str, str, str, str, datetime]  # metric, granularity, dimension, dimension key, bucket start
+
+
+def bucket_start(moment: datetime, granularity: str) -> datetime:
+    """Start of the bucket containing a naive UTC datetime"""
+    if granularity == 'hour':
+        return moment.replace(minute=0, second=0, microsecond=0)
+    if granularity == 'day':
+        return moment.replace(hour=0, minute=0, second=0, microsecond=0)
+    return moment.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+
+def next_bucket(start: datetime, granularity: str) -> datetime:
+    """Start of the bucket following the one starting at 'start'"""
+    if granularity == 'hour':
+        return start + timedelta(hours=1)
+    if granularity == 'day':
+        return start + timedelta(days=1)
+    return start.replace(year=start.year + start.month // 12, month=start.month % 12 + 1)
+
+
+def bucket_range(start: datetime, end: datetime, granularity: str) -> List[datetime]:
+    """Starts of every bucket from the one containing 'start' to the one containing 'end'"""
+    starts = []
+    current = bucket_start(start, granularity)
+    while current <= end:
+        starts.append(current)
+        current = next_bucket(current, granularity)
+    return starts
+
+
+def retention_horizons(now: Optional[datetime] = None) -> Dict[str, Optional[datetime]]:
+    """Earliest bucket start kept for each granularity (None when kept forever)"""
+    retention = dict(DEFAULT_RETENTION_DAYS)
+    if has_app_context():
+        retention['hour'] = current_app.config.get('ANALYTICS_HOUR_RETENTION_DAYS', retention['hour'])
+        retention['day'] = current_app.config.get('ANALYTICS_DAY_RETENTION_DAYS', retention['day'])
+    now = now or datetime.utcnow()
+    return {
+        granularity: bucket_start(now - timedelta(days=days), granularity) if days else None
+        for granularity, days in retention.items()
+    }
+
+
+class AnalyticsBuckets:
+    """Value deltas per metric, granularity, dimension key and bucket"""
+
+    def __init__(self, horizons: Optional[Dict[str, Optional[datetime]]] = None):
+        self.horizons = horizons or {}
+        self.values: Dict[Key, Any] = defaultdict(int)
+
+    def add(self, metric: str, moment: Optional[datetime], value, **keys):
+        """Add a value at 'moment' to the metric-wide bucket and to those of the given dimension keys"""
+        if not value:
+            return
+        moment = moment or datetime.utcnow()
+        dimensions = [(ALL, '')] + [
+            (dimension, str(key)) for dimension, key in keys.items()
+            if key is not None and dimension in METRIC_DIMENSIONS[metric]
+        ]
+        for granularity in GRANULARITIES:
+            start = bucket_start(moment, granularity)
+            horizon = self.horizons.get(granularity)
+            if horizon is not None and start < horizon:
+                continue  # Already compacted away
+            for dimension, key in dimensions:
+                self.values[(metric, granularity, dimension, key, start)] += value
+
+    def rows(self) -> List[dict]:
+        return [
+            {'metric': metric, 'granularity': granularity, 'dimension': dimension,
+             'dimension_key': key, 'bucket_start': start, 'value': value}
+            for (metric, granularity, dimension, key, start), value in self.values.items() if value
+        ]
+
+    def series(self, metric: str, granularity: str, dimension: str, starts: List[datetime]) -> Dict[str, Dict[datetime, Any]]:
+        """{key: {bucket start: value}} over the given buckets (in-memory store queries)"""
+        wanted = set(starts)
+        series = defaultdict(dict)
+        for (row_metric, row_granularity, row_dimension, key, start), value in self.values.items():
+            if (row_metric, row_granularity, row_dimension) == (metric, granularity, dimension) and start in wanted and value:
+                series[key][start] = value
+        return series
+
+    def merge(self, other: 'AnalyticsBuckets'):
+        """Add another set of deltas to these"""
+        for key, value in other.values.items():
+            self.values[key] += value
+
+    def __len__(self):
+        return len(self.values)
+
+    def __bool__(self):
+        return any(self.values.values())
+
+
+def write_buckets(connection, buckets: AnalyticsBuckets):
+    """Add accumulated values to analytics_buckets in one executemany upsert"""
+    from app.models.analytics_bucket import AnalyticsBucket
+
+    upsert_increments(
+        connection, AnalyticsBucket.__table__,
+        ['metric', 'granularity', 'dimension', 'dimension_key', 'bucket_start'],
+        buckets.rows(), ['value']
+    )
+
+
+def parse_timeseries_args(args, now: Optional[datetime] = None) -> Dict[str, Any]:
+    """Validate timeseries query parameters (request.args); raises ValueError with a client-facing message"""
+    metric = args.get('metric', 'views')
+    if metric not in METRIC_DIMENSIONS:
+        raise ValueError(f"metric must be one of: {', '.join(METRIC_DIMENSIONS)}")
+    by = args.get('by', ALL)
+    if by not in METRIC_DIMENSIONS[metric]:
+        raise ValueError(f"{metric} can be grouped by: {', '.join(METRIC_DIMENSIONS[metric])}")
+    granularity = args.get('granularity', 'day')
+    if granularity not in GRANULARITIES:
+        raise ValueError(f"granularity must be one of: {', '.join(GRANULARITIES)}")
+
+    now = now or datetime.utcnow()
+    end = _parse_time(args.get('to'), 'to') or now
+    start = _parse_time(args.get('from'), 'from') or end - DEFAULT_SPANS[granularity]
+    if start > end:
+        raise ValueError("'from' must not be after 'to'")
+
+    horizon = retention_horizons(now)[granularity]
+    if horizon is not None and bucket_start(start, granularity) < horizon:
+        raise ValueError(f'{granularity} buckets are only kept since {horizon.isoformat()}; use a coarser granularity')
+
+    starts = bucket_range(start, end, granularity)
+    if len(starts) > MAX_POINTS:
+        raise ValueError(f'At most {MAX_POINTS} buckets can be requested; use a coarser granularity')
+
+    limit = args.get('limit', 10, type=int)
+    return {
+        'metric': metric,
+        'by': by,
+        'granularity': granularity,
+        'key': args.get('key') or None,
+        'limit': min(max(limit or 10, 1), 100),
+        'starts': starts
+    }
+
+
+def _parse_time(value: Optional[str], name: str) -> Optional[datetime]:
+    if not value:
+        return None
+    try:
+        parsed = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    except ValueError:
+        raise ValueError(f"'{name}' must be an ISO 8601 date or datetime")
+    if parsed.tzinfo is not None:
+        parsed = (parsed - parsed.utcoffset()).replace(tzinfo=None)
+    return parsed
+
+
+def timeseries_payload(params: Dict[str, Any], series: Dict[str, Dict[datetime, Any]]) -> Dict[str, Any]:
+    """Response body: zero-filled series, largest total first, at most params['limit'] of them"""
+    starts = params['starts']
+
+    def number(value):
+        return float(value) if params['metric'] == 'revenue' else int(value)
+
+    ranked = sorted(series.items(), key=lambda item: (-sum(item[1].values()), item[0]))[:params['limit']]
+    return {
+        'metric': params['metric'],
+        'by': params['by'],
+        'granularity': params['granularity'],
+        'from': starts[0].isoformat(),
+        'to': next_bucket(starts[-1], params['granularity']).isoformat(),
+        'buckets': [start.isoformat() for start in starts],
+        'series': [
+            {
+                'key': key,
+                'total': number(sum(values.values())),
+                'values': [number(values.get(start, 0)) for start in starts]
+            }
+            for key, values in ranked
+        ]
+    }
+
+
+def query_timeseries(params: Dict[str, Any]) -> Dict[str, Any]:
+    """Read a timeseries from analytics_buckets: top keys first, then their buckets"""
+    from app import db
+    from app.models.analytics_bucket import AnalyticsBucket
+
+    starts = params['starts']
+    base = AnalyticsBucket.query.filter(
+        AnalyticsBucket.metric == params['metric'],
+        AnalyticsBucket.granularity == params['granularity'],
+        AnalyticsBucket.dimension == params['by'],
+        AnalyticsBucket.bucket_start >= starts[0],
+        AnalyticsBucket.bucket_start <= starts[-1]
+    )
+    if params['by'] == ALL:
+        keys = ['']
+    elif params['key']:
+        keys = [params['key']]
+    else:
+        total = db.func.sum(AnalyticsBucket.value)
+        keys = [key for key, in base.with_entities(AnalyticsBucket.dimension_key).group_by(
+            AnalyticsBucket.dimension_key
+        ).order_by(total.desc(), AnalyticsBucket.dimension_key).limit(params['limit'])]
+
+    series = defaultdict(dict)
+    if keys:
+        for bucket in base.filter(AnalyticsBucket.dimension_key.in_(keys)):
+            series[bucket.dimension_key][bucket.bucket_start] = bucket.value
+    return timeseries_payload(params, series)
+
+
+def _product_dimensions(connection, product_ids) -> Dict[Any, Dict[str, Any]]:
+    """product, producer, category and region keys of each product, with one query"""
+    from app.models.product import Product
+    from app.models.user import User
+
+    if not product_ids:
+        return {}
+    products, users = Product.__table__, User.__table__
+    rows = connection.execute(
+        products.select().with_only_columns(products.c.id, products.c.producer_id, products.c.category, users.c.region)
+        .select_from(products.outerjoin(users, users.c.id == products.c.producer_id))
+        .where(products.c.id.in_(list(product_ids)))
+    )
+    return {
+        product_id: {'product': product_id, 'producer': producer_id, 'category': category, 'region': region}
+        for product_id, producer_id, category, region in rows
+    }
+
+
+def _user_regions(connection, user_ids) -> Dict[Any, Optional[str]]:
+    from app.models.user import User
+
+    if not user_ids:
+        return {}
+    users = User.__table__
+    return dict(connection.execute(
+        users.select().with_only_columns(users.c.id, users.c.region).where(users.c.id.in_(list(user_ids)))
+    ).all())
+
+
+def record_view_batch(connection, rows):
+    """Add a batch of product_views rows to the view buckets"""
+    dimensions = _product_dimensions(connection, {row['product_id'] for row in rows})
+    buckets = AnalyticsBuckets(retention_horizons())
+    for row in rows:
+        buckets.add('views', row.get('created_at'), 1, **dimensions.get(row['product_id'], {}))
+    write_buckets(connection, buckets)
+
+
+def record_search_batch(connection, entries):
+    """Add a batch of coalesced search history entries to the search buckets"""
+    regions = _user_regions(connection, {entry['user_id'] for entry in entries if entry['user_id'] is not None})
+    buckets = AnalyticsBuckets(retention_horizons())
+    for entry in entries:
+        buckets.add('searches', entry['last_searched_at'], entry['search_count'], region=regions.get(entry['user_id']))
+    write_buckets(connection, buckets)
+
+
+def _previous(instance, attribute):
+    """Value of an attribute before the current flush"""
+    history = get_history(instance, attribute)
+    if history.deleted:
+        return history.deleted[0]
+    if history.unchanged:
+        return history.unchanged[0]
+    return getattr(instance, attribute)
+
+
+def _order_values(status, total_amount) -> Dict[str, Any]:
+    if status in EXCLUDED_ORDER_STATUSES:
+        return {}
+    return {'orders': 1, 'revenue': Decimal(str(total_amount or 0))}
+
+
+def collect_flush_buckets(session) -> AnalyticsBuckets:
+    """Bucket deltas implied by the favorites and orders inserted, updated or deleted in a flush"""
+    from app.models.favorite import Favorite
+    from app.models.order import Order
+
+    buckets = AnalyticsBuckets(retention_horizons())
+    favorites = []  # (product id, created_at, sign)
+    orders = []  # (producer id, created_at, {metric: value}, sign)
+
+    for instance in session.new:
+        if isinstance(instance, Favorite):
+            favorites.append((instance.product_id, instance.created_at, 1))
+        elif isinstance(instance, Order):
+            orders.append((instance.producer_id, instance.created_at, _order_values(instance.status, instance.total_amount), 1))
+
+    for instance in session.deleted:
+        if isinstance(instance, Favorite):
+            favorites.append((_previous(instance, 'product_id'), instance.created_at, -1))
+        elif isinstance(instance, Order):
+            values = _order_values(_previous(instance, 'status'), _previous(instance, 'total_amount'))
+            orders.append((instance.producer_id, instance.created_at, values, -1))
+
+    for instance in session.dirty:
+        if isinstance(instance, Order):
+            previous = _order_values(_previous(instance, 'status'), _previous(instance, 'total_amount'))
+            current = _order_values(instance.status, instance.total_amount)
+            if previous != current:
+                orders.append((instance.producer_id, instance.created_at, previous, -1))
+                orders.append((instance.producer_id, instance.created_at, current, 1))
+
+    if favorites:
+        connection = session.connection()
+        dimensions = _product_dimensions(connection, {product_id for product_id, _, _ in favorites})
+        for product_id, created_at, sign in favorites:
+            buckets.add('favorites', created_at, sign, **dimensions.get(product_id, {'product': product_id}))
+
+    orders = [order for order in orders if order[2]]
+    if orders:
+        regions = _user_regions(session.connection(), {producer_id for producer_id, _, _, _ in orders})
+        for producer_id, created_at, values, sign in orders:
+            for metric, value in values.items():
+                buckets.add(metric, created_at, sign * value, producer=producer_id, region=regions.get(producer_id))
+    return buckets
+
+
+@event.listens_for(Session, 'after_flush')
+def _update_analytics_buckets(session, flush_context):
+    stage(session, 'analytics_buckets', write_buckets, collect_flush_buckets(session))
+
+
+def _hour(column, dialect: str):
+    """Expression truncating a timestamp column to the hour"""
+    from app import db
+
+    if dialect == 'sqlite':
+        return db.func.strftime('%Y-%m-%d %H:00:00', column)
+    return db.func.date_trunc('hour', column)
+
+
+def _as_datetime(value) -> datetime:
+    return datetime.fromisoformat(value) if isinstance(value, str) else value
+
+
+def compute_analytics_buckets() -> AnalyticsBuckets:
+    """Buckets recomputed from the raw tables with one hourly grouped query per source
+
+    Search history rows are coalesced per user and query, so their counts fall
+    in the hour of each query's last search; anonymous searches have no rows.
+    """
+    from app import db
+    from app.models.favorite import Favorite
+    from app.models.order import Order
+    from app.models.product_view import ProductView
+    from app.models.search_history import SearchHistory
+
+    connection = db.session.connection()
+    dialect = connection.dialect.name
+    buckets = AnalyticsBuckets(retention_horizons())
+
+    product_ids = set()
+    grouped = {}
+    for metric, model in (('views', ProductView), ('favorites', Favorite)):
+        hour = _hour(model.created_at, dialect)
+        grouped[metric] = db.session.query(model.product_id, hour, db.func.count()).group_by(model.product_id, hour).all()
+        product_ids.update(product_id for product_id, _, _ in grouped[metric])
+
+    dimensions = _product_dimensions(connection, product_ids)
+    for metric, rows in grouped.items():
+        for product_id, hour, count in rows:
+            buckets.add(metric, _as_datetime(hour), count, **dimensions.get(product_id, {'product': product_id}))
+
+    hour = _hour(Order.created_at, dialect)
+    orders = db.session.query(Order.producer_id, hour, db.func.count(Order.id), db.func.sum(Order.total_amount)).filter(
+        Order.status.notin_(EXCLUDED_ORDER_STATUSES)
+    ).group_by(Order.producer_id, hour).all()
+    hour = _hour(SearchHistory.last_searched_at, dialect)
+    searches = db.session.query(SearchHistory.user_id, hour, db.func.sum(SearchHistory.search_count)).group_by(
+        SearchHistory.user_id, hour
+    ).all()
+
+    regions = _user_regions(connection, {row[0] for row in orders} | {row[0] for row in searches})
+    for producer_id, hour, count, revenue in orders:
+        keys = {'producer': producer_id, 'region': regions.get(producer_id)}
+        buckets.add('orders', _as_datetime(hour), count, **keys)
+        buckets.add('revenue', _as_datetime(hour), Decimal(str(revenue or 0)), **keys)
+    for user_id, hour, count in searches:
+        buckets.add('searches', _as_datetime(hour), int(count or 0), region=regions.get(user_id))
+
+    return buckets
+
+
+def backfill_analytics() -> int:
+    """Replace analytics_buckets with buckets recomputed from the raw tables"""
+    from app import db
+    from app.models.analytics_bucket import AnalyticsBucket
+
+    buckets = compute_analytics_buckets()
+    connection = db.session.connection()
+    connection.execute(AnalyticsBucket.__table__.delete())
+    write_buckets(connection, buckets)
+    db.session.commit()
+    return len(buckets.rows())
+
+
+def compact_analytics(now: Optional[datetime] = None) -> int:
+    """Delete hourly and daily buckets older than their retention, and buckets netted to zero"""
+    from app import db
+    from app.models.analytics_bucket import AnalyticsBucket
+
+    deleted = AnalyticsBucket.query.filter(AnalyticsBucket.value == 0).delete(synchronize_session=False)
+    for granularity, horizon in retention_horizons(now).items():
+        if horizon is not None:
+            deleted += AnalyticsBucket.query.filter(
+                AnalyticsBucket.granularity == granularity, AnalyticsBucket.bucket_start < horizon
+            ).delete(synchronize_session=False)
+    db.session.commit()
+    return deleted
+
+
+@click.command('backfill-analytics')
+@with_appcontext
+def backfill_analytics_command():
+    """Rebuild the time-bucketed analytics store from the raw tables"""
+    buckets = backfill_analytics()
+    click.echo(f'Backfilled {buckets} analytics bucket(s)')
+
+
+@click.command('compact-analytics')
+@with_appcontext
+def compact_analytics_command():
+    """Drop expired hourly and daily analytics buckets and empty ones"""
+    deleted = compact_analytics()
+    click.echo(f'Deleted {deleted} expired analytics bucket(s)')
@@ -0,0 +1,343 @@
+"""
+Read-through response cache for public catalog endpoints
+
+Views decorated with @cached_response store their JSON body keyed by the
+endpoint, its URL arguments and the normalized query string. Entries are
+grouped under tags ('products', 'product:<id>', 'trending', ...); writes call
+invalidate() on the tags they affect, which bumps a per-tag version so every
+key built from the old version is never read again.
+
+Backends:
+- LRUCache: in-process, bounded, per-entry TTL (default)
+- KeyValueCache: any shared store exposing get/set(ex=)/incr/delete, such as
+  a redis.Redis client; LocalKeyValueStore is an in-process stand-in with the
+  same interface for development and tests
+"""
+
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict, defaultdict
+from functools import wraps
+from typing import Any, Dict, Iterable, Optional
+
+from flask import Response, current_app, has_app_context, request
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+
+
+class LRUCache:
+    """Thread-safe in-process LRU cache with per-entry TTL"""
+
+    def __init__(self, max_entries: int = 1024, default_ttl: int = 60):
+        self.max_entries = max_entries
+        self.default_ttl = default_ttl
+        self._entries: 'OrderedDict[str, tuple]' = OrderedDict()
+        self._counters: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[Any]:
+        """Get a live entry and mark it as recently used"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at is not None and expires_at <= time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: Any, ttl: Optional[int] = None):
+        """Store an entry, evicting the least recently used ones beyond max_entries"""
+        ttl = self.default_ttl if ttl is None else ttl
+        expires_at = time.monotonic() + ttl if ttl else None
+        with self._lock:
+            self._entries[key] = (value, expires_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, key: str):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def incr(self, key: str) -> int:
+        """Increment a counter and return its new value"""
+        # Counters (tag versions) are kept apart so LRU eviction never resets them
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + 1
+            return self._counters[key]
+
+    def get_counter(self, key: str) -> int:
+        return self._counters.get(key, 0)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class LocalKeyValueStore:
+    """In-process stand-in for a shared key-value server (redis-py compatible subset)"""
+
+    def __init__(self):
+        self._data: Dict[str, tuple] = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at is not None and expires_at <= time.monotonic():
+                del self._data[key]
+                return None
+            return value
+
+    def set(self, key, value, ex=None):
+        if isinstance(value, str):
+            value = value.encode()
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + ex if ex else None)
+        return True
+
+    def incr(self, key):
+        with self._lock:
+            value, expires_at = self._data.get(key, (b'0', None))
+            value = int(value) + 1
+            self._data[key] = (str(value).encode(), expires_at)
+            return value
+
+    def delete(self, *keys):
+        with self._lock:
+            return sum(1 for key in keys if self._data.pop(key, None) is not None)
+
+    def flushdb(self):
+        with self._lock:
+            self._data.clear()
+
+
+class KeyValueCache:
+    """Cache backend over a shared key-value client, values stored as JSON"""
+
+    def __init__(self, client, prefix: str = 'mantouji:cache:', default_ttl: int = 60):
+        self.client = client
+        self.prefix = prefix
+        self.default_ttl = default_ttl
+
+    def get(self, key: str) -> Optional[Any]:
+        raw = self.client.get(self.prefix + key)
+        return json.loads(raw) if raw is not None else None
+
+    def set(self, key: str, value: Any, ttl: Optional[int] = None):
+        ttl = self.default_ttl if ttl is None else ttl
+        self.client.set(self.prefix + key, json.dumps(value), ex=ttl or None)
+
+    def delete(self, key: str):
+        self.client.delete(self.prefix + key)
+
+    def incr(self, key: str) -> int:
+        return int(self.client.incr(self.prefix + key))
+
+    def get_counter(self, key: str) -> int:
+        raw = self.client.get(self.prefix + key)
+        return int(raw) if raw is not None else 0
+
+    def clear(self):
+        pass  # Shared entries expire through their TTL and tag versions
+
+
+class ResponseCache:
+    """Tag-invalidated cache of serialized responses with hit/miss metrics"""
+
+    def __init__(self, backend, default_ttl: int = 60):
+        self.backend = backend
+        self.default_ttl = default_ttl
+        self._metrics = defaultdict(lambda: {'hits': 0, 'misses': 0})
+        self._invalidations = 0
+        self._lock = threading.Lock()
+
+    def build_key(self, namespace: str, params: Dict[str, Any], tags: Iterable[str]) -> str:
+        """Key from the namespace, normalized parameters and current tag versions"""
+        payload = json.dumps(params, sort_keys=True, separators=(',', ':'), default=str)
+        digest = hashlib.sha1(payload.encode()).hexdigest()
+        versions = '.'.join(str(self.backend.get_counter(f'tag:{tag}')) for tag in sorted(tags))
+        return f'{namespace}:{digest}:{versions}'
+
+    def get(self, namespace: str, key: str) -> Optional[Any]:
+        value = self.backend.get(key)
+        with self._lock:
+            self._metrics[namespace]['hits' if value is not None else 'misses'] += 1
+        return value
+
+    def set(self, key: str, value: Any, ttl: Optional[int] = None):
+        self.backend.set(key, value, self.default_ttl if ttl is None else ttl)
+
+    def invalidate(self, *tags: str):
+        """Make every entry stored under any of the tags unreachable"""
+        for tag in set(tags):
+            self.backend.incr(f'tag:{tag}')
+        with self._lock:
+            self._invalidations += len(set(tags))
+
+    def clear(self):
+        self.backend.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit/miss counters per namespace and overall"""
+        with self._lock:
+            namespaces = {name: dict(counts) for name, counts in self._metrics.items()}
+            invalidations = self._invalidations
+
+        hits = sum(counts['hits'] for counts in namespaces.values())
+        misses = sum(counts['misses'] for counts in namespaces.values())
+        for counts in namespaces.values():
+            lookups = counts['hits'] + counts['misses']
+            counts['hit_ratio'] = round(counts['hits'] / lookups, 4) if lookups else 0
+
+        stats = {
+            'backend': type(self.backend).__name__,
+            'hits': hits,
+            'misses': misses,
+            'hit_ratio': round(hits / (hits + misses), 4) if hits + misses else 0,
+            'invalidations': invalidations,
+            'namespaces': namespaces
+        }
+        if hasattr(self.backend, '__len__'):
+            stats['entries'] = len(self.backend)
+        return stats
+
+
+def create_response_cache(config) -> Optional[ResponseCache]:
+    """Build the response cache described by CACHE_* configuration"""
+    backend_name = config.get('CACHE_BACKEND', 'memory')
+    default_ttl = config.get('CACHE_DEFAULT_TTL', 60)
+
+    if backend_name == 'none':
+        return None
+    if backend_name == 'memory':
+        backend = LRUCache(max_entries=config.get('CACHE_MAX_ENTRIES', 1024), default_ttl=default_ttl)
+    elif backend_name == 'local':
+        backend = KeyValueCache(LocalKeyValueStore(), default_ttl=default_ttl)
+    elif backend_name == 'redis':
+        try:
+            import redis
+        except ImportError:
+            raise RuntimeError('CACHE_BACKEND=redis requires the redis package')
+        backend = KeyValueCache(redis.Redis.from_url(config['CACHE_REDIS_URL']), default_ttl=default_ttl)
+    else:
+        raise ValueError(f'Unknown CACHE_BACKEND: {backend_name}')
+
+    return ResponseCache(backend, default_ttl=default_ttl)
+
+
+def get_response_cache() -> Optional[ResponseCache]:
+    """Response cache of the current app, if caching is enabled"""
+    return current_app.extensions.get('response_cache')
+
+
+def invalidate(*tags: str):
+    """Invalidate tags on the current app's response cache"""
+    cache = get_response_cache()
+    if cache is not None:
+        cache.invalidate(*tags)
+
+
+def normalize_args(args, defaults: Optional[Dict[str, str]] = None) -> Dict[str, Any]:
+    """Query arguments with empty values and default values dropped"""
+    defaults = defaults or {}
+    normalized = {}
+    for key in sorted(args.keys()):
+        values = sorted(value.strip() for value in args.getlist(key) if value.strip())
+        if not values or (len(values) == 1 and defaults.get(key) == values[0]):
+            continue
+        normalized[key] = values if len(values) > 1 else values[0]
+    return normalized
+
+
+def cached_response(namespace: str, tags, ttl: Optional[int] = None, defaults: Optional[Dict[str, str]] = None):
+    """Decorator caching successful JSON responses of a public GET view
+
+    tags is a list of tag names or a callable receiving the view arguments.
+    """
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            cache = get_response_cache()
+            if cache is None or request.method != 'GET':
+                return f(*args, **kwargs)
+
+            entry_tags = tags(**kwargs) if callable(tags) else tags
+            params = {'view': kwargs, 'args': normalize_args(request.args, defaults)}
+            key = cache.build_key(namespace, params, entry_tags)
+
+            cached = cache.get(namespace, key)
+            if cached is not None:
+                response = Response(cached['body'], status=cached['status'], mimetype=cached['mimetype'])
+                response.headers['X-Cache'] = 'HIT'
+                return response
+
+            response = current_app.make_response(f(*args, **kwargs))
+            if response.status_code == 200 and not response.direct_passthrough:
+                cache.set(key, {
+                    'body': response.get_data(as_text=True),
+                    'status': response.status_code,
+                    'mimetype': response.mimetype
+                }, ttl)
+            response.headers['X-Cache'] = 'MISS'
+            return response
+        return decorated_function
+    return decorator
+
+
+# User fields embedded in product responses (producer summary, review authors)
+PROFILE_FIELDS = ('username', 'first_name', 'last_name', 'city', 'region')
+
+
+def tags_for_instance(instance) -> set:
+    """Cache tags affected by a write to a model instance"""
+    table = getattr(instance, '__tablename__', None)
+    if table == 'users':
+        # Only edits of a loaded profile field; new users are not embedded anywhere yet
+        state = inspect(instance)
+        if any(state.attrs[field].history.deleted for field in PROFILE_FIELDS):
+            return {'products', 'profiles'}
+        return set()
+    if table == 'products':
+        return {'products', f'product:{instance.id}', 'trending'}
+    if table == 'reviews':
+        return {'products', f'product:{instance.product_id}', 'trending'}
+    if table == 'favorites':
+        return {'trending'}
+    return set()
+
+
+def changed_instances(session):
+    """Instances inserted, modified or deleted by the flush in progress"""
+    dirty = [instance for instance in session.dirty if session.is_modified(instance)]
+    return list(session.new) + dirty + list(session.deleted)
+
+
+@event.listens_for(Session, 'after_flush')
+def _collect_cache_tags(session, flush_context):
+    tags = session.info.setdefault('cache_tags', set())
+    for instance in changed_instances(session):
+        tags |= tags_for_instance(instance)
+
+
+@event.listens_for(Session, 'after_commit')
+def _invalidate_committed_tags(session):
+    tags = session.info.pop('cache_tags', None)
+    if tags and has_app_context():
+        invalidate(*tags)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_cache_tags(session):
+    session.info.pop('cache_tags', None)
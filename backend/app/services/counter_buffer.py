@@ -0,0 +1,183 @@
+"""
+Write-behind buffer for aggregate counters
+
+Rollup tables have rows that many writers share: the metric-wide series of
+the analytics store, for instance, is incremented by every order and
+favorite. Incrementing them inside each writer's transaction makes those
+transactions wait on each other until commit. Instead, after_flush listeners
+stage their deltas in the session (stage()), the deltas are handed to the
+app's CounterBuffer when the transaction commits (and dropped on rollback),
+and a background worker coalesces them and writes them every
+COUNTER_FLUSH_INTERVAL seconds (or as soon as COUNTER_FLUSH_KEYS keys are
+waiting) in a short transaction of its own.
+
+A flush writes each group in a transaction of its own, in name order, and
+every group writes its rows in key order (the order the view and search batch
+sinks use too), so the writers of shared rows cannot deadlock. A group that
+fails is retried with the next flush and dropped after MAX_ATTEMPTS failures.
+
+Without a buffer (CLI commands, scripts) staged deltas are written at once in
+the caller's transaction. Deltas still buffered when a process is killed are
+lost; the rebuild and backfill commands recompute the tables.
+"""
+
+import atexit
+import logging
+import threading
+from typing import Callable, Dict, List, Optional
+
+from flask import current_app, has_app_context
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+logger = logging.getLogger(__name__)
+
+# write(connection, deltas); deltas support merge(other), len() (keys) and bool()
+Writer = Callable[[object, object], None]
+
+MAX_ATTEMPTS = 3
+
+
+class CounterBuffer:
+    """Coalescing in-memory deltas flushed in bulk by a background worker"""
+
+    def __init__(self, app, flush_interval: float = 1.0, flush_keys: int = 20000):
+        self.app = app
+        self.flush_interval = flush_interval
+        self.flush_keys = flush_keys
+        self._pending: Dict[str, List] = {}  # Group name -> [writer, deltas, failed attempts]
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._stats = {'added': 0, 'flushes': 0, 'written_keys': 0, 'failed': 0, 'dropped_keys': 0}
+
+    def add(self, name: str, write: Writer, deltas):
+        """Buffer the deltas of a committed transaction"""
+        self._ensure_started()
+        with self._lock:
+            self._merge(name, write, deltas)
+            self._stats['added'] += 1
+            if self._pending_keys() >= self.flush_keys:
+                self._wake.set()
+
+    def flush(self) -> int:
+        """Write everything buffered, one transaction per group; returns the number of keys written"""
+        from app import db
+
+        with self._flush_lock:
+            with self._lock:
+                pending, self._pending = self._pending, {}
+            if not pending:
+                return 0
+
+            written = 0
+            for name in sorted(pending):
+                write, deltas, attempts = pending[name]
+                try:
+                    with self.app.app_context():
+                        write(db.session.connection(), deltas)
+                        db.session.commit()
+                except Exception:
+                    logger.exception('Failed to write %d buffered %s counter(s)', len(deltas), name)
+                    with self._lock:
+                        self._stats['failed'] += 1
+                        if attempts + 1 >= MAX_ATTEMPTS:
+                            self._stats['dropped_keys'] += len(deltas)
+                        else:
+                            self._merge(name, write, deltas, attempts + 1)  # Retried on the next flush
+                    continue
+                written += len(deltas)
+
+            with self._lock:
+                self._stats['flushes'] += 1
+                self._stats['written_keys'] += written
+            return written
+
+    def stop(self, timeout: float = 5.0):
+        """Stop the worker after writing everything still buffered"""
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        self.flush()
+
+    def stats(self) -> Dict[str, object]:
+        """Buffered keys and write counters"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats['pending_keys'] = self._pending_keys()
+        stats['running'] = bool(self._thread and self._thread.is_alive())
+        return stats
+
+    def _merge(self, name: str, write: Writer, deltas, attempts: int = 0):
+        entry = self._pending.get(name)
+        if entry is None:
+            self._pending[name] = [write, deltas, attempts]
+        else:
+            entry[1].merge(deltas)
+            entry[2] = max(entry[2], attempts)
+
+    def _pending_keys(self) -> int:
+        return sum(len(deltas) for _, deltas, _ in self._pending.values())
+
+    def _ensure_started(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name='counter-buffer', daemon=True)
+            self._thread.start()
+            atexit.register(self.stop)
+
+    def _run(self):
+        while not self._stop.is_set():
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            self.flush()
+
+
+def create_counter_buffer(app) -> CounterBuffer:
+    """Build the counter buffer described by COUNTER_* configuration"""
+    return CounterBuffer(
+        app,
+        flush_interval=app.config.get('COUNTER_FLUSH_INTERVAL', 1.0),
+        flush_keys=app.config.get('COUNTER_FLUSH_KEYS', 20000)
+    )
+
+
+def get_counter_buffer() -> Optional[CounterBuffer]:
+    """Counter buffer of the current app, if deferred counter writes are enabled"""
+    return current_app.extensions.get('counter_buffer') if has_app_context() else None
+
+
+def stage(session, name: str, write: Writer, deltas):
+    """Write a flush's deltas once its transaction commits (or now, without a buffer)"""
+    if not deltas:
+        return
+    if get_counter_buffer() is None:
+        write(session.connection(), deltas)
+        return
+    staged = session.info.setdefault('counter_deltas', {})
+    if name in staged:
+        staged[name][1].merge(deltas)
+    else:
+        staged[name] = [write, deltas]
+
+
+@event.listens_for(Session, 'after_commit')
+def _buffer_committed_deltas(session):
+    staged = session.info.pop('counter_deltas', None)
+    buffer = get_counter_buffer()
+    if not staged or buffer is None:
+        return
+    for name, (write, deltas) in staged.items():
+        buffer.add(name, write, deltas)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_staged_deltas(session):
+    session.info.pop('counter_deltas', None)
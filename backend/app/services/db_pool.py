@@ -0,0 +1,150 @@
+"""
+Database connection pool configuration and saturation metrics
+
+Pool sizing comes from SQLALCHEMY_ENGINE_OPTIONS (built per environment in
+config.py, overridable through DB_POOL_* variables). configure_engine_options()
+completes those options before the engine is created:
+- the pool becomes an InstrumentedQueuePool, which records how many callers
+  are waiting for a connection and how long acquiring one takes
+- DB_STATEMENT_TIMEOUT_MS is set as a PostgreSQL session option
+- with DB_PGBOUNCER (PgBouncer in transaction mode) nothing may rely on
+  session state: server-side prepared statements are disabled for drivers
+  that use them, and the statement timeout is set per transaction with
+  SET LOCAL instead of as a startup option PgBouncer would reject
+
+pool_stats() reports the pool's current occupancy (checked out, overflow)
+together with those counters; load_test_pool.py measures throughput against
+pool size.
+"""
+
+import threading
+import time
+from typing import Any, Dict
+
+from flask import current_app
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.pool import QueuePool
+
+from app import db
+from app.utils.metrics import LatencyWindow
+
+
+class PoolMetrics:
+    """Waiting callers and connection acquisition times of one pool"""
+
+    def __init__(self):
+        self.acquire_latency = LatencyWindow()
+        self._lock = threading.Lock()
+        self._waiting = 0
+        self._stats = {'acquired': 0, 'timeouts': 0, 'max_waiting': 0}
+
+    def started(self):
+        with self._lock:
+            self._waiting += 1
+            self._stats['max_waiting'] = max(self._stats['max_waiting'], self._waiting)
+
+    def finished(self, seconds: float, timed_out: bool = False):
+        self.acquire_latency.record(seconds)
+        with self._lock:
+            self._waiting -= 1
+            self._stats['timeouts' if timed_out else 'acquired'] += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = {**self._stats, 'waiting': self._waiting}
+        return {**stats, 'acquire': self.acquire_latency.summary()}
+
+
+class InstrumentedQueuePool(QueuePool):
+    """QueuePool recording the time callers spend obtaining a connection"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.metrics = PoolMetrics()
+
+    def _do_get(self):
+        # Covers both waiting for a checked-in connection and opening an overflow one
+        self.metrics.started()
+        started = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except PoolTimeoutError:
+            self.metrics.finished(time.perf_counter() - started, timed_out=True)
+            raise
+        except Exception:
+            self.metrics.finished(time.perf_counter() - started)
+            raise
+        self.metrics.finished(time.perf_counter() - started)
+        return connection
+
+    def recreate(self):
+        # engine.dispose() swaps in a fresh pool; keep counting into the same metrics
+        pool = super().recreate()
+        pool.metrics = self.metrics
+        return pool
+
+
+def configure_engine_options(config):
+    """Complete SQLALCHEMY_ENGINE_OPTIONS with the instrumented pool, statement timeout and PgBouncer settings"""
+    if not config.get('SQLALCHEMY_DATABASE_URI'):
+        return
+    options = dict(config.get('SQLALCHEMY_ENGINE_OPTIONS') or {})
+    url = make_url(config['SQLALCHEMY_DATABASE_URI'])
+
+    if 'pool_size' in options:
+        options.setdefault('poolclass', InstrumentedQueuePool)
+
+    if url.get_backend_name() == 'postgresql':
+        connect_args = dict(options.get('connect_args') or {})
+        if config.get('DB_PGBOUNCER'):
+            # psycopg 3 prepares statements server-side after a few executions; psycopg2 never does
+            if url.get_driver_name() == 'psycopg':
+                connect_args['prepare_threshold'] = None
+        elif config.get('DB_STATEMENT_TIMEOUT_MS'):
+            connect_args['options'] = f"-c statement_timeout={int(config['DB_STATEMENT_TIMEOUT_MS'])}"
+        if connect_args:
+            options['connect_args'] = connect_args
+
+    config['SQLALCHEMY_ENGINE_OPTIONS'] = options
+
+
+def instrument_engine(engine, config):
+    """Engine-level settings that cannot be passed as engine options"""
+    timeout = config.get('DB_STATEMENT_TIMEOUT_MS')
+    if config.get('DB_PGBOUNCER') and timeout and engine.dialect.name == 'postgresql':
+        @event.listens_for(engine, 'begin')
+        def _set_statement_timeout(connection):
+            connection.exec_driver_sql(f'SET LOCAL statement_timeout = {int(timeout)}')
+
+
+def pool_stats(engine) -> Dict[str, Any]:
+    """Occupancy and wait counters of an engine's pool"""
+    pool = engine.pool
+    stats = {'pool': type(pool).__name__}
+    if isinstance(pool, QueuePool):
+        stats.update({
+            'size': pool.size(),
+            'checked_out': pool.checkedout(),
+            'checked_in': pool.checkedin(),
+            'overflow': max(pool.overflow(), 0),
+            'timeout': pool.timeout()
+        })
+    metrics = getattr(pool, 'metrics', None)
+    if metrics is not None:
+        stats.update(metrics.stats())
+    return stats
+
+
+def get_pool_stats() -> Dict[str, Any]:
+    """Pool stats of the current app's engine"""
+    stats = {
+        'pgbouncer': bool(current_app.config.get('DB_PGBOUNCER')),
+        'statement_timeout_ms': current_app.config.get('DB_STATEMENT_TIMEOUT_MS') or None,
+        **pool_stats(db.engine)
+    }
+    replicas = {key: pool_stats(engine) for key, engine in db.engines.items() if key is not None}
+    if replicas:
+        stats['binds'] = replicas
+    return stats
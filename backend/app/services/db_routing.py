@@ -0,0 +1,276 @@
+"""
+Read-replica routing
+
+Replica URLs come from SQLALCHEMY_REPLICA_URIS and become Flask-SQLAlchemy
+binds ('replica_0', 'replica_1', ...). The app's session class,
+RoutingSession, sends a statement to a replica only when all of these hold:
+- the view is decorated with @replica_reads and the request is a GET/HEAD
+- the statement is a SELECT issued outside a flush (writes, flushes and
+  session.connection() always use the primary)
+- the caller has not written in the last REPLICA_STICKY_SECONDS, so users
+  read their own writes; callers are keyed by the bearer token's subject (or
+  the client address). Marks are kept in the shared response cache backend
+  when it is a key-value server, so they hold across workers; otherwise per
+  worker
+- a healthy replica is available. Replicas are probed (with their
+  replication lag on PostgreSQL, against REPLICA_MAX_LAG_SECONDS) at most
+  every REPLICA_HEALTH_CHECK_SECONDS and marked down as soon as a statement
+  on them fails with a connection error; reads then fall back to the primary
+
+The replica is chosen once per request, so a request never mixes replicas.
+A read that fails on the replica with an OperationalError or a disconnect
+(replica restarting, query cancelled by recovery) is retried once on the
+primary, and the rest of the request stays there, so the failure does not
+reach the client.
+"""
+
+import itertools
+import math
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+from typing import Any, Dict, Optional
+
+import jwt as pyjwt
+from flask import current_app, g, has_request_context, request
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event
+from sqlalchemy.exc import DBAPIError, OperationalError
+from sqlalchemy.orm import Session as OrmSession
+
+_PRIMARY = object()  # g.db_route value of requests pinned to the primary
+
+
+def replica_bind_keys(uris) -> Dict[str, str]:
+    """Flask-SQLAlchemy binds of the replica URLs"""
+    return {f'replica_{index}': uri for index, uri in enumerate(uris)}
+
+
+class ReplicaRouter:
+    """Picks a healthy replica for a request, honouring read-your-writes stickiness"""
+
+    def __init__(self, engines: Dict[str, Any], sticky_store, sticky_seconds: float = 5.0,
+                 health_interval: float = 10.0, max_lag: Optional[float] = 30.0, clock=time.monotonic):
+        self.engines = engines
+        self.sticky_store = sticky_store
+        self.sticky_seconds = sticky_seconds
+        self.health_interval = health_interval
+        self.max_lag = max_lag
+        self.clock = clock
+        self._order = itertools.cycle(sorted(engines))
+        self._health = {name: {'healthy': True, 'checked_at': None, 'lag': None, 'outages': 0} for name in engines}
+        self._lock = threading.Lock()
+        self._probe_lock = threading.Lock()
+        self._stats = {'replica': 0, 'sticky': 0, 'fallback': 0, 'retried_on_primary': 0}
+
+    def choose(self, caller: str):
+        """Replica engine for a caller's reads, or None for the primary"""
+        if self.sticky_seconds and self.sticky_store.get(f'sticky:{caller}') is not None:
+            self._count('sticky')
+            return None
+        for _ in range(len(self.engines)):
+            with self._lock:
+                name = next(self._order)
+            if self._is_healthy(name):
+                self._count('replica')
+                return self.engines[name]
+        self._count('fallback')
+        return None
+
+    def mark_write(self, caller: str):
+        """Pin a caller's reads to the primary for the sticky window"""
+        if self.sticky_seconds:
+            self.sticky_store.set(f'sticky:{caller}', 1, ttl=math.ceil(self.sticky_seconds))
+
+    def count_retry(self):
+        self._count('retried_on_primary')
+
+    def mark_down(self, name: str):
+        self._set_health(name, False)
+
+    def _set_health(self, name: str, healthy: bool, lag: Optional[float] = None):
+        with self._lock:
+            health = self._health[name]
+            if health['healthy'] and not healthy:
+                health['outages'] += 1
+            health.update(healthy=healthy, checked_at=self.clock(), lag=lag)
+
+    def _is_healthy(self, name: str) -> bool:
+        health = self._health[name]
+        due = health['checked_at'] is None or self.clock() - health['checked_at'] >= self.health_interval
+        # One probe at a time; other requests go by the last known state meanwhile
+        if due and self._probe_lock.acquire(blocking=False):
+            try:
+                self._probe(name)
+            finally:
+                self._probe_lock.release()
+        return health['healthy']
+
+    def _probe(self, name: str):
+        engine = self.engines[name]
+        lag = None
+        try:
+            with engine.connect() as connection:
+                if engine.dialect.name == 'postgresql':
+                    lag = connection.exec_driver_sql(
+                        'SELECT EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp())'
+                    ).scalar()
+                else:
+                    connection.exec_driver_sql('SELECT 1')
+            lag = float(lag) if lag is not None else None
+            healthy = lag is None or self.max_lag is None or lag <= self.max_lag
+        except Exception:
+            healthy = False
+        self._set_health(name, healthy, lag)
+
+    def _count(self, name: str):
+        with self._lock:
+            self._stats[name] += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'routed': dict(self._stats),
+                'replicas': {
+                    name: {'healthy': health['healthy'], 'lag_seconds': health['lag'], 'outages': health['outages']}
+                    for name, health in self._health.items()
+                }
+            }
+
+
+def caller_key() -> str:
+    """Stickiness key of the current request: bearer token subject, else client address
+
+    The token is not verified here; it only decides where this caller's reads go.
+    """
+    header = request.headers.get('Authorization', '')
+    if header.startswith('Bearer '):
+        try:
+            subject = pyjwt.decode(header[7:], options={'verify_signature': False}).get('sub')
+        except pyjwt.PyJWTError:
+            subject = None
+        if subject:
+            return f'user:{subject}'
+    return f'addr:{request.remote_addr}'
+
+
+def get_replica_router() -> Optional[ReplicaRouter]:
+    """Replica router of the current app, if replicas are configured"""
+    return current_app.extensions.get('replica_router')
+
+
+class RoutingSession(Session):
+    """Flask-SQLAlchemy session sending eligible SELECTs to a read replica"""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and not self._flushing and getattr(clause, 'is_select', False):
+            engine = _request_replica()
+            if engine is not None:
+                return engine
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+    def execute(self, statement, params=None, **kwargs):
+        try:
+            return super().execute(statement, params, **kwargs)
+        except DBAPIError as error:
+            if not _retry_on_primary(error):
+                raise
+        # The replica's connection is left to be rolled back when the session closes
+        return super().execute(statement, params, **kwargs)
+
+
+def _retry_on_primary(error: DBAPIError) -> bool:
+    """Pin the request to the primary after a replica read failed; False when not retryable"""
+    if getattr(error, 'replica_name', None) is None or not has_request_context():
+        return False
+    if not (isinstance(error, OperationalError) or error.connection_invalidated):
+        return False
+    if g.get('db_route') is _PRIMARY:
+        return False  # Already retried
+    g.db_route = _PRIMARY
+    router = get_replica_router()
+    if router is not None:
+        router.count_retry()
+    return True
+
+
+def _request_replica():
+    if not has_request_context() or not g.get('replica_reads') or g.get('primary_reads'):
+        return None
+    route = g.get('db_route')
+    if route is None:
+        router = get_replica_router()
+        g.db_route = _PRIMARY  # Reads made while choosing (none expected) use the primary
+        engine = router.choose(caller_key()) if router is not None else None
+        route = g.db_route = engine if engine is not None else _PRIMARY
+    return None if route is _PRIMARY else route
+
+
+def replica_reads(f):
+    """Let a read-only view's SELECTs go to a read replica (GET/HEAD only)"""
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        if request.method in ('GET', 'HEAD'):
+            g.replica_reads = True
+        return f(*args, **kwargs)
+    return decorated_function
+
+
+@contextmanager
+def primary_reads():
+    """Read from the primary inside the block, e.g. for security-relevant lookups"""
+    previous = g.get('primary_reads') if has_request_context() else None
+    if has_request_context():
+        g.primary_reads = True
+    try:
+        yield
+    finally:
+        if has_request_context():
+            g.primary_reads = previous
+
+
+def create_replica_router(app, db, sticky_store) -> Optional[ReplicaRouter]:
+    """Build the router over the replica binds (call inside an app context)"""
+    names = list(replica_bind_keys(app.config.get('SQLALCHEMY_REPLICA_URIS') or []))
+    if not names:
+        return None
+    engines = {name: db.engines[name] for name in names}
+    router = ReplicaRouter(
+        engines,
+        sticky_store,
+        sticky_seconds=app.config.get('REPLICA_STICKY_SECONDS', 5),
+        health_interval=app.config.get('REPLICA_HEALTH_CHECK_SECONDS', 10),
+        max_lag=app.config.get('REPLICA_MAX_LAG_SECONDS', 30)
+    )
+    for name, engine in engines.items():
+        _watch_replica(router, name, engine)
+    return router
+
+
+def _watch_replica(router: ReplicaRouter, name: str, engine):
+    @event.listens_for(engine, 'handle_error')
+    def _replica_error(context):
+        if context.sqlalchemy_exception is not None:
+            context.sqlalchemy_exception.replica_name = name  # Lets RoutingSession retry on the primary
+        if context.is_disconnect or context.connection is None:
+            router.mark_down(name)
+
+
+@event.listens_for(OrmSession, 'after_flush')
+def _note_write(session, flush_context):
+    if has_request_context():
+        session.info['routing_wrote'] = True
+
+
+@event.listens_for(OrmSession, 'after_commit')
+def _mark_writer_sticky(session):
+    if session.info.pop('routing_wrote', None) and has_request_context():
+        router = get_replica_router()
+        if router is not None:
+            router.mark_write(caller_key())
+
+
+@event.listens_for(OrmSession, 'after_rollback')
+def _forget_write(session):
+    session.info.pop('routing_wrote', None)
@@ -0,0 +1,182 @@
+"""
+ETag / If-None-Match support for catalog endpoints
+
+A response's ETag is derived from the endpoint, its normalized arguments and
+the version counters of the cache tags it depends on ('products',
+'product:<id>', 'profiles' for the user fields embedded in products, ...).
+Versions are always read from the primary, so a lagging replica cannot
+answer 304 for a response that changed. Revalidating a response therefore only needs the
+current versions: a single primary-key lookup instead of running the query
+and serializing the result.
+
+Version sources:
+- DatabaseVersionStore: resource_versions table, shared by all workers.
+  The tags a transaction writes are collected as it flushes and bumped
+  right after it commits, in a short transaction of their own: bumping the
+  shared 'products' and 'trending' rows inside every product, review or
+  order transaction made those writes wait on each other until commit. A
+  revalidation racing the bump may still get one 304 for the old version
+- CacheVersionStore: the response cache's own tag counters, for the
+  single-process development server
+"""
+
+import hashlib
+import json
+import logging
+from functools import wraps
+from typing import Dict, Iterable, Optional
+
+from flask import current_app, has_app_context, request
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from app import db
+from app.models.resource_version import ResourceVersion
+from app.services.cache import changed_instances, normalize_args, tags_for_instance
+from app.services.db_routing import get_replica_router, primary_reads
+from app.utils.upsert import dialect_insert
+
+logger = logging.getLogger(__name__)
+
+class DatabaseVersionStore:
+    """Version counters stored in the resource_versions table"""
+
+    def get(self, tags: Iterable[str]) -> Dict[str, int]:
+        """Current version of each tag (0 when never bumped)"""
+        tags = list(tags)
+        rows = db.session.query(ResourceVersion.scope, ResourceVersion.version).filter(
+            ResourceVersion.scope.in_(tags)
+        )
+        versions = dict.fromkeys(tags, 0)
+        versions.update({scope: version for scope, version in rows})
+        return versions
+
+    def bump(self, connection, tags: Iterable[str]):
+        """Increment tag versions inside the connection's transaction"""
+        table = ResourceVersion.__table__
+        for tag in sorted(set(tags)):  # Fixed order avoids deadlocks between writers
+            result = connection.execute(
+                table.update().where(table.c.scope == tag).values(version=table.c.version + 1)
+            )
+            if result.rowcount == 0:
+                connection.execute(_upsert_version(connection, table, tag))
+
+
+def _upsert_version(connection, table, tag):
+    """INSERT for a first bump, tolerating a concurrent insert of the same scope"""
+    insert = dialect_insert(connection)
+    if insert is None:
+        return table.insert().values(scope=tag, version=1)
+
+    statement = insert(table).values(scope=tag, version=1)
+    return statement.on_conflict_do_update(
+        index_elements=[table.c.scope],
+        set_={'version': table.c.version + 1}
+    )
+
+
+class CacheVersionStore:
+    """Version counters read from a ResponseCache's tag versions"""
+
+    def __init__(self, response_cache):
+        self.response_cache = response_cache
+
+    def get(self, tags: Iterable[str]) -> Dict[str, int]:
+        """Current version of each tag"""
+        return {tag: self.response_cache.backend.get_counter(f'tag:{tag}') for tag in tags}
+
+
+def get_version_store():
+    """Version store of the current app, if ETags are enabled"""
+    return current_app.extensions.get('resource_versions')
+
+
+def touch(session, tags: Iterable[str]):
+    """Expire cached responses and ETags of tags written through Core once the session commits"""
+    tags = set(tags)
+    session.info.setdefault('cache_tags', set()).update(tags)
+    session.info.setdefault('version_tags', set()).update(tags)
+
+
+@event.listens_for(Session, 'after_flush')
+def _collect_version_tags(session, flush_context):
+    tags = session.info.setdefault('version_tags', set())
+    for instance in changed_instances(session):
+        tags |= tags_for_instance(instance)
+
+
+@event.listens_for(Session, 'after_commit')
+def _bump_committed_versions(session):
+    tags = session.info.pop('version_tags', None)
+    if not tags or not has_app_context():
+        return
+    store = get_version_store()
+    if not isinstance(store, DatabaseVersionStore):
+        return
+    try:
+        with db.engine.begin() as connection:
+            store.bump(connection, tags)
+    except Exception:
+        # The write itself is committed; clients revalidate against the old versions until the next bump
+        logger.exception('Failed to bump resource versions %s', sorted(tags))
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_version_tags(session):
+    session.info.pop('version_tags', None)
+
+
+def compute_etag(namespace: str, params: dict, versions: Dict[str, int]) -> str:
+    """Strong ETag for a response built from these parameters and versions"""
+    payload = json.dumps([namespace, params, versions], sort_keys=True, separators=(',', ':'), default=str)
+    return '"' + hashlib.sha1(payload.encode()).hexdigest() + '"'
+
+
+def etag_matches(etag: str, header: Optional[str]) -> bool:
+    """Check an ETag against an If-None-Match header (weak comparison)"""
+    if not header:
+        return False
+    candidates = [candidate.strip() for candidate in header.split(',')]
+    if '*' in candidates:
+        return True
+    return etag in [candidate[2:] if candidate.startswith('W/') else candidate for candidate in candidates]
+
+
+def conditional_response(namespace: str, tags, cache_control: str = 'no-cache',
+                         defaults: Optional[Dict[str, str]] = None):
+    """Decorator adding ETag, Cache-Control and 304 Not Modified handling to a GET view
+
+    tags is a list of tag names or a callable receiving the view arguments.
+    """
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            store = get_version_store()
+            if store is None or request.method != 'GET':
+                return f(*args, **kwargs)
+
+            entry_tags = tags(**kwargs) if callable(tags) else tags
+            params = {'view': kwargs, 'args': normalize_args(request.args, defaults)}
+            # From the primary even in @replica_reads views: a lagging replica would hand out the old ETag
+            with primary_reads():
+                versions = store.get(entry_tags)
+            etag = compute_etag(namespace, params, versions)
+
+            if etag_matches(etag, request.headers.get('If-None-Match')):
+                response = current_app.response_class(status=304)
+            else:
+                # Nor may it render an old body under the new ETag; versions are bumped after
+                # the writes they cover commit, so a replica that has them has the writes too
+                if get_replica_router() is not None and store.get(entry_tags) != versions:
+                    with primary_reads():
+                        response = current_app.make_response(f(*args, **kwargs))
+                else:
+                    response = current_app.make_response(f(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+
+            response.headers['ETag'] = etag
+            response.headers['Cache-Control'] = cache_control
+            return response
+        return decorated_function
+    return decorator
@@ -0,0 +1,613 @@
+"""
+Geospatial tiles, heatmaps and nearest producers
+
+Locations are users' latitude/longitude. Heatmaps read pre-aggregated counts
+from geo_tiles: everything counted adds 1 to the Web Mercator (slippy map)
+tile containing its location at each zoom level of GEO_TILE_ZOOMS:
+- producers and products: at the producer's location; products move with
+  their producer
+- views, favorites and orders (demand): at the location of the user who
+  viewed, favorited or ordered, when known; anonymous views are not placed
+
+As with the analytics buckets, a session after_flush listener turns users,
+products, favorites and orders into tile deltas and stages them with the
+counter buffer, which writes them shortly after the transaction commits: low
+zoom tiles cover whole regions, so writing them inline would make every order
+and favorite in a region wait on the same rows. The view ingestor adds its
+batches through record_view_batch(). backfill-geo-tiles rebuilds the table from the raw rows,
+placing past demand at users' current locations.
+
+query_heatmap() answers a bounding box at a map zoom with the cells of the
+deepest stored level no deeper than zoom + GEO_CELL_DETAIL (a 256px map tile
+then shows up to 8x8 cells), so the response size depends on the viewport rather
+than on how many rows were counted.
+
+Nearest-producer queries search ProducerGrid, an in-memory grid of producer
+locations in GEO_GRID_CELL_DEGREES cells, ring by ring outwards. It is built
+lazily, updated as producer writes commit in this worker, and rebuilt when
+the producers' signature changes (writes from other workers), checked at most
+every GEO_INDEX_REFRESH_SECONDS.
+"""
+
+import math
+import threading
+import time
+from collections import defaultdict
+from itertools import chain
+from typing import Any, Dict, List, Optional, Tuple
+
+import click
+from flask import current_app, has_app_context
+from flask.cli import with_appcontext
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from sqlalchemy.orm.attributes import get_history
+
+from app.services.counter_buffer import stage
+from app.services.producer_stats import EXCLUDED_ORDER_STATUSES
+from app.utils.upsert import upsert_increments
+from app.utils.validators import validate_coordinates
+
+METRICS = ('producers', 'products', 'views', 'favorites', 'orders')
+DEMAND_METRICS = ('views', 'favorites', 'orders')
+
+DEFAULT_ZOOMS = (4, 6, 8, 10, 12)
+MAX_ZOOM = 22
+MAX_LATITUDE = 85.05112878  # Web Mercator covers latitudes up to here
+EARTH_RADIUS_KM = 6371.0088
+
+Location = Tuple[float, float]  # latitude, longitude
+
+
+def location(latitude, longitude) -> Optional[Location]:
+    """(latitude, longitude) of valid coordinates, else None"""
+    if latitude is None or longitude is None or not validate_coordinates(latitude, longitude)[0]:
+        return None
+    return float(latitude), float(longitude)
+
+
+def tile_for(latitude: float, longitude: float, zoom: int) -> Tuple[int, int]:
+    """x, y of the Web Mercator tile containing a point"""
+    n = 1 << zoom
+    latitude = max(-MAX_LATITUDE, min(MAX_LATITUDE, latitude))
+    x = int((longitude + 180.0) / 360.0 * n)
+    y = int((1.0 - math.asinh(math.tan(math.radians(latitude))) / math.pi) / 2.0 * n)
+    return min(max(x, 0), n - 1), min(max(y, 0), n - 1)
+
+
+def tile_bounds(x: int, y: int, zoom: int) -> Tuple[float, float, float, float]:
+    """south, west, north, east of a tile"""
+    n = 1 << zoom
+
+    def latitude(row):
+        return math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * row / n))))
+
+    return latitude(y + 1), x / n * 360.0 - 180.0, latitude(y), (x + 1) / n * 360.0 - 180.0
+
+
+def haversine_km(a: Location, b: Location) -> float:
+    """Great-circle distance between two points"""
+    lat1, lon1, lat2, lon2 = map(math.radians, (a[0], a[1], b[0], b[1]))
+    h = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(h)))
+
+
+def tile_zooms() -> Tuple[int, ...]:
+    """Zoom levels tiles are kept at, coarsest first"""
+    zooms = current_app.config.get('GEO_TILE_ZOOMS', DEFAULT_ZOOMS) if has_app_context() else DEFAULT_ZOOMS
+    return tuple(sorted(set(zooms)))
+
+
+class GeoTiles:
+    """Count deltas per metric, zoom level and tile"""
+
+    def __init__(self, zooms=DEFAULT_ZOOMS):
+        self.zooms = zooms
+        self.values: Dict[Tuple[str, int, int, int], int] = defaultdict(int)
+
+    def add(self, metric: str, point: Optional[Location], value: int = 1):
+        """Add a value at a location to its tile at every zoom level"""
+        if point is None or not value:
+            return
+        for zoom in self.zooms:
+            x, y = tile_for(point[0], point[1], zoom)
+            self.values[(metric, zoom, x, y)] += value
+
+    def rows(self) -> List[dict]:
+        return [
+            {'metric': metric, 'zoom': zoom, 'tile_x': x, 'tile_y': y, 'value': value}
+            for (metric, zoom, x, y), value in self.values.items() if value
+        ]
+
+    def merge(self, other: 'GeoTiles'):
+        """Add another set of deltas to these"""
+        for key, value in other.values.items():
+            self.values[key] += value
+
+    def __len__(self):
+        return len(self.values)
+
+    def __bool__(self):
+        return any(self.values.values())
+
+
+def write_tiles(connection, tiles: GeoTiles):
+    """Add accumulated counts to geo_tiles in one executemany upsert"""
+    from app.models.geo_tile import GeoTile
+
+    upsert_increments(connection, GeoTile.__table__, ['metric', 'zoom', 'tile_x', 'tile_y'], tiles.rows(), ['value'])
+
+
+def parse_heatmap_args(args) -> Dict[str, Any]:
+    """Validate heatmap query parameters (request.args); raises ValueError with a client-facing message"""
+    metric = args.get('metric', 'products')
+    if metric not in METRICS:
+        raise ValueError(f"metric must be one of: {', '.join(METRICS)}")
+
+    zoom = args.get('zoom', 6, type=int)
+    if zoom is None or not 0 <= zoom <= MAX_ZOOM:
+        raise ValueError(f'zoom must be an integer between 0 and {MAX_ZOOM}')
+
+    try:
+        west, south, east, north = (float(value) for value in args.get('bbox', '-180,-85,180,85').split(','))
+    except ValueError:
+        raise ValueError("bbox must be 'west,south,east,north' in degrees")
+    if not (validate_coordinates(south, west)[0] and validate_coordinates(north, east)[0]):
+        raise ValueError('bbox coordinates are out of range')
+    if west >= east or south >= north:
+        raise ValueError('bbox must have west < east and south < north')
+
+    return {'metric': metric, 'zoom': zoom, 'bbox': (west, south, east, north)}
+
+
+def heatmap_level(zoom: int, bbox, zooms, detail: int = 3, max_cells: int = 4096) -> Tuple[int, range, range]:
+    """Stored zoom level and tile ranges to answer a request with"""
+    west, south, east, north = bbox
+    candidates = [level for level in zooms if level <= zoom + detail] or [zooms[0]]
+    for level in reversed(candidates):
+        x0, y0 = tile_for(north, west, level)
+        x1, y1 = tile_for(south, east, level)
+        if (x1 - x0 + 1) * (y1 - y0 + 1) <= max_cells or level == candidates[0]:
+            return level, range(x0, x1 + 1), range(y0, y1 + 1)
+
+
+def heatmap_payload(params: Dict[str, Any], level: int, tiles) -> Dict[str, Any]:
+    """Response body of (x, y, value) cells at a stored level"""
+    cells = []
+    for x, y, value in tiles:
+        south, west, north, east = tile_bounds(x, y, level)
+        cells.append({
+            'x': x,
+            'y': y,
+            'value': value,
+            'bounds': [south, west, north, east],
+            'center': [(south + north) / 2, (west + east) / 2]
+        })
+    return {
+        'metric': params['metric'],
+        'zoom': params['zoom'],
+        'cell_zoom': level,
+        'bbox': list(params['bbox']),
+        'total': sum(cell['value'] for cell in cells),
+        'max': max((cell['value'] for cell in cells), default=0),
+        'cells': cells
+    }
+
+
+def query_heatmap(params: Dict[str, Any]) -> Dict[str, Any]:
+    """Read the non-empty cells of a bounding box from geo_tiles"""
+    from app.models.geo_tile import GeoTile
+
+    level, xs, ys = heatmap_level(
+        params['zoom'], params['bbox'], tile_zooms(),
+        detail=current_app.config.get('GEO_CELL_DETAIL', 3),
+        max_cells=current_app.config.get('GEO_MAX_CELLS', 4096)
+    )
+    rows = GeoTile.query.with_entities(GeoTile.tile_x, GeoTile.tile_y, GeoTile.value).filter(
+        GeoTile.metric == params['metric'],
+        GeoTile.zoom == level,
+        GeoTile.tile_x.between(xs.start, xs.stop - 1),
+        GeoTile.tile_y.between(ys.start, ys.stop - 1),
+        GeoTile.value > 0
+    ).order_by(GeoTile.tile_x, GeoTile.tile_y)
+    return heatmap_payload(params, level, rows)
+
+
+def _previous(instance, attribute):
+    """Value of an attribute before the current flush"""
+    history = get_history(instance, attribute)
+    if history.deleted:
+        return history.deleted[0]
+    if history.unchanged:
+        return history.unchanged[0]
+    return getattr(instance, attribute)
+
+
+def _counted_order(status) -> bool:
+    return status not in EXCLUDED_ORDER_STATUSES
+
+
+def _user_locations(session, user_ids) -> Dict[Any, Tuple[Optional[Location], Optional[Location]]]:
+    """(location before, location after) the flush of each user, with at most one query"""
+    from app.models.user import User
+
+    locations = {}
+    for instance in chain(session.new, session.dirty, session.deleted):
+        if isinstance(instance, User) and instance.id in user_ids:
+            before = None if instance in session.new else location(
+                _previous(instance, 'latitude'), _previous(instance, 'longitude')
+            )
+            after = None if instance in session.deleted else location(instance.latitude, instance.longitude)
+            locations[instance.id] = (before, after)
+
+    missing = set(user_ids) - locations.keys()
+    if missing:
+        users = User.__table__
+        rows = session.connection().execute(
+            users.select().with_only_columns(users.c.id, users.c.latitude, users.c.longitude)
+            .where(users.c.id.in_(list(missing)))
+        )
+        for user_id, latitude, longitude in rows:
+            point = location(latitude, longitude)
+            locations[user_id] = (point, point)
+    return locations
+
+
+def collect_flush_tiles(session) -> GeoTiles:
+    """Tile deltas implied by the users, products, favorites and orders written in a flush"""
+    from app import db
+    from app.models.favorite import Favorite
+    from app.models.order import Order
+    from app.models.product import Product
+    from app.models.product_view import ProductView
+    from app.models.user import User
+
+    tiles = GeoTiles(tile_zooms())
+    users = []  # (user id, role before, role after)
+    products = []  # (producer id, sign)
+    demand = []  # (metric, user id, sign)
+
+    for instance in session.new:
+        if isinstance(instance, User):
+            users.append((instance.id, None, instance.role))
+        elif isinstance(instance, Product):
+            products.append((instance.producer_id, 1))
+        elif isinstance(instance, Favorite):
+            demand.append(('favorites', instance.user_id, 1))
+        elif isinstance(instance, Order) and _counted_order(instance.status):
+            demand.append(('orders', instance.consumer_id, 1))
+
+    for instance in session.deleted:
+        if isinstance(instance, User):
+            users.append((instance.id, _previous(instance, 'role'), None))
+        elif isinstance(instance, Product):
+            products.append((_previous(instance, 'producer_id'), -1))
+        elif isinstance(instance, Favorite):
+            demand.append(('favorites', _previous(instance, 'user_id'), -1))
+        elif isinstance(instance, ProductView):
+            demand.append(('views', instance.user_id, -1))  # Views are only deleted with their product
+        elif isinstance(instance, Order) and _counted_order(_previous(instance, 'status')):
+            demand.append(('orders', instance.consumer_id, -1))
+
+    for instance in session.dirty:
+        if isinstance(instance, User):
+            users.append((instance.id, _previous(instance, 'role'), instance.role))
+        elif isinstance(instance, Order):
+            before, after = _counted_order(_previous(instance, 'status')), _counted_order(instance.status)
+            if before != after:
+                demand.append(('orders', instance.consumer_id, 1 if after else -1))
+
+    if not (users or products or demand):
+        return tiles
+
+    locations = _user_locations(
+        session,
+        {user_id for user_id, _, _ in users} | {producer_id for producer_id, _ in products}
+        | {user_id for _, user_id, _ in demand if user_id is not None}
+    )
+
+    # Additions go to where the user is now, removals to where they were counted
+    for producer_id, sign in products:
+        before, after = locations.get(producer_id, (None, None))
+        tiles.add('products', after if sign > 0 else before, sign)
+    for metric, user_id, sign in demand:
+        before, after = locations.get(user_id, (None, None))
+        tiles.add(metric, after if sign > 0 else before, sign)
+
+    moved = {}
+    for user_id, role_before, role_after in users:
+        before, after = locations[user_id]
+        if role_before == 'producer':
+            tiles.add('producers', before, -1)
+        if role_after == 'producer':
+            tiles.add('producers', after, 1)
+        if before != after and role_before is not None and role_after is not None:
+            moved[user_id] = (before, after)
+
+    if moved:
+        # Products already stored move with their producer; ones added in this flush were placed above
+        counts = dict(session.connection().execute(
+            db.select(Product.__table__.c.producer_id, db.func.count())
+            .where(Product.__table__.c.producer_id.in_(list(moved)))
+            .group_by(Product.__table__.c.producer_id)
+        ).all())
+        for producer_id, sign in products:
+            if producer_id in moved and sign > 0:
+                counts[producer_id] = counts.get(producer_id, 0) - 1
+        for producer_id, (before, after) in moved.items():
+            tiles.add('products', before, -counts.get(producer_id, 0))
+            tiles.add('products', after, counts.get(producer_id, 0))
+    return tiles
+
+
+def record_view_batch(connection, rows):
+    """Add a batch of product_views rows to the views tiles at the viewers' locations"""
+    from app.models.user import User
+
+    user_ids = {row['user_id'] for row in rows if row.get('user_id') is not None}
+    if not user_ids:
+        return
+    users = User.__table__
+    locations = {
+        user_id: location(latitude, longitude)
+        for user_id, latitude, longitude in connection.execute(
+            users.select().with_only_columns(users.c.id, users.c.latitude, users.c.longitude)
+            .where(users.c.id.in_(list(user_ids)))
+        )
+    }
+    tiles = GeoTiles(tile_zooms())
+    for row in rows:
+        tiles.add('views', locations.get(row.get('user_id')))
+    write_tiles(connection, tiles)
+
+
+@event.listens_for(Session, 'after_flush')
+def _update_geo_tiles(session, flush_context):
+    stage(session, 'geo_tiles', write_tiles, collect_flush_tiles(session))
+
+
+class ProducerGrid:
+    """In-memory grid of producer locations answering k-nearest queries"""
+
+    def __init__(self, cell_degrees: float = 0.5):
+        self.cell_degrees = cell_degrees
+        self._cells: Dict[Tuple[int, int], Dict[Any, Location]] = defaultdict(dict)
+        self._where: Dict[Any, Tuple[int, int]] = {}
+        self._lock = threading.Lock()
+
+    def _cell(self, point: Location) -> Tuple[int, int]:
+        return math.floor(point[0] / self.cell_degrees), math.floor(point[1] / self.cell_degrees)
+
+    def add(self, producer_id, point: Location):
+        with self._lock:
+            self._remove(producer_id)
+            cell = self._cell(point)
+            self._cells[cell][producer_id] = point
+            self._where[producer_id] = cell
+
+    def remove(self, producer_id):
+        with self._lock:
+            self._remove(producer_id)
+
+    def _remove(self, producer_id):
+        cell = self._where.pop(producer_id, None)
+        if cell is not None:
+            self._cells[cell].pop(producer_id, None)
+            if not self._cells[cell]:
+                del self._cells[cell]
+
+    def clear(self):
+        with self._lock:
+            self._cells.clear()
+            self._where.clear()
+
+    def __len__(self):
+        return len(self._where)
+
+    def nearest(self, point: Location, k: int = 10, radius_km: Optional[float] = None) -> List[Tuple[Any, float]]:
+        """Up to k (producer id, distance in km) pairs, closest first"""
+        with self._lock:
+            row, col = self._cell(point)
+            found: List[Tuple[float, Any]] = []
+            ring = 0
+            while True:
+                if (2 * ring + 1) ** 2 >= len(self._cells):
+                    # The rings now cover more cells than are populated: finish with a scan of those
+                    found = [
+                        (haversine_km(point, other), producer_id)
+                        for members in self._cells.values() for producer_id, other in members.items()
+                    ]
+                    break
+                for cell in self._ring(row, col, ring):
+                    for producer_id, other in self._cells.get(cell, {}).items():
+                        found.append((haversine_km(point, other), producer_id))
+                # Anything outside the searched block is at least this far away
+                bound = self._distance_to_block_edge(point, row, col, ring)
+                found.sort()
+                if (len(found) >= k and found[k - 1][0] <= bound) or (radius_km is not None and bound >= radius_km):
+                    break
+                ring += 1
+
+        found.sort()
+        if radius_km is not None:
+            found = [item for item in found if item[0] <= radius_km]
+        return [(producer_id, distance) for distance, producer_id in found[:k]]
+
+    @staticmethod
+    def _ring(row: int, col: int, ring: int):
+        if ring == 0:
+            yield row, col
+            return
+        for offset in range(-ring, ring + 1):
+            yield row - ring, col + offset
+            yield row + ring, col + offset
+        for offset in range(-ring + 1, ring):
+            yield row + offset, col - ring
+            yield row + offset, col + ring
+
+    def _distance_to_block_edge(self, point: Location, row: int, col: int, ring: int) -> float:
+        size = self.cell_degrees
+        south, north = (row - ring) * size, (row + ring + 1) * size
+        west, east = (col - ring) * size, (col + ring + 1) * size
+        latitude_gap = math.radians(min(point[0] - south, north - point[0]))
+        longitude_gap = math.radians(min(point[1] - west, east - point[1]))
+        # Closest point of a meridian longitude_gap away is asin(cos(lat) * sin(gap)) along a great circle
+        meridian = math.asin(min(1.0, math.cos(math.radians(point[0])) * math.sin(min(longitude_gap, math.pi / 2))))
+        return EARTH_RADIUS_KM * min(latitude_gap, meridian)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {'producers': len(self._where), 'cells': len(self._cells), 'cell_degrees': self.cell_degrees}
+
+
+producer_grid = ProducerGrid()
+
+_grid_state = {'signature': None, 'checked_at': 0.0, 'rebuilds': 0}
+_grid_lock = threading.Lock()
+
+
+def _producers_signature():
+    """Count and latest update of producers with a location"""
+    from app import db
+    from app.models.user import User
+
+    return tuple(db.session.query(db.func.count(User.id), db.func.max(User.updated_at)).filter(
+        User.role == 'producer', User.latitude.isnot(None), User.longitude.isnot(None)
+    ).one())
+
+
+def rebuild_producer_grid():
+    """Rebuild the producer grid from the users table"""
+    from app import db
+    from app.models.user import User
+
+    with _grid_lock:
+        signature = _producers_signature()
+        rows = db.session.query(User.id, User.latitude, User.longitude).filter(
+            User.role == 'producer', User.latitude.isnot(None), User.longitude.isnot(None)
+        ).yield_per(1000)
+
+        cell_degrees = current_app.config.get('GEO_GRID_CELL_DEGREES', 0.5)
+        if producer_grid.cell_degrees != cell_degrees:
+            producer_grid.cell_degrees = cell_degrees
+        producer_grid.clear()
+        for producer_id, latitude, longitude in rows:
+            point = location(latitude, longitude)
+            if point is not None:
+                producer_grid.add(producer_id, point)
+
+        _grid_state['signature'] = signature
+        _grid_state['checked_at'] = time.monotonic()
+        _grid_state['rebuilds'] += 1
+
+
+def get_producer_grid() -> ProducerGrid:
+    """Return the producer grid, building or refreshing it when needed"""
+    refresh_seconds = current_app.config.get('GEO_INDEX_REFRESH_SECONDS', 60)
+
+    if _grid_state['signature'] is None:
+        rebuild_producer_grid()
+    elif time.monotonic() - _grid_state['checked_at'] >= refresh_seconds:
+        _grid_state['checked_at'] = time.monotonic()
+        if _producers_signature() != _grid_state['signature']:
+            rebuild_producer_grid()
+
+    return producer_grid
+
+
+def nearest_producers(point: Location, k: int = 10, radius_km: Optional[float] = None) -> List[Tuple[Any, float]]:
+    """The k producers closest to a point, with their distance in km"""
+    return get_producer_grid().nearest(point, k=k, radius_km=radius_km)
+
+
+def grid_stats() -> Dict[str, Any]:
+    return {**producer_grid.stats(), 'built': _grid_state['signature'] is not None, 'rebuilds': _grid_state['rebuilds']}
+
+
+@event.listens_for(Session, 'after_flush')
+def _collect_producer_moves(session, flush_context):
+    from app.models.user import User
+
+    moves = session.info.setdefault('geo_producer_moves', {})
+    for instance in chain(session.new, session.dirty):
+        if isinstance(instance, User):
+            point = location(instance.latitude, instance.longitude) if instance.role == 'producer' else None
+            moves[instance.id] = point
+    for instance in session.deleted:
+        if isinstance(instance, User):
+            moves[instance.id] = None
+
+
+@event.listens_for(Session, 'after_commit')
+def _apply_producer_moves(session):
+    moves = session.info.pop('geo_producer_moves', None)
+    if not moves or _grid_state['signature'] is None:
+        return  # Not built yet; the first query will load it
+    for producer_id, point in moves.items():
+        if point is None:
+            producer_grid.remove(producer_id)
+        else:
+            producer_grid.add(producer_id, point)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_producer_moves(session):
+    session.info.pop('geo_producer_moves', None)
+
+
+def compute_geo_tiles() -> GeoTiles:
+    """Tiles recomputed from the raw tables, one grouped query per source"""
+    from app import db
+    from app.models.favorite import Favorite
+    from app.models.order import Order
+    from app.models.product import Product
+    from app.models.product_view import ProductView
+    from app.models.user import User
+
+    tiles = GeoTiles(tile_zooms())
+    located = db.session.query(User.id, User.latitude, User.longitude, User.role).filter(
+        User.latitude.isnot(None), User.longitude.isnot(None)
+    )
+    locations = {}
+    for user_id, latitude, longitude, role in located:
+        point = location(latitude, longitude)
+        if point is not None:
+            locations[user_id] = point
+            if role == 'producer':
+                tiles.add('producers', point)
+
+    sources = [
+        ('products', db.session.query(Product.producer_id, db.func.count(Product.id)).group_by(Product.producer_id)),
+        ('views', db.session.query(ProductView.user_id, db.func.count(ProductView.id)).filter(
+            ProductView.user_id.isnot(None)
+        ).group_by(ProductView.user_id)),
+        ('favorites', db.session.query(Favorite.user_id, db.func.count(Favorite.id)).group_by(Favorite.user_id)),
+        ('orders', db.session.query(Order.consumer_id, db.func.count(Order.id)).filter(
+            Order.status.notin_(EXCLUDED_ORDER_STATUSES)
+        ).group_by(Order.consumer_id))
+    ]
+    for metric, query in sources:
+        for user_id, count in query:
+            tiles.add(metric, locations.get(user_id), count)
+    return tiles
+
+
+def backfill_geo_tiles() -> int:
+    """Replace geo_tiles with tiles recomputed from the raw tables"""
+    from app import db
+    from app.models.geo_tile import GeoTile
+
+    tiles = compute_geo_tiles()
+    connection = db.session.connection()
+    connection.execute(GeoTile.__table__.delete())
+    write_tiles(connection, tiles)
+    db.session.commit()
+    return len(tiles.rows())
+
+
+@click.command('backfill-geo-tiles')
+@with_appcontext
+def backfill_geo_tiles_command():
+    """Rebuild the heatmap tiles from the raw tables"""
+    tiles = backfill_geo_tiles()
+    click.echo(f'Backfilled {tiles} geo tile(s)')
@@ -0,0 +1,218 @@
+"""
+LLM-generated insights behind a content-addressed cache
+
+Every completion request is reduced to a canonical JSON document (model,
+messages and generation parameters, keys sorted) whose SHA-256 is the key of
+the llm_insights table, so a prompt that was answered before - by any worker,
+at any time - is served from the table and never sent to the provider again.
+Answers are also kept in a per-process LRU (INSIGHT_CACHE_ENTRIES) in front
+of the table.
+
+To stop concurrent requests for the same new prompt from each calling the
+provider, the first one claims the key by inserting a 'pending' row; the
+others wait up to INSIGHT_WAIT_SECONDS for it to become 'ready'. A claim
+older than INSIGHT_PENDING_TIMEOUT seconds (its worker died) may be taken
+over, and a failed generation releases its claim.
+
+The provider is chosen with INSIGHT_PROVIDER: 'openai' (the default when
+OPENAI_API_KEY is set, model INSIGHT_MODEL) or 'none'.
+"""
+
+import hashlib
+import json
+import logging
+import time
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+from flask import current_app
+
+from app.services.cache import LRUCache
+from app.utils.upsert import dialect_insert
+
+logger = logging.getLogger(__name__)
+
+
+class InsightUnavailable(Exception):
+    """No provider is configured, it failed, or another worker is still generating the answer"""
+
+
+class InsightProvider:
+    """Produces the text of a chat completion"""
+
+    def complete(self, model: str, messages: List[Dict[str, str]], **params) -> str:
+        raise NotImplementedError
+
+
+class OpenAIProvider(InsightProvider):
+    def __init__(self, api_key: str, timeout: float = 30.0):
+        try:
+            from openai import OpenAI
+        except ImportError:
+            raise RuntimeError('INSIGHT_PROVIDER=openai requires the openai package')
+        self.client = OpenAI(api_key=api_key, timeout=timeout)
+
+    def complete(self, model: str, messages: List[Dict[str, str]], **params) -> str:
+        response = self.client.chat.completions.create(model=model, messages=messages, **params)
+        return response.choices[0].message.content or ''
+
+
+def content_hash(model: str, messages: List[Dict[str, str]], params: Dict[str, Any]) -> str:
+    """SHA-256 of the canonical form of a completion request"""
+    canonical = json.dumps({'model': model, 'messages': messages, 'params': params},
+                           sort_keys=True, separators=(',', ':'), ensure_ascii=False)
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+
+class InsightService:
+    def __init__(self, provider: Optional[InsightProvider], model: str, cache_entries: int = 1024,
+                 wait_seconds: float = 20.0, pending_timeout: float = 120.0, poll_interval: float = 0.25):
+        self.provider = provider
+        self.model = model
+        self.wait_seconds = wait_seconds
+        self.pending_timeout = pending_timeout
+        self.poll_interval = poll_interval
+        self._memory = LRUCache(max_entries=cache_entries, default_ttl=24 * 3600)
+        self.stats = {'memory_hits': 0, 'database_hits': 0, 'generated': 0, 'waited': 0, 'failures': 0}
+
+    @property
+    def enabled(self) -> bool:
+        return self.provider is not None
+
+    def _lookup(self, key: str):
+        from app import db
+        from app.models.llm_insight import LLMInsight
+        from app.services.db_routing import primary_reads
+
+        # Claims and answers are written moments apart; a replica may lag behind both
+        with primary_reads():
+            return db.session.execute(
+                db.select(LLMInsight.status, LLMInsight.response, LLMInsight.created_at)
+                .where(LLMInsight.content_hash == key)
+            ).first()
+
+    def _claim(self, key: str, stale_before: datetime) -> bool:
+        """Insert a pending row for the key (or take over a stale one); False when someone else holds it"""
+        from sqlalchemy.exc import IntegrityError
+        from app import db
+        from app.models.llm_insight import LLMInsight
+
+        table = LLMInsight.__table__
+        connection = db.session.connection()
+        row = {'content_hash': key, 'model': self.model, 'status': 'pending', 'created_at': datetime.utcnow()}
+        insert = dialect_insert(connection)
+        try:
+            if insert is not None:
+                result = connection.execute(insert(table).values(**row).on_conflict_do_nothing(index_elements=['content_hash']))
+            else:
+                result = connection.execute(table.insert().values(**row))
+            claimed = result.rowcount == 1
+            if not claimed:
+                result = connection.execute(table.update().where(
+                    table.c.content_hash == key, table.c.status == 'pending', table.c.created_at < stale_before
+                ).values(created_at=row['created_at']))
+                claimed = result.rowcount == 1
+            db.session.commit()
+        except IntegrityError:
+            db.session.rollback()
+            return False
+        return claimed
+
+    def _complete(self, key: str, text: Optional[str]):
+        """Store the answer, or release the claim when there is none"""
+        from app import db
+        from app.models.llm_insight import LLMInsight
+
+        table = LLMInsight.__table__
+        if text is None:
+            db.session.execute(table.delete().where(table.c.content_hash == key, table.c.status == 'pending'))
+        else:
+            db.session.execute(table.update().where(table.c.content_hash == key).values(
+                status='ready', response=text, completed_at=datetime.utcnow()
+            ))
+        db.session.commit()
+
+    def generate(self, messages: List[Dict[str, str]], **params) -> Tuple[str, bool]:
+        """(answer, served from cache) for a chat completion request"""
+        key = content_hash(self.model, messages, params)
+        cached = self._memory.get(key)
+        if cached is not None:
+            self.stats['memory_hits'] += 1
+            return cached, True
+
+        deadline = time.monotonic() + self.wait_seconds
+        while True:
+            row = self._lookup(key)
+            if row is not None and row.status == 'ready':
+                self.stats['database_hits'] += 1
+                self._memory.set(key, row.response)
+                return row.response, True
+            if not self.enabled:
+                raise InsightUnavailable('No insight provider is configured')
+            if self._claim(key, datetime.utcnow() - timedelta(seconds=self.pending_timeout)):
+                break
+            if time.monotonic() >= deadline:
+                raise InsightUnavailable('The insight is still being generated')
+            self.stats['waited'] += 1
+            time.sleep(self.poll_interval)
+
+        try:
+            text = self.provider.complete(self.model, messages, **params)
+        except Exception:
+            self.stats['failures'] += 1
+            logger.exception('Insight provider failed')
+            self._complete(key, None)
+            raise InsightUnavailable('The insight provider failed')
+
+        self._complete(key, text)
+        self._memory.set(key, text)
+        self.stats['generated'] += 1
+        return text, False
+
+
+def create_insight_service(config) -> InsightService:
+    """Build the insight service described by INSIGHT_* configuration"""
+    provider_name = config.get('INSIGHT_PROVIDER') or ('openai' if config.get('OPENAI_API_KEY') else 'none')
+    if provider_name == 'openai':
+        provider = OpenAIProvider(config['OPENAI_API_KEY'], timeout=config.get('INSIGHT_TIMEOUT', 30.0))
+    elif provider_name == 'none':
+        provider = None
+    else:
+        raise ValueError(f'Unknown INSIGHT_PROVIDER: {provider_name}')
+    return InsightService(
+        provider,
+        model=config.get('INSIGHT_MODEL', 'gpt-4o-mini'),
+        cache_entries=config.get('INSIGHT_CACHE_ENTRIES', 1024),
+        wait_seconds=config.get('INSIGHT_WAIT_SECONDS', 20.0),
+        pending_timeout=config.get('INSIGHT_PENDING_TIMEOUT', 120.0)
+    )
+
+
+def get_insight_service() -> InsightService:
+    return current_app.extensions['insight_service']
+
+
+def product_insight_messages(product, predictions) -> List[Dict[str, str]]:
+    """Prompt asking for advice on a product from its data and latest predictions
+
+    Only stable fields go into the prompt, so it - and its cache key - only
+    change when the product or its predictions do.
+    """
+    facts = {
+        'name': product.name,
+        'category': product.category,
+        'price': float(product.price),
+        'currency': product.currency,
+        'unit': product.unit,
+        'stock_quantity': product.stock_quantity,
+        'is_organic': product.is_organic,
+        'rating_average': float(product.rating_average or 0),
+        'rating_count': product.rating_count or 0,
+        'predictions': {prediction.prediction_type: prediction.prediction_data for prediction in predictions}
+    }
+    return [
+        {'role': 'system', 'content': 'You advise small regional producers selling on an online marketplace. '
+                                      'Answer in at most five short bullet points.'},
+        {'role': 'user', 'content': 'Suggest how to improve the sales of this product:\n'
+                                    + json.dumps(facts, sort_keys=True, ensure_ascii=False)}
+    ]
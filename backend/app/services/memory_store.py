@@ -0,0 +1,247 @@
+"""
+In-memory repository used by the development server (simple_app.py)
+
+Rows are plain dicts keyed by an auto-incremented integer id. Each table keeps
+secondary indexes so lookups by foreign key or unique field are O(1) instead
+of scanning every row.
+"""
+
+import threading
+from bisect import bisect_left, bisect_right, insort
+from itertools import islice
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional
+
+
+class IndexedTable:
+    """Dict-backed table with secondary and unique indexes"""
+
+    def __init__(self, indexes: Optional[Dict[str, Callable]] = None,
+                 unique_indexes: Optional[Dict[str, Callable]] = None,
+                 sorted_indexes: Optional[Dict[str, Callable]] = None):
+        self._rows: Dict[int, dict] = {}
+        self._next_id = 1
+        self._lock = threading.RLock()
+        # index name -> (key function, key -> {row id: row})
+        self._indexes = {name: (key_func, {}) for name, key_func in (indexes or {}).items()}
+        # index name -> (key function, key -> row)
+        self._unique = {name: (key_func, {}) for name, key_func in (unique_indexes or {}).items()}
+        # index name -> (key function, sorted list of (key, row id))
+        self._sorted = {name: (key_func, []) for name, key_func in (sorted_indexes or {}).items()}
+
+    def __len__(self):
+        return len(self._rows)
+
+    def __iter__(self) -> Iterator[dict]:
+        return iter(list(self._rows.values()))
+
+    def __contains__(self, row_id):
+        return row_id in self._rows
+
+    def next_id(self) -> int:
+        """Reserve the next primary key"""
+        with self._lock:
+            row_id = self._next_id
+            self._next_id += 1
+            return row_id
+
+    def insert(self, row: dict) -> dict:
+        """Insert a row, assigning an id if it has none"""
+        with self._lock:
+            if row.get('id') is None:
+                row['id'] = self.next_id()
+            else:
+                self._next_id = max(self._next_id, row['id'] + 1)
+
+            for name, (key_func, entries) in self._unique.items():
+                key = key_func(row)
+                if key is not None and key in entries:
+                    raise ValueError(f'Duplicate value for unique index {name}: {key}')
+
+            self._rows[row['id']] = row
+            self._index_row(row)
+            return row
+
+    def insert_many(self, rows: Iterable[dict]) -> None:
+        """Insert several rows"""
+        for row in rows:
+            self.insert(row)
+
+    def get(self, row_id) -> Optional[dict]:
+        """Get a row by primary key"""
+        return self._rows.get(row_id)
+
+    def get_by(self, index_name: str, key: Any) -> Optional[dict]:
+        """Get a row through a unique index"""
+        return self._unique[index_name][1].get(key)
+
+    def filter_by(self, index_name: str, key: Any) -> List[dict]:
+        """Get all rows matching a secondary index key, in insertion order"""
+        return list(self._indexes[index_name][1].get(key, {}).values())
+
+    def count_by(self, index_name: str, key: Any) -> int:
+        """Count rows matching a secondary index key"""
+        return len(self._indexes[index_name][1].get(key, ()))
+
+    def index_keys(self, index_name: str) -> List[Any]:
+        """Get the distinct keys currently present in a secondary index"""
+        return list(self._indexes[index_name][1].keys())
+
+    def index_counts(self, index_name: str) -> Dict[Any, int]:
+        """Get the number of rows per key of a secondary index"""
+        return {key: len(rows) for key, rows in self._indexes[index_name][1].items()}
+
+    def slice(self, start: int, stop: int) -> List[dict]:
+        """Get rows by position without copying the whole table"""
+        return list(islice(self._rows.values(), start, stop))
+
+    def sort_key(self, index_name: str, row: dict) -> tuple:
+        """Position of a row in a sorted index"""
+        return (self._sorted[index_name][0](row), row['id'])
+
+    def iter_sorted(self, index_name: str, after: Optional[tuple] = None,
+                    descending: bool = False, chunk_size: int = 256) -> Iterator[dict]:
+        """Iterate rows in sorted index order, starting just past the 'after' position"""
+        keys = self._sorted[index_name][1]
+        while True:
+            # Copy one chunk at a time so concurrent writes never invalidate the walk
+            with self._lock:
+                if descending:
+                    stop = bisect_left(keys, after) if after is not None else len(keys)
+                    chunk = keys[max(stop - chunk_size, 0):stop][::-1]
+                else:
+                    start = bisect_right(keys, after) if after is not None else 0
+                    chunk = keys[start:start + chunk_size]
+            if not chunk:
+                return
+
+            for key in chunk:
+                row = self._rows.get(key[1])
+                if row is not None:
+                    yield row
+            after = chunk[-1]
+
+    def update(self, row_id, changes: Dict[str, Any]) -> Optional[dict]:
+        """Update a row in place and refresh the indexes it belongs to"""
+        with self._lock:
+            row = self._rows.get(row_id)
+            if row is None:
+                return None
+
+            self._unindex_row(row)
+            row.update(changes)
+            self._index_row(row)
+            return row
+
+    def delete(self, row_id) -> Optional[dict]:
+        """Delete a row by primary key"""
+        with self._lock:
+            row = self._rows.pop(row_id, None)
+            if row is not None:
+                self._unindex_row(row)
+            return row
+
+    def _index_row(self, row):
+        for key_func, entries in self._indexes.values():
+            for key in _index_keys(key_func(row)):
+                entries.setdefault(key, {})[row['id']] = row
+
+        for key_func, keys in self._sorted.values():
+            insort(keys, (key_func(row), row['id']))
+
+        for key_func, entries in self._unique.values():
+            key = key_func(row)
+            if key is not None:
+                entries[key] = row
+
+    def _unindex_row(self, row):
+        for key_func, entries in self._indexes.values():
+            for key in _index_keys(key_func(row)):
+                bucket = entries.get(key)
+                if bucket is None:
+                    continue
+                bucket.pop(row['id'], None)
+                if not bucket:
+                    del entries[key]
+
+        for key_func, keys in self._sorted.values():
+            key = (key_func(row), row['id'])
+            position = bisect_left(keys, key)
+            if position < len(keys) and keys[position] == key:
+                del keys[position]
+
+        for key_func, entries in self._unique.values():
+            key = key_func(row)
+            if key is not None and entries.get(key) is row:
+                del entries[key]
+
+
+def _index_keys(value):
+    """Normalize an index key function result to a list of keys"""
+    if value is None:
+        return []
+    if isinstance(value, (list, set, frozenset)):
+        return [key for key in value if key is not None]
+    return [value]
+
+
+class MemoryStore:
+    """Repository holding every in-memory table of the development server"""
+
+    def __init__(self):
+        self.users = IndexedTable(
+            indexes={
+                'role': lambda u: u.get('role'),
+                'region': lambda u: u.get('region'),
+            },
+            unique_indexes={
+                'email': lambda u: u.get('email'),
+            }
+        )
+        self.products = IndexedTable(
+            indexes={
+                'producer_id': lambda p: p.get('producer_id'),
+                'category': lambda p: p.get('category'),
+            },
+            sorted_indexes={
+                'created_at': lambda p: p.get('created_at') or '',
+                'price': lambda p: float(p.get('price') or 0),
+                'rating_average': lambda p: float(p.get('rating_average') or 0),
+            }
+        )
+        self.reviews = IndexedTable(
+            indexes={
+                'product_id': lambda r: r.get('product_id'),
+                'user_id': lambda r: r.get('user_id'),
+            }
+        )
+        self.favorites = IndexedTable(
+            indexes={
+                'product_id': lambda f: f.get('product_id'),
+                'user_id': lambda f: f.get('user_id'),
+            },
+            unique_indexes={
+                'user_product': lambda f: (f.get('user_id'), f.get('product_id')),
+            }
+        )
+        self.search_history = IndexedTable(
+            indexes={
+                'user_id': lambda s: s.get('user_id'),
+            },
+            unique_indexes={
+                'user_query': lambda s: (s.get('user_id'), s['normalized_query']) if s.get('normalized_query') else None,
+            }
+        )
+        self.search_query_stats = IndexedTable(
+            unique_indexes={
+                'normalized_query': lambda s: s.get('normalized_query'),
+            },
+            sorted_indexes={
+                'search_count': lambda s: s.get('search_count', 0),
+            }
+        )
+        self.product_views = IndexedTable(
+            indexes={
+                'product_id': lambda v: v.get('product_id'),
+                'user_id': lambda v: v.get('user_id'),
+            }
+        )
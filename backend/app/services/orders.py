@@ -0,0 +1,198 @@
+"""
+Order placement with atomic stock reservation
+
+place_orders() turns a cart into one order per producer inside a single
+transaction:
+1. the cart's product rows are read and locked (SELECT ... FOR UPDATE, in id
+   order so concurrent carts sharing products cannot deadlock) and checked
+   against availability, stock and min/max order quantities
+2. stock is reserved for every line with one conditional UPDATE
+   (stock_quantity = stock_quantity - CASE id ...) guarded by
+   WHERE stock_quantity >= CASE id ...; fewer rows updated than lines means
+   another transaction took the stock, and the whole cart is rolled back
+3. the orders and their items are inserted through the ORM and everything
+   commits together; the stats, analytics and geo flush events only stage
+   their deltas, which the counter buffer writes after the commit, so no
+   rollup row is locked while the stock locks are held
+
+The guard in step 2 is what makes overselling impossible even where row locks
+are not available (SQLite); the locks in step 1 only make the error precise.
+Cancelling an order flips its status with a conditional UPDATE (WHERE status
+IN the cancellable statuses) and restocks only when that UPDATE changed the
+row, so an order is restocked at most once, SQLite included; its quantities
+go back to stock with one UPDATE.
+"""
+
+from collections import defaultdict
+from decimal import Decimal
+from typing import Any, Dict, Iterable, List, Optional
+
+from flask import current_app
+
+from app import db
+from app.models.order import Order, OrderItem
+from app.models.product import Product
+from app.services.etags import touch
+
+CANCELLABLE_STATUSES = {'pending', 'confirmed'}
+
+
+class OrderError(ValueError):
+    """A cart that cannot be ordered; 'details' lists the offending lines"""
+
+    def __init__(self, message: str, status: int = 400, details: Optional[List[Dict[str, Any]]] = None):
+        super().__init__(message)
+        self.status = status
+        self.details = details or []
+
+
+def parse_cart(items) -> Dict[str, int]:
+    """Quantity per product id of a request's items (repeated products are added up)"""
+    if not isinstance(items, list) or not items:
+        raise OrderError('items must be a non-empty list')
+    cart: Dict[str, int] = defaultdict(int)
+    for item in items:
+        product_id = item.get('product_id') if isinstance(item, dict) else None
+        quantity = item.get('quantity') if isinstance(item, dict) else None
+        if not isinstance(product_id, str) or not product_id:
+            raise OrderError('Each item needs a product_id')
+        if isinstance(quantity, bool) or not isinstance(quantity, int) or quantity < 1:
+            raise OrderError('Each item needs a positive integer quantity')
+        cart[product_id] += quantity
+    max_items = current_app.config.get('ORDER_MAX_ITEMS', 50)
+    if len(cart) > max_items:
+        raise OrderError(f'A cart can hold at most {max_items} different products')
+    return dict(cart)
+
+
+def _lock_products(product_ids: Iterable[str]) -> Dict[str, Any]:
+    """Rows of the cart's products, locked until the transaction ends"""
+    rows = db.session.execute(
+        db.select(Product.id, Product.producer_id, Product.price, Product.currency, Product.stock_quantity,
+                  Product.min_order_quantity, Product.max_order_quantity, Product.is_available)
+        .where(Product.id.in_(sorted(product_ids)))
+        .order_by(Product.id)
+        .with_for_update()
+    ).all()
+    return {row.id: row for row in rows}
+
+
+def _check_cart(cart: Dict[str, int], products: Dict[str, Any], consumer_id: str):
+    missing = [{'product_id': product_id, 'error': 'Product not found'} for product_id in cart if product_id not in products]
+    if missing:
+        raise OrderError('Some products do not exist', 404, missing)
+
+    problems = []
+    for product_id, quantity in cart.items():
+        product = products[product_id]
+        if product.producer_id == consumer_id:
+            problems.append({'product_id': product_id, 'error': 'You cannot order your own product'})
+        elif not product.is_available:
+            problems.append({'product_id': product_id, 'error': 'Product is not available'})
+        elif quantity < (product.min_order_quantity or 1):
+            problems.append({'product_id': product_id, 'error': f'Minimum order quantity is {product.min_order_quantity}'})
+        elif product.max_order_quantity and quantity > product.max_order_quantity:
+            problems.append({'product_id': product_id, 'error': f'Maximum order quantity is {product.max_order_quantity}'})
+    if problems:
+        raise OrderError('Some items cannot be ordered', 400, problems)
+
+    short = [
+        {'product_id': product_id, 'requested': quantity, 'available': products[product_id].stock_quantity}
+        for product_id, quantity in cart.items() if quantity > products[product_id].stock_quantity
+    ]
+    if short:
+        raise OrderError('Insufficient stock', 409, short)
+
+
+def _adjust_stock(quantities: Dict[str, int], sign: int) -> int:
+    """Add sign * quantity to each product's stock in one statement; returns the rows changed
+
+    Removals only apply to rows that still have enough stock.
+    """
+    table = Product.__table__
+    change = db.case(quantities, value=table.c.id)
+    statement = table.update().where(table.c.id.in_(list(quantities)))
+    if sign < 0:
+        statement = statement.where(table.c.stock_quantity >= change)
+    result = db.session.execute(statement.values(stock_quantity=table.c.stock_quantity + sign * change))
+    _touch_products(quantities)
+    return result.rowcount
+
+
+def _touch_products(product_ids: Iterable[str]):
+    """Expire the detail and list caches and ETags of products whose stock changed through Core"""
+    touch(db.session, {'products'} | {f'product:{product_id}' for product_id in product_ids})
+
+
+def place_orders(consumer_id: str, items, shipping_address: str, notes: Optional[str] = None) -> List[Order]:
+    """Reserve stock for a cart and create one order per producer, all or nothing"""
+    cart = parse_cart(items)
+    try:
+        products = _lock_products(cart)
+        _check_cart(cart, products, consumer_id)
+
+        if _adjust_stock(cart, -1) != len(cart):
+            # Only reachable without row locks: another cart took the stock since it was read
+            raise OrderError('Insufficient stock', 409, [
+                {'product_id': product_id, 'requested': quantity} for product_id, quantity in cart.items()
+            ])
+
+        by_producer: Dict[str, List[str]] = defaultdict(list)
+        for product_id in sorted(cart):
+            by_producer[products[product_id].producer_id].append(product_id)
+
+        orders = []
+        for producer_id, product_ids in by_producer.items():
+            order = Order(
+                consumer_id=consumer_id,
+                producer_id=producer_id,
+                total_amount=sum((products[product_id].price * cart[product_id] for product_id in product_ids), Decimal('0')),
+                currency=products[product_ids[0]].currency,
+                status='pending',
+                shipping_address=shipping_address,
+                notes=notes
+            )
+            db.session.add(order)
+            for product_id in product_ids:
+                db.session.add(OrderItem(
+                    order=order,
+                    product_id=product_id,
+                    quantity=cart[product_id],
+                    unit_price=products[product_id].price,
+                    total_price=products[product_id].price * cart[product_id]
+                ))
+            orders.append(order)
+
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    return orders
+
+
+def cancel_order(order: Order, allowed_statuses: Iterable[str] = CANCELLABLE_STATUSES):
+    """Cancel an order and return its quantities to stock"""
+    try:
+        # Flip the status only if it is still cancellable; of two concurrent cancellations
+        # exactly one updates the row, with or without row locks, and only that one restocks
+        table = Order.__table__
+        claimed = db.session.execute(
+            table.update()
+            .where(table.c.id == order.id, table.c.status.in_(sorted(allowed_statuses)))
+            .values(status='cancelled')
+        ).rowcount
+        if claimed != 1:
+            raise OrderError(f'Only {" or ".join(sorted(allowed_statuses))} orders can be cancelled', 409)
+        quantities: Dict[str, int] = defaultdict(int)
+        for product_id, quantity in db.session.execute(
+            db.select(OrderItem.product_id, OrderItem.quantity).where(OrderItem.order_id == order.id)
+        ):
+            quantities[product_id] += quantity
+        if quantities:
+            _adjust_stock(dict(quantities), 1)
+        # Also through the ORM, so the stats, analytics and geo flush events see the change
+        order.update_status('cancelled')
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
@@ -0,0 +1,156 @@
+"""
+Password hashing policy
+
+The algorithm and cost come from PASSWORD_HASH_METHOD (a werkzeug method
+string such as 'scrypt:32768:8:1' or 'pbkdf2:sha256:600000') instead of the
+library default, so the CPU cost of a login is a deliberate setting. Hashing
+and verification run on a bounded thread pool (hashlib releases the GIL while
+it works): at most PASSWORD_HASH_WORKERS hashes run at once and at most
+PASSWORD_HASH_MAX_PENDING more may wait, so a login burst is shed with
+PasswordHasherBusy rather than piling up on every worker thread.
+
+Stored hashes record their method, so needs_rehash() tells whether a hash was
+made under an older policy; the login endpoint then re-hashes the password it
+has just verified. benchmark() (flask benchmark-password-hash) measures
+hashes per second for a method, on one core and on all of them.
+"""
+
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+from typing import Any, Dict, Optional
+
+import click
+from flask import current_app, has_app_context
+from flask.cli import with_appcontext
+from werkzeug.security import check_password_hash, generate_password_hash
+
+DEFAULT_METHOD = 'scrypt:32768:8:1'
+
+
+class PasswordHasherBusy(Exception):
+    """Raised when the hashing pool and its queue are full, or a hash timed out"""
+
+
+def hash_method(password_hash: str) -> str:
+    """Method string (algorithm and cost) a stored hash was made with"""
+    return password_hash.split('$', 1)[0] if password_hash else ''
+
+
+class PasswordHasher:
+    """Hashes and verifies passwords under one policy on a bounded pool"""
+
+    def __init__(self, method: str = DEFAULT_METHOD, salt_length: int = 16, workers: Optional[int] = None,
+                 max_pending: int = 64, timeout: float = 10.0):
+        self.method = method
+        self.salt_length = salt_length
+        self.workers = workers or os.cpu_count() or 1
+        self.timeout = timeout
+        # Werkzeug fills in default costs ('pbkdf2:sha256' becomes 'pbkdf2:sha256:1000000')
+        self.canonical_method = hash_method(generate_password_hash('', method, salt_length))
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='password-hash')
+        self._slots = threading.BoundedSemaphore(self.workers + max_pending)
+        self._lock = threading.Lock()
+        self._stats = {'hashed': 0, 'verified': 0, 'rejected': 0, 'timed_out': 0, 'busy_seconds': 0.0}
+
+    def hash(self, password: str) -> str:
+        """Hash a password under the current policy"""
+        return self._run('hashed', generate_password_hash, password, self.method, self.salt_length)
+
+    def verify(self, password_hash: str, password: str) -> bool:
+        """Check a password against a stored hash of any supported method"""
+        if not password_hash:
+            return False
+        return self._run('verified', check_password_hash, password_hash, password)
+
+    def needs_rehash(self, password_hash: str) -> bool:
+        """Whether a stored hash was made with another algorithm or cost than the policy"""
+        return hash_method(password_hash) != self.canonical_method
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {**self._stats, 'method': self.canonical_method, 'workers': self.workers}
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False)
+
+    def _run(self, counter: str, function, *args):
+        if not self._slots.acquire(blocking=False):
+            self._count('rejected')
+            raise PasswordHasherBusy('Password hashing capacity exceeded')
+        started = time.perf_counter()
+        try:
+            future = self._executor.submit(function, *args)
+        except RuntimeError:
+            self._slots.release()
+            raise
+        # The slot is held until the hash finishes, even if this caller stops waiting
+        future.add_done_callback(lambda _: self._slots.release())
+        try:
+            result = future.result(timeout=self.timeout)
+        except FutureTimeout:
+            self._count('timed_out')
+            raise PasswordHasherBusy('Password hashing timed out')
+        with self._lock:
+            self._stats[counter] += 1
+            self._stats['busy_seconds'] += time.perf_counter() - started
+        return result
+
+    def _count(self, name: str):
+        with self._lock:
+            self._stats[name] += 1
+
+
+def create_password_hasher(config) -> PasswordHasher:
+    """Build the password hasher described by PASSWORD_HASH_* configuration"""
+    return PasswordHasher(
+        method=config.get('PASSWORD_HASH_METHOD', DEFAULT_METHOD),
+        salt_length=config.get('PASSWORD_SALT_LENGTH', 16),
+        workers=config.get('PASSWORD_HASH_WORKERS'),
+        max_pending=config.get('PASSWORD_HASH_MAX_PENDING', 64),
+        timeout=config.get('PASSWORD_HASH_TIMEOUT', 10.0)
+    )
+
+
+_fallback = {}
+
+
+def get_password_hasher() -> PasswordHasher:
+    """Password hasher of the current app (a default-policy one outside an app)"""
+    if has_app_context() and 'password_hasher' in current_app.extensions:
+        return current_app.extensions['password_hasher']
+    if 'hasher' not in _fallback:
+        _fallback['hasher'] = PasswordHasher(workers=1)
+    return _fallback['hasher']
+
+
+def benchmark(method: str, seconds: float = 2.0, workers: int = 1, salt_length: int = 16) -> float:
+    """Hashes per second achieved by 'workers' threads hashing for about 'seconds'"""
+    deadline = time.perf_counter() + seconds
+    counts = [0] * workers
+
+    def work(index):
+        while time.perf_counter() < deadline:
+            generate_password_hash('benchmark-password', method, salt_length)
+            counts[index] += 1
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        list(executor.map(work, range(workers)))
+    return sum(counts) / (time.perf_counter() - started)
+
+
+@click.command('benchmark-password-hash')
+@click.option('--method', default=None, help='Werkzeug method string (default: PASSWORD_HASH_METHOD)')
+@click.option('--seconds', default=2.0, show_default=True, help='Duration of each run')
+@with_appcontext
+def benchmark_password_hash_command(method, seconds):
+    """Report password hashes per second, per core and across all cores"""
+    method = method or current_app.config.get('PASSWORD_HASH_METHOD', DEFAULT_METHOD)
+    cores = os.cpu_count() or 1
+    single = benchmark(method, seconds, workers=1)
+    parallel = benchmark(method, seconds, workers=cores)
+    click.echo(f'Method: {hash_method(generate_password_hash("", method))}')
+    click.echo(f'1 core: {single:.1f} hashes/s ({1000 / single:.1f} ms per hash)')
+    click.echo(f'{cores} core(s): {parallel:.1f} hashes/s ({parallel / cores:.1f} per core)')
@@ -0,0 +1,132 @@
+"""
+Admin metrics bound to the SQLAlchemy backend
+
+The counters are loaded with one grouped UNION ALL query and then kept current
+in-process: users, products, reviews, orders and favorites through session
+events applied after commit, searches through the search history sink once
+its batch is committed. Writes made by other workers or raw SQL are folded in
+by reconciling every ADMIN_METRICS_RECONCILE_SECONDS.
+"""
+
+import threading
+import time
+
+from flask import current_app
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from app import db
+from app.models.favorite import Favorite
+from app.models.order import Order
+from app.models.product import Product
+from app.models.review import Review
+from app.models.search_history import SearchQueryStat
+from app.models.user import User
+from app.services.admin_metrics import (
+    TOTAL, AdminMetrics, changes_for, moved, order_keys, product_keys, review_keys, user_keys
+)
+
+admin_metrics = AdminMetrics()
+
+_state = {'loaded_at': None}
+_reconcile_lock = threading.Lock()
+
+
+def _grouped(dimension, key, model, count=None):
+    """SELECT dimension, key, COUNT(*) FROM model GROUP BY key"""
+    key = key.label('key')
+    return db.select(
+        db.literal_column(f"'{dimension}'", db.String).label('dimension'),
+        key,
+        (count if count is not None else db.func.count()).label('count')
+    ).select_from(model).group_by(key)
+
+
+def count_query():
+    """Every counter in one grouped UNION ALL statement"""
+    available = db.case((Product.is_available == db.true(), 'available'), else_='unavailable')
+    flagged = db.case((Review.is_flagged == db.true(), 'flagged'), else_='unflagged')
+    total = db.literal_column(f"'{TOTAL}'", db.String)
+    return db.union_all(
+        _grouped('users_by_role', db.func.coalesce(User.role, 'consumer'), User),
+        _grouped('users_by_region', db.func.coalesce(User.region, 'unknown'), User),
+        _grouped('products_by_category', db.func.coalesce(Product.category, 'uncategorized'), Product),
+        _grouped('products_by_availability', available, Product),
+        _grouped('reviews_by_status', flagged, Review),
+        _grouped('orders_by_status', db.func.coalesce(Order.status, 'pending'), Order),
+        _grouped('favorites', total, Favorite),
+        _grouped('searches', total, SearchQueryStat, db.func.coalesce(db.func.sum(SearchQueryStat.search_count), 0))
+    )
+
+
+def reconcile_admin_metrics():
+    """Replace the live counters with exact counts from the database"""
+    with _reconcile_lock:
+        counts = {}
+        for dimension, key, count in db.session.execute(count_query()):
+            counts.setdefault(dimension, {})[key] = int(count)
+        admin_metrics.replace(counts)
+        _state['loaded_at'] = time.monotonic()
+
+
+def get_admin_metrics() -> AdminMetrics:
+    """Return the admin metrics, reconciling them when due"""
+    reconcile_seconds = current_app.config.get('ADMIN_METRICS_RECONCILE_SECONDS', 300)
+    if _state['loaded_at'] is None or time.monotonic() - _state['loaded_at'] >= reconcile_seconds:
+        reconcile_admin_metrics()
+    return admin_metrics
+
+
+def record_searches(entries):
+    """Count a committed batch of search history entries"""
+    if _state['loaded_at'] is not None:
+        admin_metrics.add('searches', sum(entry['search_count'] for entry in entries))
+
+
+def _previous(instance, name):
+    """Value of an attribute before the flush"""
+    history = db.inspect(instance).attrs[name].history
+    if history.deleted:
+        return history.deleted[0]
+    return getattr(instance, name)
+
+
+def _keys(instance, value=getattr):
+    if isinstance(instance, User):
+        return user_keys(value(instance, 'role'), value(instance, 'region'))
+    if isinstance(instance, Product):
+        return product_keys(value(instance, 'category'), value(instance, 'is_available'))
+    if isinstance(instance, Review):
+        return review_keys(value(instance, 'is_flagged'))
+    if isinstance(instance, Order):
+        return order_keys(value(instance, 'status'))
+    if isinstance(instance, Favorite):
+        return [('favorites', TOTAL)]
+    return []
+
+
+@event.listens_for(Session, 'after_flush')
+def _collect_admin_metric_changes(session, flush_context):
+    if _state['loaded_at'] is None:
+        return
+    changes = session.info.setdefault('admin_metric_changes', [])
+
+    for instance in session.new:
+        changes.extend(changes_for(_keys(instance), 1))
+    for instance in session.deleted:
+        changes.extend(changes_for(_keys(instance, _previous), -1))
+    for instance in session.dirty:
+        changes.extend(moved(_keys(instance, _previous), _keys(instance)))
+
+
+@event.listens_for(Session, 'after_commit')
+def _apply_admin_metric_changes(session):
+    changes = session.info.pop('admin_metric_changes', None)
+    if changes:
+        admin_metrics.apply(changes)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_admin_metric_changes(session):
+    session.info.pop('admin_metric_changes', None)
+
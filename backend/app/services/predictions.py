@@ -0,0 +1,462 @@
+"""
+Batch scoring of AI predictions
+
+score_predictions() (flask score-predictions, meant to run from a scheduler)
+computes every prediction type for all users and products in one pass:
+- features come from one grouped query per source table and are placed into
+  NumPy arrays aligned on sorted id arrays with np.searchsorted, so nothing
+  loops in Python per user or product
+- client_potential (per consumer): a scikit-learn logistic regression trained
+  on a time split (activity older than PREDICTION_HORIZON_DAYS against whether
+  the consumer ordered since) and applied to current activity, giving the
+  probability of an order within the next horizon
+- demand_trend (per product, for its producer): least-squares slope of the
+  last PREDICTION_TREND_DAYS of daily views from analytics_buckets, fitted for
+  every product with one matrix product; R² is the confidence
+- price_optimization (per product, for its producer): a ridge regression of
+  log demand on the price relative to the category median (with a quadratic
+  term), rating, organic and stock features; every product is evaluated at
+  candidate prices within PREDICTION_PRICE_RANGE of its own in one predict
+  call and the revenue-maximising one is suggested
+
+When there is too little data to train (a single class, fewer than
+PREDICTION_MIN_SAMPLES rows) a simple heuristic is used instead and recorded
+as the model with a low confidence. Each type's results are written with
+executemany inserts sharing the run's timestamp; runs beyond the latest
+PREDICTION_KEEP_RUNS are deleted and the 'ai_predictions' cache tag is
+invalidated.
+"""
+
+import time
+import uuid
+from datetime import datetime, timedelta
+from decimal import Decimal
+from typing import Any, Dict, List, Optional, Sequence
+
+import click
+import numpy as np
+from flask import current_app
+from flask.cli import with_appcontext
+
+from app import db
+from app.services.cache import invalidate
+from app.services.producer_stats import EXCLUDED_ORDER_STATUSES
+
+PREDICTION_TYPES = ('client_potential', 'demand_trend', 'price_optimization')
+
+# Demand signal weights of the price model (an order is worth more than a view)
+DEMAND_WEIGHTS = {'views': 1.0, 'favorites': 5.0, 'units': 20.0}
+
+PRICE_CANDIDATES = 9  # Prices evaluated per product, evenly spread over the allowed range
+TREND_THRESHOLD = 0.10  # Weekly change (relative to the mean) beyond which a trend is rising/falling
+INSERT_CHUNK = 1000
+
+
+def _setting(name: str, default):
+    return current_app.config.get(name, default)
+
+
+def _align(ids: np.ndarray, keys: Sequence, values: Sequence) -> np.ndarray:
+    """Values summed onto the positions of their keys in the sorted 'ids'; unknown keys are ignored"""
+    result = np.zeros(len(ids))
+    if len(ids) == 0 or len(keys) == 0:
+        return result
+    keys = np.asarray(keys, dtype=str)
+    positions = np.minimum(np.searchsorted(ids, keys), len(ids) - 1)
+    found = ids[positions] == keys
+    np.add.at(result, positions[found], np.asarray(values, dtype=float)[found])
+    return result
+
+
+def _columns(rows, width: int):
+    """Columns of a list of result rows (empty tuples when there are none)"""
+    return tuple(zip(*rows)) if rows else tuple(() for _ in range(width))
+
+
+def _confidence(values: np.ndarray) -> List[Decimal]:
+    return [Decimal(f'{value:.2f}') for value in np.clip(values, 0, 1).tolist()]
+
+
+def _rows(prediction_type: str, user_ids, product_ids, data: List[dict], confidence: np.ndarray,
+          run_at: datetime) -> List[dict]:
+    return [
+        {'id': str(uuid.uuid4()), 'user_id': user_id, 'product_id': product_id, 'prediction_type': prediction_type,
+         'prediction_data': payload, 'confidence_score': score, 'created_at': run_at}
+        for user_id, product_id, payload, score in zip(user_ids, product_ids, data, _confidence(confidence))
+    ]
+
+
+# Client potential
+
+def consumer_features(cutoff: Optional[datetime] = None) -> Dict[str, np.ndarray]:
+    """Activity counts of every consumer, before 'cutoff' when given, plus orders since it"""
+    from app.models.favorite import Favorite
+    from app.models.order import Order
+    from app.models.product_view import ProductView
+    from app.models.review import Review
+    from app.models.search_history import SearchHistory
+    from app.models.user import User
+
+    users = db.session.execute(
+        db.select(User.id, User.created_at).where(User.role == 'consumer').order_by(User.id)
+    ).all()
+    user_ids, created = _columns(users, 2)
+    ids = np.asarray(user_ids, dtype=str)
+    moment = cutoff or datetime.utcnow()
+
+    def before(column):
+        # Count (or sum) of rows older than the cutoff; everything when there is none
+        return db.func.sum(db.case((column < cutoff, 1), else_=0)) if cutoff else db.func.count()
+
+    sources = {
+        'views': (ProductView.user_id, before(ProductView.created_at), None),
+        'favorites': (Favorite.user_id, before(Favorite.created_at), None),
+        'reviews': (Review.user_id, before(Review.created_at), None),
+        'searches': (SearchHistory.user_id, db.func.sum(
+            db.case((SearchHistory.created_at < cutoff, SearchHistory.search_count), else_=0)
+        ) if cutoff else db.func.sum(SearchHistory.search_count), None),
+        'orders': (Order.consumer_id, before(Order.created_at), Order.status.notin_(EXCLUDED_ORDER_STATUSES))
+    }
+    features = {'ids': ids}
+    for name, (key, aggregate, condition) in sources.items():
+        statement = db.select(key, aggregate).where(key.isnot(None)).group_by(key)
+        if condition is not None:
+            statement = statement.where(condition)
+        keys, counts = _columns(db.session.execute(statement).all(), 2)
+        features[name] = _align(ids, keys, [count or 0 for count in counts])
+
+    created = np.array([value or moment for value in created], dtype='datetime64[s]')
+    features['tenure_days'] = np.maximum((np.datetime64(moment, 's') - created) / np.timedelta64(1, 'D'), 0)
+    features['exists'] = created < np.datetime64(moment, 's')
+
+    if cutoff:
+        keys, counts = _columns(db.session.execute(
+            db.select(Order.consumer_id, db.func.count()).where(
+                Order.created_at >= cutoff, Order.status.notin_(EXCLUDED_ORDER_STATUSES)
+            ).group_by(Order.consumer_id)
+        ).all(), 2)
+        features['ordered_since'] = _align(ids, keys, counts) > 0
+    return features
+
+
+CONSUMER_FEATURES = ('views', 'favorites', 'reviews', 'searches', 'orders', 'tenure_days')
+
+
+def _consumer_matrix(features: Dict[str, np.ndarray]) -> np.ndarray:
+    return np.log1p(np.column_stack([features[name] for name in CONSUMER_FEATURES]))
+
+
+def score_client_potential(run_at: datetime) -> List[dict]:
+    from sklearn.linear_model import LogisticRegression
+    from sklearn.metrics import roc_auc_score
+    from sklearn.model_selection import cross_val_predict
+    from sklearn.pipeline import make_pipeline
+    from sklearn.preprocessing import StandardScaler
+
+    horizon = _setting('PREDICTION_HORIZON_DAYS', 30)
+    current = consumer_features()
+    if len(current['ids']) == 0:
+        return []
+    past = consumer_features(run_at - timedelta(days=horizon))
+
+    X_train = _consumer_matrix(past)[past['exists']]
+    y_train = past['ordered_since'][past['exists']]
+    X = _consumer_matrix(current)
+
+    positives = int(y_train.sum())
+    if len(y_train) >= _setting('PREDICTION_MIN_SAMPLES', 20) and 0 < positives < len(y_train):
+        model = make_pipeline(StandardScaler(), LogisticRegression(class_weight='balanced', max_iter=1000))
+        folds = min(5, positives, len(y_train) - positives)
+        if folds >= 2:
+            held_out = cross_val_predict(model, X_train, y_train, cv=folds, method='predict_proba')[:, 1]
+            quality = roc_auc_score(y_train, held_out)
+        else:
+            quality = 0.5
+        model.fit(X_train, y_train)
+        probability = model.predict_proba(X)[:, 1]
+        model_name = 'logistic_regression'
+        # AUC 0.5 is chance level; map 0.5..1 onto 0..1
+        confidence = np.full(len(X), max(quality - 0.5, 0) * 2)
+    else:
+        # Not enough history to learn from: rank by standardized overall activity
+        activity = X[:, :5].sum(axis=1)
+        spread = activity.std() or 1.0
+        probability = 1 / (1 + np.exp(-(activity - activity.mean()) / spread))
+        model_name = 'activity_heuristic'
+        confidence = np.full(len(X), 0.2)
+
+    segment = np.where(probability >= 0.66, 'high', np.where(probability >= 0.33, 'medium', 'low'))
+    counts = {name: current[name].astype(int).tolist() for name in CONSUMER_FEATURES[:5]}
+    data = [
+        {'probability': round(p, 4), 'segment': s, 'horizon_days': horizon, 'model': model_name,
+         'activity': dict(zip(CONSUMER_FEATURES[:5], values))}
+        for p, s, *values in zip(probability.tolist(), segment.tolist(), *counts.values())
+    ]
+    user_ids = current['ids'].tolist()
+    return _rows('client_potential', user_ids, [None] * len(user_ids), data, confidence, run_at)
+
+
+# Demand trend
+
+def _products():
+    from app.models.product import Product
+
+    rows = db.session.execute(
+        db.select(Product.id, Product.producer_id, Product.category, Product.price, Product.rating_average,
+                  Product.rating_count, Product.is_organic, Product.stock_quantity).order_by(Product.id)
+    ).all()
+    columns = _columns(rows, 8)
+    return {
+        'ids': np.asarray(columns[0], dtype=str),
+        'producer_ids': list(columns[1]),
+        'categories': np.asarray([category or '' for category in columns[2]], dtype=str),
+        'prices': np.asarray(columns[3], dtype=float),
+        'rating_average': np.asarray([value or 0 for value in columns[4]], dtype=float),
+        'rating_count': np.asarray([value or 0 for value in columns[5]], dtype=float),
+        'organic': np.asarray([bool(value) for value in columns[6]], dtype=float),
+        'stock': np.asarray([value or 0 for value in columns[7]], dtype=float)
+    }
+
+
+def daily_views(product_ids: np.ndarray, start: datetime, days: int) -> np.ndarray:
+    """(products x days) matrix of daily views from analytics_buckets"""
+    from app.models.analytics_bucket import AnalyticsBucket
+
+    matrix = np.zeros((len(product_ids), days))
+    rows = db.session.execute(
+        db.select(AnalyticsBucket.dimension_key, AnalyticsBucket.bucket_start, AnalyticsBucket.value).where(
+            AnalyticsBucket.metric == 'views',
+            AnalyticsBucket.granularity == 'day',
+            AnalyticsBucket.dimension == 'product',
+            AnalyticsBucket.bucket_start >= start,
+            AnalyticsBucket.bucket_start < start + timedelta(days=days)
+        )
+    ).all()
+    if not rows or len(product_ids) == 0:
+        return matrix
+    keys, starts, values = _columns(rows, 3)
+    keys = np.asarray(keys, dtype=str)
+    positions = np.minimum(np.searchsorted(product_ids, keys), len(product_ids) - 1)
+    found = product_ids[positions] == keys
+    offsets = ((np.asarray(starts, dtype='datetime64[D]') - np.datetime64(start.date(), 'D')) // np.timedelta64(1, 'D'))
+    np.add.at(matrix, (positions[found], offsets.astype(int)[found]), np.asarray(values, dtype=float)[found])
+    return matrix
+
+
+def fit_trends(matrix: np.ndarray, forecast_days: int = 7) -> Dict[str, np.ndarray]:
+    """Least-squares line through each row of a (series x days) matrix"""
+    days = matrix.shape[1]
+    x = np.arange(days, dtype=float)
+    centered = x - x.mean()
+    mean = matrix.mean(axis=1)
+    slope = (matrix - mean[:, None]) @ centered / (centered @ centered)
+    intercept = mean - slope * x.mean()
+    fitted = intercept[:, None] + slope[:, None] * x
+    total = ((matrix - mean[:, None]) ** 2).sum(axis=1)
+    residual = ((matrix - fitted) ** 2).sum(axis=1)
+    r2 = np.where(total > 0, 1 - residual / np.where(total > 0, total, 1), 0.0)
+    future = np.arange(days, days + forecast_days, dtype=float)
+    forecast = np.clip(intercept[:, None] + slope[:, None] * future, 0, None).sum(axis=1)
+    return {'slope': slope, 'mean': mean, 'r2': np.clip(r2, 0, 1), 'forecast': forecast}
+
+
+def score_demand_trend(run_at: datetime, products=None) -> List[dict]:
+    products = products or _products()
+    if len(products['ids']) == 0:
+        return []
+    days = max(_setting('PREDICTION_TREND_DAYS', 28), 2)
+    today = run_at.replace(hour=0, minute=0, second=0, microsecond=0)
+    matrix = daily_views(products['ids'], today - timedelta(days=days), days)
+    trend = fit_trends(matrix)
+
+    weekly_change = np.where(trend['mean'] > 0, trend['slope'] * 7 / np.where(trend['mean'] > 0, trend['mean'], 1), 0.0)
+    direction = np.where(weekly_change > TREND_THRESHOLD, 'rising',
+                         np.where(weekly_change < -TREND_THRESHOLD, 'falling', 'stable'))
+    recent = matrix[:, -7:].sum(axis=1)
+    data = [
+        {'trend': d, 'slope_per_day': round(s, 4), 'weekly_change_pct': round(c * 100, 2),
+         'recent_7d_views': int(r), 'forecast_next_7d_views': round(f, 1), 'window_days': days}
+        for d, s, c, r, f in zip(direction.tolist(), trend['slope'].tolist(), weekly_change.tolist(),
+                                 recent.tolist(), trend['forecast'].tolist())
+    ]
+    return _rows('demand_trend', products['producer_ids'], products['ids'].tolist(), data, trend['r2'], run_at)
+
+
+# Price optimization
+
+def category_medians(categories: np.ndarray, prices: np.ndarray) -> np.ndarray:
+    """Median price of each row's category, without a loop over categories"""
+    groups, inverse = np.unique(categories, return_inverse=True)
+    order = np.lexsort((prices, inverse))
+    counts = np.bincount(inverse, minlength=len(groups))
+    starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+    sorted_prices = prices[order]
+    medians = (sorted_prices[starts + (counts - 1) // 2] + sorted_prices[starts + counts // 2]) / 2
+    return medians[inverse]
+
+
+def product_demand(product_ids: np.ndarray) -> np.ndarray:
+    """Weighted views, favorites and ordered units of each product"""
+    from app.models.favorite import Favorite
+    from app.models.order import Order, OrderItem
+    from app.models.product_view import ProductViewCount
+
+    views = _columns(db.session.execute(db.select(ProductViewCount.product_id, ProductViewCount.view_count)).all(), 2)
+    favorites = _columns(db.session.execute(
+        db.select(Favorite.product_id, db.func.count()).group_by(Favorite.product_id)
+    ).all(), 2)
+    units = _columns(db.session.execute(
+        db.select(OrderItem.product_id, db.func.sum(OrderItem.quantity))
+        .join(Order, Order.id == OrderItem.order_id)
+        .where(Order.status.notin_(EXCLUDED_ORDER_STATUSES))
+        .group_by(OrderItem.product_id)
+    ).all(), 2)
+    return (DEMAND_WEIGHTS['views'] * _align(product_ids, *views)
+            + DEMAND_WEIGHTS['favorites'] * _align(product_ids, *favorites)
+            + DEMAND_WEIGHTS['units'] * _align(product_ids, units[0], [value or 0 for value in units[1]]))
+
+
+def _price_features(log_ratio: np.ndarray, products) -> np.ndarray:
+    """Model inputs; log_ratio may carry an extra candidate axis"""
+    others = np.column_stack([
+        products['rating_average'] / 5,
+        np.log1p(products['rating_count']),
+        products['organic'],
+        np.log1p(products['stock'])
+    ])
+    if log_ratio.ndim == 2:
+        others = np.broadcast_to(others[:, None, :], log_ratio.shape + (others.shape[1],))
+    return np.concatenate([log_ratio[..., None], (log_ratio ** 2)[..., None], others], axis=-1)
+
+
+def score_price_optimization(run_at: datetime, products=None) -> List[dict]:
+    from sklearn.linear_model import Ridge
+    from sklearn.model_selection import cross_val_score
+
+    products = products or _products()
+    prices = products['prices']
+    if len(prices) == 0:
+        return []
+    price_range = _setting('PREDICTION_PRICE_RANGE', 0.2)
+    medians = category_medians(products['categories'], prices)
+    log_ratio = np.log(prices / medians)
+    demand = product_demand(products['ids'])
+    target = np.log1p(demand)
+
+    multipliers = np.linspace(1 - price_range, 1 + price_range, PRICE_CANDIDATES)
+    X = _price_features(log_ratio, products)
+    if len(prices) >= _setting('PREDICTION_MIN_SAMPLES', 20) and log_ratio.std() > 0 and target.std() > 0:
+        model = Ridge(alpha=1.0)
+        quality = cross_val_score(model, X, target, cv=min(5, len(prices)), scoring='r2').mean()
+        model.fit(X, target)
+
+        # Every product at every candidate price in one predict call
+        candidates = log_ratio[:, None] + np.log(multipliers)[None, :]
+        predicted = np.expm1(model.predict(
+            _price_features(candidates, products).reshape(-1, X.shape[1])
+        ).reshape(candidates.shape)).clip(min=0)
+        revenue = prices[:, None] * multipliers[None, :] * predicted
+        best = revenue.argmax(axis=1)
+        rows = np.arange(len(prices))
+        suggested = prices * multipliers[best]
+        current_index = PRICE_CANDIDATES // 2
+        baseline_demand, baseline_revenue = predicted[:, current_index], revenue[:, current_index]
+        demand_change = np.where(baseline_demand > 0, predicted[rows, best] / np.where(baseline_demand > 0, baseline_demand, 1) - 1, 0.0)
+        revenue_change = np.where(baseline_revenue > 0, revenue[rows, best] / np.where(baseline_revenue > 0, baseline_revenue, 1) - 1, 0.0)
+        model_name = 'ridge_regression'
+        confidence = np.full(len(prices), max(quality, 0))
+    else:
+        # Too little data: move halfway towards the category median, within the allowed range
+        suggested = np.clip(prices + (medians - prices) / 2, prices * (1 - price_range), prices * (1 + price_range))
+        demand_change = revenue_change = np.zeros(len(prices))
+        model_name = 'category_median'
+        confidence = np.full(len(prices), 0.2)
+
+    suggested = np.round(suggested, 2)
+    data = [
+        {'current_price': round(p, 2), 'suggested_price': s, 'change_pct': round((s / p - 1) * 100, 2),
+         'category_median_price': round(m, 2), 'expected_demand_change_pct': round(d * 100, 2),
+         'expected_revenue_change_pct': round(r * 100, 2), 'model': model_name}
+        for p, s, m, d, r in zip(prices.tolist(), suggested.tolist(), medians.tolist(),
+                                 demand_change.tolist(), revenue_change.tolist())
+    ]
+    return _rows('price_optimization', products['producer_ids'], products['ids'].tolist(), data, confidence, run_at)
+
+
+SCORERS = {
+    'client_potential': score_client_potential,
+    'demand_trend': score_demand_trend,
+    'price_optimization': score_price_optimization
+}
+
+
+def write_predictions(prediction_type: str, rows: List[dict], run_at: datetime):
+    """Insert a run's predictions and drop the runs beyond PREDICTION_KEEP_RUNS"""
+    from app.models.ai_prediction import AIPrediction
+
+    table = AIPrediction.__table__
+    for start in range(0, len(rows), INSERT_CHUNK):
+        db.session.execute(table.insert(), rows[start:start + INSERT_CHUNK])
+
+    keep = max(_setting('PREDICTION_KEEP_RUNS', 3), 1)
+    runs = db.session.execute(
+        db.select(table.c.created_at).where(table.c.prediction_type == prediction_type)
+        .group_by(table.c.created_at).order_by(table.c.created_at.desc()).offset(keep - 1).limit(1)
+    ).scalar()
+    if runs is not None:
+        db.session.execute(table.delete().where(
+            table.c.prediction_type == prediction_type, table.c.created_at < runs
+        ))
+
+
+def score_predictions(types: Sequence[str] = PREDICTION_TYPES) -> Dict[str, Dict[str, Any]]:
+    """Score and store the given prediction types; returns rows written and seconds taken per type"""
+    run_at = datetime.utcnow()
+    products = _products() if set(types) & {'demand_trend', 'price_optimization'} else None
+    results = {}
+    for prediction_type in types:
+        started = time.perf_counter()
+        scorer = SCORERS[prediction_type]
+        rows = scorer(run_at) if prediction_type == 'client_potential' else scorer(run_at, products)
+        write_predictions(prediction_type, rows, run_at)
+        db.session.commit()
+        results[prediction_type] = {'predictions': len(rows), 'seconds': round(time.perf_counter() - started, 3)}
+    invalidate('ai_predictions')
+    return results
+
+
+def latest_predictions(user_id: Optional[str] = None, prediction_type: Optional[str] = None,
+                       product_id: Optional[str] = None, exclude_types: Sequence[str] = ()):
+    """Most recent prediction per (user, product, type) matching the filters"""
+    from app.models.ai_prediction import AIPrediction
+
+    rank = db.func.row_number().over(
+        partition_by=(AIPrediction.user_id, AIPrediction.product_id, AIPrediction.prediction_type),
+        order_by=AIPrediction.created_at.desc()
+    ).label('rank')
+    ranked = db.select(AIPrediction.id, rank)
+    if user_id is not None:
+        ranked = ranked.where(AIPrediction.user_id == user_id)
+    if prediction_type is not None:
+        ranked = ranked.where(AIPrediction.prediction_type == prediction_type)
+    if product_id is not None:
+        ranked = ranked.where(AIPrediction.product_id == product_id)
+    if exclude_types:
+        ranked = ranked.where(AIPrediction.prediction_type.notin_(exclude_types))
+    ranked = ranked.subquery()
+
+    return db.session.scalars(
+        db.select(AIPrediction).join(ranked, ranked.c.id == AIPrediction.id).where(ranked.c.rank == 1)
+        .order_by(AIPrediction.prediction_type, AIPrediction.product_id)
+    ).all()
+
+
+@click.command('score-predictions')
+@click.option('--type', 'types', multiple=True, type=click.Choice(PREDICTION_TYPES),
+              help='Prediction type to score (repeatable; default: all)')
+@with_appcontext
+def score_predictions_command(types):
+    """Score AI predictions for all users and products"""
+    results = score_predictions(types or PREDICTION_TYPES)
+    for prediction_type, result in results.items():
+        click.echo(f"{prediction_type}: {result['predictions']} prediction(s) in {result['seconds']}s")
@@ -0,0 +1,316 @@
+"""
+Per-producer analytics rollups
+
+Producer dashboards read totals (products, views, favorites, reviews, rating
+sum/count, orders, revenue) and a per-day series from two materialized tables
+instead of scanning raw rows:
+- producer_stats: one row of running totals per producer
+- producer_daily_stats: the net change of each counter per producer and day
+
+Writes feed them incrementally. A session after_flush listener turns the
+products, favorites, reviews and orders changed by the flush into deltas and
+stages them with the counter buffer, which upserts them shortly after the
+transaction commits. A checkout's orders therefore do not lock rollup rows
+while the transaction holds its stock locks. View batches from the view
+ingestor are added by record_view_batch(). The rebuild-producer-stats command
+recomputes both tables from the raw tables (backfill or drift repair).
+"""
+
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from typing import Dict, Iterable, Optional, Tuple
+
+import click
+from flask.cli import with_appcontext
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from sqlalchemy.orm.attributes import get_history
+
+from app.services.counter_buffer import stage
+from app.utils.upsert import upsert_increments
+
+STAT_FIELDS = ['product_count', 'view_count', 'favorite_count', 'review_count',
+               'rating_sum', 'rating_count', 'order_count', 'revenue']
+
+# Orders in these statuses do not count toward orders and revenue
+EXCLUDED_ORDER_STATUSES = {'cancelled'}
+
+
+class ProducerRollups:
+    """Counter deltas per producer, in total and per day"""
+
+    def __init__(self):
+        self.totals: Dict[object, Dict[str, object]] = defaultdict(lambda: dict.fromkeys(STAT_FIELDS, 0))
+        self.days: Dict[Tuple[object, date], Dict[str, object]] = defaultdict(lambda: dict.fromkeys(STAT_FIELDS, 0))
+
+    def add(self, producer_id, day: date, **deltas):
+        """Add deltas (e.g. favorite_count=1) to a producer's totals and day bucket"""
+        if producer_id is None or not any(deltas.values()):
+            return
+        for bucket in (self.totals[producer_id], self.days[(producer_id, day)]):
+            for field, delta in deltas.items():
+                bucket[field] += delta
+
+    def total(self, producer_id) -> Dict[str, object]:
+        """Totals of a producer (zeros when unknown)"""
+        return dict(self.totals.get(producer_id) or dict.fromkeys(STAT_FIELDS, 0))
+
+    def series(self, producer_id, start: date, end: date) -> Iterable[Tuple[date, Dict[str, object]]]:
+        """(day, deltas) for every day in [start, end], zero-filled"""
+        day = start
+        while day <= end:
+            yield day, dict(self.days.get((producer_id, day)) or dict.fromkeys(STAT_FIELDS, 0))
+            day += timedelta(days=1)
+
+    def merge(self, other: 'ProducerRollups'):
+        """Add another set of deltas to these"""
+        for mine, theirs in ((self.totals, other.totals), (self.days, other.days)):
+            for key, deltas in theirs.items():
+                bucket = mine[key]
+                for field, delta in deltas.items():
+                    bucket[field] += delta
+
+    def __len__(self):
+        return len(self.totals) + len(self.days)
+
+    def __bool__(self):
+        return bool(self.totals)
+
+
+def summarize(totals: Dict[str, object]) -> Dict[str, object]:
+    """Dashboard fields from a producer's counters"""
+    rating_count = totals['rating_count']
+    return {
+        'total_products': totals['product_count'],
+        'total_views': totals['view_count'],
+        'total_favorites': totals['favorite_count'],
+        'total_reviews': totals['review_count'],
+        'average_rating': round(totals['rating_sum'] / rating_count, 2) if rating_count else 0,
+        'total_orders': totals['order_count'],
+        'total_revenue': float(totals['revenue'] or 0)
+    }
+
+
+def daily_point(day: date, deltas: Dict[str, object]) -> Dict[str, object]:
+    """Chart point of one day bucket"""
+    return {
+        'day': day.isoformat(),
+        'products': deltas['product_count'],
+        'views': deltas['view_count'],
+        'favorites': deltas['favorite_count'],
+        'reviews': deltas['review_count'],
+        'rating_sum': deltas['rating_sum'],
+        'rating_count': deltas['rating_count'],
+        'orders': deltas['order_count'],
+        'revenue': float(deltas['revenue'] or 0)
+    }
+
+
+def write_rollups(connection, rollups: ProducerRollups):
+    """Upsert accumulated deltas into producer_stats and producer_daily_stats"""
+    from app.models.producer_stat import ProducerDailyStat, ProducerStat
+
+    now = datetime.utcnow()
+    totals = [{'producer_id': producer_id, **deltas, 'updated_at': now} for producer_id, deltas in rollups.totals.items()]
+    days = [{'producer_id': producer_id, 'day': day, **deltas} for (producer_id, day), deltas in rollups.days.items()]
+    upsert_increments(connection, ProducerStat.__table__, ['producer_id'], totals, STAT_FIELDS, replace=['updated_at'])
+    upsert_increments(connection, ProducerDailyStat.__table__, ['producer_id', 'day'], days, STAT_FIELDS)
+
+
+def _day(value: Optional[datetime]) -> date:
+    return (value or datetime.utcnow()).date()
+
+
+def _previous(instance, attribute):
+    """Value of an attribute before the current flush"""
+    history = get_history(instance, attribute)
+    if history.deleted:
+        return history.deleted[0]
+    if history.unchanged:
+        return history.unchanged[0]
+    return getattr(instance, attribute)
+
+
+def _review_deltas(rating, is_flagged, sign):
+    if rating is None or is_flagged:
+        return {}
+    return {'review_count': sign, 'rating_sum': sign * rating, 'rating_count': sign}
+
+
+def _order_deltas(status, total_amount, sign):
+    if status in EXCLUDED_ORDER_STATUSES:
+        return {}
+    return {'order_count': sign, 'revenue': sign * Decimal(str(total_amount or 0))}
+
+
+def collect_flush_rollups(session) -> ProducerRollups:
+    """Producer deltas implied by the objects inserted, updated or deleted in a flush"""
+    from app.models.favorite import Favorite
+    from app.models.order import Order
+    from app.models.product import Product
+    from app.models.review import Review
+
+    rollups = ProducerRollups()
+    today = datetime.utcnow().date()
+    pending = []  # (product id, day, deltas) needing the product's producer
+
+    for instance in session.new:
+        if isinstance(instance, Product):
+            rollups.add(instance.producer_id, _day(instance.created_at), product_count=1)
+        elif isinstance(instance, Favorite):
+            pending.append((instance.product_id, _day(instance.created_at), {'favorite_count': 1}))
+        elif isinstance(instance, Review):
+            pending.append((instance.product_id, _day(instance.created_at), _review_deltas(instance.rating, instance.is_flagged, 1)))
+        elif isinstance(instance, Order):
+            rollups.add(instance.producer_id, _day(instance.created_at), **_order_deltas(instance.status, instance.total_amount, 1))
+
+    for instance in session.deleted:
+        if isinstance(instance, Product):
+            rollups.add(instance.producer_id, today, product_count=-1)
+        elif isinstance(instance, Favorite):
+            pending.append((instance.product_id, today, {'favorite_count': -1}))
+        elif isinstance(instance, Review):
+            pending.append((_previous(instance, 'product_id'), today,
+                            _review_deltas(_previous(instance, 'rating'), _previous(instance, 'is_flagged'), -1)))
+        elif isinstance(instance, Order):
+            rollups.add(instance.producer_id, today,
+                        **_order_deltas(_previous(instance, 'status'), _previous(instance, 'total_amount'), -1))
+
+    for instance in session.dirty:
+        if isinstance(instance, Review):
+            previous = tuple(_previous(instance, name) for name in ('product_id', 'rating', 'is_flagged'))
+            current = (instance.product_id, instance.rating, instance.is_flagged)
+            if previous != current:
+                pending.append((previous[0], today, _review_deltas(previous[1], previous[2], -1)))
+                pending.append((current[0], today, _review_deltas(current[1], current[2], 1)))
+        elif isinstance(instance, Order):
+            previous = (_previous(instance, 'status'), _previous(instance, 'total_amount'))
+            current = (instance.status, instance.total_amount)
+            if previous != current:
+                rollups.add(instance.producer_id, today, **_order_deltas(*previous, -1))
+                rollups.add(instance.producer_id, today, **_order_deltas(*current, 1))
+
+    pending = [(product_id, day, deltas) for product_id, day, deltas in pending if deltas]
+    if pending:
+        producers = _producers_of(session, {product_id for product_id, _, _ in pending})
+        for product_id, day, deltas in pending:
+            rollups.add(producers.get(product_id), day, **deltas)
+    return rollups
+
+
+def _producers_of(session, product_ids) -> Dict[object, object]:
+    """producer_id of each product, from the session's objects or one IN query"""
+    from app.models.product import Product
+
+    producers = {}
+    for instance in list(session.identity_map.values()) + list(session.deleted):
+        if isinstance(instance, Product) and instance.id in product_ids:
+            producers[instance.id] = instance.producer_id
+
+    missing = [product_id for product_id in product_ids if product_id not in producers]
+    if missing:
+        table = Product.__table__
+        rows = session.connection().execute(
+            table.select().with_only_columns(table.c.id, table.c.producer_id).where(table.c.id.in_(missing))
+        )
+        producers.update({product_id: producer_id for product_id, producer_id in rows})
+    return producers
+
+
+@event.listens_for(Session, 'after_flush')
+def _update_producer_rollups(session, flush_context):
+    stage(session, 'producer_stats', write_rollups, collect_flush_rollups(session))
+
+
+def record_view_batch(connection, rows):
+    """Add a batch of product_views rows to their producers' view counters"""
+    from app.models.product import Product
+
+    counts = defaultdict(int)
+    for row in rows:
+        counts[(row['product_id'], _day(row.get('created_at')))] += 1
+
+    table = Product.__table__
+    product_ids = list({product_id for product_id, _ in counts})
+    producers = dict(connection.execute(
+        table.select().with_only_columns(table.c.id, table.c.producer_id).where(table.c.id.in_(product_ids))
+    ).all())
+
+    rollups = ProducerRollups()
+    for (product_id, day), views in counts.items():
+        rollups.add(producers.get(product_id), day, view_count=views)
+    write_rollups(connection, rollups)
+
+
+def compute_producer_rollups() -> ProducerRollups:
+    """Rollups recomputed from the raw tables with one grouped query per source"""
+    from app import db
+    from app.models.favorite import Favorite
+    from app.models.order import Order
+    from app.models.product import Product
+    from app.models.product_view import ProductView
+    from app.models.review import Review
+
+    rollups = ProducerRollups()
+
+    def day_of(column):
+        return db.func.date(column)
+
+    def grouped(query, field_columns, day_column):
+        day = day_of(day_column)
+        rows = query.add_columns(day, *field_columns.values()).group_by(Product.producer_id, day)
+        for producer_id, bucket, *values in rows:
+            if isinstance(bucket, str):
+                bucket = date.fromisoformat(bucket[:10])
+            rollups.add(producer_id, bucket, **{
+                field: (Decimal(str(value)) if field == 'revenue' else int(value)) if value is not None else 0
+                for field, value in zip(field_columns, values)
+            })
+
+    grouped(db.session.query(Product.producer_id), {'product_count': db.func.count(Product.id)}, Product.created_at)
+    grouped(db.session.query(Product.producer_id).join(Favorite, Favorite.product_id == Product.id),
+            {'favorite_count': db.func.count(Favorite.id)}, Favorite.created_at)
+    grouped(db.session.query(Product.producer_id).join(ProductView, ProductView.product_id == Product.id),
+            {'view_count': db.func.count(ProductView.id)}, ProductView.created_at)
+    grouped(
+        db.session.query(Product.producer_id).join(Review, Review.product_id == Product.id).filter(
+            db.or_(Review.is_flagged == db.false(), Review.is_flagged.is_(None))
+        ),
+        {'review_count': db.func.count(Review.id), 'rating_sum': db.func.sum(Review.rating),
+         'rating_count': db.func.count(Review.id)},
+        Review.created_at
+    )
+
+    day = day_of(Order.created_at)
+    orders = db.session.query(Order.producer_id, day, db.func.count(Order.id), db.func.sum(Order.total_amount)).filter(
+        Order.status.notin_(EXCLUDED_ORDER_STATUSES)
+    ).group_by(Order.producer_id, day)
+    for producer_id, bucket, order_count, revenue in orders:
+        if isinstance(bucket, str):
+            bucket = date.fromisoformat(bucket[:10])
+        rollups.add(producer_id, bucket, order_count=order_count, revenue=Decimal(str(revenue or 0)))
+
+    return rollups
+
+
+def rebuild_producer_stats() -> int:
+    """Replace both rollup tables with values recomputed from the raw tables"""
+    from app import db
+    from app.models.producer_stat import ProducerDailyStat, ProducerStat
+
+    rollups = compute_producer_rollups()
+    connection = db.session.connection()
+    connection.execute(ProducerDailyStat.__table__.delete())
+    connection.execute(ProducerStat.__table__.delete())
+    write_rollups(connection, rollups)
+    db.session.commit()
+    return len(rollups.totals)
+
+
+@click.command('rebuild-producer-stats')
+@with_appcontext
+def rebuild_producer_stats_command():
+    """Recompute producer analytics rollups from the raw tables"""
+    producers = rebuild_producer_stats()
+    click.echo(f'Rebuilt analytics rollups for {producers} producer(s)')
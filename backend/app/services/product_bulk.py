@@ -0,0 +1,350 @@
+"""
+Bulk product import and catalog export
+
+ProductImport.run() reads a CSV or NDJSON upload row by row straight from the
+request stream (the body is never held in memory; Werkzeug stops the stream
+at MAX_CONTENT_LENGTH). Each row is validated like POST /api/products
+(required fields, validate_price, validate_stock_quantity) plus type checks on
+the optional fields; invalid rows are reported with their line number and
+skipped. Valid rows are written in batches of PRODUCT_IMPORT_BATCH_SIZE, one
+transaction per batch: a row with an 'id' updates that product of the
+producer's catalog (ids outside it are reported), a row without one creates a
+product. The ORM session is used
+so the flush events (rating, metrics, cache invalidation) see every row, and
+the search index is refreshed after each committed batch.
+
+export_rows() walks a producer's catalog with yield_per, so the export
+endpoint streams it without loading every product; CSV columns and NDJSON keys
+match what import accepts, so an export can be edited and imported back.
+"""
+
+import csv
+import io
+import json
+from datetime import date
+from decimal import Decimal
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from app import db
+from app.models.product import Product
+from app.services.product_search import index_product
+from app.utils.streaming import stream_query
+from app.utils.validators import validate_price, validate_stock_quantity
+
+FORMATS = {
+    'text/csv': 'csv',
+    'application/csv': 'csv',
+    'application/x-ndjson': 'ndjson',
+    'application/ndjson': 'ndjson',
+    'application/jsonl': 'ndjson'
+}
+
+REQUIRED_FIELDS = ['name', 'description', 'category', 'price']
+
+COLUMNS = [
+    'id', 'name', 'description', 'category', 'subcategory', 'price', 'currency', 'unit',
+    'stock_quantity', 'min_order_quantity', 'max_order_quantity', 'images', 'tags',
+    'is_organic', 'is_available', 'harvest_date', 'expiry_date'
+]
+
+MAX_PRICE = Decimal('100000000')
+
+LIST_SEPARATOR = '|'  # Separates images and tags inside a CSV cell
+
+_TRUE = {'1', 'true', 'yes', 'y', 'on'}
+_FALSE = {'0', 'false', 'no', 'n', 'off', ''}
+
+
+def detect_format(mimetype: str, filename: Optional[str] = None) -> Optional[str]:
+    """'csv' or 'ndjson' from an upload's content type or file extension"""
+    if mimetype in FORMATS:
+        return FORMATS[mimetype]
+    extension = (filename or '').rsplit('.', 1)[-1].lower()
+    if extension == 'csv':
+        return 'csv'
+    if extension in ('ndjson', 'jsonl'):
+        return 'ndjson'
+    return None
+
+
+def iter_rows(stream, fmt: str) -> Iterator[Tuple[int, Optional[Dict[str, Any]], Optional[str]]]:
+    """(line number, row, parse error) for each record of a binary stream"""
+    if fmt == 'csv':
+        text = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='')
+        try:
+            reader = csv.DictReader(text)
+            for row in reader:
+                # Blank cells mean "not given", like a missing NDJSON key
+                values = {key.strip(): value for key, value in row.items() if key and value not in (None, '')}
+                if None in row:
+                    yield reader.line_num, None, 'More cells than header columns'
+                elif values:
+                    yield reader.line_num, values, None
+        except UnicodeDecodeError:
+            yield reader.line_num + 1, None, 'File is not valid UTF-8'
+        finally:
+            text.detach()  # Leave the request stream open for Werkzeug
+        return
+
+    for line_number, line in enumerate(stream, start=1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            row = json.loads(line)
+        except (UnicodeDecodeError, ValueError):
+            yield line_number, None, 'Invalid JSON'
+            continue
+        if not isinstance(row, dict):
+            yield line_number, None, 'Each line must be a JSON object'
+            continue
+        yield line_number, row, None
+
+
+def _integer(value) -> int:
+    if isinstance(value, bool) or (isinstance(value, float) and not value.is_integer()):
+        raise ValueError
+    return int(value)
+
+
+def _price(value) -> Optional[Decimal]:
+    if isinstance(value, bool) or not validate_price(value):
+        return None
+    price = Decimal(str(value).strip())
+    # Numeric(10, 2) holds at most eight integer digits
+    return price if price < MAX_PRICE else None
+
+
+def _boolean(value) -> bool:
+    if isinstance(value, bool):
+        return value
+    text = str(value).strip().lower()
+    if text in _TRUE:
+        return True
+    if text in _FALSE:
+        return False
+    raise ValueError
+
+
+def _string_list(value) -> List[str]:
+    if isinstance(value, str):
+        return [item.strip() for item in value.split(LIST_SEPARATOR) if item.strip()]
+    if isinstance(value, list) and all(isinstance(item, str) for item in value):
+        return value
+    raise ValueError
+
+
+def parse_row(row: Dict[str, Any]) -> Tuple[Dict[str, Any], List[str]]:
+    """Validated product fields of an import row, and the problems found"""
+    errors = []
+    values = {}
+
+    missing = [field for field in REQUIRED_FIELDS if field not in row or row[field] in (None, '')]
+    if missing:
+        errors.append(f"Missing required fields: {', '.join(missing)}")
+
+    for field, limit in (('name', 100), ('category', 50), ('subcategory', 50), ('unit', 20), ('currency', 3)):
+        if row.get(field) not in (None, ''):
+            value = str(row[field]).strip()
+            if len(value) > limit:
+                errors.append(f'{field} must be at most {limit} characters')
+            values[field] = value
+    if row.get('description') not in (None, ''):
+        values['description'] = str(row['description'])
+
+    if row.get('price') not in (None, ''):
+        price = _price(row['price'])
+        if price is None:
+            errors.append('Invalid price format')
+        else:
+            values['price'] = price
+
+    if 'stock_quantity' in row:
+        if validate_stock_quantity(row['stock_quantity']):
+            values['stock_quantity'] = int(row['stock_quantity'])
+        else:
+            errors.append('Invalid stock quantity')
+
+    for field in ('min_order_quantity', 'max_order_quantity'):
+        if row.get(field) not in (None, ''):
+            try:
+                values[field] = _integer(row[field])
+                if values[field] < 1:
+                    raise ValueError
+            except (TypeError, ValueError):
+                errors.append(f'{field} must be a positive integer')
+
+    for field in ('is_organic', 'is_available'):
+        if field in row:
+            try:
+                values[field] = _boolean(row[field])
+            except ValueError:
+                errors.append(f'{field} must be true or false')
+
+    for field in ('images', 'tags'):
+        if field in row:
+            try:
+                values[field] = _string_list(row[field])
+            except ValueError:
+                errors.append(f'{field} must be a list of strings')
+
+    for field in ('harvest_date', 'expiry_date'):
+        if row.get(field) not in (None, ''):
+            try:
+                values[field] = date.fromisoformat(str(row[field]))
+            except ValueError:
+                errors.append(f'{field} must be a YYYY-MM-DD date')
+
+    if row.get('id') not in (None, ''):
+        values['id'] = str(row['id'])
+
+    return values, errors
+
+
+def _new_product(producer_id: str, values: Dict[str, Any]) -> Product:
+    # Same defaults as POST /api/products
+    return Product(
+        producer_id=producer_id,
+        **{
+            'currency': 'MAD',
+            'unit': 'piece',
+            'stock_quantity': 0,
+            'min_order_quantity': 1,
+            'images': [],
+            'tags': [],
+            'is_organic': False,
+            'is_available': True,
+            **values
+        }
+    )
+
+
+class ProductImport:
+    """Accumulates valid rows and writes them one batch (transaction) at a time"""
+
+    def __init__(self, producer_id: str, batch_size: int = 500, max_errors: int = 1000):
+        self.producer_id = producer_id
+        self.batch_size = max(1, batch_size)
+        self.max_errors = max_errors
+        self.result = {'rows': 0, 'created': 0, 'updated': 0, 'failed': 0, 'batches': 0, 'errors': []}
+        self._batch: List[Tuple[int, Dict[str, Any]]] = []
+
+    def reject(self, line: int, errors: List[str]):
+        self.result['failed'] += 1
+        if len(self.result['errors']) < self.max_errors:
+            self.result['errors'].append({'row': line, 'errors': errors})
+
+    def add(self, line: int, row: Dict[str, Any]):
+        self.result['rows'] += 1
+        values, errors = parse_row(row)
+        if errors:
+            self.reject(line, errors)
+            return
+        self._batch.append((line, values))
+        if len(self._batch) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        """Write the pending rows in one transaction"""
+        batch, self._batch = self._batch, []
+        if not batch:
+            return
+        ids = {values['id'] for _, values in batch if 'id' in values}
+        existing = {}
+        if ids:
+            existing = {
+                product.id: product
+                for product in Product.query.filter(Product.id.in_(ids), Product.producer_id == self.producer_id)
+            }
+
+        written, created, updated = [], 0, 0
+        try:
+            for line, values in batch:
+                if 'id' not in values:
+                    product = _new_product(self.producer_id, values)
+                    db.session.add(product)
+                    created += 1
+                elif values['id'] in existing:
+                    product = existing[values['id']]
+                    for field, value in values.items():
+                        setattr(product, field, value)
+                    updated += 1
+                else:
+                    self.reject(line, ['Product not found in your catalog'])
+                    continue
+                written.append((line, product))
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            for line, _ in written:
+                self.reject(line, ['Batch could not be saved'])
+            return
+
+        self.result['created'] += created
+        self.result['updated'] += updated
+        self.result['batches'] += 1
+        for _, product in written:
+            index_product(product)
+            # Keep the identity map from growing with the upload
+            db.session.expunge(product)
+
+    def run(self, stream, fmt: str) -> Dict[str, Any]:
+        """Validate and upsert every row of an upload; returns counts and per-row errors"""
+        for line, row, error in iter_rows(stream, fmt):
+            if error:
+                self.result['rows'] += 1
+                self.reject(line, [error])
+            else:
+                self.add(line, row)
+        self.flush()
+        return self.summary()
+
+    def summary(self) -> Dict[str, Any]:
+        errors = sorted(self.result['errors'], key=lambda error: error['row'])
+        return {**self.result, 'errors': errors, 'errors_truncated': self.result['failed'] > len(errors)}
+
+
+def export_record(product: Product) -> Dict[str, Any]:
+    """Importable representation of a product"""
+    return {
+        'id': product.id,
+        'name': product.name,
+        'description': product.description,
+        'category': product.category,
+        'subcategory': product.subcategory,
+        'price': float(product.price) if product.price is not None else None,
+        'currency': product.currency,
+        'unit': product.unit,
+        'stock_quantity': product.stock_quantity,
+        'min_order_quantity': product.min_order_quantity,
+        'max_order_quantity': product.max_order_quantity,
+        'images': product.images or [],
+        'tags': product.tags or [],
+        'is_organic': product.is_organic,
+        'is_available': product.is_available,
+        'harvest_date': product.harvest_date.isoformat() if product.harvest_date else None,
+        'expiry_date': product.expiry_date.isoformat() if product.expiry_date else None
+    }
+
+
+def export_rows(producer_id: str, fmt: str, chunk_size: int = 500) -> Iterator[str]:
+    """Chunks of a producer's catalog as CSV (with header) or NDJSON"""
+    statement = db.select(Product).filter_by(producer_id=producer_id).order_by(Product.created_at, Product.id)
+    products = (product for chunk in stream_query(statement, chunk_size) for product in chunk)
+    if fmt == 'csv':
+        buffer = io.StringIO()
+        writer = csv.DictWriter(buffer, fieldnames=COLUMNS)
+        writer.writeheader()
+        yield buffer.getvalue()
+        for product in products:
+            buffer.seek(0)
+            buffer.truncate()
+            record = export_record(product)
+            record['images'] = LIST_SEPARATOR.join(record['images'])
+            record['tags'] = LIST_SEPARATOR.join(record['tags'])
+            writer.writerow(record)
+            yield buffer.getvalue()
+        return
+
+    for product in products:
+        yield json.dumps(export_record(product), ensure_ascii=False) + '\n'
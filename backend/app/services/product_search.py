@@ -0,0 +1,116 @@
+"""
+Product search index bound to the SQLAlchemy backend
+
+The index is built on the first search and updated in place by the product
+endpoints after their writes commit. Other workers' writes are picked up by a
+cheap signature check (row count and latest update) run in a background
+thread at most every SEARCH_INDEX_REFRESH_SECONDS. When the signature changed
+that thread builds a fresh index and swaps it in with a single reference
+assignment, so searches never see an empty or partly built index and no
+request waits for a rebuild. Local writes made during a rebuild are replayed
+onto the new index before the swap.
+"""
+
+import logging
+import threading
+import time
+
+from flask import current_app
+from app import db
+from app.models.product import Product
+from app.services.search_index import SearchIndex
+
+logger = logging.getLogger(__name__)
+
+_state = {'index': None, 'signature': None, 'checked_at': 0.0, 'refreshing': False, 'building': False, 'replay': []}
+_state_lock = threading.Lock()
+_build_lock = threading.RLock()
+
+
+def _table_signature():
+    """Row count and latest update of the products table"""
+    return tuple(db.session.query(db.func.count(Product.id), db.func.max(Product.updated_at)).one())
+
+
+def rebuild_index() -> SearchIndex:
+    """Build a fresh search index from the products table and swap it in"""
+    with _build_lock:
+        with _state_lock:
+            _state['building'] = True
+            _state['replay'] = []
+        try:
+            signature = _table_signature()
+            index = SearchIndex()
+            rows = db.session.query(Product.id, Product.name, Product.description, Product.tags).yield_per(1000)
+            for product_id, name, description, tags in rows:
+                index.add(product_id, name, description, tags)
+        except Exception:
+            with _state_lock:
+                _state.update(building=False, replay=[])
+            raise
+
+        with _state_lock:
+            # Writes that committed while the rows were read
+            for product_id, fields in _state['replay']:
+                if fields is None:
+                    index.remove(product_id)
+                else:
+                    index.add(product_id, *fields)
+            _state.update(index=index, signature=signature, checked_at=time.monotonic(), building=False, replay=[])
+        return index
+
+
+def _refresh(app):
+    """Rebuild the index if another worker changed the products table (background thread)"""
+    with app.app_context():
+        try:
+            if _table_signature() != _state['signature']:
+                rebuild_index()
+        except Exception:
+            logger.exception('Failed to refresh the product search index')
+        finally:
+            _state['refreshing'] = False
+
+
+def get_product_index() -> SearchIndex:
+    """Return the search index, building it on first use and refreshing it in the background"""
+    index = _state['index']
+    if index is None:
+        with _build_lock:
+            index = _state['index']
+            return index if index is not None else rebuild_index()
+
+    refresh_seconds = current_app.config.get('SEARCH_INDEX_REFRESH_SECONDS', 30)
+    with _state_lock:
+        start = not _state['refreshing'] and time.monotonic() - _state['checked_at'] >= refresh_seconds
+        if start:
+            _state['refreshing'] = True
+            _state['checked_at'] = time.monotonic()
+    if start:
+        threading.Thread(
+            target=_refresh, args=(current_app._get_current_object(),), name='search-index-refresh', daemon=True
+        ).start()
+    return index
+
+
+def _apply(product_id, fields):
+    with _state_lock:
+        index = _state['index']
+        if _state['building']:
+            _state['replay'].append((product_id, fields))
+    if index is None:
+        return  # Not built yet; the first search will load it
+    if fields is None:
+        index.remove(product_id)
+    else:
+        index.add(product_id, *fields)
+
+
+def index_product(product):
+    """Add or refresh a product in the search index after a write"""
+    _apply(product.id, (product.name, product.description, product.tags))
+
+
+def unindex_product(product_id):
+    """Remove a deleted product from the search index"""
+    _apply(product_id, None)
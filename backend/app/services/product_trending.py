@@ -0,0 +1,145 @@
+"""
+Trending engine bound to the SQLAlchemy backend
+
+The engine is loaded lazily from favorites, non-flagged reviews and product
+views (aggregated per product and day, limited to TRENDING_LOOKBACK_HALF_LIVES
+half-lives) and then kept current in-process: product views through
+record_product_view(), favorites, reviews and products through session events
+applied after commit. Other workers' events are picked up by reloading every
+TRENDING_REBUILD_SECONDS.
+"""
+
+import calendar
+import threading
+import time
+from datetime import date, datetime, timedelta
+
+from flask import current_app
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from app import db
+from app.models.favorite import Favorite
+from app.models.product import Product
+from app.models.product_view import ProductView
+from app.models.review import Review
+from app.services.trending import TrendingEngine
+
+trending_engine = TrendingEngine()
+
+_state = {'loaded_at': None}
+_build_lock = threading.Lock()
+
+
+def _weights(config):
+    return {
+        'view': config.get('TRENDING_VIEW_WEIGHT', 0.1),
+        'favorite': config.get('TRENDING_FAVORITE_WEIGHT', 2.0),
+        'review': config.get('TRENDING_REVIEW_WEIGHT', 1.5)
+    }
+
+
+def _epoch(value: datetime) -> float:
+    """Epoch seconds of a naive UTC datetime"""
+    return calendar.timegm(value.timetuple()) + value.microsecond / 1e6
+
+
+def _bucket_epoch(bucket) -> float:
+    """Epoch seconds of noon on a day bucket (a date, or an ISO string on SQLite), at most now"""
+    if isinstance(bucket, str):
+        bucket = date.fromisoformat(bucket[:10])
+    return min(_epoch(datetime.combine(bucket, datetime.min.time()) + timedelta(hours=12)), time.time())
+
+
+def _daily_events(model, event_name, cutoff, *criteria):
+    """(product id, event, count, time) per product and day since the cutoff"""
+    day = db.func.date(model.created_at)
+    rows = db.session.query(model.product_id, day, db.func.count()).filter(
+        model.created_at >= cutoff, *criteria
+    ).group_by(model.product_id, day)
+    for product_id, bucket, count in rows:
+        yield product_id, event_name, count, _bucket_epoch(bucket)
+
+
+def rebuild_trending():
+    """Reload the trending engine from the database"""
+    config = current_app.config
+    with _build_lock:
+        half_life = config.get('TRENDING_HALF_LIFE_HOURS', 24) * 3600
+        trending_engine.configure(_weights(config), half_life)
+        trending_engine.max_k = config.get('TRENDING_MAX_K', 100)
+
+        cutoff = datetime.utcnow() - timedelta(seconds=half_life * config.get('TRENDING_LOOKBACK_HALF_LIVES', 10))
+        products = db.session.query(Product.id, Product.category).yield_per(1000)
+        not_flagged = db.or_(Review.is_flagged == db.false(), Review.is_flagged.is_(None))
+
+        def events():
+            yield from _daily_events(Favorite, 'favorite', cutoff)
+            yield from _daily_events(Review, 'review', cutoff, not_flagged)
+            yield from _daily_events(ProductView, 'view', cutoff)
+
+        trending_engine.load(products, events())
+        _state['loaded_at'] = time.monotonic()
+
+
+def get_trending_engine() -> TrendingEngine:
+    """Return the trending engine, loading or reloading it when needed"""
+    rebuild_seconds = current_app.config.get('TRENDING_REBUILD_SECONDS', 300)
+    if _state['loaded_at'] is None or time.monotonic() - _state['loaded_at'] >= rebuild_seconds:
+        rebuild_trending()
+    return trending_engine
+
+
+def record_product_view(product_id):
+    """Count a product view toward trending"""
+    if _state['loaded_at'] is not None:
+        trending_engine.record(product_id, 'view')
+
+
+def _event_time(instance) -> float:
+    return _epoch(instance.created_at or datetime.utcnow())
+
+
+@event.listens_for(Session, 'after_flush')
+def _collect_trending_events(session, flush_context):
+    if _state['loaded_at'] is None:
+        return
+    changes = session.info.setdefault('trending_events', [])
+
+    for instance in session.new:
+        if isinstance(instance, Product):
+            changes.append(('set_product', instance.id, instance.category))
+        elif isinstance(instance, Favorite):
+            changes.append(('record', instance.product_id, 'favorite', 1, _event_time(instance)))
+        elif isinstance(instance, Review) and not instance.is_flagged:
+            changes.append(('record', instance.product_id, 'review', 1, _event_time(instance)))
+
+    for instance in session.deleted:
+        if isinstance(instance, Product):
+            changes.append(('remove_product', instance.id))
+        elif isinstance(instance, Favorite):
+            changes.append(('record', instance.product_id, 'favorite', -1, _event_time(instance)))
+        elif isinstance(instance, Review) and not instance.is_flagged:
+            changes.append(('record', instance.product_id, 'review', -1, _event_time(instance)))
+
+    for instance in session.dirty:
+        if isinstance(instance, Product):
+            history = db.inspect(instance).attrs.category.history
+            if history.has_changes():
+                changes.append(('set_product', instance.id, instance.category))
+        elif isinstance(instance, Review):
+            history = db.inspect(instance).attrs.is_flagged.history
+            if history.has_changes():
+                sign = -1 if instance.is_flagged else 1
+                changes.append(('record', instance.product_id, 'review', sign, _event_time(instance)))
+
+
+@event.listens_for(Session, 'after_commit')
+def _apply_trending_events(session):
+    for change in session.info.pop('trending_events', None) or []:
+        getattr(trending_engine, change[0])(*change[1:])
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_trending_events(session):
+    session.info.pop('trending_events', None)
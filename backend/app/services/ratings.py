@@ -0,0 +1,80 @@
+"""
+Reconciliation of the denormalized product rating aggregates
+
+Review events keep Product.rating_* columns current on every write. This
+module recomputes them from the reviews table with one grouped query, for
+backfilling existing databases or repairing drift after raw SQL edits.
+"""
+
+import click
+from flask.cli import with_appcontext
+
+from app import db
+from app.models.product import Product
+from app.models.review import Review
+
+AGGREGATE_COLUMNS = ['rating_sum', 'rating_count', 'rating_average'] + [f'rating_{star}_count' for star in range(1, 6)]
+
+
+def compute_rating_aggregates():
+    """Aggregate non-flagged reviews per product in a single grouped query"""
+    star_counts = [
+        db.func.sum(db.case((Review.rating == star, 1), else_=0))
+        for star in range(1, 6)
+    ]
+    rows = db.session.query(
+        Review.product_id,
+        db.func.sum(Review.rating),
+        db.func.count(Review.id),
+        *star_counts
+    ).filter(
+        db.or_(Review.is_flagged == db.false(), Review.is_flagged.is_(None))
+    ).group_by(Review.product_id)
+
+    aggregates = {}
+    for product_id, rating_sum, rating_count, *stars in rows:
+        values = {
+            'rating_sum': int(rating_sum or 0),
+            'rating_count': int(rating_count or 0),
+            'rating_average': float(rating_sum) / rating_count if rating_count else 0.0,
+        }
+        values.update({f'rating_{star}_count': int(count or 0) for star, count in zip(range(1, 6), stars)})
+        aggregates[product_id] = values
+    return aggregates
+
+
+def reconcile_rating_aggregates(batch_size=1000):
+    """Rewrite drifted product rating aggregates and return how many products were fixed"""
+    expected = compute_rating_aggregates()
+    empty = {column: 0 for column in AGGREGATE_COLUMNS}
+
+    stored = db.session.query(Product.id, *[getattr(Product, column) for column in AGGREGATE_COLUMNS])
+    updates = []
+    for product_id, *values in stored.yield_per(batch_size):
+        current = dict(zip(AGGREGATE_COLUMNS, values))
+        target = expected.get(product_id, empty)
+        if any(_differs(current[column], target[column]) for column in AGGREGATE_COLUMNS):
+            updates.append({'id': product_id, **target})
+
+    # Bulk UPDATE ... WHERE id = :id executed in batches
+    for start in range(0, len(updates), batch_size):
+        db.session.bulk_update_mappings(Product, updates[start:start + batch_size])
+    db.session.commit()
+
+    return len(updates)
+
+
+def _differs(current, target):
+    if current is None:
+        return True
+    if isinstance(target, float):
+        return abs(float(current) - target) > 1e-9
+    return current != target
+
+
+@click.command('reconcile-ratings')
+@with_appcontext
+def reconcile_ratings_command():
+    """Rebuild product rating aggregates from the reviews table"""
+    fixed = reconcile_rating_aggregates()
+    click.echo(f'Reconciled rating aggregates for {fixed} product(s)')
@@ -0,0 +1,255 @@
+"""
+Item-to-item product recommendations
+
+refresh_recommendations() (flask refresh-recommendations, meant to run from a
+scheduler) builds a sparse user x product matrix of weighted interactions:
+product views within RECOMMENDATION_WINDOW_DAYS (log-damped counts),
+favorites and ordered products, with weights RECOMMENDATION_VIEW_WEIGHT,
+RECOMMENDATION_FAVORITE_WEIGHT and RECOMMENDATION_ORDER_WEIGHT. The cosine
+similarity of the product columns is a sparse matrix product; the top
+RECOMMENDATION_TOP_N neighbors of each product are stored in
+product_similarities, so serving them is a single indexed lookup.
+
+Refreshes are incremental: products with interactions newer than the last
+refresh (minus RECOMMENDATION_REFRESH_OVERLAP seconds for views still queued
+in the ingestor) are dirty, and only the rows of products sharing a user with
+a dirty product are recomputed - the similarities of any other pair cannot
+have changed. Removed favorites and expired views are only seen by a full
+rebuild (--full), which also clears neighbors of products left without
+interactions.
+"""
+
+import time
+from datetime import datetime, timedelta
+from typing import Any, Dict, Optional
+
+import click
+import numpy as np
+from flask import current_app
+from flask.cli import with_appcontext
+from scipy import sparse
+
+from app import db
+from app.services.cache import invalidate
+from app.services.producer_stats import EXCLUDED_ORDER_STATUSES
+
+INSERT_CHUNK = 1000
+
+
+def _setting(name: str, default):
+    return current_app.config.get(name, default)
+
+
+def load_interactions(since: Optional[datetime] = None):
+    """(user id, product id, weight) arrays of every interaction, or only of those newer than 'since'"""
+    from app.models.favorite import Favorite
+    from app.models.order import Order, OrderItem
+    from app.models.product_view import ProductView
+
+    window_start = datetime.utcnow() - timedelta(days=_setting('RECOMMENDATION_WINDOW_DAYS', 180))
+    sources = [
+        (db.select(ProductView.user_id, ProductView.product_id, db.func.count()).where(
+            ProductView.user_id.isnot(None), ProductView.created_at >= max(window_start, since or window_start)
+        ).group_by(ProductView.user_id, ProductView.product_id), 'views'),
+        (db.select(Favorite.user_id, Favorite.product_id, db.func.count()).where(
+            *([Favorite.created_at >= since] if since else [])
+        ).group_by(Favorite.user_id, Favorite.product_id), 'favorites'),
+        (db.select(Order.consumer_id, OrderItem.product_id, db.func.count())
+         .join(Order, Order.id == OrderItem.order_id)
+         .where(Order.status.notin_(EXCLUDED_ORDER_STATUSES), *([OrderItem.created_at >= since] if since else []))
+         .group_by(Order.consumer_id, OrderItem.product_id), 'orders')
+    ]
+    weights = {
+        'views': _setting('RECOMMENDATION_VIEW_WEIGHT', 1.0),
+        'favorites': _setting('RECOMMENDATION_FAVORITE_WEIGHT', 3.0),
+        'orders': _setting('RECOMMENDATION_ORDER_WEIGHT', 5.0)
+    }
+
+    users, products, values = [], [], []
+    for statement, source in sources:
+        rows = db.session.execute(statement).all()
+        if not rows:
+            continue
+        user_ids, product_ids, counts = zip(*rows)
+        counts = np.asarray(counts, dtype=float)
+        # Repeated views add little over the first one; favorites and orders count once per product
+        strength = np.log1p(counts) / np.log(2) if source == 'views' else np.ones(len(counts))
+        users.append(np.asarray(user_ids, dtype=str))
+        products.append(np.asarray(product_ids, dtype=str))
+        values.append(weights[source] * strength)
+    if not users:
+        return np.array([], dtype=str), np.array([], dtype=str), np.array([])
+    return np.concatenate(users), np.concatenate(products), np.concatenate(values)
+
+
+def interaction_matrix(user_ids: np.ndarray, product_ids: np.ndarray, values: np.ndarray):
+    """CSR user x product matrix (duplicates summed) and the sorted product ids of its columns"""
+    users, user_index = np.unique(user_ids, return_inverse=True)
+    products, product_index = np.unique(product_ids, return_inverse=True)
+    matrix = sparse.csr_matrix((values, (user_index, product_index)), shape=(len(users), len(products)))
+    matrix.sum_duplicates()
+    return matrix, products
+
+
+def top_neighbors(matrix, rows: np.ndarray, top_n: int, chunk_size: int = 1000):
+    """(row product, neighbor product, score, rank) arrays of the top_n cosine neighbors of the given columns"""
+    norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=0)).ravel())
+    normalized = (matrix @ sparse.diags(np.divide(1.0, norms, out=np.zeros_like(norms), where=norms > 0))).tocsc()
+
+    sources, neighbors, scores, ranks = [], [], [], []
+    for start in range(0, len(rows), chunk_size):
+        chunk = rows[start:start + chunk_size]
+        similarity = (normalized[:, chunk].T @ normalized).tocoo()
+        source = chunk[similarity.row]
+        keep = (similarity.col != source) & (similarity.data > 0)
+        source, neighbor, score = source[keep], similarity.col[keep], similarity.data[keep]
+
+        # Best first within each product, then the position within the product's run is its rank
+        order = np.lexsort((neighbor, -score, source))
+        source, neighbor, score = source[order], neighbor[order], score[order]
+        rank = np.arange(len(source)) - np.searchsorted(source, source)
+        keep = rank < top_n
+        sources.append(source[keep])
+        neighbors.append(neighbor[keep])
+        scores.append(score[keep])
+        ranks.append(rank[keep] + 1)
+
+    if not sources:
+        return (np.array([], dtype=int),) * 2 + (np.array([]), np.array([], dtype=int))
+    return np.concatenate(sources), np.concatenate(neighbors), np.concatenate(scores), np.concatenate(ranks)
+
+
+def affected_columns(matrix, dirty: np.ndarray) -> np.ndarray:
+    """Columns sharing at least one user with a dirty column (the dirty ones included)"""
+    if len(dirty) == 0:
+        return dirty
+    users = np.flatnonzero(matrix[:, dirty].getnnz(axis=1))
+    return np.unique(matrix[users].indices)
+
+
+def last_refresh() -> Optional[datetime]:
+    from app.models.product_similarity import ProductSimilarity
+
+    return db.session.scalar(db.select(db.func.max(ProductSimilarity.computed_at)))
+
+
+def refresh_recommendations(full: bool = False) -> Dict[str, Any]:
+    """Recompute the neighbors of the products whose similarities may have changed"""
+    from app.models.product_similarity import ProductSimilarity
+
+    started = time.perf_counter()
+    computed_at = datetime.utcnow()
+    table = ProductSimilarity.__table__
+    previous = None if full else last_refresh()
+    full = previous is None
+
+    user_ids, product_ids, values = load_interactions()
+    matrix, products = interaction_matrix(user_ids, product_ids, values)
+
+    if full:
+        rows = np.arange(len(products))
+    else:
+        since = previous - timedelta(seconds=_setting('RECOMMENDATION_REFRESH_OVERLAP', 300))
+        _, changed, _ = load_interactions(since)
+        changed = np.unique(changed)
+        positions = np.minimum(np.searchsorted(products, changed), max(len(products) - 1, 0))
+        dirty = positions[products[positions] == changed] if len(products) else positions[:0]
+        rows = affected_columns(matrix, dirty)
+
+    sources, neighbors, scores, ranks = top_neighbors(
+        matrix, rows, _setting('RECOMMENDATION_TOP_N', 20), _setting('RECOMMENDATION_CHUNK_SIZE', 1000)
+    )
+
+    if full:
+        db.session.execute(table.delete())
+    else:
+        refreshed = products[rows].tolist()
+        for start in range(0, len(refreshed), INSERT_CHUNK):
+            db.session.execute(table.delete().where(table.c.product_id.in_(refreshed[start:start + INSERT_CHUNK])))
+
+    records = [
+        {'product_id': product_id, 'similar_product_id': similar_id, 'rank': rank, 'score': score,
+         'computed_at': computed_at}
+        for product_id, similar_id, rank, score in zip(
+            products[sources].tolist(), products[neighbors].tolist(), ranks.tolist(), scores.tolist()
+        )
+    ]
+    for start in range(0, len(records), INSERT_CHUNK):
+        db.session.execute(table.insert(), records[start:start + INSERT_CHUNK])
+    db.session.commit()
+
+    if len(rows):
+        invalidate('recommendations')
+    return {
+        'mode': 'full' if full else 'incremental',
+        'products': len(products),
+        'refreshed': int(len(rows)),
+        'neighbors': len(records),
+        'seconds': round(time.perf_counter() - started, 3)
+    }
+
+
+def similar_products(product_id: str, limit: int):
+    """Stored neighbors of a product that are still available, most similar first"""
+    from app.models.product import Product
+    from app.models.product_similarity import ProductSimilarity
+
+    return db.session.execute(
+        db.select(Product, ProductSimilarity.score)
+        .join(ProductSimilarity, ProductSimilarity.similar_product_id == Product.id)
+        .where(ProductSimilarity.product_id == product_id, Product.is_available.is_(True))
+        .order_by(ProductSimilarity.rank)
+        .limit(limit)
+    ).all()
+
+
+def user_recommendations(user_id: str, limit: int):
+    """Products most similar to those a user viewed, favorited or ordered, excluding those
+
+    The neighbors of every seed product are summed in one query over
+    product_similarities.
+    """
+    from app.models.favorite import Favorite
+    from app.models.order import Order, OrderItem
+    from app.models.product import Product
+    from app.models.product_similarity import ProductSimilarity
+    from app.models.product_view import ProductView
+
+    window_start = datetime.utcnow() - timedelta(days=_setting('RECOMMENDATION_WINDOW_DAYS', 180))
+    seeds = db.union(
+        db.select(Favorite.product_id).where(Favorite.user_id == user_id),
+        db.select(OrderItem.product_id).join(Order, Order.id == OrderItem.order_id).where(
+            Order.consumer_id == user_id, Order.status.notin_(EXCLUDED_ORDER_STATUSES)
+        ),
+        db.select(ProductView.product_id).where(ProductView.user_id == user_id, ProductView.created_at >= window_start)
+    ).subquery()
+
+    score = db.func.sum(ProductSimilarity.score).label('score')
+    ranked = (
+        db.select(ProductSimilarity.similar_product_id.label('product_id'), score)
+        .where(
+            ProductSimilarity.product_id.in_(db.select(seeds.c.product_id)),
+            ProductSimilarity.similar_product_id.notin_(db.select(seeds.c.product_id))
+        )
+        .group_by(ProductSimilarity.similar_product_id)
+        .subquery()
+    )
+    return db.session.execute(
+        db.select(Product, ranked.c.score)
+        .join(ranked, ranked.c.product_id == Product.id)
+        .where(Product.is_available.is_(True))
+        .order_by(ranked.c.score.desc(), Product.id)
+        .limit(limit)
+    ).all()
+
+
+@click.command('refresh-recommendations')
+@click.option('--full', is_flag=True, help='Recompute every product instead of those with new interactions')
+@with_appcontext
+def refresh_recommendations_command(full):
+    """Refresh the precomputed product neighbors"""
+    result = refresh_recommendations(full=full)
+    click.echo(
+        f"{result['mode']} refresh: {result['refreshed']} of {result['products']} product(s), "
+        f"{result['neighbors']} neighbor(s) in {result['seconds']}s"
+    )
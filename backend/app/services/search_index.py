@@ -0,0 +1,214 @@
+"""
+Inverted-index product search with BM25 ranking
+
+Product names, descriptions and tags are normalized (lowercased, French
+elisions split off, accents and transliteration marks folded) and tokenized
+into an in-memory inverted index. Stop words are matched before accents are
+folded, so 'thé' is not mistaken for 'the'.
+Queries match documents containing every term, the last term also matching as
+a prefix so search-as-you-type works, and results are ranked with BM25.
+"""
+
+import math
+import re
+import threading
+import unicodedata
+from bisect import bisect_left, insort
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# Relative weight of each indexed field in term frequencies
+FIELD_WEIGHTS = {
+    'name': 3.0,
+    'tags': 2.0,
+    'description': 1.0,
+}
+
+# BM25 parameters
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+# Maximum number of vocabulary terms a trailing prefix may expand to
+MAX_PREFIX_EXPANSIONS = 50
+
+STOP_WORDS = frozenset([
+    'a', 'an', 'and', 'for', 'in', 'of', 'the', 'to', 'with',
+    'à', 'au', 'aux', 'de', 'des', 'du', 'en', 'et', 'la', 'le', 'les', 'un', 'une',
+    'al', 'el',
+])
+
+# Apostrophes and ayn/hamza marks used in Arabic transliterations (ma'louf, ʿasal)
+_TRANSLITERATION_MARKS = re.compile(r"['’ʻʼʾʿˈ`]")
+# French elided articles and pronouns (l'huile, d'argan, qu'il); the word after them stays
+_ELISIONS = re.compile(r"\b(?:jusqu|lorsqu|puisqu|qu|[cdjlmnst])['’]")
+_WORD_PATTERN = re.compile(r"(?:[^\W_]|['’ʻʼʾʿˈ`])+")
+_TOKEN_PATTERN = re.compile(r'[a-z0-9]+')
+_FOLDED_LETTERS = str.maketrans({'ß': 'ss', 'æ': 'ae', 'œ': 'oe', 'ø': 'o', 'ł': 'l', 'đ': 'd', 'ı': 'i'})
+
+
+def normalize_text(text: Optional[str]) -> str:
+    """Lowercase text and fold accents and transliteration marks"""
+    if not text:
+        return ''
+    text = _TRANSLITERATION_MARKS.sub('', text.lower()).translate(_FOLDED_LETTERS)
+    decomposed = unicodedata.normalize('NFKD', text)
+    return ''.join(ch for ch in decomposed if not unicodedata.combining(ch))
+
+
+def stem(token: str) -> str:
+    """Strip plural endings so 'carpets' and 'carpet' share a term"""
+    if len(token) > 3 and token.endswith('s') and not token.endswith('ss'):
+        return token[:-1]
+    return token
+
+
+def tokenize(text: Optional[str]) -> List[str]:
+    """Split text into normalized, stemmed terms"""
+    if not text:
+        return []
+    terms = []
+    for word in _WORD_PATTERN.findall(_ELISIONS.sub(' ', text.lower())):
+        # Before folding: 'thé' is a word, 'the' a stop word
+        if word in STOP_WORDS:
+            continue
+        terms.extend(stem(token) for token in _TOKEN_PATTERN.findall(normalize_text(word)))
+    return terms
+
+
+class SearchIndex:
+    """Incrementally updated inverted index over products"""
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        # term -> {doc id: weighted term frequency}
+        self._postings: Dict[str, Dict[object, float]] = {}
+        # doc id -> weighted document length
+        self._doc_lengths: Dict[object, float] = {}
+        # doc id -> terms, used to remove a document without scanning postings
+        self._doc_terms: Dict[object, Tuple[str, ...]] = {}
+        self._total_length = 0.0
+        self._vocabulary: List[str] = []
+
+    def __len__(self):
+        return len(self._doc_lengths)
+
+    def __contains__(self, doc_id):
+        return doc_id in self._doc_lengths
+
+    def clear(self):
+        """Remove every document"""
+        with self._lock:
+            self._postings.clear()
+            self._doc_lengths.clear()
+            self._doc_terms.clear()
+            self._total_length = 0.0
+            self._vocabulary = []
+
+    def add(self, doc_id, name: Optional[str] = None, description: Optional[str] = None,
+            tags: Optional[Iterable[str]] = None):
+        """Index a document, replacing any previous version of it"""
+        fields = {
+            'name': tokenize(name),
+            'description': tokenize(description),
+            'tags': [term for tag in (tags or []) for term in tokenize(tag)],
+        }
+
+        frequencies: Dict[str, float] = {}
+        length = 0.0
+        for field, terms in fields.items():
+            weight = FIELD_WEIGHTS[field]
+            for term in terms:
+                frequencies[term] = frequencies.get(term, 0.0) + weight
+            length += weight * len(terms)
+
+        with self._lock:
+            self._remove_unlocked(doc_id)
+            for term, frequency in frequencies.items():
+                postings = self._postings.get(term)
+                if postings is None:
+                    postings = self._postings[term] = {}
+                    insort(self._vocabulary, term)
+                postings[doc_id] = frequency
+            self._doc_lengths[doc_id] = length
+            self._doc_terms[doc_id] = tuple(frequencies)
+            self._total_length += length
+
+    def add_product(self, product: dict):
+        """Index a product dictionary as returned by to_dict()"""
+        self.add(product['id'], product.get('name'), product.get('description'), product.get('tags'))
+
+    def remove(self, doc_id):
+        """Remove a document from the index"""
+        with self._lock:
+            self._remove_unlocked(doc_id)
+
+    def search(self, query: str, limit: Optional[int] = None) -> List[Tuple[object, float]]:
+        """Return (doc id, score) pairs matching every query term, best first"""
+        terms = tokenize(query)
+        if not terms:
+            return []
+
+        with self._lock:
+            doc_count = len(self._doc_lengths)
+            if not doc_count:
+                return []
+            average_length = self._total_length / doc_count or 1.0
+
+            # Every term must match; the last one may also match as a prefix
+            term_groups = [[term] for term in terms[:-1]]
+            term_groups.append(self._expand_prefix(terms[-1]))
+
+            scores: Optional[Dict[object, float]] = None
+            for group in term_groups:
+                group_scores: Dict[object, float] = {}
+                for term in group:
+                    postings = self._postings.get(term)
+                    if not postings:
+                        continue
+                    idf = math.log(1 + (doc_count - len(postings) + 0.5) / (len(postings) + 0.5))
+                    for doc_id, frequency in postings.items():
+                        if scores is not None and doc_id not in scores:
+                            continue
+                        norm = BM25_K1 * (1 - BM25_B + BM25_B * self._doc_lengths[doc_id] / average_length)
+                        score = idf * frequency * (BM25_K1 + 1) / (frequency + norm)
+                        group_scores[doc_id] = max(group_scores.get(doc_id, 0.0), score)
+
+                if scores is None:
+                    scores = group_scores
+                else:
+                    scores = {doc_id: scores[doc_id] + score for doc_id, score in group_scores.items()}
+                if not scores:
+                    return []
+
+        ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)
+        return ranked[:limit] if limit is not None else ranked
+
+    def _expand_prefix(self, prefix: str) -> List[str]:
+        """Vocabulary terms starting with prefix, exact match first"""
+        expansions = []
+        if prefix in self._postings:
+            expansions.append(prefix)
+        position = bisect_left(self._vocabulary, prefix)
+        while position < len(self._vocabulary) and len(expansions) < MAX_PREFIX_EXPANSIONS:
+            term = self._vocabulary[position]
+            if not term.startswith(prefix):
+                break
+            if term != prefix:
+                expansions.append(term)
+            position += 1
+        return expansions
+
+    def _remove_unlocked(self, doc_id):
+        terms = self._doc_terms.pop(doc_id, None)
+        if terms is None:
+            return
+        for term in terms:
+            postings = self._postings.get(term)
+            if postings is None:
+                continue
+            postings.pop(doc_id, None)
+            if not postings:
+                del self._postings[term]
+                position = bisect_left(self._vocabulary, term)
+                if position < len(self._vocabulary) and self._vocabulary[position] == term:
+                    del self._vocabulary[position]
+        self._total_length -= self._doc_lengths.pop(doc_id, 0.0)
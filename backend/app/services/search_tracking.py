@@ -0,0 +1,332 @@
+"""
+Write-behind buffer for search history
+
+Search-as-you-type clients report a search on nearly every keystroke. Instead
+of writing each one, record() coalesces them in memory per searcher:
+- the same normalized query repeated within SEARCH_HISTORY_WINDOW seconds is
+  one search
+- a query refining the searcher's previous one within the window ('arg' ->
+  'argan') replaces it, so only the settled query is kept
+
+A background worker flushes settled entries every SEARCH_HISTORY_FLUSH_INTERVAL
+seconds with bulk upserts into search_history (one row per user and query,
+with a search_count) and search_query_stats (query frequencies across all
+users), so neither table grows with every search.
+"""
+
+import atexit
+import logging
+import threading
+import time
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional
+
+from flask import current_app
+
+from app.services.search_index import normalize_text
+from app.utils.upsert import dialect_insert
+
+logger = logging.getLogger(__name__)
+
+MAX_QUERY_LENGTH = 255
+
+
+def normalize_query(query: Optional[str]) -> str:
+    """Case-, accent- and whitespace-insensitive form of a search query"""
+    return ' '.join(normalize_text(query).split())[:MAX_QUERY_LENGTH]
+
+
+class SearchHistoryWriter:
+    """Coalescing in-memory buffer flushed in bulk by a background worker"""
+
+    def __init__(self, sink, window: float = 30.0, flush_interval: float = 5.0,
+                 max_pending: int = 10000):
+        self.sink = sink
+        self.window = window
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self._pending: Dict[tuple, dict] = {}
+        self._latest: Dict[Any, tuple] = {}  # Searcher -> key of their most recent query
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._stats = {
+            'recorded': 0,
+            'coalesced': 0,
+            'ignored': 0,
+            'dropped': 0,
+            'written': 0,
+            'failed': 0,
+            'flushes': 0
+        }
+
+    def record(self, query: Optional[str], user_id=None, client_key=None,
+               filters: Optional[dict] = None, results_count: int = 0) -> bool:
+        """Buffer a search; returns False when it was ignored or dropped
+
+        client_key (e.g. the client IP) tells anonymous searchers apart.
+        """
+        normalized = normalize_query(query)
+        if not normalized:
+            with self._lock:
+                self._stats['ignored'] += 1
+            return False
+
+        self._ensure_started()
+        searcher = user_id if user_id is not None else ('anonymous', client_key)
+        key = (searcher, normalized)
+        now = time.monotonic()
+        searched_at = datetime.utcnow()
+
+        with self._lock:
+            self._stats['recorded'] += 1
+            entry = self._pending.get(key)
+            previous_key = self._latest.get(searcher)
+            previous = self._pending.get(previous_key) if previous_key != key else None
+
+            if previous is not None and now - previous['seen'] <= self.window and _refines(normalized, previous['normalized_query']):
+                # Keystroke refinement: drop the intermediate query
+                self._stats['coalesced'] += 1
+                if previous['search_count'] > 1:
+                    previous['search_count'] -= 1
+                else:
+                    del self._pending[previous_key]
+            elif entry is not None and now - entry['seen'] <= self.window:
+                self._stats['coalesced'] += 1
+
+            if entry is None:
+                if len(self._pending) >= self.max_pending:
+                    self._stats['dropped'] += 1
+                    self._wake.set()
+                    return False
+                entry = self._pending[key] = {
+                    'user_id': user_id,
+                    'normalized_query': normalized,
+                    'search_count': 0,
+                    'seen': 0.0
+                }
+
+            if now - entry['seen'] > self.window or entry['search_count'] == 0:
+                entry['search_count'] += 1
+            entry.update({
+                'search_query': query.strip()[:MAX_QUERY_LENGTH],
+                'filters': filters or {},
+                'results_count': results_count or 0,
+                'last_searched_at': searched_at,
+                'seen': now
+            })
+            entry.setdefault('created_at', searched_at)
+            self._latest[searcher] = key
+        return True
+
+    def pending_for(self, user_id) -> List[dict]:
+        """Buffered, not yet written searches of a user, most recent first"""
+        with self._lock:
+            entries = [
+                _public(entry) for (searcher, _), entry in self._pending.items()
+                if searcher == user_id and entry['search_count'] > 0
+            ]
+        return sorted(entries, key=lambda entry: entry['last_searched_at'], reverse=True)
+
+    def flush(self, force: bool = True) -> int:
+        """Write buffered searches (all of them, or only settled ones) and return how many"""
+        with self._flush_lock:
+            entries = self._take(force)
+            if not entries:
+                return 0
+            try:
+                self.sink.write(entries)
+            except Exception:
+                logger.exception('Failed to write %d search history entries', len(entries))
+                with self._lock:
+                    self._stats['failed'] += len(entries)
+                return 0
+
+            with self._lock:
+                self._stats['written'] += len(entries)
+                self._stats['flushes'] += 1
+            return len(entries)
+
+    def stop(self, timeout: float = 5.0):
+        """Stop the worker after writing everything still buffered"""
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        self.flush()
+
+    def stats(self) -> Dict[str, object]:
+        """Buffer size and write counters"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats['pending'] = len(self._pending)
+        stats['max_pending'] = self.max_pending
+        stats['running'] = bool(self._thread and self._thread.is_alive())
+        return stats
+
+    def _take(self, force: bool) -> List[dict]:
+        """Remove and return entries that are settled (or every entry when forced)"""
+        now = time.monotonic()
+        with self._lock:
+            ready = [
+                key for key, entry in self._pending.items()
+                if force or now - entry['seen'] > self.window or len(self._pending) >= self.max_pending
+            ]
+            entries = []
+            for key in ready:
+                entry = self._pending.pop(key)
+                if self._latest.get(key[0]) == key:
+                    del self._latest[key[0]]
+                if entry['search_count'] > 0:
+                    entries.append(_public(entry))
+        return entries
+
+    def _ensure_started(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name='search-history-writer', daemon=True)
+            self._thread.start()
+            atexit.register(self.stop)
+
+    def _run(self):
+        while not self._stop.is_set():
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            self.flush(force=False)
+
+
+def _refines(query: str, previous: str) -> bool:
+    """Whether a query extends or trims the previous one, as when typing"""
+    return query.startswith(previous) or previous.startswith(query)
+
+
+def _public(entry: dict) -> dict:
+    return {key: value for key, value in entry.items() if key != 'seen'}
+
+
+def aggregate_query_stats(entries: List[dict]) -> List[dict]:
+    """Combine buffered searches into one frequency row per normalized query"""
+    stats: Dict[str, dict] = {}
+    for entry in sorted(entries, key=lambda entry: entry['last_searched_at']):
+        stat = stats.setdefault(entry['normalized_query'], {
+            'normalized_query': entry['normalized_query'],
+            'search_count': 0
+        })
+        stat['search_count'] += entry['search_count']
+        stat['search_query'] = entry['search_query']
+        stat['results_count'] = entry['results_count']
+        stat['last_searched_at'] = entry['last_searched_at']
+    return list(stats.values())
+
+
+class DatabaseSearchSink:
+    """Upserts buffered searches into search_history and search_query_stats"""
+
+    def __init__(self, app, on_write: Optional[Callable[[List[dict]], None]] = None):
+        self.app = app
+        self.on_write = on_write
+
+    def write(self, entries: List[dict]):
+        from app import db
+        from app.models.search_history import SearchHistory, SearchQueryStat
+        from app.services.analytics_store import record_search_batch
+
+        history = [entry for entry in entries if entry['user_id'] is not None]
+        with self.app.app_context():
+            connection = db.session.connection()
+            if history:
+                _upsert_counts(
+                    connection, SearchHistory.__table__, ['user_id', 'normalized_query'], history,
+                    replace=['search_query', 'filters', 'results_count', 'last_searched_at']
+                )
+            _upsert_counts(
+                connection, SearchQueryStat.__table__, ['normalized_query'], aggregate_query_stats(entries),
+                replace=['search_query', 'results_count', 'last_searched_at']
+            )
+            record_search_batch(connection, entries)
+            db.session.commit()
+        if self.on_write:
+            self.on_write(entries)
+
+
+def _upsert_counts(connection, table, key_columns: List[str], rows: List[dict], replace: List[str]):
+    """Insert rows or add their search_count to existing ones, in one executemany"""
+    rows = [{column: row[column] for column in row if column in table.c} for row in rows]
+    insert = dialect_insert(connection)
+    if insert is None:
+        for row in rows:
+            condition = [table.c[column] == row[column] for column in key_columns]
+            changes = {column: row[column] for column in replace}
+            result = connection.execute(
+                table.update().where(*condition).values(search_count=table.c.search_count + row['search_count'], **changes)
+            )
+            if result.rowcount == 0:
+                connection.execute(table.insert().values(**row))
+        return
+
+    statement = insert(table)
+    update = {column: statement.excluded[column] for column in replace}
+    update['search_count'] = table.c.search_count + statement.excluded.search_count
+    connection.execute(statement.on_conflict_do_update(index_elements=key_columns, set_=update), rows)
+
+
+class MemorySearchSink:
+    """Writes buffered searches to the development server's in-memory store"""
+
+    def __init__(self, store, on_write: Optional[Callable[[List[dict]], None]] = None):
+        self.store = store
+        self.on_write = on_write
+
+    def write(self, entries: List[dict]):
+        for entry in entries:
+            if entry['user_id'] is None:
+                continue
+            row = {**entry, 'created_at': _isoformat(entry['created_at']), 'last_searched_at': _isoformat(entry['last_searched_at'])}
+            existing = self.store.search_history.get_by('user_query', (entry['user_id'], entry['normalized_query']))
+            if existing:
+                self.store.search_history.update(existing['id'], {
+                    **{key: row[key] for key in ('search_query', 'filters', 'results_count', 'last_searched_at')},
+                    'search_count': existing['search_count'] + entry['search_count']
+                })
+            else:
+                self.store.search_history.insert(row)
+
+        for stat in aggregate_query_stats(entries):
+            stat = {**stat, 'last_searched_at': _isoformat(stat['last_searched_at'])}
+            existing = self.store.search_query_stats.get_by('normalized_query', stat['normalized_query'])
+            if existing:
+                self.store.search_query_stats.update(existing['id'], {
+                    **stat, 'search_count': existing['search_count'] + stat['search_count']
+                })
+            else:
+                self.store.search_query_stats.insert(stat)
+
+        if self.on_write:
+            self.on_write(entries)
+
+
+def _isoformat(value: datetime) -> str:
+    return value.isoformat() + 'Z'
+
+
+def create_search_history_writer(app) -> SearchHistoryWriter:
+    """Build the search history writer described by SEARCH_HISTORY_* configuration"""
+    from app.services.platform_metrics import record_searches
+
+    return SearchHistoryWriter(
+        DatabaseSearchSink(app, on_write=record_searches),
+        window=app.config.get('SEARCH_HISTORY_WINDOW', 30.0),
+        flush_interval=app.config.get('SEARCH_HISTORY_FLUSH_INTERVAL', 5.0),
+        max_pending=app.config.get('SEARCH_HISTORY_MAX_PENDING', 10000)
+    )
+
+
+def get_search_history_writer() -> Optional[SearchHistoryWriter]:
+    """Search history writer of the current app"""
+    return current_app.extensions.get('search_history_writer')
@@ -0,0 +1,409 @@
+"""
+Semantic product search over a local embedding index
+
+Products are embedded (name, category, tags and description) by a pluggable
+local model chosen with EMBEDDING_MODEL:
+- 'hashing' (default): signed feature hashing of stemmed tokens and character
+  trigrams. Deterministic, no download, tolerant of typos and inflections;
+  used by tests and when no model is installed
+- 'sentence-transformers:<model name>': a sentence-transformers model for
+  real semantic similarity (the package must be installed)
+
+The vectors form an inverted-file (IVF) index: k-means centroids partition
+them into lists, and a query is only compared with the vectors of its
+EMBEDDING_NPROBE closest lists. A build is written under EMBEDDING_INDEX_DIR
+(relative to the app's instance folder), in a subdirectory keyed by the
+database URL, as .npy files in a directory of its own and published by
+atomically replacing the CURRENT file; every worker maps the arrays with
+np.load(mmap_mode='r'), so they share the page cache instead of each holding a
+copy, and switch to a new build when CURRENT changes. A build made from
+another database, or from a products table newer than the current one (a
+restored or recreated database), is rebuilt instead of loaded.
+
+Products written since the build are embedded into an in-memory delta
+(refreshed every EMBEDDING_REFRESH_SECONDS from a signature check, like the
+keyword index) and deleted ones are masked; once the delta exceeds
+EMBEDDING_DELTA_MAX products the index is rebuilt. hybrid_search() blends the
+cosine similarity with the BM25 score of the keyword index.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+from functools import lru_cache
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import click
+import numpy as np
+from flask import current_app
+from flask.cli import with_appcontext
+
+from app import db
+from app.models.product import Product
+from app.services.product_search import get_product_index
+from app.services.search_index import tokenize
+
+logger = logging.getLogger(__name__)
+
+ARRAYS = ('vectors', 'ids', 'offsets', 'centroids')
+
+
+class EmbeddingModel:
+    """Maps texts to L2-normalized float32 vectors"""
+
+    name = 'base'
+    dimension = 0
+
+    def encode(self, texts: Sequence[str]) -> np.ndarray:
+        raise NotImplementedError
+
+
+class HashingEmbeddingModel(EmbeddingModel):
+    """Signed feature hashing of stemmed tokens and their character trigrams"""
+
+    def __init__(self, dimension: int = 256):
+        self.dimension = dimension
+        self.name = f'hashing-{dimension}'
+
+    @staticmethod
+    def features(text: str) -> List[str]:
+        features = []
+        for token in tokenize(text):
+            padded = f'#{token}#'
+            features.append(f'w:{token}')
+            features.extend(f'c:{padded[i:i + 3]}' for i in range(len(padded) - 2))
+        return features
+
+    @lru_cache(maxsize=65536)
+    def _slot(self, feature: str) -> Tuple[int, float]:
+        # A stable hash (not hash()) so every process builds the same vectors
+        digest = int.from_bytes(hashlib.blake2b(feature.encode(), digest_size=8).digest(), 'little')
+        return digest % self.dimension, 1.0 if digest >> 63 else -1.0
+
+    def encode(self, texts: Sequence[str]) -> np.ndarray:
+        vectors = np.zeros((len(texts), self.dimension), dtype=np.float32)
+        for row, text in enumerate(texts):
+            slots = [self._slot(feature) for feature in self.features(text)]
+            if slots:
+                columns, signs = zip(*slots)
+                np.add.at(vectors[row], list(columns), signs)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors / np.where(norms > 0, norms, 1)
+
+
+class SentenceTransformerModel(EmbeddingModel):
+    """A sentence-transformers model run locally"""
+
+    def __init__(self, model_name: str):
+        try:
+            from sentence_transformers import SentenceTransformer
+        except ImportError:
+            raise RuntimeError('EMBEDDING_MODEL=sentence-transformers requires the sentence-transformers package')
+        self.model = SentenceTransformer(model_name)
+        self.dimension = self.model.get_sentence_embedding_dimension()
+        self.name = f'sentence-transformers:{model_name}'
+
+    def encode(self, texts: Sequence[str]) -> np.ndarray:
+        return self.model.encode(list(texts), normalize_embeddings=True, convert_to_numpy=True).astype(np.float32)
+
+
+def create_embedding_model(config) -> EmbeddingModel:
+    """Embedding model named by EMBEDDING_MODEL"""
+    name = config.get('EMBEDDING_MODEL', 'hashing')
+    if name == 'hashing':
+        return HashingEmbeddingModel(config.get('EMBEDDING_DIMENSION', 256))
+    if name.startswith('sentence-transformers:'):
+        return SentenceTransformerModel(name.split(':', 1)[1])
+    raise ValueError(f'Unknown EMBEDDING_MODEL: {name}')
+
+
+def product_text(name, category, tags, description) -> str:
+    return ' '.join(part for part in (name, category, ' '.join(tags or []), description) if part)
+
+
+def _signature():
+    """Row count and latest update of the products table"""
+    return tuple(db.session.query(db.func.count(Product.id), db.func.max(Product.updated_at)).one())
+
+
+def _database_key() -> str:
+    """Short stable id of the database the index is built from (password left out)"""
+    url = db.engine.url.render_as_string(hide_password=True)
+    return hashlib.sha256(url.encode()).hexdigest()[:16]
+
+
+def build_ivf(vectors: np.ndarray, ids: np.ndarray, min_list_size: int):
+    """Vectors and ids grouped by k-means list, list offsets and centroids"""
+    # About sqrt(n) lists, but none expected to be smaller than min_list_size
+    lists = max(1, min(int(np.sqrt(len(vectors))), len(vectors) // max(min_list_size, 1)))
+    if lists == 1:
+        centroid = vectors.mean(axis=0, keepdims=True) if len(vectors) else np.zeros((1, vectors.shape[1]), np.float32)
+        return vectors, ids, np.array([0, len(vectors)]), centroid.astype(np.float32)
+
+    from sklearn.cluster import MiniBatchKMeans
+
+    kmeans = MiniBatchKMeans(n_clusters=lists, random_state=0, n_init=3, batch_size=4096).fit(vectors)
+    labels = kmeans.labels_
+    order = np.argsort(labels, kind='stable')
+    offsets = np.concatenate(([0], np.cumsum(np.bincount(labels, minlength=lists))))
+    return vectors[order], ids[order], offsets, kmeans.cluster_centers_.astype(np.float32)
+
+
+class SemanticIndex:
+    """IVF index of product embeddings on memory-mapped arrays, plus an in-memory delta"""
+
+    def __init__(self, config, root: str):
+        self.config = config
+        self.root = root
+        self._directory: Optional[str] = None
+        self._model: Optional[EmbeddingModel] = None
+        self._lock = threading.RLock()
+        self._build_id: Optional[str] = None
+        self._arrays: Dict[str, np.ndarray] = {}
+        self._meta: dict = {}
+        self._delta: Dict[str, np.ndarray] = {}  # Products written since the build
+        self._deleted: set = set()  # Built products deleted or re-embedded since
+        self._state = {'signature': None, 'synced_at': None, 'checked_at': 0.0}
+        self.stats = {'builds': 0, 'loads': 0, 'searches': 0}
+
+    @property
+    def model(self) -> EmbeddingModel:
+        if self._model is None:
+            self._model = create_embedding_model(self.config)
+        return self._model
+
+    @property
+    def directory(self) -> str:
+        """Build directory of the app's database"""
+        if self._directory is None:
+            self._directory = os.path.join(self.root, _database_key())
+        return self._directory
+
+    def _current_path(self) -> str:
+        return os.path.join(self.directory, 'CURRENT')
+
+    def _published_build(self) -> Optional[str]:
+        try:
+            with open(self._current_path()) as f:
+                return f.read().strip() or None
+        except FileNotFoundError:
+            return None
+
+    def build(self) -> dict:
+        """Embed every product and publish a new build; returns its metadata"""
+        with self._lock:
+            signature = _signature()
+            synced_at = datetime.utcnow()
+            batch_size = self.config.get('EMBEDDING_BATCH_SIZE', 256)
+            rows = db.session.execute(
+                db.select(Product.id, Product.name, Product.category, Product.tags, Product.description)
+                .execution_options(yield_per=batch_size)
+            )
+            ids, chunks = [], []
+            for partition in rows.partitions():
+                ids.extend(row[0] for row in partition)
+                chunks.append(self.model.encode([product_text(*row[1:]) for row in partition]))
+            vectors = np.concatenate(chunks) if chunks else np.zeros((0, self.model.dimension), np.float32)
+            vectors, ids, offsets, centroids = build_ivf(
+                vectors, np.asarray(ids, dtype='<U36'), self.config.get('EMBEDDING_MIN_LIST_SIZE', 64)
+            )
+
+            build_id = f"{synced_at.strftime('%Y%m%d%H%M%S')}-{uuid.uuid4().hex[:8]}"
+            path = os.path.join(self.directory, build_id)
+            os.makedirs(path, exist_ok=True)
+            for name, array in zip(ARRAYS, (vectors, ids, offsets, centroids)):
+                np.save(os.path.join(path, f'{name}.npy'), array)
+            meta = {
+                'build_id': build_id, 'database': _database_key(), 'model': self.model.name, 'dimension': self.model.dimension,
+                'count': len(ids), 'lists': len(centroids), 'synced_at': synced_at.isoformat(),
+                'signature': [signature[0], signature[1].isoformat() if signature[1] else None]
+            }
+            with open(os.path.join(path, 'meta.json'), 'w') as f:
+                json.dump(meta, f)
+
+            # Publish atomically, then drop builds older than the previous one
+            temporary = f'{self._current_path()}.{os.getpid()}.tmp'
+            with open(temporary, 'w') as f:
+                f.write(build_id)
+            os.replace(temporary, self._current_path())
+            self._prune(oldest_kept=min(filter(None, (build_id, self._build_id))))
+            self.stats['builds'] += 1
+            self._load(build_id)
+            return meta
+
+    def _prune(self, oldest_kept: str):
+        # Build ids sort by time; newer ones may still be written by another worker
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            if name < oldest_kept and os.path.isdir(path):
+                for file in os.listdir(path):
+                    os.remove(os.path.join(path, file))
+                os.rmdir(path)
+
+    def _load(self, build_id: str):
+        path = os.path.join(self.directory, build_id)
+        with open(os.path.join(path, 'meta.json')) as f:
+            meta = json.load(f)
+        if meta['model'] != self.model.name:
+            raise ValueError(f"Index built with {meta['model']}, configured model is {self.model.name}")
+        if meta.get('database') != _database_key():
+            raise ValueError('Index built from another database')
+        built_until = meta['signature'][1] and datetime.fromisoformat(meta['signature'][1])
+        latest_update = _signature()[1]
+        if built_until and (latest_update is None or latest_update < built_until):
+            raise ValueError('Index built from a newer products table than the current one')
+        self._arrays = {name: np.load(os.path.join(path, f'{name}.npy'), mmap_mode='r') for name in ARRAYS}
+        self._meta = meta
+        self._build_id = build_id
+        self._delta.clear()
+        self._deleted.clear()
+        self._state['synced_at'] = datetime.fromisoformat(meta['synced_at'])
+        self._state['signature'] = None  # Catch up with writes made since the build
+        self._state['checked_at'] = 0.0
+        self.stats['loads'] += 1
+
+    def ensure_current(self):
+        """Load the published build (building one when there is none) and apply recent writes"""
+        with self._lock:
+            published = self._published_build()
+            if published is None:
+                self.build()
+            elif published != self._build_id:
+                try:
+                    self._load(published)
+                except ValueError as error:
+                    logger.warning('%s; rebuilding the semantic index', error)
+                    self.build()
+
+            refresh_seconds = self.config.get('EMBEDDING_REFRESH_SECONDS', 30)
+            if time.monotonic() - self._state['checked_at'] >= refresh_seconds:
+                self._state['checked_at'] = time.monotonic()
+                signature = _signature()
+                if signature != self._state['signature']:
+                    self._sync()
+                    self._state['signature'] = signature
+
+    def _sync(self):
+        """Embed products updated since the last sync and mask deleted ones"""
+        # Overlap covers transactions that committed after our snapshot with an earlier updated_at
+        since = self._state['synced_at'] - timedelta(seconds=self.config.get('EMBEDDING_SYNC_OVERLAP', 5))
+        synced_at = datetime.utcnow()
+        rows = db.session.execute(
+            db.select(Product.id, Product.name, Product.category, Product.tags, Product.description)
+            .where(Product.updated_at >= since)
+        ).all()
+        if rows:
+            vectors = self.model.encode([product_text(*row[1:]) for row in rows])
+            for row, vector in zip(rows, vectors):
+                self._delta[row[0]] = vector
+                self._deleted.add(row[0])
+
+        existing = np.asarray(db.session.scalars(db.select(Product.id)).all(), dtype='<U36')
+        known = np.union1d(np.asarray(self._arrays['ids']), np.asarray(list(self._delta), dtype='<U36'))
+        gone = np.setdiff1d(known, existing).tolist()
+        self._deleted.update(gone)
+        for product_id in gone:
+            self._delta.pop(product_id, None)
+        self._state['synced_at'] = synced_at
+
+        if len(self._deleted) > self.config.get('EMBEDDING_DELTA_MAX', 1000):
+            self.build()
+
+    def search(self, query: str, k: int = 20) -> List[Tuple[str, float]]:
+        """(product id, cosine similarity) pairs of the k nearest products, best first"""
+        if not query or not query.strip():
+            return []
+        self.ensure_current()
+        vector = self.model.encode([query])[0]
+        if not vector.any():
+            return []
+
+        with self._lock:
+            arrays, delta, deleted = self._arrays, dict(self._delta), set(self._deleted)
+        self.stats['searches'] += 1
+
+        # Compare with the vectors of the closest lists only
+        nprobe = min(self.config.get('EMBEDDING_NPROBE', 8), len(arrays['centroids']))
+        probe = np.argpartition(-(arrays['centroids'] @ vector), nprobe - 1)[:nprobe]
+        offsets = arrays['offsets']
+        scores, ids = [], []
+        for list_id in probe:
+            start, end = int(offsets[list_id]), int(offsets[list_id + 1])
+            if end > start:
+                scores.append(arrays['vectors'][start:end] @ vector)
+                ids.append(arrays['ids'][start:end])
+        if delta:
+            scores.append(np.stack(list(delta.values())) @ vector)
+            ids.append(np.asarray(list(delta), dtype='<U36'))
+        if not scores:
+            return []
+        scores, ids = np.concatenate(scores), np.concatenate(ids)
+
+        # Built rows replaced by the delta (or deleted) are skipped; delta rows are kept
+        base_count = len(ids) - len(delta)
+        if deleted:
+            masked = np.isin(ids[:base_count], list(deleted))
+            scores[:base_count][masked] = -np.inf
+        top = np.argsort(-scores, kind='stable')[:k]
+        return [(str(ids[i]), float(scores[i])) for i in top if np.isfinite(scores[i]) and scores[i] > 0]
+
+    def describe(self) -> dict:
+        return {
+            **self.stats,
+            'build_id': self._build_id,
+            'model': self._meta.get('model'),
+            'products': self._meta.get('count', 0),
+            'lists': self._meta.get('lists', 0),
+            'delta': len(self._delta),
+            'masked': len(self._deleted)
+        }
+
+
+def create_semantic_index(app) -> SemanticIndex:
+    """Semantic index storing its builds under the app's instance folder"""
+    return SemanticIndex(app.config, os.path.join(app.instance_path, app.config.get('EMBEDDING_INDEX_DIR', 'embeddings')))
+
+
+def get_semantic_index() -> SemanticIndex:
+    return current_app.extensions['semantic_index']
+
+
+def hybrid_search(query: str, limit: int, mode: str = 'hybrid') -> List[Dict[str, float]]:
+    """Products ranked by a blend of semantic similarity and keyword relevance
+
+    Both lists are fetched with EMBEDDING_CANDIDATES candidates; BM25 scores are
+    scaled by the best one so both signals lie in [0, 1], then combined with
+    SEMANTIC_SEARCH_WEIGHT as the semantic share.
+    """
+    candidates = max(limit, current_app.config.get('EMBEDDING_CANDIDATES', 100))
+    semantic = dict(get_semantic_index().search(query, candidates)) if mode != 'keyword' else {}
+    keyword = dict(get_product_index().search(query, limit=candidates)) if mode != 'semantic' else {}
+    if keyword:
+        best = max(keyword.values()) or 1.0
+        keyword = {product_id: score / best for product_id, score in keyword.items()}
+
+    weight = {'semantic': 1.0, 'keyword': 0.0}.get(mode, current_app.config.get('SEMANTIC_SEARCH_WEIGHT', 0.6))
+    results = [
+        {
+            'id': product_id,
+            'score': weight * semantic.get(product_id, 0.0) + (1 - weight) * keyword.get(product_id, 0.0),
+            'semantic': semantic.get(product_id, 0.0),
+            'keyword': keyword.get(product_id, 0.0)
+        }
+        for product_id in semantic.keys() | keyword.keys()
+    ]
+    results.sort(key=lambda result: (-result['score'], result['id']))
+    return results
+
+
+@click.command('build-embedding-index')
+@with_appcontext
+def build_embedding_index_command():
+    """Embed every product and publish a new semantic search index"""
+    meta = get_semantic_index().build()
+    click.echo(f"Indexed {meta['count']} product(s) in {meta['lists']} list(s) with {meta['model']} ({meta['build_id']})")
@@ -0,0 +1,407 @@
+"""
+Token issuing, refresh rotation and revocation
+
+Access and refresh tokens are JWTs issued through flask_jwt_extended. Every
+token carries a 'fam' claim naming its session: the pair issued at login and
+every pair obtained by refreshing it share one family. Refreshing rotates the
+pair: the presented refresh token is revoked and a new pair of the same
+family is issued. A rotated refresh token that is presented again has been
+copied, so its whole family is revoked. Logout revokes the token it was
+called with and its family.
+
+Verification stays stateless on the common path. Revoked keys ('jti:<jti>'
+and 'family:<id>') are kept exactly in a revocation store (the revoked_tokens
+table, or memory for the development server) and mirrored into an in-memory
+Bloom filter. A token none of whose keys are in the filter is accepted
+without a lookup; only filter hits (revoked tokens, plus about
+TOKEN_BLOOM_ERROR_RATE of the others) are checked against the store. Each
+worker pulls revocations made by other workers every
+TOKEN_REVOCATION_SYNC_SECONDS and rebuilds its filter, dropping expired
+entries, every TOKEN_REVOCATION_REBUILD_SECONDS.
+"""
+
+import hashlib
+import math
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from flask import current_app, g
+from flask_jwt_extended import create_access_token, create_refresh_token
+from flask_jwt_extended.default_callbacks import default_decode_key_callback
+
+from app.utils.metrics import LatencyWindow
+from app.utils.upsert import dialect_insert
+
+# Rows revoked this long before the sync cursor are read again, so a revocation
+# committed after a later one is not skipped
+SYNC_OVERLAP = timedelta(seconds=60)
+
+
+def jti_key(jti: str) -> str:
+    return f'jti:{jti}'
+
+
+def family_key(family: str) -> str:
+    return f'family:{family}'
+
+
+def token_keys(jwt_data: Dict[str, Any]) -> List[str]:
+    """Revocation keys covering a decoded token"""
+    keys = [jti_key(jwt_data['jti'])]
+    if jwt_data.get('fam'):
+        keys.append(family_key(jwt_data['fam']))
+    return keys
+
+
+def expires_at(jwt_data: Dict[str, Any]) -> datetime:
+    """Expiry of a decoded token as a naive UTC datetime"""
+    if 'exp' not in jwt_data:
+        return datetime.utcnow() + timedelta(days=3650)
+    return datetime.fromtimestamp(jwt_data['exp'], tz=timezone.utc).replace(tzinfo=None)
+
+
+class BloomFilter:
+    """Set membership with false positives but no false negatives"""
+
+    def __init__(self, capacity: int = 100000, error_rate: float = 0.001):
+        self.capacity = max(capacity, 1)
+        self.error_rate = error_rate
+        self.size = max(8, math.ceil(-self.capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / self.capacity * math.log(2)))
+        self._bits = bytearray((self.size + 7) // 8)
+        self._count = 0
+        # Setting a bit is a read-modify-write of its byte; concurrent adds must not lose bits
+        self._lock = threading.Lock()
+
+    def _positions(self, key: str):
+        digest = hashlib.blake2b(key.encode(), digest_size=16).digest()
+        first, second = int.from_bytes(digest[:8], 'big'), int.from_bytes(digest[8:], 'big') | 1
+        return [(first + i * second) % self.size for i in range(self.hashes)]
+
+    def add(self, key: str):
+        positions = self._positions(key)
+        with self._lock:
+            for position in positions:
+                self._bits[position >> 3] |= 1 << (position & 7)
+            self._count += 1
+
+    def __contains__(self, key: str) -> bool:
+        bits = self._bits
+        return all(bits[position >> 3] & (1 << (position & 7)) for position in self._positions(key))
+
+    def __len__(self):
+        return self._count
+
+    def stats(self) -> Dict[str, Any]:
+        count = self._count
+        return {
+            'entries': count,
+            'capacity': self.capacity,
+            'bits': self.size,
+            'hashes': self.hashes,
+            'expected_error_rate': (1 - math.exp(-self.hashes * count / self.size)) ** self.hashes
+        }
+
+
+class MemoryRevocationStore:
+    """Exact revocation entries kept in process (single-process development server)"""
+
+    def __init__(self):
+        self._entries: Dict[str, dict] = {}
+        self._log: List[Tuple[int, str]] = []
+        self._sequence = 0
+        self._lock = threading.Lock()
+
+    def add(self, key: str, expires: datetime, reason: str, user_id=None) -> bool:
+        """Record a revocation; False when the key was already revoked"""
+        with self._lock:
+            if key in self._entries:
+                return False
+            self._entries[key] = {'expires_at': expires, 'reason': reason, 'user_id': user_id}
+            self._sequence += 1
+            self._log.append((self._sequence, key))
+            return True
+
+    def revoked(self, keys: Iterable[str]) -> List[str]:
+        """The given keys that are revoked"""
+        with self._lock:
+            return [key for key in keys if key in self._entries]
+
+    def since(self, cursor) -> Tuple[List[str], Any]:
+        """Keys revoked after 'cursor' (None: every key) and the next cursor"""
+        with self._lock:
+            keys = [key for sequence, key in self._log if cursor is None or sequence > cursor]
+            return keys, self._sequence
+
+    def active(self, now: datetime) -> Tuple[List[str], Any]:
+        """Unexpired keys, dropping expired ones, and the cursor to sync from"""
+        with self._lock:
+            for key in [key for key, entry in self._entries.items() if entry['expires_at'] <= now]:
+                del self._entries[key]
+            self._log = [(sequence, key) for sequence, key in self._log if key in self._entries]
+            return list(self._entries), self._sequence
+
+
+class DatabaseRevocationStore:
+    """Exact revocation entries in the revoked_tokens table, shared by all workers"""
+
+    def add(self, key: str, expires: datetime, reason: str, user_id=None) -> bool:
+        """Insert and commit a revocation; False when the key was already revoked"""
+        from sqlalchemy.exc import IntegrityError
+        from app import db
+        from app.models.revoked_token import RevokedToken
+
+        table = RevokedToken.__table__
+        row = {'key': key, 'user_id': user_id, 'reason': reason, 'expires_at': expires,
+               'revoked_at': datetime.utcnow()}
+        connection = db.session.connection()
+        insert = dialect_insert(connection)
+        try:
+            if insert is not None:
+                result = connection.execute(insert(table).values(**row).on_conflict_do_nothing(index_elements=['key']))
+            else:
+                result = connection.execute(table.insert().values(**row))
+            db.session.commit()
+        except IntegrityError:
+            db.session.rollback()
+            return False
+        return result.rowcount == 1
+
+    def revoked(self, keys: Iterable[str]) -> List[str]:
+        from app import db
+        from app.models.revoked_token import RevokedToken
+        from app.services.db_routing import primary_reads
+
+        # A replica may not have a revocation made a moment ago
+        with primary_reads():
+            rows = db.session.query(RevokedToken.key).filter(RevokedToken.key.in_(list(keys))).all()
+        return [key for key, in rows]
+
+    def since(self, cursor) -> Tuple[List[str], Any]:
+        from app import db
+        from app.models.revoked_token import RevokedToken
+
+        query = db.session.query(RevokedToken.key, RevokedToken.revoked_at)
+        if cursor is not None:
+            query = query.filter(RevokedToken.revoked_at > cursor - SYNC_OVERLAP)
+        rows = query.all()
+        latest = max((revoked_at for _, revoked_at in rows), default=cursor)
+        return [key for key, _ in rows], latest
+
+    def active(self, now: datetime) -> Tuple[List[str], Any]:
+        from app import db
+        from app.models.revoked_token import RevokedToken
+
+        db.session.query(RevokedToken).filter(RevokedToken.expires_at <= now).delete(synchronize_session=False)
+        db.session.commit()
+        return self.since(None)
+
+
+class RevocationList:
+    """Bloom filter in front of an exact revocation store"""
+
+    def __init__(self, store, capacity: int = 100000, error_rate: float = 0.001,
+                 sync_interval: float = 5.0, rebuild_interval: float = 3600.0, clock=time.monotonic):
+        self.store = store
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.sync_interval = sync_interval
+        self.rebuild_interval = rebuild_interval
+        self.clock = clock
+        self._filter = BloomFilter(capacity, error_rate)
+        self._cursor = None
+        self._synced_at: Optional[float] = None
+        self._rebuilt_at: Optional[float] = None
+        self._refresh_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._stats = {'checks': 0, 'filter_negatives': 0, 'exact_lookups': 0, 'false_positives': 0,
+                       'revoked': 0, 'revocations': 0, 'syncs': 0, 'rebuilds': 0}
+
+    def revoke(self, key: str, expires: datetime, reason: str, user_id=None) -> bool:
+        """Revoke a key; False when it already was"""
+        added = self.store.add(key, expires, reason, user_id)
+        self._filter.add(key)
+        if added:
+            self._count('revocations')
+        return added
+
+    def revoked(self, keys: List[str]) -> List[str]:
+        """The given keys that are revoked, looking up the store only on filter hits"""
+        self._refresh()
+        candidates = [key for key in keys if key in self._filter]
+        if not candidates:
+            self._count('checks', 'filter_negatives')
+            return []
+
+        revoked = self.store.revoked(candidates)
+        self._count('checks', 'exact_lookups', 'revoked' if revoked else 'false_positives')
+        return revoked
+
+    def sync(self):
+        """Add keys revoked since the last sync (by any worker) to the filter"""
+        keys, self._cursor = self.store.since(self._cursor)
+        for key in keys:
+            self._filter.add(key)
+        self._synced_at = self.clock()
+        self._count('syncs')
+
+    def rebuild(self):
+        """Replace the filter with one holding only unexpired keys"""
+        keys, cursor = self.store.active(datetime.utcnow())
+        bloom = BloomFilter(max(self.capacity, 2 * len(keys)), self.error_rate)
+        for key in keys:
+            bloom.add(key)
+        self._filter, self._cursor = bloom, cursor
+        self._rebuilt_at = self._synced_at = self.clock()
+        self._count('rebuilds')
+        # Keys revoked in this process while the new filter was loading
+        self.sync()
+
+    def _refresh(self):
+        now = self.clock()
+        if (self._rebuilt_at is not None and now - self._rebuilt_at < self.rebuild_interval
+                and now - self._synced_at < self.sync_interval):
+            return
+        # One thread refreshes; the others keep checking against the current filter
+        # (except before the first load, when there is no filter to check against)
+        if not self._refresh_lock.acquire(blocking=self._rebuilt_at is None):
+            return
+        try:
+            now = self.clock()
+            if self._rebuilt_at is None or now - self._rebuilt_at >= self.rebuild_interval:
+                self.rebuild()
+            elif now - self._synced_at >= self.sync_interval:
+                self.sync()
+        finally:
+            self._refresh_lock.release()
+
+    def _count(self, *names: str):
+        with self._stats_lock:
+            for name in names:
+                self._stats[name] += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._stats_lock:
+            stats = dict(self._stats)
+        return {**stats, 'filter': self._filter.stats()}
+
+
+class TokenService:
+    """Issues token pairs, rotates refresh tokens and answers revocation checks"""
+
+    def __init__(self, revocations: RevocationList):
+        self.revocations = revocations
+        self.verify_latency = LatencyWindow()
+        self.revocation_latency = LatencyWindow()
+        self._lock = threading.Lock()
+        self._stats = {'issued': 0, 'rotated': 0, 'reuse_detected': 0, 'logouts': 0}
+
+    def issue(self, identity, claims: Optional[Dict[str, Any]] = None, family: Optional[str] = None) -> Dict[str, str]:
+        """Access and refresh token of a new (or the given) family"""
+        family = family or uuid.uuid4().hex
+        self._count('issued')
+        return {
+            'access_token': create_access_token(identity=identity, additional_claims={**(claims or {}), 'fam': family}),
+            'refresh_token': create_refresh_token(identity=identity, additional_claims={'fam': family})
+        }
+
+    def rotate(self, refresh_data: Dict[str, Any], identity, claims: Optional[Dict[str, Any]] = None) -> Optional[Dict[str, str]]:
+        """Revoke a refresh token and issue the next pair of its family
+
+        Returns None when the token had already been rotated (a concurrent
+        refresh with the same token); its family is then revoked.
+        """
+        if not self.revocations.revoke(jti_key(refresh_data['jti']), expires_at(refresh_data), 'rotated', identity):
+            self._reuse(refresh_data)
+            return None
+        self._count('rotated')
+        return self.issue(identity, claims, family=refresh_data.get('fam'))
+
+    def revoke_session(self, jwt_data: Dict[str, Any], reason: str = 'logout'):
+        """Revoke a token and every token of its family"""
+        user_id = jwt_data.get('sub')
+        self.revocations.revoke(jti_key(jwt_data['jti']), expires_at(jwt_data), reason, user_id)
+        if jwt_data.get('fam'):
+            self.revocations.revoke(family_key(jwt_data['fam']), datetime.utcnow() + _family_lifetime(), reason, user_id)
+        self._count('logouts')
+
+    def is_revoked(self, jwt_data: Dict[str, Any]) -> bool:
+        """Revocation check run on every verified token"""
+        started = time.perf_counter()
+        keys = token_keys(jwt_data)
+        revoked = self.revocations.revoked(keys)
+        if revoked and jwt_data.get('type') == 'refresh' and keys[0] in revoked and len(keys) > 1 and keys[1] not in revoked:
+            # A rotated refresh token used again: it was copied, end the whole session
+            self._reuse(jwt_data)
+
+        finished = time.perf_counter()
+        self.revocation_latency.record(finished - started)
+        decode_started = g.pop('token_verify_started', None)
+        if decode_started is not None:
+            self.verify_latency.record(finished - decode_started)
+        return bool(revoked)
+
+    def _reuse(self, jwt_data: Dict[str, Any]):
+        self._count('reuse_detected')
+        if jwt_data.get('fam'):
+            self.revocations.revoke(family_key(jwt_data['fam']), datetime.utcnow() + _family_lifetime(), 'reuse',
+                                    jwt_data.get('sub'))
+
+    def _count(self, name: str):
+        with self._lock:
+            self._stats[name] += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self._stats)
+        return {
+            **stats,
+            'verification': self.verify_latency.summary(),
+            'revocation_check': self.revocation_latency.summary(),
+            'revocation': self.revocations.stats()
+        }
+
+
+def _lifetime(name: str, default: timedelta) -> timedelta:
+    value = current_app.config.get(name, default)
+    if value is False:
+        return timedelta(days=3650)
+    return value if isinstance(value, timedelta) else timedelta(seconds=value)
+
+
+def _family_lifetime() -> timedelta:
+    """How long a family revocation must be kept: until its last token expires"""
+    return max(_lifetime('JWT_ACCESS_TOKEN_EXPIRES', timedelta(minutes=15)),
+               _lifetime('JWT_REFRESH_TOKEN_EXPIRES', timedelta(days=30)))
+
+
+def create_token_service(config, store=None) -> TokenService:
+    """Build the token service described by TOKEN_* configuration"""
+    return TokenService(RevocationList(
+        store if store is not None else DatabaseRevocationStore(),
+        capacity=config.get('TOKEN_BLOOM_CAPACITY', 100000),
+        error_rate=config.get('TOKEN_BLOOM_ERROR_RATE', 0.001),
+        sync_interval=config.get('TOKEN_REVOCATION_SYNC_SECONDS', 5),
+        rebuild_interval=config.get('TOKEN_REVOCATION_REBUILD_SECONDS', 3600)
+    ))
+
+
+def get_token_service() -> TokenService:
+    """Token service of the current app"""
+    return current_app.extensions['token_service']
+
+
+def register_token_callbacks(jwt_manager):
+    """Route flask_jwt_extended's revocation check through the token service"""
+
+    @jwt_manager.decode_key_loader
+    def _start_verification(jwt_header, jwt_data):
+        g.token_verify_started = time.perf_counter()
+        return default_decode_key_callback(jwt_header, jwt_data)
+
+    @jwt_manager.token_in_blocklist_loader
+    def _token_revoked(jwt_header, jwt_data):
+        return get_token_service().is_revoked(jwt_data)
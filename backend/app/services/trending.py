@@ -0,0 +1,215 @@
+"""
+Incremental trending scores with exponential time decay
+
+Every view, favorite or review adds its weight to the product's score, decayed
+with a configurable half-life. Scores use forward decay: an event at time t is
+stored as weight * e^(λ·(t - landmark)), so older events never need to be
+revisited and the ranking of stored scores is the ranking of decayed scores
+at any instant. The current value is the stored score times e^(-λ·(now -
+landmark)); the landmark is moved forward before the exponent can overflow.
+
+Each category (and the catalog as a whole) keeps its top max_k products in a
+min-heap, so an event costs O(log K) and a top-k read costs O(K). Score
+decreases (a removed favorite or review) may let an outsider overtake a
+member, so they mark the category for a rebuild on its next read.
+"""
+
+import heapq
+import math
+import threading
+import time
+from collections import defaultdict
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+DEFAULT_WEIGHTS = {'view': 0.1, 'favorite': 2.0, 'review': 1.5}
+
+ALL_CATEGORIES = None  # Heap key of the catalog-wide ranking
+
+# Rebase the landmark once stored scores have grown by e^REBASE_EXPONENT
+REBASE_EXPONENT = 50.0
+
+
+class TrendingEngine:
+    """Decayed per-product scores with a top-K heap per category"""
+
+    def __init__(self, weights: Optional[Dict[str, float]] = None, half_life_seconds: float = 86400.0,
+                 max_k: int = 100, clock: Callable[[], float] = time.time):
+        self.max_k = max_k
+        self.clock = clock
+        self._lock = threading.RLock()
+        self.configure(weights or DEFAULT_WEIGHTS, half_life_seconds)
+        self.clear()
+
+    def configure(self, weights: Dict[str, float], half_life_seconds: float):
+        """Change the event weights and half-life (applies to future events)"""
+        with self._lock:
+            self.weights = dict(weights)
+            self.half_life_seconds = half_life_seconds
+            self.decay_rate = math.log(2) / half_life_seconds
+
+    def clear(self):
+        """Forget every product and score"""
+        with self._lock:
+            self._landmark = self.clock()
+            self._scores: Dict[Any, float] = {}
+            self._categories: Dict[Any, Optional[str]] = {}
+            self._products_by_category: Dict[Optional[str], set] = defaultdict(set)
+            self._members: Dict[Optional[str], Dict[Any, float]] = defaultdict(dict)
+            self._heaps: Dict[Optional[str], List[Tuple[float, Any]]] = defaultdict(list)
+            self._dirty: set = set()
+
+    def set_product(self, product_id, category: Optional[str]):
+        """Register a product or move it to another category"""
+        with self._lock:
+            if product_id in self._categories:
+                previous = self._categories[product_id]
+                if previous == category:
+                    return
+                self._leave(previous, product_id)
+            self._categories[product_id] = category
+            self._products_by_category[category].add(product_id)
+            score = self._scores.get(product_id, 0.0)
+            if score > 0:
+                self._offer(category, product_id, score)
+
+    def remove_product(self, product_id):
+        """Drop a deleted product from every ranking"""
+        with self._lock:
+            if product_id in self._categories:
+                self._leave(self._categories.pop(product_id), product_id)
+            self._leave(ALL_CATEGORIES, product_id)
+            self._scores.pop(product_id, None)
+
+    def record(self, product_id, event: str, count: float = 1, at: Optional[float] = None) -> bool:
+        """Apply count occurrences (negative to retract) of an event at epoch time 'at'"""
+        weight = self.weights.get(event, 0.0)
+        if not weight or not count:
+            return False
+
+        with self._lock:
+            at = self.clock() if at is None else at
+            self._maybe_rebase(at)
+            delta = weight * count * math.exp(self.decay_rate * (at - self._landmark))
+            score = max(self._scores.get(product_id, 0.0) + delta, 0.0)
+            self._scores[product_id] = score
+
+            categories = [ALL_CATEGORIES]
+            if self._categories.get(product_id) is not None:
+                categories.append(self._categories[product_id])
+            for category in categories:
+                if delta > 0:
+                    self._offer(category, product_id, score)
+                elif product_id in self._members[category]:
+                    self._dirty.add(category)
+            return True
+
+    def score(self, product_id) -> float:
+        """Current decayed score of a product"""
+        with self._lock:
+            return self._scores.get(product_id, 0.0) * self._decay_factor()
+
+    def top(self, k: int = 10, category: Optional[str] = ALL_CATEGORIES) -> List[Tuple[Any, float]]:
+        """Top k (product id, current score) pairs of a category, best first"""
+        with self._lock:
+            if category in self._dirty:
+                self._rebuild_heap(category)
+            factor = self._decay_factor()
+            members = self._members.get(category, {})
+            ranked = sorted(members.items(), key=lambda item: (-item[1], str(item[0])))
+            return [(product_id, score * factor) for product_id, score in ranked[:min(k, self.max_k)]]
+
+    def load(self, products: Iterable[Tuple[Any, Optional[str]]],
+             events: Iterable[Tuple[Any, str, float, float]]):
+        """Replace all state from (product id, category) pairs and (product id, event, count, at) events
+
+        An event time of None means now.
+        """
+        with self._lock:
+            self.clear()
+            now = self.clock()
+            for product_id, category in products:
+                self._categories[product_id] = category
+                self._products_by_category[category].add(product_id)
+
+            for product_id, event, count, at in events:
+                weight = self.weights.get(event, 0.0)
+                if weight and product_id in self._categories:
+                    at = now if at is None else at
+                    self._maybe_rebase(at)
+                    delta = weight * count * math.exp(self.decay_rate * (at - self._landmark))
+                    self._scores[product_id] = max(self._scores.get(product_id, 0.0) + delta, 0.0)
+
+            self._rebuild_heap(ALL_CATEGORIES)
+            for category in list(self._products_by_category):
+                self._rebuild_heap(category)
+
+    def stats(self) -> Dict[str, Any]:
+        """Sizes of the tracked state"""
+        with self._lock:
+            return {
+                'products': len(self._scores),
+                'categories': len([category for category in self._products_by_category if category is not None]),
+                'max_k': self.max_k,
+                'half_life_seconds': self.half_life_seconds,
+                'weights': dict(self.weights)
+            }
+
+    def _decay_factor(self) -> float:
+        return math.exp(-self.decay_rate * (self.clock() - self._landmark))
+
+    def _maybe_rebase(self, at: float):
+        """Move the landmark forward before forward-decayed scores overflow"""
+        if self.decay_rate * (at - self._landmark) < REBASE_EXPONENT:
+            return
+        factor = math.exp(-self.decay_rate * (at - self._landmark))
+        self._landmark = at
+        self._scores = {product_id: score * factor for product_id, score in self._scores.items()}
+        for category, members in self._members.items():
+            self._members[category] = {product_id: score * factor for product_id, score in members.items()}
+            self._heaps[category] = [(score, product_id) for product_id, score in self._members[category].items()]
+            heapq.heapify(self._heaps[category])
+
+    def _offer(self, category, product_id, score: float):
+        """Insert or raise a product in a category's top-K heap"""
+        members = self._members[category]
+        heap = self._heaps[category]
+
+        if product_id not in members and len(members) >= self.max_k:
+            lowest_score, lowest_id = self._peek_lowest(category)
+            if score <= lowest_score:
+                return
+            heapq.heappop(heap)
+            del members[lowest_id]
+
+        # The previous heap entry of a member becomes stale and is skipped lazily
+        members[product_id] = score
+        heapq.heappush(heap, (score, product_id))
+        if len(heap) > 4 * self.max_k:
+            self._heaps[category] = [(member_score, member_id) for member_id, member_score in members.items()]
+            heapq.heapify(self._heaps[category])
+
+    def _peek_lowest(self, category) -> Tuple[float, Any]:
+        """Lowest live entry of a category's heap"""
+        members = self._members[category]
+        heap = self._heaps[category]
+        while heap and members.get(heap[0][1]) != heap[0][0]:
+            heapq.heappop(heap)
+        return heap[0]
+
+    def _leave(self, category, product_id):
+        self._products_by_category[category].discard(product_id)
+        if self._members[category].pop(product_id, None) is not None:
+            self._dirty.add(category)  # A free slot may now belong to an outsider
+
+    def _rebuild_heap(self, category):
+        """Recompute a category's top-K from the scores of all its products"""
+        if category is ALL_CATEGORIES:
+            candidates = self._scores.items()
+        else:
+            candidates = ((product_id, self._scores.get(product_id, 0.0)) for product_id in self._products_by_category[category])
+        best = heapq.nlargest(self.max_k, ((score, product_id) for product_id, score in candidates if score > 0),
+                              key=lambda entry: entry[0])
+        self._members[category] = {product_id: score for score, product_id in best}
+        self._heaps[category] = list(best)
+        heapq.heapify(self._heaps[category])
+        self._dirty.discard(category)
@@ -0,0 +1,143 @@
+"""
+Authenticated user resolution
+
+Protected endpoints used to load the caller's row several times per request
+(role decorator, then the view). resolve_current_user() loads it at most once
+per request, keeping it on flask.g, from a process-wide cache of user
+snapshots that expire after USER_CACHE_TTL seconds. Commits that change or
+delete a user invalidate that user's entry in this process; other workers see
+the change within the TTL.
+
+Authorization reads the role and active flag from the snapshot, not from the
+access token's 'role' claim (token_claims()), so demoting or deactivating a
+user takes effect within USER_CACHE_TTL instead of when their access token
+expires. The claim only tells clients the role the token was issued for.
+"""
+
+import threading
+from dataclasses import dataclass, field
+from typing import Any, Dict, Optional
+
+from flask import current_app, g
+from flask_jwt_extended import get_jwt_identity
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from app import db
+from app.models.user import User
+from app.services.cache import LRUCache
+
+_MISSING = object()
+
+
+@dataclass(frozen=True)
+class UserSnapshot:
+    """Read-only copy of the fields authorization and profile responses need"""
+    id: str
+    role: str
+    is_active: bool
+    data: Dict[str, Any] = field(compare=False)
+
+    @classmethod
+    def from_user(cls, user: User) -> 'UserSnapshot':
+        return cls(id=user.id, role=user.role, is_active=bool(user.is_active), data=user.to_dict())
+
+    def is_producer(self):
+        return self.role == 'producer'
+
+    def is_consumer(self):
+        return self.role == 'consumer'
+
+    def is_admin(self):
+        return self.role == 'admin'
+
+    def to_dict(self):
+        return dict(self.data)
+
+
+class UserCache:
+    """TTL cache of user snapshots by id, with hit/miss counters"""
+
+    def __init__(self, max_entries: int = 10000):
+        self._entries = LRUCache(max_entries=max_entries)
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'misses': 0, 'invalidations': 0}
+
+    def get(self, user_id, ttl: int) -> Optional[UserSnapshot]:
+        """Snapshot of a user, loading it from the database on a miss"""
+        if user_id is None:
+            return None
+        snapshot = self._entries.get(str(user_id)) if ttl else None
+        if snapshot is not None:
+            self._count('hits')
+            return snapshot
+
+        self._count('misses')
+        user = db.session.get(User, user_id)
+        if user is None:
+            return None
+        snapshot = UserSnapshot.from_user(user)
+        if ttl:
+            self._entries.set(str(user_id), snapshot, ttl=ttl)
+        return snapshot
+
+    def invalidate(self, user_id):
+        self._entries.delete(str(user_id))
+        self._count('invalidations')
+
+    def clear(self):
+        self._entries.clear()
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {**self._stats, 'entries': len(self._entries)}
+
+    def _count(self, name: str):
+        with self._lock:
+            self._stats[name] += 1
+
+
+user_cache = UserCache()
+
+
+def load_user(user_id) -> Optional[UserSnapshot]:
+    """Snapshot of any user through the process-wide cache"""
+    return user_cache.get(user_id, current_app.config.get('USER_CACHE_TTL', 30))
+
+
+def resolve_current_user() -> Optional[UserSnapshot]:
+    """Snapshot of the authenticated user, resolved once per request (requires a verified JWT)"""
+    snapshot = g.get('current_user', _MISSING)
+    if snapshot is _MISSING:
+        snapshot = load_user(get_jwt_identity())
+        g.current_user = snapshot
+    return snapshot
+
+
+def current_role() -> Optional[str]:
+    """Role of the authenticated user, or None when the user is gone or deactivated"""
+    snapshot = resolve_current_user()
+    return snapshot.role if snapshot and snapshot.is_active else None
+
+
+def token_claims(user) -> Dict[str, Any]:
+    """Additional access token claims of a user"""
+    return {'role': user.role}
+
+
+@event.listens_for(Session, 'after_flush')
+def _collect_user_invalidations(session, flush_context):
+    changed = [instance.id for instance in list(session.dirty) + list(session.deleted) if isinstance(instance, User)]
+    if changed:
+        session.info.setdefault('user_cache_invalidations', set()).update(changed)
+
+
+@event.listens_for(Session, 'after_commit')
+def _apply_user_invalidations(session):
+    for user_id in session.info.pop('user_cache_invalidations', None) or ():
+        user_cache.invalidate(user_id)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_user_invalidations(session):
+    session.info.pop('user_cache_invalidations', None)
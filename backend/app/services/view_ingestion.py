@@ -0,0 +1,305 @@
+"""
+Asynchronous, batched ingestion of product views
+
+The product detail endpoint only enqueues a view into a bounded in-process
+queue. A background flusher thread drains it and writes rows in bulk
+(executemany) when either VIEW_BATCH_SIZE rows are waiting or
+VIEW_FLUSH_INTERVAL seconds have passed, and periodically rolls the per-product
+view totals into product_view_counts. When the queue is full the view is
+dropped and counted instead of blocking the request.
+"""
+
+import atexit
+import logging
+import queue
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+from functools import wraps
+from typing import Callable, Dict, List, Optional
+
+from flask import current_app, request
+
+from app.utils.upsert import dialect_insert
+
+logger = logging.getLogger(__name__)
+
+
+class ViewIngestor:
+    """Bounded queue plus background bulk writer for product views"""
+
+    def __init__(self, sink, max_queue: int = 10000, batch_size: int = 500,
+                 flush_interval: float = 1.0, rollup_interval: float = 30.0,
+                 enqueue_timeout: float = 0.0):
+        self.sink = sink
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.rollup_interval = rollup_interval
+        self.enqueue_timeout = enqueue_timeout
+        self._queue: 'queue.Queue[dict]' = queue.Queue(maxsize=max_queue)
+        self._pending_counts: Counter = Counter()
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self._last_rollup = time.monotonic()
+        self._stats = {
+            'enqueued': 0,
+            'dropped': 0,
+            'written': 0,
+            'failed': 0,
+            'batches': 0,
+            'rollups': 0,
+            'last_batch_size': 0,
+            'last_flush_seconds': 0.0
+        }
+
+    def record(self, product_id, user_id=None, ip_address: Optional[str] = None,
+               user_agent: Optional[str] = None) -> bool:
+        """Enqueue a view without blocking; returns False when it had to be dropped"""
+        self._ensure_started()
+        row = {
+            'product_id': product_id,
+            'user_id': user_id,
+            'ip_address': ip_address,
+            'user_agent': user_agent,
+            'created_at': datetime.utcnow()
+        }
+        try:
+            if self.enqueue_timeout:
+                self._queue.put(row, timeout=self.enqueue_timeout)
+            else:
+                self._queue.put_nowait(row)
+        except queue.Full:
+            with self._lock:
+                self._stats['dropped'] += 1
+            return False
+
+        with self._lock:
+            self._stats['enqueued'] += 1
+        return True
+
+    def flush(self, rollup: bool = True):
+        """Synchronously write everything queued so far (used on shutdown and in scripts)"""
+        while self._drain_once(block=False):
+            pass
+        if rollup:
+            self._rollup()
+
+    def stop(self, timeout: float = 5.0):
+        """Stop the flusher thread after writing the remaining views"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        self.flush()
+
+    def stats(self) -> Dict[str, object]:
+        """Queue depth and ingestion counters"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats['pending_rollup_products'] = len(self._pending_counts)
+        stats['queue_depth'] = self._queue.qsize()
+        stats['queue_capacity'] = self._queue.maxsize
+        stats['running'] = bool(self._thread and self._thread.is_alive())
+        return stats
+
+    def _ensure_started(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name='view-ingestor', daemon=True)
+            self._thread.start()
+            atexit.register(self.stop)
+
+    def _run(self):
+        while not self._stop.is_set():
+            self._drain_once(block=True)
+            if time.monotonic() - self._last_rollup >= self.rollup_interval:
+                self._rollup()
+
+    def _drain_once(self, block: bool) -> bool:
+        """Collect up to batch_size views (waiting at most flush_interval) and write them"""
+        # Held while collecting too, so flush() also waits for a batch already dequeued
+        with self._flush_lock:
+            batch: List[dict] = []
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                try:
+                    if block:
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0:
+                            break
+                        batch.append(self._queue.get(timeout=remaining))
+                    else:
+                        batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            if not batch:
+                return False
+
+            started = time.monotonic()
+            try:
+                self.sink.write_batch(batch)
+            except Exception:
+                logger.exception('Failed to write %d product views', len(batch))
+                with self._lock:
+                    self._stats['failed'] += len(batch)
+                return True
+
+            with self._lock:
+                self._stats['written'] += len(batch)
+                self._stats['batches'] += 1
+                self._stats['last_batch_size'] = len(batch)
+                self._stats['last_flush_seconds'] = round(time.monotonic() - started, 6)
+                self._pending_counts.update(row['product_id'] for row in batch)
+        return True
+
+    def _rollup(self):
+        """Add the views written since the last rollup to the per-product counters"""
+        with self._lock:
+            counts = self._pending_counts
+            self._pending_counts = Counter()
+            self._last_rollup = time.monotonic()
+        if not counts:
+            return
+
+        try:
+            self.sink.rollup(dict(counts))
+        except Exception:
+            logger.exception('Failed to roll up views for %d products', len(counts))
+            with self._lock:
+                self._pending_counts.update(counts)  # Retried on the next rollup
+            return
+
+        with self._lock:
+            self._stats['rollups'] += 1
+
+
+class DatabaseViewSink:
+    """Writes product views to the SQLAlchemy database in bulk"""
+
+    def __init__(self, app):
+        self.app = app
+
+    def write_batch(self, rows: List[dict]):
+        """Insert a batch of product_views rows with one executemany"""
+        from app import db
+        from app.models.product_view import ProductView
+        from app.services import analytics_store, geo, producer_stats
+
+        with self.app.app_context():
+            db.session.execute(ProductView.__table__.insert(), rows)
+            connection = db.session.connection()
+            # Same table order as the counter buffer's flushes
+            analytics_store.record_view_batch(connection, rows)
+            geo.record_view_batch(connection, rows)
+            producer_stats.record_view_batch(connection, rows)
+            db.session.commit()
+
+    def rollup(self, counts: Dict[object, int]):
+        """Add view totals to product_view_counts in one executemany upsert"""
+        from app import db
+        from app.models.product_view import ProductViewCount
+
+        now = datetime.utcnow()
+        rows = [
+            {'product_id': product_id, 'view_count': views, 'updated_at': now}
+            for product_id, views in counts.items()
+        ]
+        with self.app.app_context():
+            connection = db.session.connection()
+            _upsert_view_counts(connection, ProductViewCount.__table__, rows)
+            db.session.commit()
+
+
+def _upsert_view_counts(connection, table, rows: List[dict]):
+    """Increment view counters, creating the rows of first-time products"""
+    insert = dialect_insert(connection)
+    if insert is None:
+        for row in rows:
+            result = connection.execute(
+                table.update().where(table.c.product_id == row['product_id']).values(
+                    view_count=table.c.view_count + row['view_count'], updated_at=row['updated_at']
+                )
+            )
+            if result.rowcount == 0:
+                connection.execute(table.insert().values(**row))
+        return
+
+    statement = insert(table)
+    connection.execute(statement.on_conflict_do_update(
+        index_elements=[table.c.product_id],
+        set_={
+            'view_count': table.c.view_count + statement.excluded.view_count,
+            'updated_at': statement.excluded.updated_at
+        }
+    ), rows)
+
+
+class MemoryViewSink:
+    """Writes product views to the development server's in-memory store"""
+
+    def __init__(self, store):
+        self.store = store
+
+    def write_batch(self, rows: List[dict]):
+        """Append a batch of views to the product_views table"""
+        for row in rows:
+            self.store.product_views.insert({**row, 'created_at': row['created_at'].isoformat() + 'Z'})
+
+    def rollup(self, counts: Dict[object, int]):
+        """Add view totals to each product's 'views' counter"""
+        for product_id, views in counts.items():
+            product = self.store.products.get(product_id)
+            if product:
+                self.store.products.update(product_id, {'views': product.get('views', 0) + views})
+
+
+def create_view_ingestor(app) -> ViewIngestor:
+    """Build the view ingestor described by VIEW_* configuration"""
+    return ViewIngestor(
+        DatabaseViewSink(app),
+        max_queue=app.config.get('VIEW_QUEUE_MAX', 10000),
+        batch_size=app.config.get('VIEW_BATCH_SIZE', 500),
+        flush_interval=app.config.get('VIEW_FLUSH_INTERVAL', 1.0),
+        rollup_interval=app.config.get('VIEW_ROLLUP_INTERVAL', 30.0)
+    )
+
+
+def get_view_ingestor() -> Optional[ViewIngestor]:
+    """View ingestor of the current app, if view tracking is enabled"""
+    return current_app.extensions.get('view_ingestor')
+
+
+def track_product_view(get_user_id: Optional[Callable[[], object]] = None,
+                       on_view: Optional[Callable[[object], None]] = None):
+    """Decorator enqueueing a view whenever a product detail is served (200 or 304)
+
+    on_view is also called with the product id, for in-process consumers such
+    as the trending engine.
+    """
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            response = current_app.make_response(f(*args, **kwargs))
+            if response.status_code not in (200, 304):
+                return response
+
+            ingestor = get_view_ingestor()
+            if ingestor is not None:
+                ingestor.record(
+                    kwargs.get('product_id'),
+                    user_id=get_user_id() if get_user_id else None,
+                    ip_address=request.remote_addr,
+                    user_agent=request.user_agent.string or None
+                )
+            if on_view is not None:
+                on_view(kwargs.get('product_id'))
+            return response
+        return decorated_function
+    return decorator
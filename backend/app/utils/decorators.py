@@ -1,7 +1,7 @@
 from functools import wraps
 from flask import request, jsonify
-from flask_jwt_extended import jwt_required, get_jwt_identity
-from app.models.user import User
+from flask_jwt_extended import jwt_required, get_jwt_identity, verify_jwt_in_request
+from app.services.user_cache import resolve_current_user
 
 def validate_json(required_fields):
     """Decorator to validate JSON request data"""
@@ -29,12 +29,15 @@ def require_role(roles):
         @wraps(f)
         @jwt_required()
         def decorated_function(*args, **kwargs):
-            current_user_id = get_jwt_identity()
-            user = User.query.get(current_user_id)
+            # Checked against the cached user, not the token's role claim, so role changes apply before the token expires
+            user = resolve_current_user()
             
-            if not user:
+            if user is None:
                 return jsonify({'error': 'User not found'}), 404
             
+            if not user.is_active:
+                return jsonify({'error': 'Account is deactivated'}), 401
+            
             if user.role not in roles:
                 return jsonify({'error': 'Insufficient permissions'}), 403
             
@@ -65,3 +68,11 @@ def handle_errors(f):
         except Exception as e:
             return jsonify({'error': 'Internal server error'}), 500
     return decorated_function
+
+def optional_jwt_identity():
+    """Identity of a valid bearer token, or None for anonymous requests"""
+    try:
+        verify_jwt_in_request(optional=True)
+        return get_jwt_identity()
+    except Exception:
+        return None
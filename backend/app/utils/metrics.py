@@ -0,0 +1,36 @@
+import threading
+from collections import deque
+from typing import Any, Dict
+
+
+class LatencyWindow:
+    """Percentiles over the most recent samples"""
+
+    def __init__(self, size: int = 2048):
+        self._samples = deque(maxlen=size)
+        self._count = 0
+        self._lock = threading.Lock()
+
+    def record(self, seconds: float):
+        with self._lock:
+            self._samples.append(seconds)
+            self._count += 1
+
+    def summary(self) -> Dict[str, Any]:
+        with self._lock:
+            samples = sorted(self._samples)
+            count = self._count
+        if not samples:
+            return {'count': count}
+
+        def percentile(p):
+            return round(samples[min(len(samples) - 1, int(p * len(samples)))] * 1000, 4)
+
+        return {
+            'count': count,
+            'mean_ms': round(sum(samples) / len(samples) * 1000, 4),
+            'p50_ms': percentile(0.50),
+            'p95_ms': percentile(0.95),
+            'p99_ms': percentile(0.99),
+            'max_ms': round(samples[-1] * 1000, 4)
+        }
@@ -0,0 +1,101 @@
+import base64
+import json
+from datetime import datetime
+from decimal import Decimal
+from typing import Any, Optional, Tuple
+
+from app import db
+
+# Cursor sort name -> (sort column, descending)
+CURSOR_SORTS = {
+    'newest': ('created_at', True),
+    'oldest': ('created_at', False),
+    'price_asc': ('price', False),
+    'price_desc': ('price', True),
+    'top_rated': ('rating_average', True),
+}
+
+DEFAULT_CURSOR_SORT = 'newest'
+DEFAULT_CURSOR_LIMIT = 20
+MAX_CURSOR_LIMIT = 100
+
+
+def is_cursor_request(args) -> bool:
+    """Check whether the client opted into cursor pagination"""
+    return 'cursor' in args or 'limit' in args
+
+
+def get_cursor_params(args) -> Tuple[str, Optional[str], int]:
+    """Read sort, cursor and limit query parameters"""
+    sort = args.get('sort') or DEFAULT_CURSOR_SORT
+    if sort not in CURSOR_SORTS:
+        raise ValueError(f'Invalid sort for cursor pagination. Must be one of: {", ".join(CURSOR_SORTS)}')
+
+    limit = args.get('limit', DEFAULT_CURSOR_LIMIT, type=int)
+    if limit is None or limit < 1:
+        raise ValueError('Limit must be a positive integer')
+
+    return sort, args.get('cursor') or None, min(limit, MAX_CURSOR_LIMIT)
+
+
+def encode_cursor(sort: str, value: Any, row_id: Any) -> str:
+    """Build an opaque cursor pointing just after a row"""
+    payload = json.dumps({'s': sort, 'v': value, 'id': row_id}, default=str, separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor: str, sort: str) -> Tuple[Any, Any]:
+    """Decode a cursor into its (sort value, row id) position"""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        value, row_id = payload['v'], payload['id']
+    except (ValueError, TypeError, KeyError):
+        raise ValueError('Invalid cursor')
+
+    if payload.get('s') != sort:
+        raise ValueError('Cursor does not match the requested sort')
+
+    return value, row_id
+
+
+def apply_sort(query, model, sort: str):
+    """Order a query by one of the CURSOR_SORTS keys, with id as tie-breaker"""
+    column_name, descending = CURSOR_SORTS[sort]
+    column = getattr(model, column_name)
+    if descending:
+        return query.order_by(column.desc(), model.id.desc())
+    return query.order_by(column.asc(), model.id.asc())
+
+
+def keyset_paginate(query, model, sort: str, cursor: Optional[str], limit: int):
+    """Seek past the cursor on an indexed (column, id) key and return (items, next cursor)"""
+    column_name, descending = CURSOR_SORTS[sort]
+    column = getattr(model, column_name)
+
+    if cursor:
+        value, row_id = decode_cursor(cursor, sort)
+        try:
+            if column_name == 'created_at':
+                value = datetime.fromisoformat(value)
+            elif column_name == 'price':
+                value = Decimal(str(value))
+            elif column_name == 'rating_average':
+                value = float(value)
+        except (ValueError, TypeError, ArithmeticError):
+            raise ValueError('Invalid cursor')
+
+        position = db.tuple_(column, model.id)
+        query = query.filter(position < db.tuple_(value, row_id) if descending else position > db.tuple_(value, row_id))
+
+    query = apply_sort(query, model, sort)
+
+    # Fetch one extra row to know whether another page exists
+    items = query.limit(limit + 1).all()
+    next_cursor = None
+    if len(items) > limit:
+        items = items[:limit]
+        last = items[-1]
+        next_cursor = encode_cursor(sort, getattr(last, column_name), last.id)
+
+    return items, next_cursor
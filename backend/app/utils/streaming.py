@@ -0,0 +1,53 @@
+"""
+Opt-in NDJSON streaming for listing endpoints
+
+A client sending `Accept: application/x-ndjson` gets one JSON object per
+line, written while rows are read instead of after the whole list has been
+built and serialized. Rows come from stream_query(), which runs the statement
+with yield_per (a server-side cursor on PostgreSQL) and hands them over one
+chunk at a time, so memory is bounded by STREAM_CHUNK_SIZE rows whatever the
+size of the result.
+"""
+
+import logging
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+from flask import Response, current_app, request, stream_with_context
+
+from app import db
+
+NDJSON_MIMETYPE = 'application/x-ndjson'
+
+logger = logging.getLogger(__name__)
+
+
+def wants_ndjson() -> bool:
+    """Whether the client asked for NDJSON over JSON (plain JSON wins ties such as */*)"""
+    return request.accept_mimetypes.best_match(
+        ['application/json', NDJSON_MIMETYPE], default='application/json'
+    ) == NDJSON_MIMETYPE
+
+
+def stream_query(statement, chunk_size: Optional[int] = None) -> Iterator[List[Any]]:
+    """Chunks of ORM objects of a select(), fetched chunk_size rows at a time"""
+    chunk_size = chunk_size or current_app.config.get('STREAM_CHUNK_SIZE', 500)
+    result = db.session.scalars(statement.execution_options(yield_per=chunk_size))
+    yield from result.partitions()
+
+
+def ndjson_response(records: Iterable[Dict[str, Any]], status: int = 200, headers=None) -> Response:
+    """Streaming response writing each record as one line of JSON
+
+    The status line is sent before the records are produced, so a failure part
+    way through is reported as a final {"error": ...} line.
+    """
+    def generate():
+        try:
+            for record in records:
+                yield current_app.json.dumps(record) + '\n'
+        except Exception:
+            logger.exception('NDJSON stream of %s failed', request.path)
+            db.session.rollback()
+            yield current_app.json.dumps({'error': 'Stream interrupted'}) + '\n'
+
+    return Response(stream_with_context(generate()), status=status, headers=headers, mimetype=NDJSON_MIMETYPE)
@@ -0,0 +1,38 @@
+def dialect_insert(connection):
+    """INSERT construct supporting ON CONFLICT for the connection's dialect, or None"""
+    dialect = connection.dialect.name
+    if dialect == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert
+        return insert
+    if dialect == 'sqlite':
+        from sqlalchemy.dialects.sqlite import insert
+        return insert
+    return None
+
+
+def upsert_increments(connection, table, key_columns, rows, fields, replace=()):
+    """Insert rows, or add their fields to (and overwrite 'replace' columns of) existing ones
+
+    Rows are written in key order, so concurrent writers lock shared rows in
+    the same order and cannot deadlock each other.
+    """
+    if not rows:
+        return
+    rows = sorted(rows, key=lambda row: tuple(row[column] for column in key_columns))
+    insert = dialect_insert(connection)
+    if insert is None:
+        for row in rows:
+            changes = {field: table.c[field] + row[field] for field in fields}
+            changes.update({column: row[column] for column in replace})
+            result = connection.execute(
+                table.update().where(*[table.c[column] == row[column] for column in key_columns]).values(**changes)
+            )
+            if result.rowcount == 0:
+                connection.execute(table.insert().values(**row))
+        return
+
+    statement = insert(table)
+    update = {field: table.c[field] + statement.excluded[field] for field in fields}
+    update.update({column: statement.excluded[column] for column in replace})
+    connection.execute(statement.on_conflict_do_update(index_elements=key_columns, set_=update), rows)
+
@@ -3,21 +3,160 @@ from dotenv import load_dotenv
 
 load_dotenv()
 
+def engine_options(pool_size, max_overflow, pool_timeout=30, pool_recycle=1800):
+    """SQLALCHEMY_ENGINE_OPTIONS of a pooled engine; DB_* environment variables override the defaults"""
+    return {
+        'pool_size': int(os.environ.get('DB_POOL_SIZE', pool_size)),
+        'max_overflow': int(os.environ.get('DB_MAX_OVERFLOW', max_overflow)),
+        'pool_timeout': float(os.environ.get('DB_POOL_TIMEOUT', pool_timeout)),
+        'pool_recycle': int(os.environ.get('DB_POOL_RECYCLE', pool_recycle)),
+        'pool_pre_ping': os.environ.get('DB_POOL_PRE_PING', 'true').lower() == 'true'
+    }
+
 class Config:
     """Base configuration class"""
     SECRET_KEY = os.environ.get('SECRET_KEY') or 'dev-secret-key-change-in-production'
     SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL') or 'postgresql://localhost/mantouji_db'
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+    
+    # Connection pool per worker process: workers x (pool_size + max_overflow) must stay
+    # below the server's (or PgBouncer's) connection limit
+    SQLALCHEMY_ENGINE_OPTIONS = engine_options(pool_size=5, max_overflow=10)
+    DB_STATEMENT_TIMEOUT_MS = int(os.environ.get('DB_STATEMENT_TIMEOUT_MS', 0))  # 0: no limit
+    # Behind PgBouncer in transaction mode: no server-side prepared statements or session settings
+    DB_PGBOUNCER = os.environ.get('DB_PGBOUNCER', 'false').lower() == 'true'
+    
+    # Read replicas (comma-separated URLs) used by GET endpoints marked @replica_reads
+    SQLALCHEMY_REPLICA_URIS = [uri for uri in os.environ.get('DATABASE_REPLICA_URLS', '').split(',') if uri]
+    REPLICA_STICKY_SECONDS = int(os.environ.get('REPLICA_STICKY_SECONDS', 5))  # Read-your-writes window
+    REPLICA_HEALTH_CHECK_SECONDS = float(os.environ.get('REPLICA_HEALTH_CHECK_SECONDS', 10))
+    REPLICA_MAX_LAG_SECONDS = float(os.environ.get('REPLICA_MAX_LAG_SECONDS', 30))
+    
     JWT_SECRET_KEY = os.environ.get('JWT_SECRET_KEY') or 'jwt-secret-string'
     JWT_ACCESS_TOKEN_EXPIRES = int(os.environ.get('JWT_ACCESS_TOKEN_EXPIRES', 3600))
+    JWT_REFRESH_TOKEN_EXPIRES = int(os.environ.get('JWT_REFRESH_TOKEN_EXPIRES', 2592000))  # 30 days
     
     # OpenAI Configuration
     OPENAI_API_KEY = os.environ.get('OPENAI_API_KEY')
     
+    # LLM insights (answers cached by a hash of model, prompt and parameters)
+    INSIGHT_PROVIDER = os.environ.get('INSIGHT_PROVIDER')  # openai or none; openai when OPENAI_API_KEY is set
+    INSIGHT_MODEL = os.environ.get('INSIGHT_MODEL', 'gpt-4o-mini')
+    INSIGHT_TIMEOUT = float(os.environ.get('INSIGHT_TIMEOUT', 30.0))
+    INSIGHT_CACHE_ENTRIES = int(os.environ.get('INSIGHT_CACHE_ENTRIES', 1024))  # Per-process LRU in front of the table
+    INSIGHT_WAIT_SECONDS = float(os.environ.get('INSIGHT_WAIT_SECONDS', 20.0))  # Wait for another worker generating the same prompt
+    INSIGHT_PENDING_TIMEOUT = float(os.environ.get('INSIGHT_PENDING_TIMEOUT', 120.0))  # Claims older than this are taken over
+    
     # File Upload Configuration
     UPLOAD_FOLDER = os.environ.get('UPLOAD_FOLDER', 'uploads')
     MAX_CONTENT_LENGTH = int(os.environ.get('MAX_CONTENT_LENGTH', 16777216))  # 16MB
     
+    # Bulk Product Import/Export Configuration
+    PRODUCT_IMPORT_BATCH_SIZE = int(os.environ.get('PRODUCT_IMPORT_BATCH_SIZE', 500))  # Rows per transaction
+    PRODUCT_IMPORT_MAX_ERRORS = int(os.environ.get('PRODUCT_IMPORT_MAX_ERRORS', 1000))  # Row errors listed in the report
+    PRODUCT_EXPORT_CHUNK_SIZE = int(os.environ.get('PRODUCT_EXPORT_CHUNK_SIZE', 500))
+    
+    # Checkout (distinct products per cart)
+    ORDER_MAX_ITEMS = int(os.environ.get('ORDER_MAX_ITEMS', 50))
+    
+    # NDJSON Streaming Configuration (Accept: application/x-ndjson on listing endpoints)
+    STREAM_CHUNK_SIZE = int(os.environ.get('STREAM_CHUNK_SIZE', 500))  # Rows fetched per round trip
+    
+    # Search Configuration
+    SEARCH_INDEX_REFRESH_SECONDS = int(os.environ.get('SEARCH_INDEX_REFRESH_SECONDS', 30))
+    SEARCH_MAX_RESULTS = int(os.environ.get('SEARCH_MAX_RESULTS', 1000))  # Best matches a product search can page through
+    
+    # Semantic search (local embedding model and memory-mapped IVF index)
+    EMBEDDING_MODEL = os.environ.get('EMBEDDING_MODEL', 'hashing')  # hashing or sentence-transformers:<model name>
+    EMBEDDING_DIMENSION = int(os.environ.get('EMBEDDING_DIMENSION', 256))  # hashing model only
+    EMBEDDING_INDEX_DIR = os.environ.get('EMBEDDING_INDEX_DIR', 'embeddings')  # Relative to the instance folder
+    EMBEDDING_BATCH_SIZE = int(os.environ.get('EMBEDDING_BATCH_SIZE', 256))
+    EMBEDDING_MIN_LIST_SIZE = int(os.environ.get('EMBEDDING_MIN_LIST_SIZE', 64))  # Smallest expected IVF list
+    EMBEDDING_NPROBE = int(os.environ.get('EMBEDDING_NPROBE', 8))  # Lists scanned per query
+    EMBEDDING_CANDIDATES = int(os.environ.get('EMBEDDING_CANDIDATES', 100))  # Candidates per signal before blending
+    EMBEDDING_REFRESH_SECONDS = int(os.environ.get('EMBEDDING_REFRESH_SECONDS', 30))
+    EMBEDDING_SYNC_OVERLAP = int(os.environ.get('EMBEDDING_SYNC_OVERLAP', 5))  # Seconds re-read for transactions committed late
+    EMBEDDING_DELTA_MAX = int(os.environ.get('EMBEDDING_DELTA_MAX', 1000))  # Products changed since the build before a rebuild
+    SEMANTIC_SEARCH_WEIGHT = float(os.environ.get('SEMANTIC_SEARCH_WEIGHT', 0.6))  # Semantic share of the hybrid score
+    
+    # Response Cache Configuration (memory, local, redis or none)
+    CACHE_BACKEND = os.environ.get('CACHE_BACKEND', 'memory')
+    CACHE_DEFAULT_TTL = int(os.environ.get('CACHE_DEFAULT_TTL', 60))
+    CACHE_MAX_ENTRIES = int(os.environ.get('CACHE_MAX_ENTRIES', 1024))
+    CACHE_REDIS_URL = os.environ.get('CACHE_REDIS_URL', 'redis://localhost:6379/0')
+    
+    # View Tracking Configuration (views are queued and written in batches)
+    VIEW_TRACKING_ENABLED = os.environ.get('VIEW_TRACKING_ENABLED', 'true').lower() == 'true'
+    VIEW_QUEUE_MAX = int(os.environ.get('VIEW_QUEUE_MAX', 10000))
+    VIEW_BATCH_SIZE = int(os.environ.get('VIEW_BATCH_SIZE', 500))
+    VIEW_FLUSH_INTERVAL = float(os.environ.get('VIEW_FLUSH_INTERVAL', 1.0))
+    VIEW_ROLLUP_INTERVAL = float(os.environ.get('VIEW_ROLLUP_INTERVAL', 30.0))
+    
+    # Search History Configuration (searches are coalesced per user and written in bulk)
+    SEARCH_HISTORY_WINDOW = float(os.environ.get('SEARCH_HISTORY_WINDOW', 30.0))
+    SEARCH_HISTORY_FLUSH_INTERVAL = float(os.environ.get('SEARCH_HISTORY_FLUSH_INTERVAL', 5.0))
+    SEARCH_HISTORY_MAX_PENDING = int(os.environ.get('SEARCH_HISTORY_MAX_PENDING', 10000))
+    
+    # Trending Configuration (event weights and exponential decay)
+    TRENDING_VIEW_WEIGHT = float(os.environ.get('TRENDING_VIEW_WEIGHT', 0.1))
+    TRENDING_FAVORITE_WEIGHT = float(os.environ.get('TRENDING_FAVORITE_WEIGHT', 2.0))
+    TRENDING_REVIEW_WEIGHT = float(os.environ.get('TRENDING_REVIEW_WEIGHT', 1.5))
+    TRENDING_HALF_LIFE_HOURS = float(os.environ.get('TRENDING_HALF_LIFE_HOURS', 24))
+    TRENDING_LOOKBACK_HALF_LIVES = int(os.environ.get('TRENDING_LOOKBACK_HALF_LIVES', 10))
+    TRENDING_MAX_K = int(os.environ.get('TRENDING_MAX_K', 100))
+    TRENDING_REBUILD_SECONDS = int(os.environ.get('TRENDING_REBUILD_SECONDS', 300))
+    
+    # Admin overview counters (live, recounted periodically)
+    ADMIN_METRICS_RECONCILE_SECONDS = int(os.environ.get('ADMIN_METRICS_RECONCILE_SECONDS', 300))
+    
+    # Deferred counter writes (rollup deltas are coalesced and written after commit)
+    COUNTER_FLUSH_INTERVAL = float(os.environ.get('COUNTER_FLUSH_INTERVAL', 1.0))
+    COUNTER_FLUSH_KEYS = int(os.environ.get('COUNTER_FLUSH_KEYS', 20000))
+    
+    # Time-bucketed analytics (retention of hourly and daily buckets; monthly ones are kept)
+    ANALYTICS_HOUR_RETENTION_DAYS = int(os.environ.get('ANALYTICS_HOUR_RETENTION_DAYS', 14))
+    ANALYTICS_DAY_RETENTION_DAYS = int(os.environ.get('ANALYTICS_DAY_RETENTION_DAYS', 730))
+    
+    # Geospatial heatmap tiles (Web Mercator zoom levels kept) and nearest-producer grid
+    GEO_TILE_ZOOMS = [int(zoom) for zoom in os.environ.get('GEO_TILE_ZOOMS', '4,6,8,10,12').split(',')]
+    GEO_CELL_DETAIL = int(os.environ.get('GEO_CELL_DETAIL', 3))  # Cell levels below the map zoom (3 -> 8x8 per tile)
+    GEO_MAX_CELLS = int(os.environ.get('GEO_MAX_CELLS', 4096))
+    GEO_GRID_CELL_DEGREES = float(os.environ.get('GEO_GRID_CELL_DEGREES', 0.5))
+    GEO_INDEX_REFRESH_SECONDS = int(os.environ.get('GEO_INDEX_REFRESH_SECONDS', 60))
+    GEO_NEAREST_MAX_K = int(os.environ.get('GEO_NEAREST_MAX_K', 50))
+    
+    # Batch AI predictions (flask score-predictions)
+    PREDICTION_HORIZON_DAYS = int(os.environ.get('PREDICTION_HORIZON_DAYS', 30))  # Window of the client potential label
+    PREDICTION_TREND_DAYS = int(os.environ.get('PREDICTION_TREND_DAYS', 28))
+    PREDICTION_PRICE_RANGE = float(os.environ.get('PREDICTION_PRICE_RANGE', 0.2))  # Largest suggested price change (fraction)
+    PREDICTION_MIN_SAMPLES = int(os.environ.get('PREDICTION_MIN_SAMPLES', 20))  # Below this a heuristic replaces the model
+    PREDICTION_KEEP_RUNS = int(os.environ.get('PREDICTION_KEEP_RUNS', 3))
+    
+    # Item-to-item recommendations (flask refresh-recommendations)
+    RECOMMENDATION_TOP_N = int(os.environ.get('RECOMMENDATION_TOP_N', 20))  # Neighbors stored per product
+    RECOMMENDATION_WINDOW_DAYS = int(os.environ.get('RECOMMENDATION_WINDOW_DAYS', 180))  # Views older than this are ignored
+    RECOMMENDATION_VIEW_WEIGHT = float(os.environ.get('RECOMMENDATION_VIEW_WEIGHT', 1.0))
+    RECOMMENDATION_FAVORITE_WEIGHT = float(os.environ.get('RECOMMENDATION_FAVORITE_WEIGHT', 3.0))
+    RECOMMENDATION_ORDER_WEIGHT = float(os.environ.get('RECOMMENDATION_ORDER_WEIGHT', 5.0))
+    RECOMMENDATION_REFRESH_OVERLAP = int(os.environ.get('RECOMMENDATION_REFRESH_OVERLAP', 300))  # Seconds re-read for late views
+    RECOMMENDATION_CHUNK_SIZE = int(os.environ.get('RECOMMENDATION_CHUNK_SIZE', 1000))  # Products per similarity product
+    
+    # Authenticated user snapshots (seconds before another worker's profile/role change is seen)
+    USER_CACHE_TTL = int(os.environ.get('USER_CACHE_TTL', 30))
+    
+    # Password hashing policy (werkzeug method string; existing hashes are upgraded on login)
+    PASSWORD_HASH_METHOD = os.environ.get('PASSWORD_HASH_METHOD', 'scrypt:32768:8:1')
+    PASSWORD_SALT_LENGTH = int(os.environ.get('PASSWORD_SALT_LENGTH', 16))
+    PASSWORD_HASH_WORKERS = int(os.environ.get('PASSWORD_HASH_WORKERS', 0)) or os.cpu_count()
+    PASSWORD_HASH_MAX_PENDING = int(os.environ.get('PASSWORD_HASH_MAX_PENDING', 64))
+    PASSWORD_HASH_TIMEOUT = float(os.environ.get('PASSWORD_HASH_TIMEOUT', 10.0))
+    
+    # Token revocation (Bloom filter sizing; revocations by other workers are seen within the sync interval)
+    TOKEN_BLOOM_CAPACITY = int(os.environ.get('TOKEN_BLOOM_CAPACITY', 100000))
+    TOKEN_BLOOM_ERROR_RATE = float(os.environ.get('TOKEN_BLOOM_ERROR_RATE', 0.001))
+    TOKEN_REVOCATION_SYNC_SECONDS = float(os.environ.get('TOKEN_REVOCATION_SYNC_SECONDS', 5))
+    TOKEN_REVOCATION_REBUILD_SECONDS = float(os.environ.get('TOKEN_REVOCATION_REBUILD_SECONDS', 3600))
+    
     # CORS Configuration
     CORS_ORIGINS = os.environ.get('CORS_ORIGINS', 'http://localhost:3000').split(',')
 
@@ -25,17 +164,23 @@ class DevelopmentConfig(Config):
     """Development configuration"""
     DEBUG = True
     SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL') or 'postgresql://localhost/mantouji_dev'
+    SQLALCHEMY_ENGINE_OPTIONS = engine_options(pool_size=2, max_overflow=3)
 
 class ProductionConfig(Config):
     """Production configuration"""
     DEBUG = False
     SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL')
+    SQLALCHEMY_ENGINE_OPTIONS = engine_options(pool_size=10, max_overflow=20, pool_recycle=900)
+    DB_STATEMENT_TIMEOUT_MS = int(os.environ.get('DB_STATEMENT_TIMEOUT_MS', 30000))
 
 class TestingConfig(Config):
     """Testing configuration"""
     TESTING = True
     SQLALCHEMY_DATABASE_URI = 'sqlite:///:memory:'
+    SQLALCHEMY_ENGINE_OPTIONS = {}  # Single shared in-memory connection
+    SQLALCHEMY_REPLICA_URIS = []
     WTF_CSRF_ENABLED = False
+    PASSWORD_HASH_METHOD = 'pbkdf2:sha256:1000'  # Fast hashes for tests
 
 config = {
     'development': DevelopmentConfig,
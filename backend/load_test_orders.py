@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+"""
+Checkout load test for Mantouji.ma: flash demand on limited stock
+
+Creates a producer with --products limited items (--stock units each) and
+--workers consumers, then every worker places --attempts carts of one or two
+of those products (1 to --max-quantity units each) through the order service,
+all at once. Afterwards it checks, per product, that the initial stock equals
+the remaining stock plus the quantities of the orders placed (no oversell, no
+lost reservation) and prints orders/sec and checkout latency. The test data
+is deleted at the end unless --keep is given.
+
+Usage:
+    DATABASE_URL=postgresql://localhost/mantouji_dev python load_test_orders.py \\
+        --workers 32 --products 3 --stock 100 --attempts 20
+
+Exits with status 1 when a product was oversold or its stock does not add up.
+"""
+
+import argparse
+import os
+import random
+import threading
+import time
+import uuid
+
+from flask import Flask
+
+from app import db
+from app.models.order import Order, OrderItem
+from app.models.product import Product
+from app.models.user import User
+from app.services.counter_buffer import create_counter_buffer
+from app.services.orders import OrderError, place_orders
+from app.utils.metrics import LatencyWindow
+from config import config, engine_options
+
+
+def make_app(url, workers):
+    """Minimal app bound to the database under test (one pooled connection per worker)"""
+    app = Flask(__name__)
+    app.config.from_object(config['development'])
+    app.config['SQLALCHEMY_DATABASE_URI'] = url
+    app.config['SQLALCHEMY_REPLICA_URIS'] = []
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options(pool_size=workers, max_overflow=0)
+    db.init_app(app)
+    # Rollup deltas are written after commit, as in the app
+    app.extensions['counter_buffer'] = create_counter_buffer(app)
+    return app
+
+
+def seed(run_id, products, stock, consumers):
+    producer = User(username=f'load-producer-{run_id}', email=f'load-producer-{run_id}@example.com',
+                    first_name='Load', last_name='Producer', role='producer', password_hash='!')
+    db.session.add(producer)
+    db.session.flush()
+    items = [
+        Product(producer_id=producer.id, name=f'Saffron {run_id} #{index}', description='Limited harvest',
+                category='Spices', price=120, stock_quantity=stock, min_order_quantity=1, tags=[])
+        for index in range(products)
+    ]
+    buyers = [
+        User(username=f'load-consumer-{run_id}-{index}', email=f'load-consumer-{run_id}-{index}@example.com',
+             first_name='Load', last_name='Consumer', role='consumer', password_hash='!')
+        for index in range(consumers)
+    ]
+    db.session.add_all(items + buyers)
+    db.session.commit()
+    return producer.id, [product.id for product in items], [buyer.id for buyer in buyers]
+
+
+def verify(product_ids, stock):
+    """(product id, remaining stock, quantity ordered, consistent) per product"""
+    rows = []
+    for product_id in product_ids:
+        remaining = db.session.scalar(db.select(Product.stock_quantity).where(Product.id == product_id))
+        ordered = db.session.scalar(
+            db.select(db.func.coalesce(db.func.sum(OrderItem.quantity), 0)).where(OrderItem.product_id == product_id)
+        )
+        rows.append((product_id, remaining, ordered, remaining >= 0 and remaining + ordered == stock))
+    return rows
+
+
+def cleanup(producer_id, consumer_ids):
+    order_ids = db.select(Order.id).where(Order.producer_id == producer_id)
+    db.session.execute(db.delete(OrderItem).where(OrderItem.order_id.in_(order_ids)))
+    db.session.execute(db.delete(Order).where(Order.producer_id == producer_id))
+    db.session.execute(db.delete(Product).where(Product.producer_id == producer_id))
+    db.session.execute(db.delete(User).where(User.id.in_(consumer_ids + [producer_id])))
+    db.session.commit()
+
+
+def run(app, product_ids, consumer_ids, attempts, max_quantity):
+    latency = LatencyWindow(size=100000)
+    counts = {'orders': 0, 'carts': 0, 'sold_out': 0, 'errors': 0}
+    lock = threading.Lock()
+    start = threading.Barrier(len(consumer_ids))
+
+    def work(consumer_id):
+        rng = random.Random(consumer_id)
+        with app.app_context():
+            start.wait()
+            for _ in range(attempts):
+                cart = [
+                    {'product_id': product_id, 'quantity': rng.randint(1, max_quantity)}
+                    for product_id in rng.sample(product_ids, min(len(product_ids), rng.randint(1, 2)))
+                ]
+                began = time.perf_counter()
+                try:
+                    orders = place_orders(consumer_id, cart, 'Load test address')
+                    outcome = 'carts'
+                except OrderError as e:
+                    orders, outcome = [], 'sold_out' if e.status == 409 else 'errors'
+                except Exception:
+                    orders, outcome = [], 'errors'
+                latency.record(time.perf_counter() - began)
+                with lock:
+                    counts[outcome] += 1
+                    counts['orders'] += len(orders)
+            db.session.remove()
+
+    threads = [threading.Thread(target=work, args=(consumer_id,)) for consumer_id in consumer_ids]
+    began = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return counts, time.perf_counter() - began, latency.summary()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Place concurrent orders on limited stock and check for overselling')
+    parser.add_argument('--url', default=os.environ.get('DATABASE_URL', 'postgresql://localhost/mantouji_dev'))
+    parser.add_argument('--workers', type=int, default=32, help='Concurrent consumers')
+    parser.add_argument('--products', type=int, default=3, help='Limited products competed for')
+    parser.add_argument('--stock', type=int, default=100, help='Initial stock of each product')
+    parser.add_argument('--attempts', type=int, default=20, help='Carts placed by each consumer')
+    parser.add_argument('--max-quantity', type=int, default=3, help='Largest quantity of a cart line')
+    parser.add_argument('--keep', action='store_true', help='Keep the test users, products and orders')
+    args = parser.parse_args()
+
+    app = make_app(args.url, args.workers)
+    run_id = uuid.uuid4().hex[:8]
+    with app.app_context():
+        producer_id, product_ids, consumer_ids = seed(run_id, args.products, args.stock, args.workers)
+
+    print(f"🛒 Checkout load test: {args.workers} consumers x {args.attempts} carts on "
+          f"{args.products} product(s) with {args.stock} units each")
+    counts, elapsed, latency = run(app, product_ids, consumer_ids, args.attempts, args.max_quantity)
+    app.extensions['counter_buffer'].stop()
+
+    with app.app_context():
+        rows = verify(product_ids, args.stock)
+        if not args.keep:
+            cleanup(producer_id, consumer_ids)
+
+    print(f"carts placed {counts['carts']}, orders {counts['orders']}, sold out {counts['sold_out']}, "
+          f"errors {counts['errors']} in {elapsed:.2f}s")
+    print(f"throughput {counts['carts'] / elapsed:.1f} carts/s ({counts['orders'] / elapsed:.1f} orders/s), "
+          f"latency p50 {latency.get('p50_ms', 0):.2f} ms, p95 {latency.get('p95_ms', 0):.2f} ms")
+    print(f"{'product':>10} {'remaining':>10} {'ordered':>8}  check")
+    for product_id, remaining, ordered, consistent in rows:
+        print(f"{product_id[:8]:>10} {remaining:>10} {ordered:>8}  {'ok' if consistent else 'OVERSOLD / INCONSISTENT'}")
+
+    if not all(consistent for *_, consistent in rows):
+        raise SystemExit(1)
+    print('✅ No product was oversold')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+Connection pool load test for Mantouji.ma
+
+For each pool size, concurrent workers repeatedly check out a connection, run
+a catalog query and keep the connection for --hold-ms (the rest of a
+request's work inside its transaction). Prints throughput, request latency
+and time spent waiting for a connection per pool size, to pick
+DB_POOL_SIZE / DB_MAX_OVERFLOW for a worker.
+
+Usage:
+    DATABASE_URL=postgresql://localhost/mantouji_dev python load_test_pool.py \\
+        --pool-sizes 1,2,5,10,20 --workers 32 --seconds 10
+"""
+
+import argparse
+import os
+import threading
+import time
+
+from sqlalchemy import create_engine, text
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+
+from app.services.db_pool import InstrumentedQueuePool
+from app.utils.metrics import LatencyWindow
+
+DEFAULT_QUERY = (
+    "SELECT id, name, price FROM products "
+    "WHERE is_available = true ORDER BY created_at DESC LIMIT 20"
+)
+
+
+def run(url, pool_size, max_overflow, workers, seconds, hold_ms, query, pool_timeout):
+    """Throughput and latency of 'workers' threads sharing one pool"""
+    engine = create_engine(url, poolclass=InstrumentedQueuePool, pool_size=pool_size,
+                           max_overflow=max_overflow, pool_timeout=pool_timeout, pool_pre_ping=True)
+    latency = LatencyWindow(size=100000)
+    counts = {'requests': 0, 'errors': 0}
+    lock = threading.Lock()
+    deadline = time.perf_counter() + seconds
+
+    def work():
+        while time.perf_counter() < deadline:
+            started = time.perf_counter()
+            try:
+                with engine.connect() as connection:
+                    connection.execute(text(query)).fetchall()
+                    if hold_ms:
+                        time.sleep(hold_ms / 1000)
+            except PoolTimeoutError:
+                with lock:
+                    counts['errors'] += 1
+                continue
+            latency.record(time.perf_counter() - started)
+            with lock:
+                counts['requests'] += 1
+
+    threads = [threading.Thread(target=work) for _ in range(workers)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    pool_metrics = engine.pool.metrics.stats()
+    engine.dispose()
+    summary = latency.summary()
+    return {
+        'pool_size': pool_size,
+        'throughput': counts['requests'] / elapsed,
+        'p50_ms': summary.get('p50_ms', 0),
+        'p95_ms': summary.get('p95_ms', 0),
+        'wait_ms': pool_metrics['acquire'].get('mean_ms', 0),
+        'max_waiting': pool_metrics['max_waiting'],
+        'timeouts': counts['errors']
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure throughput against connection pool size')
+    parser.add_argument('--url', default=os.environ.get('DATABASE_URL', 'postgresql://localhost/mantouji_dev'))
+    parser.add_argument('--pool-sizes', default='1,2,5,10,20', help='Comma-separated pool sizes to compare')
+    parser.add_argument('--max-overflow', type=int, default=0)
+    parser.add_argument('--workers', type=int, default=32, help='Concurrent request threads')
+    parser.add_argument('--seconds', type=float, default=10.0, help='Duration of each run')
+    parser.add_argument('--hold-ms', type=float, default=5.0, help='Time a request keeps its connection after the query')
+    parser.add_argument('--pool-timeout', type=float, default=30.0)
+    parser.add_argument('--query', default=DEFAULT_QUERY)
+    args = parser.parse_args()
+
+    print(f"📊 Pool load test: {args.workers} workers, {args.seconds:g}s per run, {args.hold_ms:g}ms held per request")
+    print(f"{'pool':>6} {'req/s':>10} {'p50 ms':>10} {'p95 ms':>10} {'wait ms':>10} {'waiting':>8} {'timeouts':>9}")
+    for pool_size in [int(size) for size in args.pool_sizes.split(',')]:
+        result = run(args.url, pool_size, args.max_overflow, args.workers, args.seconds,
+                     args.hold_ms, args.query, args.pool_timeout)
+        print(f"{result['pool_size']:>6} {result['throughput']:>10.1f} {result['p50_ms']:>10.2f} "
+              f"{result['p95_ms']:>10.2f} {result['wait_ms']:>10.2f} {result['max_waiting']:>8} {result['timeouts']:>9}")
+
+
+if __name__ == '__main__':
+    main()
@@ -3,15 +3,51 @@
 Simple working Flask app for Mantouji.ma
 """
 
-from flask import Flask, jsonify, request
+from flask import Flask, g, jsonify, request
+from functools import wraps
+from itertools import islice
+from datetime import datetime, timedelta
 from flask_cors import CORS
+from flask_jwt_extended import JWTManager, get_jwt, get_jwt_identity, verify_jwt_in_request
+from flask_jwt_extended.exceptions import JWTExtendedException, NoAuthorizationError, RevokedTokenError
+from jwt.exceptions import PyJWTError
 import json
+import os
+from app.services.memory_store import MemoryStore
+from app.services.search_index import SearchIndex
+from app.utils.validators import validate_rating
+from app.services.cache import LRUCache, ResponseCache, cached_response
+from app.services.etags import CacheVersionStore, conditional_response
+from app.services.view_ingestion import MemoryViewSink, ViewIngestor, track_product_view
+from app.services.search_tracking import MemorySearchSink, SearchHistoryWriter
+from app.services.trending import TrendingEngine
+from app.services.producer_stats import ProducerRollups, daily_point, summarize
+from app.services.analytics_store import AnalyticsBuckets, parse_timeseries_args, timeseries_payload
+from app.services.tokens import MemoryRevocationStore, create_token_service, register_token_callbacks
+from app.services.admin_metrics import AdminMetrics, changes_for, moved, product_keys, review_keys, user_keys
+from app.utils.pagination import CURSOR_SORTS, is_cursor_request, get_cursor_params, encode_cursor, decode_cursor
 
 app = Flask(__name__)
 CORS(app)
 
+# Same token scheme as the main app: JWT pairs with refresh rotation, revocations kept in memory
+app.config['JWT_SECRET_KEY'] = os.environ.get('JWT_SECRET_KEY', 'dev-simple-app-jwt-secret-change-me')
+app.config['JWT_ACCESS_TOKEN_EXPIRES'] = int(os.environ.get('JWT_ACCESS_TOKEN_EXPIRES', 3600))
+app.config['JWT_REFRESH_TOKEN_EXPIRES'] = int(os.environ.get('JWT_REFRESH_TOKEN_EXPIRES', 2592000))
+jwt = JWTManager(app)
+token_service = create_token_service(app.config, MemoryRevocationStore())
+app.extensions['token_service'] = token_service
+register_token_callbacks(jwt)
+
+# Read-through cache for the public catalog endpoints
+response_cache = ResponseCache(LRUCache(max_entries=1024, default_ttl=60))
+app.extensions['response_cache'] = response_cache
+app.extensions['resource_versions'] = CacheVersionStore(response_cache)
+
 # In-memory storage for testing
-users = [
+store = MemoryStore()
+
+store.users.insert_many([
     {
         'id': 1,
         'username': 'ahmed_producer',
@@ -33,9 +69,9 @@ users = [
         'role': 'admin',
         'created_at': '2024-01-01T00:00:00Z'
     }
-]
+])
 
-products = [
+store.products.insert_many([
     {
         'id': 1,
         'name': 'Organic Argan Oil',
@@ -111,9 +147,9 @@ products = [
         'created_at': '2024-02-05T00:00:00Z',
         'updated_at': '2024-02-05T00:00:00Z'
     }
-]
+])
 
-reviews = [
+store.reviews.insert_many([
     {
         'id': 1,
         'product_id': 1,
@@ -138,9 +174,9 @@ reviews = [
         'comment': 'Beautiful carpet, exactly as described. Perfect for my living room.',
         'created_at': '2024-02-15T00:00:00Z'
     }
-]
+])
 
-favorites = [
+store.favorites.insert_many([
     {
         'id': 1,
         'user_id': 2,
@@ -153,26 +189,291 @@ favorites = [
         'product_id': 2,
         'created_at': '2024-02-10T00:00:00Z'
     }
-]
+])
 
-search_history = [
+store.search_history.insert_many([
     {
         'id': 1,
         'user_id': 2,
-        'query': 'argan oil',
+        'search_query': 'argan oil',
+        'normalized_query': 'argan oil',
         'filters': {'category': 'Beauty & Health'},
         'results_count': 1,
-        'created_at': '2024-02-08T00:00:00Z'
+        'search_count': 1,
+        'created_at': '2024-02-08T00:00:00Z',
+        'last_searched_at': '2024-02-08T00:00:00Z'
     },
     {
         'id': 2,
         'user_id': 2,
-        'query': 'carpet',
+        'search_query': 'carpet',
+        'normalized_query': 'carpet',
         'filters': {'category': 'Home & Decor'},
         'results_count': 1,
-        'created_at': '2024-02-10T00:00:00Z'
+        'search_count': 1,
+        'created_at': '2024-02-10T00:00:00Z',
+        'last_searched_at': '2024-02-10T00:00:00Z'
+    }
+])
+
+# Query frequencies aggregated from the search history
+store.search_query_stats.insert_many([
+    {
+        'normalized_query': search['normalized_query'],
+        'search_query': search['search_query'],
+        'search_count': search['search_count'],
+        'results_count': search['results_count'],
+        'last_searched_at': search['last_searched_at']
+    }
+    for search in store.search_history
+])
+
+# Full-text index over product name, description and tags
+search_index = SearchIndex()
+for _product in store.products:
+    search_index.add_product(_product)
+
+def empty_rating_aggregates():
+    """Rating fields of a product without reviews"""
+    return {
+        'rating_sum': 0,
+        'rating_count': 0,
+        'rating_average': 0,
+        'rating_histogram': {str(star): 0 for star in range(1, 6)}
+    }
+
+def apply_review_rating(review, sign):
+    """Add (sign=1) or remove (sign=-1) a review from its product's rating aggregates"""
+    product = store.products.get(review.get('product_id'))
+    if not product or review.get('rating') is None:
+        return
+    
+    rating = int(review['rating'])
+    rating_sum = product.get('rating_sum', 0) + sign * rating
+    rating_count = product.get('rating_count', 0) + sign
+    histogram = dict(product.get('rating_histogram') or empty_rating_aggregates()['rating_histogram'])
+    histogram[str(rating)] = histogram.get(str(rating), 0) + sign
+    
+    store.products.update(product['id'], {
+        'rating_sum': rating_sum,
+        'rating_count': rating_count,
+        'rating_average': rating_sum / rating_count if rating_count else 0,
+        'rating_histogram': histogram
+    })
+
+# Denormalized rating aggregates, kept current by the review endpoints
+for _product in store.products:
+    store.products.update(_product['id'], empty_rating_aggregates())
+for _review in store.reviews:
+    apply_review_rating(_review, 1)
+
+def now_iso():
+    """Current UTC time as an ISO 8601 timestamp"""
+    return datetime.utcnow().isoformat() + 'Z'
+
+def epoch(timestamp):
+    """Epoch seconds of an ISO 8601 timestamp"""
+    return datetime.fromisoformat(timestamp.replace('Z', '+00:00')).timestamp()
+
+# Decayed trending scores, updated by view, favorite and review events
+trending = TrendingEngine({'view': 0.1, 'favorite': 2.0, 'review': 1.5}, half_life_seconds=24 * 3600)
+trending.load(
+    ((product['id'], product['category']) for product in store.products),
+    [(product['id'], 'view', product.get('views', 0), None) for product in store.products]
+    + [(favorite['product_id'], 'favorite', 1, epoch(favorite['created_at'])) for favorite in store.favorites]
+    + [(review['product_id'], 'review', 1, epoch(review['created_at'])) for review in store.reviews]
+)
+
+def day_of(timestamp):
+    """UTC day of an ISO 8601 timestamp"""
+    return datetime.fromisoformat(timestamp[:10]).date()
+
+def producer_of(product_id):
+    product = store.products.get(product_id)
+    return product['producer_id'] if product else None
+
+def review_deltas(review, sign):
+    """Producer rollup deltas of adding (1) or removing (-1) a review"""
+    return {'review_count': sign, 'rating_sum': sign * review['rating'], 'rating_count': sign}
+
+# Producer dashboard counters, in total and per day, updated by the write endpoints
+producer_rollups = ProducerRollups()
+for _product in store.products:
+    producer_rollups.add(_product['producer_id'], day_of(_product['created_at']),
+                         product_count=1, view_count=_product.get('views', 0))
+for _favorite in store.favorites:
+    producer_rollups.add(producer_of(_favorite['product_id']), day_of(_favorite['created_at']), favorite_count=1)
+for _review in store.reviews:
+    producer_rollups.add(producer_of(_review['product_id']), day_of(_review['created_at']), **review_deltas(_review, 1))
+
+def product_dimensions(product_id):
+    """Analytics dimension keys of a product"""
+    product = store.products.get(product_id)
+    if not product:
+        return {'product': product_id}
+    producer = store.users.get(product['producer_id']) or {}
+    return {'product': product_id, 'producer': product['producer_id'],
+            'category': product.get('category'), 'region': producer.get('region')}
+
+def parse_time(timestamp):
+    """Naive UTC datetime of an ISO 8601 timestamp"""
+    return datetime.fromisoformat(timestamp.replace('Z', ''))
+
+# Hour/day/month analytics buckets (no compaction: the dev store is small)
+analytics_buckets = AnalyticsBuckets()
+for _product in store.products:
+    analytics_buckets.add('views', parse_time(_product['created_at']), _product.get('views', 0), **product_dimensions(_product['id']))
+for _favorite in store.favorites:
+    analytics_buckets.add('favorites', parse_time(_favorite['created_at']), 1, **product_dimensions(_favorite['product_id']))
+for _search in store.search_history:
+    analytics_buckets.add('searches', parse_time(_search['last_searched_at']), _search['search_count'],
+                          region=(store.users.get(_search['user_id']) or {}).get('region'))
+
+def record_view(product_id):
+    """Count a product view toward trending, its producer's rollups and the view buckets"""
+    trending.record(product_id, 'view')
+    producer_rollups.add(producer_of(product_id), datetime.utcnow().date(), view_count=1)
+    analytics_buckets.add('views', datetime.utcnow(), 1, **product_dimensions(product_id))
+
+def user_metric_keys(user):
+    return user_keys(user.get('role'), user.get('region'))
+
+def product_metric_keys(product):
+    return product_keys(product.get('category'), product.get('is_active', True))
+
+def review_metric_keys(review):
+    return review_keys(review.get('is_flagged'))
+
+# Admin overview counters, counted once here and then updated by the write endpoints
+admin_metrics = AdminMetrics()
+admin_metrics.apply(change for user in store.users for change in changes_for(user_metric_keys(user), 1))
+admin_metrics.apply(change for product in store.products for change in changes_for(product_metric_keys(product), 1))
+admin_metrics.apply(change for review in store.reviews for change in changes_for(review_metric_keys(review), 1))
+admin_metrics.add('favorites', len(store.favorites))
+admin_metrics.add('searches', sum(stat['search_count'] for stat in store.search_query_stats))
+
+def record_searches(entries):
+    admin_metrics.add('searches', sum(entry['search_count'] for entry in entries))
+    for entry in entries:
+        analytics_buckets.add('searches', entry['last_searched_at'], entry['search_count'],
+                              region=(store.users.get(entry['user_id']) or {}).get('region'))
+
+# Product views are queued and written in batches; totals roll up into 'views'
+view_ingestor = ViewIngestor(MemoryViewSink(store), max_queue=10000, batch_size=500,
+                             flush_interval=1.0, rollup_interval=5.0)
+app.extensions['view_ingestor'] = view_ingestor
+
+# Searches are coalesced per user and written in bulk
+search_history_writer = SearchHistoryWriter(MemorySearchSink(store, on_write=record_searches), window=30.0, flush_interval=5.0)
+app.extensions['search_history_writer'] = search_history_writer
+
+def authenticate():
+    """(user, None) for a valid, unrevoked bearer access token, else (None, error response)
+
+    The token is verified and its user looked up once per request.
+    """
+    if 'auth' not in g:
+        g.auth = _authenticate()
+    return g.auth
+
+def _authenticate(refresh=False):
+    try:
+        verify_jwt_in_request(refresh=refresh)
+    except NoAuthorizationError:
+        return None, (jsonify({'error': 'Authentication required'}), 401)
+    except RevokedTokenError:
+        return None, (jsonify({'error': 'Token has been revoked'}), 401)
+    except (JWTExtendedException, PyJWTError):
+        return None, (jsonify({'error': 'Invalid token'}), 401)
+    
+    user = store.users.get(int(get_jwt_identity()))
+    if not user:
+        return None, (jsonify({'error': 'User not found'}), 404)
+    return user, None
+
+def issue_tokens(user):
+    """Access/refresh token pair of a user (the access token carries the role)"""
+    return token_service.issue(str(user['id']), {'role': user['role']})
+
+def login_required(roles=None, forbidden='Insufficient permissions'):
+    """Require a valid token (and one of 'roles'); the user is available as g.current_user"""
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            user, error = authenticate()
+            if error:
+                return error
+            if roles and user['role'] not in roles:
+                return jsonify({'error': forbidden}), 403
+            g.current_user = user
+            return f(*args, **kwargs)
+        return decorated_function
+    return decorator
+
+def viewer_id():
+    """User id of the request's bearer token, if any"""
+    user, _ = authenticate()
+    return user['id'] if user else None
+
+def producer_summary(user):
+    """Public producer fields embedded in product responses"""
+    return {
+        'id': user['id'],
+        'username': user['username'],
+        'first_name': user.get('first_name'),
+        'last_name': user.get('last_name'),
+        'city': user.get('city'),
+        'region': user.get('region')
+    }
+
+def with_producer(product):
+    """Copy of a product with its producer joined in"""
+    producer = store.users.get(product['producer_id'])
+    if not producer:
+        return product
+    return {**product, 'producer': producer_summary(producer)}
+
+def cursor_position(cursor, sort, index_name):
+    """(sort key, id) a cursor points after, checked against the sorted index's key types"""
+    value, row_id = decode_cursor(cursor, sort)
+    if index_name == 'created_at':
+        valid = isinstance(value, str)
+    else:
+        valid = isinstance(value, (int, float)) and not isinstance(value, bool)
+    if not valid or not isinstance(row_id, int) or isinstance(row_id, bool):
+        raise ValueError('Invalid cursor')
+    return (value if index_name == 'created_at' else float(value), row_id)
+
+def cursor_page(matches, serialize=with_producer):
+    """Keyset-paginated product response walking the sorted created_at/price index"""
+    try:
+        sort, cursor, limit = get_cursor_params(request.args)
+        index_name, descending = CURSOR_SORTS[sort]
+        after = cursor_position(cursor, sort, index_name) if cursor else None
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    page_products = []
+    next_cursor = None
+    for product in store.products.iter_sorted(index_name, after=after, descending=descending):
+        if not matches(product):
+            continue
+        if len(page_products) == limit:
+            last = page_products[-1]
+            next_cursor = encode_cursor(sort, *store.products.sort_key(index_name, last))
+            break
+        page_products.append(product)
+    
+    response = {
+        'products': [serialize(p) for p in page_products],
+        'next_cursor': next_cursor,
+        'limit': limit,
+        'sort': sort
     }
-]
+    if request.args.get('include_total', '').lower() in ('1', 'true'):
+        response['total'] = sum(1 for p in store.products if matches(p))
+    
+    return jsonify(response)
 
 @app.route('/')
 def home():
@@ -199,21 +500,20 @@ def health():
 @app.route('/api/auth/register', methods=['POST'])
 def register():
     data = request.get_json()
-    user = {
-        'id': len(users) + 1,
+    if store.users.get_by('email', data.get('email')):
+        return jsonify({'error': 'Email already registered'}), 409
+    
+    user = store.users.insert({
         'username': data.get('username'),
         'email': data.get('email'),
         'role': data.get('role', 'consumer'),
         'created_at': '2024-01-01T00:00:00Z'
-    }
-    users.append(user)
-    
-    # Generate a simple token (in real app, use JWT)
-    access_token = f"token_{user['id']}_{user['username']}"
+    })
+    admin_metrics.apply(changes_for(user_metric_keys(user), 1))
     
     return jsonify({
         'message': 'User registered successfully',
-        'access_token': access_token,
+        **issue_tokens(user),
         'user': user
     }), 201
 
@@ -224,26 +524,49 @@ def login():
     password = data.get('password')
     
     # Find user by email (simple check)
-    user = next((u for u in users if u['email'] == email), None)
+    user = store.users.get_by('email', email)
     
     if not user:
         return jsonify({'error': 'Invalid credentials'}), 401
     
-    # Generate a simple token (in real app, use JWT)
-    access_token = f"token_{user['id']}_{user['username']}"
-    
     return jsonify({
         'message': 'Login successful',
-        'access_token': access_token,
+        **issue_tokens(user),
         'user': user
     })
 
+@app.route('/api/auth/refresh', methods=['POST'])
+def refresh():
+    user, error = _authenticate(refresh=True)
+    if error:
+        return error
+    
+    tokens = token_service.rotate(get_jwt(), str(user['id']), {'role': user['role']})
+    if tokens is None:
+        return jsonify({'error': 'Refresh token already used; session revoked'}), 401
+    return jsonify({**tokens, 'user': user})
+
+@app.route('/api/auth/logout', methods=['POST'])
+def logout():
+    try:
+        verify_jwt_in_request(verify_type=False)
+    except RevokedTokenError:
+        return jsonify({'error': 'Token has been revoked'}), 401
+    except (JWTExtendedException, PyJWTError):
+        return jsonify({'error': 'Authentication required'}), 401
+    
+    token_service.revoke_session(get_jwt())
+    return jsonify({'message': 'Logout successful'})
+
 @app.route('/api/auth/me', methods=['GET'])
 def get_current_user():
-    # In a real app, you'd validate the JWT token here
-    # For now, we'll return a mock user or the first user
-    if users:
-        return jsonify({'user': users[0]})
+    user, _ = authenticate()
+    if user:
+        return jsonify({'user': user})
+    
+    # Without a token, fall back to a mock user (the first one)
+    if len(store.users):
+        return jsonify({'user': store.users.slice(0, 1)[0]})
     return jsonify({'error': 'No user found'}), 404
 
 @app.route('/api/test', methods=['GET'])
@@ -254,13 +577,13 @@ def test_endpoint():
 @app.route('/api/users', methods=['GET'])
 def get_users():
     return jsonify({
-        'users': users,
-        'count': len(users)
+        'users': list(store.users),
+        'count': len(store.users)
     })
 
 @app.route('/api/users/<int:user_id>', methods=['GET'])
 def get_user(user_id):
-    user = next((u for u in users if u['id'] == user_id), None)
+    user = store.users.get(user_id)
     if user:
         return jsonify(user)
     return jsonify({'error': 'User not found'}), 404
@@ -268,14 +591,16 @@ def get_user(user_id):
 @app.route('/api/users', methods=['POST'])
 def create_user():
     data = request.get_json()
-    user = {
-        'id': len(users) + 1,
+    if store.users.get_by('email', data.get('email')):
+        return jsonify({'error': 'Email already registered'}), 409
+    
+    user = store.users.insert({
         'username': data.get('username'),
         'email': data.get('email'),
         'role': data.get('role', 'consumer'),
         'created_at': '2024-01-01T00:00:00Z'
-    }
-    users.append(user)
+    })
+    admin_metrics.apply(changes_for(user_metric_keys(user), 1))
     return jsonify({
         'message': 'User created successfully',
         'user': user
@@ -283,6 +608,9 @@ def create_user():
 
 # Product endpoints
 @app.route('/api/products', methods=['GET'])
+@conditional_response('products:list', tags=['products'], cache_control='public, no-cache',
+                      defaults={'page': '1', 'per_page': '10'})
+@cached_response('products:list', tags=['products'], defaults={'page': '1', 'per_page': '10'})
 def get_products():
     # Get query parameters for filtering and search
     search = request.args.get('search', '')
@@ -290,79 +618,87 @@ def get_products():
     producer_id = request.args.get('producer_id', type=int)
     min_price = request.args.get('min_price', type=float)
     max_price = request.args.get('max_price', type=float)
+    sort = request.args.get('sort', '')
     page = request.args.get('page', 1, type=int)
     per_page = request.args.get('per_page', 10, type=int)
     
-    # Filter products
-    filtered_products = products.copy()
-    
-    if search:
-        filtered_products = [p for p in filtered_products if 
-                           search.lower() in p.get('name', '').lower() or 
-                           search.lower() in p.get('description', '').lower()]
-    
-    if category:
-        filtered_products = [p for p in filtered_products if p.get('category') == category]
-    
-    if producer_id is not None:
-        filtered_products = [p for p in filtered_products if p.get('producer_id') == producer_id]
-    
-    if min_price is not None:
-        filtered_products = [p for p in filtered_products if p.get('price', 0) >= min_price]
-    
-    if max_price is not None:
-        filtered_products = [p for p in filtered_products if p.get('price', 0) <= max_price]
+    if is_cursor_request(request.args):
+        matching_ids = {doc_id for doc_id, _ in search_index.search(search)} if search else None
+        
+        def matches(p):
+            return ((matching_ids is None or p['id'] in matching_ids) and
+                    (not category or p.get('category') == category) and
+                    (producer_id is None or p.get('producer_id') == producer_id) and
+                    (min_price is None or p.get('price', 0) >= min_price) and
+                    (max_price is None or p.get('price', 0) <= max_price))
+        
+        return cursor_page(matches)
     
-    # Add producer information to each product
-    for product in filtered_products:
-        producer = next((u for u in users if u['id'] == product['producer_id']), None)
-        if producer:
-            product['producer'] = {
-                'id': producer['id'],
-                'username': producer['username'],
-                'first_name': producer.get('first_name'),
-                'last_name': producer.get('last_name'),
-                'city': producer.get('city'),
-                'region': producer.get('region')
-            }
-    
-    # Pagination
     start = (page - 1) * per_page
     end = start + per_page
-    paginated_products = filtered_products[start:end]
+    index_name, descending = CURSOR_SORTS.get(sort, (None, False))
+    
+    if not (search or category or producer_id is not None or min_price is not None or max_price is not None):
+        # Unfiltered listing: slice the table (or walk the sorted index) instead of copying it
+        total = len(store.products)
+        if index_name:
+            paginated_products = list(islice(store.products.iter_sorted(index_name, descending=descending), start, end))
+        else:
+            paginated_products = store.products.slice(start, end)
+    else:
+        # Start from the narrowest index, then apply the remaining filters
+        if search:
+            ranked = search_index.search(search)
+            if sort != 'relevance':
+                ranked.sort(key=lambda item: item[0])
+            filtered_products = [store.products.get(doc_id) for doc_id, _ in ranked]
+            filtered_products = [p for p in filtered_products if p]
+        elif producer_id is not None and category:
+            if store.products.count_by('producer_id', producer_id) <= store.products.count_by('category', category):
+                filtered_products = store.products.filter_by('producer_id', producer_id)
+            else:
+                filtered_products = store.products.filter_by('category', category)
+        elif producer_id is not None:
+            filtered_products = store.products.filter_by('producer_id', producer_id)
+        elif category:
+            filtered_products = store.products.filter_by('category', category)
+        else:
+            filtered_products = list(store.products)
+        
+        if category:
+            filtered_products = [p for p in filtered_products if p.get('category') == category]
+        
+        if producer_id is not None:
+            filtered_products = [p for p in filtered_products if p.get('producer_id') == producer_id]
+        
+        if min_price is not None:
+            filtered_products = [p for p in filtered_products if p.get('price', 0) >= min_price]
+        
+        if max_price is not None:
+            filtered_products = [p for p in filtered_products if p.get('price', 0) <= max_price]
+        
+        if index_name:
+            # Same order as the cursor mode: sort key, then id
+            filtered_products.sort(key=lambda p: store.products.sort_key(index_name, p), reverse=descending)
+        
+        total = len(filtered_products)
+        paginated_products = filtered_products[start:end]
+    
+    # Add producer information to the requested page only
+    paginated_products = [with_producer(p) for p in paginated_products]
     
     return jsonify({
         'products': paginated_products,
-        'total': len(filtered_products),
+        'total': total,
         'page': page,
         'per_page': per_page,
-        'pages': (len(filtered_products) + per_page - 1) // per_page
+        'pages': (total + per_page - 1) // per_page
     })
 
 @app.route('/api/products', methods=['POST'])
+@login_required(roles=['producer', 'admin'], forbidden='Only producers and admins can create products')
 def create_product():
-    # Check for authentication token
-    auth_header = request.headers.get('Authorization')
-    if not auth_header or not auth_header.startswith('Bearer '):
-        return jsonify({'error': 'Authentication required'}), 401
-    
-    # Extract token and validate (simplified for demo)
-    token = auth_header.split(' ')[1]
-    if not token.startswith('token_'):
-        return jsonify({'error': 'Invalid token format'}), 401
-    
-    # Extract user ID from token
-    try:
-        user_id = int(token.split('_')[1])
-        user = next((u for u in users if u['id'] == user_id), None)
-        if not user:
-            return jsonify({'error': 'User not found'}), 404
-        
-        # Check if user is producer or admin
-        if user['role'] not in ['producer', 'admin']:
-            return jsonify({'error': 'Only producers and admins can create products'}), 403
-    except (IndexError, ValueError):
-        return jsonify({'error': 'Invalid token'}), 401
+    user_id = g.current_user['id']
     
     data = request.get_json()
     
@@ -380,8 +716,7 @@ def create_product():
     except (ValueError, TypeError):
         return jsonify({'error': 'Invalid price format'}), 400
     
-    product = {
-        'id': len(products) + 1,
+    product = store.products.insert({
         'name': data.get('name'),
         'description': data.get('description'),
         'price': price,
@@ -391,57 +726,40 @@ def create_product():
         'stock_quantity': data.get('stock_quantity', 0),
         'is_active': data.get('is_active', True),
         'tags': data.get('tags', []),
+        **empty_rating_aggregates(),
         'created_at': '2024-01-01T00:00:00Z',
         'updated_at': '2024-01-01T00:00:00Z'
-    }
-    products.append(product)
+    })
+    search_index.add_product(product)
+    trending.set_product(product['id'], product['category'])
+    admin_metrics.apply(changes_for(product_metric_keys(product), 1))
+    producer_rollups.add(user_id, datetime.utcnow().date(), product_count=1)
+    response_cache.invalidate('products', 'trending')
     return jsonify({
         'message': 'Product created successfully',
         'product': product
     }), 201
 
 @app.route('/api/products/<int:product_id>', methods=['GET'])
+@track_product_view(get_user_id=viewer_id, on_view=record_view)
+@conditional_response('products:detail', tags=lambda product_id: [f'product:{product_id}'],
+                      cache_control='public, no-cache')
+@cached_response('products:detail', tags=lambda product_id: [f'product:{product_id}'])
 def get_product(product_id):
-    product = next((p for p in products if p['id'] == product_id), None)
+    product = store.products.get(product_id)
     if not product:
         return jsonify({'error': 'Product not found'}), 404
     
     # Add producer information
-    producer = next((u for u in users if u['id'] == product['producer_id']), None)
-    if producer:
-        product['producer'] = {
-            'id': producer['id'],
-            'username': producer['username'],
-            'first_name': producer.get('first_name'),
-            'last_name': producer.get('last_name'),
-            'city': producer.get('city'),
-            'region': producer.get('region')
-        }
-    
-    return jsonify({'product': product})
+    return jsonify({'product': with_producer(product)})
 
 @app.route('/api/products/<int:product_id>', methods=['PUT'])
+@login_required()
 def update_product(product_id):
-    # Check for authentication token
-    auth_header = request.headers.get('Authorization')
-    if not auth_header or not auth_header.startswith('Bearer '):
-        return jsonify({'error': 'Authentication required'}), 401
+    user = g.current_user
+    user_id = user['id']
     
-    # Extract token and validate
-    token = auth_header.split(' ')[1]
-    if not token.startswith('token_'):
-        return jsonify({'error': 'Invalid token format'}), 401
-    
-    # Extract user ID from token
-    try:
-        user_id = int(token.split('_')[1])
-        user = next((u for u in users if u['id'] == user_id), None)
-        if not user:
-            return jsonify({'error': 'User not found'}), 404
-    except (IndexError, ValueError):
-        return jsonify({'error': 'Invalid token'}), 401
-    
-    product = next((p for p in products if p['id'] == product_id), None)
+    product = store.products.get(product_id)
     if not product:
         return jsonify({'error': 'Product not found'}), 404
     
@@ -460,7 +778,8 @@ def update_product(product_id):
         except (ValueError, TypeError):
             return jsonify({'error': 'Invalid price format'}), 400
     
-    product.update({
+    previous_keys = product_metric_keys(product)
+    store.products.update(product_id, {
         'name': data.get('name', product['name']),
         'description': data.get('description', product['description']),
         'price': data.get('price', product['price']),
@@ -471,6 +790,10 @@ def update_product(product_id):
         'tags': data.get('tags', product['tags']),
         'updated_at': '2024-01-01T00:00:00Z'
     })
+    search_index.add_product(product)
+    trending.set_product(product_id, product['category'])
+    admin_metrics.apply(moved(previous_keys, product_metric_keys(product)))
+    response_cache.invalidate('products', f'product:{product_id}', 'trending')
     
     return jsonify({
         'message': 'Product updated successfully',
@@ -478,28 +801,12 @@ def update_product(product_id):
     })
 
 @app.route('/api/products/<int:product_id>', methods=['DELETE'])
+@login_required()
 def delete_product(product_id):
-    # Check for authentication token
-    auth_header = request.headers.get('Authorization')
-    if not auth_header or not auth_header.startswith('Bearer '):
-        return jsonify({'error': 'Authentication required'}), 401
-    
-    # Extract token and validate
-    token = auth_header.split(' ')[1]
-    if not token.startswith('token_'):
-        return jsonify({'error': 'Invalid token format'}), 401
+    user = g.current_user
+    user_id = user['id']
     
-    # Extract user ID from token
-    try:
-        user_id = int(token.split('_')[1])
-        user = next((u for u in users if u['id'] == user_id), None)
-        if not user:
-            return jsonify({'error': 'User not found'}), 404
-    except (IndexError, ValueError):
-        return jsonify({'error': 'Invalid token'}), 401
-    
-    global products
-    product = next((p for p in products if p['id'] == product_id), None)
+    product = store.products.get(product_id)
     if not product:
         return jsonify({'error': 'Product not found'}), 404
     
@@ -507,52 +814,36 @@ def delete_product(product_id):
     if product['producer_id'] != user_id and user['role'] != 'admin':
         return jsonify({'error': 'You can only delete your own products'}), 403
     
-    products = [p for p in products if p['id'] != product_id]
+    store.products.delete(product_id)
+    search_index.remove(product_id)
+    trending.remove_product(product_id)
+    admin_metrics.apply(changes_for(product_metric_keys(product), -1))
+    producer_rollups.add(product['producer_id'], datetime.utcnow().date(), product_count=-1)
+    response_cache.invalidate('products', f'product:{product_id}', 'trending')
     return jsonify({'message': 'Product deleted successfully'})
 
 @app.route('/api/products/categories', methods=['GET'])
+@conditional_response('products:categories', tags=['products'], cache_control='public, max-age=300')
+@cached_response('products:categories', tags=['products'])
 def get_categories():
-    categories = list(set(p.get('category', '') for p in products if p.get('category')))
+    categories = [c for c in store.products.index_keys('category') if c]
     return jsonify({'categories': categories})
 
 @app.route('/api/products/my-products', methods=['GET'])
+@login_required(roles=['producer', 'admin'], forbidden='Only producers and admins can view their products')
 def get_my_products():
-    # Check for authentication token
-    auth_header = request.headers.get('Authorization')
-    if not auth_header or not auth_header.startswith('Bearer '):
-        return jsonify({'error': 'Authentication required'}), 401
+    user = g.current_user
+    user_id = user['id']
     
-    # Extract token and validate
-    token = auth_header.split(' ')[1]
-    if not token.startswith('token_'):
-        return jsonify({'error': 'Invalid token format'}), 401
+    # Add producer information to each product
+    producer = producer_summary(user)
     
-    # Extract user ID from token
-    try:
-        user_id = int(token.split('_')[1])
-        user = next((u for u in users if u['id'] == user_id), None)
-        if not user:
-            return jsonify({'error': 'User not found'}), 404
-        
-        # Check if user is producer or admin
-        if user['role'] not in ['producer', 'admin']:
-            return jsonify({'error': 'Only producers and admins can view their products'}), 403
-    except (IndexError, ValueError):
-        return jsonify({'error': 'Invalid token'}), 401
+    if is_cursor_request(request.args):
+        return cursor_page(lambda p: p['producer_id'] == user_id, lambda p: {**p, 'producer': producer})
     
     # Get user's products
-    user_products = [p for p in products if p['producer_id'] == user_id]
-    
-    # Add producer information to each product
-    for product in user_products:
-        product['producer'] = {
-            'id': user['id'],
-            'username': user['username'],
-            'first_name': user.get('first_name'),
-            'last_name': user.get('last_name'),
-            'city': user.get('city'),
-            'region': user.get('region')
-        }
+    user_products = store.products.filter_by('producer_id', user_id)
+    user_products = [{**p, 'producer': producer} for p in user_products]
     
     return jsonify({
         'products': user_products,
@@ -562,25 +853,34 @@ def get_my_products():
 # Reviews and Ratings endpoints
 @app.route('/api/products/<int:product_id>/reviews', methods=['GET'])
 def get_product_reviews(product_id):
-    product_reviews = [r for r in reviews if r.get('product_id') == product_id]
+    product_reviews = store.reviews.filter_by('product_id', product_id)
+    product = store.products.get(product_id) or empty_rating_aggregates()
     return jsonify({
         'reviews': product_reviews,
         'count': len(product_reviews),
-        'average_rating': sum(r.get('rating', 0) for r in product_reviews) / len(product_reviews) if product_reviews else 0
+        'average_rating': product['rating_average'],
+        'rating_histogram': product['rating_histogram']
     })
 
 @app.route('/api/products/<int:product_id>/reviews', methods=['POST'])
 def create_review(product_id):
     data = request.get_json()
-    review = {
-        'id': len(reviews) + 1,
+    is_valid, error = validate_rating(data.get('rating'))
+    if not is_valid:
+        return jsonify({'error': error}), 400
+    
+    review = store.reviews.insert({
         'product_id': product_id,
         'user_id': data.get('user_id'),
-        'rating': data.get('rating'),
+        'rating': int(data.get('rating')),
         'comment': data.get('comment', ''),
-        'created_at': '2024-01-01T00:00:00Z'
-    }
-    reviews.append(review)
+        'created_at': now_iso()
+    })
+    apply_review_rating(review, 1)
+    trending.record(product_id, 'review', at=epoch(review['created_at']))
+    admin_metrics.apply(changes_for(review_metric_keys(review), 1))
+    producer_rollups.add(producer_of(product_id), day_of(review['created_at']), **review_deltas(review, 1))
+    response_cache.invalidate('products', f'product:{product_id}', 'trending')
     return jsonify({
         'message': 'Review created successfully',
         'review': review
@@ -588,16 +888,27 @@ def create_review(product_id):
 
 @app.route('/api/reviews/<int:review_id>', methods=['PUT'])
 def update_review(review_id):
-    review = next((r for r in reviews if r['id'] == review_id), None)
+    review = store.reviews.get(review_id)
     if not review:
         return jsonify({'error': 'Review not found'}), 404
     
     data = request.get_json()
-    review.update({
-        'rating': data.get('rating', review['rating']),
+    if 'rating' in data:
+        is_valid, error = validate_rating(data['rating'])
+        if not is_valid:
+            return jsonify({'error': error}), 400
+    
+    apply_review_rating(review, -1)
+    previous = review_deltas(review, -1)
+    store.reviews.update(review_id, {
+        'rating': int(data.get('rating', review['rating'])),
         'comment': data.get('comment', review['comment']),
         'updated_at': '2024-01-01T00:00:00Z'
     })
+    apply_review_rating(review, 1)
+    producer_rollups.add(producer_of(review['product_id']), datetime.utcnow().date(),
+                         rating_sum=previous['rating_sum'] + review['rating'])
+    response_cache.invalidate('products', f"product:{review['product_id']}", 'trending')
     
     return jsonify({
         'message': 'Review updated successfully',
@@ -606,21 +917,25 @@ def update_review(review_id):
 
 @app.route('/api/reviews/<int:review_id>', methods=['DELETE'])
 def delete_review(review_id):
-    global reviews
-    review = next((r for r in reviews if r['id'] == review_id), None)
+    review = store.reviews.get(review_id)
     if not review:
         return jsonify({'error': 'Review not found'}), 404
     
-    reviews = [r for r in reviews if r['id'] != review_id]
+    store.reviews.delete(review_id)
+    apply_review_rating(review, -1)
+    trending.record(review['product_id'], 'review', -1, at=epoch(review['created_at']))
+    admin_metrics.apply(changes_for(review_metric_keys(review), -1))
+    producer_rollups.add(producer_of(review['product_id']), datetime.utcnow().date(), **review_deltas(review, -1))
+    response_cache.invalidate('products', f"product:{review['product_id']}", 'trending')
     return jsonify({'message': 'Review deleted successfully'})
 
 # Favorites endpoints
 @app.route('/api/users/<int:user_id>/favorites', methods=['GET'])
 def get_user_favorites(user_id):
-    user_favorites = [f for f in favorites if f.get('user_id') == user_id]
+    user_favorites = store.favorites.filter_by('user_id', user_id)
     favorite_products = []
     for fav in user_favorites:
-        product = next((p for p in products if p['id'] == fav['product_id']), None)
+        product = store.products.get(fav['product_id'])
         if product:
             favorite_products.append(product)
     
@@ -635,17 +950,20 @@ def add_favorite(user_id):
     product_id = data.get('product_id')
     
     # Check if already favorited
-    existing = next((f for f in favorites if f['user_id'] == user_id and f['product_id'] == product_id), None)
+    existing = store.favorites.get_by('user_product', (user_id, product_id))
     if existing:
         return jsonify({'error': 'Product already in favorites'}), 400
     
-    favorite = {
-        'id': len(favorites) + 1,
+    favorite = store.favorites.insert({
         'user_id': user_id,
         'product_id': product_id,
-        'created_at': '2024-01-01T00:00:00Z'
-    }
-    favorites.append(favorite)
+        'created_at': now_iso()
+    })
+    trending.record(product_id, 'favorite', at=epoch(favorite['created_at']))
+    admin_metrics.add('favorites', 1)
+    analytics_buckets.add('favorites', parse_time(favorite['created_at']), 1, **product_dimensions(product_id))
+    producer_rollups.add(producer_of(product_id), day_of(favorite['created_at']), favorite_count=1)
+    response_cache.invalidate('trending')
     return jsonify({
         'message': 'Product added to favorites',
         'favorite': favorite
@@ -653,123 +971,156 @@ def add_favorite(user_id):
 
 @app.route('/api/users/<int:user_id>/favorites/<int:product_id>', methods=['DELETE'])
 def remove_favorite(user_id, product_id):
-    global favorites
-    favorite = next((f for f in favorites if f['user_id'] == user_id and f['product_id'] == product_id), None)
+    favorite = store.favorites.get_by('user_product', (user_id, product_id))
     if not favorite:
         return jsonify({'error': 'Favorite not found'}), 404
     
-    favorites = [f for f in favorites if not (f['user_id'] == user_id and f['product_id'] == product_id)]
+    store.favorites.delete(favorite['id'])
+    trending.record(product_id, 'favorite', -1, at=epoch(favorite['created_at']))
+    admin_metrics.add('favorites', -1)
+    analytics_buckets.add('favorites', parse_time(favorite['created_at']), -1, **product_dimensions(product_id))
+    producer_rollups.add(producer_of(product_id), datetime.utcnow().date(), favorite_count=-1)
+    response_cache.invalidate('trending')
     return jsonify({'message': 'Product removed from favorites'})
 
 # Search tracking
 @app.route('/api/search', methods=['POST'])
 def track_search():
-    data = request.get_json()
-    search_entry = {
-        'id': len(search_history) + 1,
-        'user_id': data.get('user_id'),
-        'query': data.get('query'),
-        'filters': data.get('filters', {}),
-        'results_count': data.get('results_count', 0),
-        'created_at': '2024-01-01T00:00:00Z'
-    }
-    search_history.append(search_entry)
-    return jsonify({'message': 'Search tracked successfully'})
+    data = request.get_json(silent=True) or {}
+    query = data.get('query')
+    if not isinstance(query, str) or not query.strip():
+        return jsonify({'error': 'Query is required'}), 400
+    
+    accepted = search_history_writer.record(
+        query,
+        user_id=data.get('user_id'),
+        client_key=request.remote_addr,
+        filters=data.get('filters', {}),
+        results_count=data.get('results_count', 0)
+    )
+    return jsonify({'message': 'Search tracked successfully', 'accepted': accepted}), 202
 
 @app.route('/api/search/history/<int:user_id>', methods=['GET'])
 def get_search_history(user_id):
-    user_searches = [s for s in search_history if s.get('user_id') == user_id]
+    # Buffered searches first, then written ones not superseded by them
+    pending = [
+        {**entry, 'created_at': entry['created_at'].isoformat() + 'Z', 'last_searched_at': entry['last_searched_at'].isoformat() + 'Z'}
+        for entry in search_history_writer.pending_for(user_id)
+    ]
+    pending_queries = {entry['normalized_query'] for entry in pending}
+    stored = sorted(
+        (search for search in store.search_history.filter_by('user_id', user_id) if search['normalized_query'] not in pending_queries),
+        key=lambda search: search['last_searched_at'], reverse=True
+    )
+    user_searches = pending + stored
     return jsonify({
         'searches': user_searches,
         'count': len(user_searches)
     })
 
+@app.route('/api/search/popular', methods=['GET'])
+def get_popular_searches():
+    limit = min(request.args.get('limit', 10, type=int) or 10, 100)
+    queries = []
+    for stat in store.search_query_stats.iter_sorted('search_count', descending=True):
+        if len(queries) >= limit:
+            break
+        queries.append(stat)
+    return jsonify({'queries': queries})
+
 # Analytics and Dashboard endpoints
 @app.route('/api/analytics/producer/<int:producer_id>/stats', methods=['GET'])
 def get_producer_stats(producer_id):
-    # Get producer's products
-    producer_products = [p for p in products if p.get('producer_id') == producer_id]
-    product_ids = [p['id'] for p in producer_products]
+    days = min(max(request.args.get('days', 30, type=int) or 30, 1), 365)
+    products_limit = min(max(request.args.get('products_limit', 5, type=int) or 0, 0), 50)
     
-    # Calculate stats
-    total_products = len(producer_products)
-    total_views = sum(p.get('views', 0) for p in producer_products)
-    total_favorites = len([f for f in favorites if f.get('product_id') in product_ids])
-    total_reviews = len([r for r in reviews if r.get('product_id') in product_ids])
+    # Totals and the daily series come from the rollups, not a scan of the producer's data
+    end = datetime.utcnow().date()
+    start = end - timedelta(days=days - 1)
+    daily = [daily_point(day, deltas) for day, deltas in producer_rollups.series(producer_id, start, end)]
     
-    # Average rating
-    product_reviews = [r for r in reviews if r.get('product_id') in product_ids]
-    avg_rating = sum(r.get('rating', 0) for r in product_reviews) / len(product_reviews) if product_reviews else 0
+    recent = sorted(store.products.filter_by('producer_id', producer_id),
+                    key=lambda p: (p['created_at'], p['id']), reverse=True)[:products_limit]
     
     return jsonify({
         'producer_id': producer_id,
-        'total_products': total_products,
-        'total_views': total_views,
-        'total_favorites': total_favorites,
-        'total_reviews': total_reviews,
-        'average_rating': round(avg_rating, 2),
-        'products': producer_products
+        **summarize(producer_rollups.total(producer_id)),
+        'daily': daily,
+        'products': recent
     })
 
 @app.route('/api/analytics/admin/overview', methods=['GET'])
 def get_admin_overview():
-    # Calculate overall stats
-    total_users = len(users)
-    total_products = len(products)
-    total_reviews = len(reviews)
-    total_favorites = len(favorites)
-    total_searches = len(search_history)
-    
-    # User role distribution
-    role_distribution = {}
-    for user in users:
-        role = user.get('role', 'consumer')
-        role_distribution[role] = role_distribution.get(role, 0) + 1
-    
-    # Category distribution
-    category_distribution = {}
-    for product in products:
-        category = product.get('category', 'uncategorized')
-        category_distribution[category] = category_distribution.get(category, 0) + 1
+    # Totals and distributions are live counters, so this is independent of table sizes
+    return jsonify(admin_metrics.overview())
+
+@app.route('/api/analytics/timeseries', methods=['GET'])
+def get_timeseries():
+    try:
+        params = parse_timeseries_args(request.args)
+    except ValueError as error:
+        return jsonify({'error': str(error)}), 400
     
-    return jsonify({
-        'total_users': total_users,
-        'total_products': total_products,
-        'total_reviews': total_reviews,
-        'total_favorites': total_favorites,
-        'total_searches': total_searches,
-        'role_distribution': role_distribution,
-        'category_distribution': category_distribution
-    })
+    series = analytics_buckets.series(params['metric'], params['granularity'], params['by'], params['starts'])
+    if params['by'] == 'all':
+        series = {'': series.get('', {})}
+    elif params['key']:
+        series = {params['key']: series.get(params['key'], {})}
+    return jsonify(timeseries_payload(params, series))
 
 @app.route('/api/analytics/products/trending', methods=['GET'])
+@cached_response('analytics:trending', tags=['trending'], ttl=30, defaults={'k': '10'})
 def get_trending_products():
-    # Simple trending calculation based on favorites and views
+    category = request.args.get('category') or None
+    k = request.args.get('k', 10, type=int)
+    if k is None or k < 1:
+        return jsonify({'error': 'k must be a positive integer'}), 400
+    
+    # Top-k straight from the category heap instead of scoring every product
     trending_products = []
-    for product in products:
-        product_id = product['id']
-        favorites_count = len([f for f in favorites if f.get('product_id') == product_id])
-        reviews_count = len([r for r in reviews if r.get('product_id') == product_id])
-        views = product.get('views', 0)
-        
-        # Simple trending score
-        trending_score = favorites_count * 2 + reviews_count * 1.5 + views * 0.1
-        
+    for product_id, score in trending.top(k, category=category):
+        product = store.products.get(product_id)
+        if not product:
+            continue
         trending_products.append({
             **product,
-            'trending_score': trending_score,
-            'favorites_count': favorites_count,
-            'reviews_count': reviews_count
+            'trending_score': round(score, 4),
+            'favorites_count': store.favorites.count_by('product_id', product_id),
+            'reviews_count': store.reviews.count_by('product_id', product_id)
         })
     
-    # Sort by trending score
-    trending_products.sort(key=lambda x: x['trending_score'], reverse=True)
-    
     return jsonify({
-        'trending_products': trending_products[:10],  # Top 10
-        'count': len(trending_products)
+        'trending_products': trending_products,
+        'count': len(trending_products),
+        'category': category,
+        'k': min(k, trending.max_k)
     })
 
+@app.route('/api/diagnostics/cache', methods=['GET'])
+@login_required(roles=['admin'])
+def cache_stats():
+    return jsonify({'enabled': True, **response_cache.stats()})
+
+@app.route('/api/diagnostics/views', methods=['GET'])
+@login_required(roles=['admin'])
+def view_ingestion_stats():
+    return jsonify({'enabled': True, **view_ingestor.stats()})
+
+@app.route('/api/diagnostics/admin-metrics', methods=['GET'])
+@login_required(roles=['admin'])
+def admin_metrics_stats():
+    return jsonify(admin_metrics.stats())
+
+@app.route('/api/diagnostics/search-history', methods=['GET'])
+@login_required(roles=['admin'])
+def search_history_stats():
+    return jsonify({'enabled': True, **search_history_writer.stats()})
+
+@app.route('/api/diagnostics/tokens', methods=['GET'])
+@login_required(roles=['admin'])
+def token_stats():
+    return jsonify(token_service.stats())
+
 if __name__ == '__main__':
     print("🚀 Starting Mantouji.ma API...")
     print("📍 API will be available at: http://localhost:5000")
@@ -0,0 +1,90 @@
+from collections import Counter
+
+import pytest
+
+from app import db
+from app.services.counter_buffer import MAX_ATTEMPTS, CounterBuffer, stage
+
+
+class Deltas(Counter):
+    def merge(self, other):
+        self.update(other)
+
+
+class Recorder:
+    """Writer recording what it was asked to write, failing while 'failing' is set"""
+
+    def __init__(self, failing=False):
+        self.failing = failing
+        self.writes = []
+
+    def __call__(self, connection, deltas):
+        if self.failing:
+            raise RuntimeError('write failed')
+        self.writes.append(dict(deltas))
+
+
+@pytest.fixture
+def buffer(app):
+    # No timed flushes: the tests flush explicitly
+    buffer = CounterBuffer(app, flush_interval=3600, flush_keys=10 ** 6)
+    app.extensions['counter_buffer'] = buffer
+    yield buffer
+    buffer.stop()
+
+
+def test_without_a_buffer_deltas_are_written_in_the_transaction(app):
+    write = Recorder()
+
+    stage(db.session, 'group', write, Deltas(a=1))
+
+    assert write.writes == [{'a': 1}]
+
+
+def test_committed_deltas_are_coalesced_until_the_flush(buffer):
+    write = Recorder()
+    for _ in range(3):
+        stage(db.session, 'group', write, Deltas(a=1, b=2))
+        db.session.commit()
+
+    assert write.writes == []
+    assert buffer.stats()['pending_keys'] == 2
+    assert buffer.flush() == 2
+    assert write.writes == [{'a': 3, 'b': 6}]
+
+
+def test_rolled_back_deltas_are_discarded(buffer):
+    write = Recorder()
+    stage(db.session, 'group', write, Deltas(a=1))
+    db.session.rollback()
+
+    assert buffer.flush() == 0
+    assert write.writes == []
+
+
+def test_a_failing_group_is_retried_then_dropped_without_blocking_others(buffer):
+    failing, healthy = Recorder(failing=True), Recorder()
+    buffer.add('broken', failing, Deltas(a=1))
+
+    for attempt in range(1, MAX_ATTEMPTS + 1):
+        buffer.add('healthy', healthy, Deltas(b=attempt))
+        buffer.flush()
+        assert buffer.stats()['failed'] == attempt
+
+    stats = buffer.stats()
+    assert stats['dropped_keys'] == 1
+    assert stats['pending_keys'] == 0
+    assert healthy.writes == [{'b': 1}, {'b': 2}, {'b': 3}]
+
+
+def test_a_group_that_recovers_writes_its_retried_deltas(buffer):
+    write = Recorder(failing=True)
+    buffer.add('group', write, Deltas(a=1))
+    buffer.flush()
+
+    write.failing = False
+    buffer.add('group', write, Deltas(a=2))
+    buffer.flush()
+
+    assert write.writes == [{'a': 3}]
+    assert buffer.stats()['dropped_keys'] == 0
@@ -0,0 +1,23 @@
+import pytest
+
+ROUTES = ['/api/diagnostics/cache', '/api/diagnostics/tokens', '/api/diagnostics/db-routing', '/api/diagnostics/user-cache']
+
+
+@pytest.mark.parametrize('route', ROUTES)
+def test_anonymous_callers_are_rejected(client, route):
+    assert client.get(route).status_code == 401
+
+
+@pytest.mark.parametrize('role', ['consumer', 'producer'])
+def test_non_admins_are_forbidden(client, make_user, auth_headers, role):
+    user = make_user('someone', role=role)
+
+    for route in ROUTES:
+        assert client.get(route, headers=auth_headers(user)).status_code == 403
+
+
+def test_admins_can_read_diagnostics(client, make_user, auth_headers):
+    admin = make_user('admin', role='admin')
+
+    for route in ROUTES:
+        assert client.get(route, headers=auth_headers(admin)).status_code == 200
@@ -0,0 +1,61 @@
+from app import db
+
+
+def _revalidate(client, url, etag):
+    return client.get(url, headers={'If-None-Match': etag})
+
+
+def test_unchanged_product_revalidates_with_304(client, make_user, make_product):
+    product = make_product(make_user('producer', role='producer'), 'Argan oil')
+    url = f'/api/products/{product.id}'
+
+    response = client.get(url)
+    assert response.status_code == 200
+
+    assert _revalidate(client, url, response.headers['ETag']).status_code == 304
+
+
+def test_product_edit_changes_the_etag(client, auth_headers, make_user, make_product):
+    producer = make_user('producer', role='producer')
+    product = make_product(producer, 'Argan oil')
+    url = f'/api/products/{product.id}'
+    etag = client.get(url).headers['ETag']
+
+    response = client.put(url, headers=auth_headers(producer), json={
+        'name': 'Cold-pressed argan oil', 'description': 'Oil', 'category': 'Food', 'price': 12
+    })
+    assert response.status_code == 200
+
+    response = _revalidate(client, url, etag)
+    assert response.status_code == 200
+    assert response.get_json()['product']['name'] == 'Cold-pressed argan oil'
+
+
+def test_producer_profile_edit_changes_product_etags(client, make_user, make_product):
+    producer = make_user('producer', role='producer')
+    product = make_product(producer, 'Argan oil')
+    detail_url, list_url = f'/api/products/{product.id}', '/api/products'
+    detail_etag = client.get(detail_url).headers['ETag']
+    list_etag = client.get(list_url).headers['ETag']
+
+    producer.first_name = 'Fatima'
+    db.session.commit()
+
+    response = _revalidate(client, detail_url, detail_etag)
+    assert response.status_code == 200
+    assert response.get_json()['product']['producer']['first_name'] == 'Fatima'
+    response = _revalidate(client, list_url, list_etag)
+    assert response.status_code == 200
+    assert response.get_json()['products'][0]['producer']['first_name'] == 'Fatima'
+
+
+def test_non_profile_user_writes_keep_product_etags(client, make_user, make_product):
+    producer = make_user('producer', role='producer')
+    product = make_product(producer, 'Argan oil')
+    url = f'/api/products/{product.id}'
+    etag = client.get(url).headers['ETag']
+
+    producer.phone = '+212600000000'
+    db.session.commit()
+
+    assert _revalidate(client, url, etag).status_code == 304
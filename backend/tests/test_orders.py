@@ -0,0 +1,84 @@
+import pytest
+
+from app import db
+from app.models.order import Order
+from app.models.producer_stat import ProducerStat
+from app.models.product import Product
+from app.services.orders import OrderError, cancel_order, place_orders
+
+
+@pytest.fixture
+def shop(make_user, make_product):
+    producer = make_user('producer', role='producer')
+    consumer = make_user('consumer')
+    product = make_product(producer, 'Argan oil', stock_quantity=5)
+    return producer, consumer, product
+
+
+def _stock(product_id):
+    db.session.expire_all()
+    return db.session.get(Product, product_id).stock_quantity
+
+
+def test_placing_an_order_reserves_stock(shop):
+    _, consumer, product = shop
+
+    orders = place_orders(consumer.id, [{'product_id': product.id, 'quantity': 3}], 'Rabat')
+
+    assert len(orders) == 1
+    assert _stock(product.id) == 2
+
+
+def test_orders_beyond_stock_are_rejected_without_reserving(shop):
+    _, consumer, product = shop
+    place_orders(consumer.id, [{'product_id': product.id, 'quantity': 4}], 'Rabat')
+
+    with pytest.raises(OrderError) as error:
+        place_orders(consumer.id, [{'product_id': product.id, 'quantity': 2}], 'Rabat')
+
+    assert error.value.status == 409
+    assert _stock(product.id) == 1
+    assert db.session.query(Order).count() == 1
+
+
+def test_cancelling_restocks_once(shop):
+    producer, consumer, product = shop
+    order, = place_orders(consumer.id, [{'product_id': product.id, 'quantity': 3}], 'Rabat')
+
+    cancel_order(order)
+    assert order.status == 'cancelled'
+    assert _stock(product.id) == 5
+    assert db.session.get(ProducerStat, producer.id).order_count == 0
+
+    with pytest.raises(OrderError):
+        cancel_order(order)
+    assert _stock(product.id) == 5
+
+
+def test_cancelling_an_order_cancelled_elsewhere_does_not_restock(shop):
+    _, consumer, product = shop
+    order, = place_orders(consumer.id, [{'product_id': product.id, 'quantity': 3}], 'Rabat')
+    assert order.status == 'pending'
+
+    # Another request cancels it after this one loaded the order
+    db.session.execute(Order.__table__.update().where(Order.__table__.c.id == order.id).values(status='cancelled'))
+
+    with pytest.raises(OrderError) as error:
+        cancel_order(order)
+    assert error.value.status == 409
+    assert _stock(product.id) == 2
+
+
+def test_cancel_endpoint(client, auth_headers, shop):
+    _, consumer, product = shop
+    response = client.post('/api/orders', headers=auth_headers(consumer), json={
+        'shipping_address': 'Rabat', 'items': [{'product_id': product.id, 'quantity': 2}]
+    })
+    assert response.status_code == 201
+    order_id = response.get_json()['orders'][0]['id']
+
+    response = client.post(f'/api/orders/{order_id}/cancel', headers=auth_headers(consumer))
+    assert response.status_code == 200
+    assert response.get_json()['order']['status'] == 'cancelled'
+    assert client.post(f'/api/orders/{order_id}/cancel', headers=auth_headers(consumer)).status_code == 409
+    assert _stock(product.id) == 5
@@ -0,0 +1,37 @@
+def _ids(response):
+    return [product['id'] for product in response.get_json()['products']]
+
+
+def test_filters_apply_before_the_result_cap(app, client, make_user, make_product):
+    app.config['SEARCH_MAX_RESULTS'] = 2
+    producer = make_user('producer', role='producer')
+    for i in range(4):
+        make_product(producer, f'Argan oil {i}', category='Food')
+    # Ranked below every oil: argan appears once, in a long description
+    spice = make_product(producer, 'Ras el hanout', category='Spices',
+                         description='Blend of cumin, ginger, cinnamon, pepper and roasted argan kernels')
+
+    response = client.get('/api/products?search=argan&category=Spices')
+
+    assert response.status_code == 200
+    assert _ids(response) == [spice.id]
+    assert response.get_json()['total'] == 1
+
+
+def test_relevance_order_uses_filtered_ranking(app, client, make_user, make_product):
+    producer = make_user('producer', role='producer')
+    cheap = make_product(producer, 'Honey', description='Honey honey honey', price=5)
+    make_product(producer, 'Honey', description='Thyme', price=50)
+
+    response = client.get('/api/products?search=honey&max_price=10&sort=relevance')
+
+    assert _ids(response) == [cheap.id]
+
+
+def test_french_names_are_searchable(client, make_user, make_product):
+    producer = make_user('producer', role='producer')
+    olive = make_product(producer, "L'huile d'olive")
+    tea = make_product(producer, 'Thé à la menthe')
+
+    assert _ids(client.get('/api/products?search=olive')) == [olive.id]
+    assert _ids(client.get('/api/products?search=thé')) == [tea.id]
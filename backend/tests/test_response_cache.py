@@ -0,0 +1,61 @@
+import pytest
+
+from app import db
+from app.models.product import Product
+from app.services.cache import KeyValueCache, LocalKeyValueStore, LRUCache, ResponseCache
+from app.services.orders import place_orders
+
+
+@pytest.mark.parametrize('backend', [LRUCache(), KeyValueCache(LocalKeyValueStore())], ids=['memory', 'key-value'])
+def test_invalidating_a_tag_makes_its_entries_unreachable(backend):
+    cache = ResponseCache(backend)
+    tagged = cache.build_key('products:list', {'page': 1}, ['products'])
+    other = cache.build_key('analytics:trending', {}, ['trending'])
+    cache.set(tagged, {'body': 'old'})
+    cache.set(other, {'body': 'kept'})
+
+    cache.invalidate('products')
+
+    assert cache.build_key('products:list', {'page': 1}, ['products']) != tagged
+    assert cache.get('products:list', cache.build_key('products:list', {'page': 1}, ['products'])) is None
+    assert cache.get('analytics:trending', cache.build_key('analytics:trending', {}, ['trending'])) == {'body': 'kept'}
+
+
+def test_lists_are_served_from_the_cache_until_a_product_changes(client, make_user, make_product):
+    producer = make_user('producer', role='producer')
+    product = make_product(producer, 'Argan oil')
+
+    assert client.get('/api/products').headers['X-Cache'] == 'MISS'
+    assert client.get('/api/products').headers['X-Cache'] == 'HIT'
+
+    product.price = 99
+    db.session.commit()
+
+    response = client.get('/api/products')
+    assert response.headers['X-Cache'] == 'MISS'
+    assert response.get_json()['products'][0]['price'] == 99
+
+
+def test_stock_written_through_core_expires_the_detail(client, make_user, make_product):
+    producer, consumer = make_user('producer', role='producer'), make_user('consumer')
+    product = make_product(producer, 'Argan oil', stock_quantity=5)
+    url = f'/api/products/{product.id}'
+    client.get(url)
+    assert client.get(url).headers['X-Cache'] == 'HIT'
+
+    place_orders(consumer.id, [{'product_id': product.id, 'quantity': 2}], 'Rabat')
+
+    response = client.get(url)
+    assert response.headers['X-Cache'] == 'MISS'
+    assert response.get_json()['product']['stock_quantity'] == 3
+
+
+def test_rolled_back_writes_keep_the_cache(client, make_user, make_product):
+    product = make_product(make_user('producer', role='producer'), 'Argan oil')
+    client.get('/api/products')
+
+    db.session.get(Product, product.id).price = 1
+    db.session.flush()
+    db.session.rollback()
+
+    assert client.get('/api/products').headers['X-Cache'] == 'HIT'
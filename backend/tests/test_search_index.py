@@ -0,0 +1,29 @@
+from app.services.search_index import SearchIndex, tokenize
+
+
+def test_elided_articles_are_split_off():
+    assert tokenize("Huile d'argan") == ['huile', 'argan']
+    assert tokenize("L'huile d'olive") == ['huile', 'olive']
+    assert tokenize('L’huile d’olive') == ['huile', 'olive']
+
+
+def test_accented_words_are_not_mistaken_for_stop_words():
+    assert tokenize('Thé à la menthe') == ['the', 'menthe']
+    assert tokenize('the honey') == ['honey']
+
+
+def test_transliteration_marks_are_folded():
+    assert tokenize("Ma'louf") == ['malouf']
+    assert tokenize('ʿasal') == ['asal']
+
+
+def test_search_matches_french_names():
+    index = SearchIndex()
+    index.add('tea', 'Thé à la menthe')
+    index.add('olive', "L'huile d'olive")
+    index.add('argan', "Huile d'argan")
+
+    assert [doc_id for doc_id, _ in index.search('thé')] == ['tea']
+    assert [doc_id for doc_id, _ in index.search('olive')] == ['olive']
+    assert [doc_id for doc_id, _ in index.search('argan')] == ['argan']
+    assert sorted(doc_id for doc_id, _ in index.search('huile')) == ['argan', 'olive']
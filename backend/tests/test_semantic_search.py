@@ -0,0 +1,37 @@
+from app import db
+from app.models.product import Product
+from app.models.user import User
+from app.services.semantic_search import create_semantic_index
+
+from conftest import build_app
+
+
+def _search(tmp_path, database, names):
+    app = build_app(SQLALCHEMY_DATABASE_URI=f'sqlite:///{tmp_path / database}')
+    app.instance_path = str(tmp_path / 'instance')
+    index = create_semantic_index(app)
+    with app.app_context():
+        db.create_all()
+        producer = User(username='producer', email='producer@example.com', first_name='P', last_name='T', role='producer')
+        producer.set_password('password1')
+        db.session.add(producer)
+        db.session.flush()
+        products = [Product(producer_id=producer.id, name=name, description=name, category='Food', price=1) for name in names]
+        db.session.add_all(products)
+        db.session.commit()
+
+        names_by_id = {product.id: product.name for product in products}
+        results = [names_by_id.get(product_id) for product_id, _ in index.search('honey')]
+        directory = index.directory
+        db.session.remove()
+    return directory, results
+
+
+def test_builds_are_kept_per_database_under_the_instance_folder(tmp_path):
+    first_directory, first = _search(tmp_path, 'first.db', ['Honey jar', 'Olive oil'])
+    second_directory, second = _search(tmp_path, 'second.db', ['Thyme honey', 'Argan oil'])
+
+    assert first_directory.startswith(str(tmp_path / 'instance' / 'embeddings'))
+    assert first_directory != second_directory
+    assert first == ['Honey jar']
+    assert second == ['Thyme honey']
@@ -0,0 +1,43 @@
+import base64
+import json
+
+import pytest
+
+
+@pytest.fixture
+def dev_client():
+    import simple_app
+    return simple_app.app.test_client()
+
+
+def _prices(response):
+    return [product['price'] for product in response.get_json()['products']]
+
+
+@pytest.mark.parametrize('params', [{}, {'min_price': 1}])
+def test_offset_listing_applies_the_sort(dev_client, params):
+    ascending = _prices(dev_client.get('/api/products', query_string={'per_page': 50, 'sort': 'price_asc', **params}))
+    descending = _prices(dev_client.get('/api/products', query_string={'per_page': 50, 'sort': 'price_desc', **params}))
+
+    assert ascending == sorted(ascending) and len(ascending) > 1
+    assert descending == ascending[::-1]
+
+
+@pytest.mark.parametrize('sort, value, row_id', [('price_asc', 'cheap', 1), ('newest', 5, 1), ('price_asc', 10, 'one')])
+def test_cursor_values_of_the_wrong_type_are_rejected(dev_client, sort, value, row_id):
+    payload = json.dumps({'s': sort, 'v': value, 'id': row_id}).encode()
+    cursor = base64.urlsafe_b64encode(payload).decode().rstrip('=')
+
+    response = dev_client.get('/api/products', query_string={'sort': sort, 'cursor': cursor})
+
+    assert response.status_code == 400
+    assert response.get_json()['error'] == 'Invalid cursor'
+
+
+def test_cursor_pages_follow_on(dev_client):
+    first = dev_client.get('/api/products', query_string={'sort': 'price_asc', 'limit': 2}).get_json()
+    second = dev_client.get('/api/products', query_string={
+        'sort': 'price_asc', 'limit': 2, 'cursor': first['next_cursor']
+    }).get_json()
+
+    assert first['products'][-1]['price'] <= second['products'][0]['price']
@@ -0,0 +1,65 @@
+import pytest
+
+from app.services.tokens import create_token_service
+
+
+def _bearer(token):
+    return {'Authorization': f'Bearer {token}'}
+
+
+@pytest.fixture
+def session_tokens(client, make_user):
+    make_user('consumer')
+    response = client.post('/api/auth/login', json={'email': 'consumer@example.com', 'password': 'password1'})
+    assert response.status_code == 200
+    return response.get_json()
+
+
+def _refresh(client, refresh_token):
+    return client.post('/api/auth/refresh', headers=_bearer(refresh_token))
+
+
+def test_refresh_rotates_the_pair(client, session_tokens):
+    response = _refresh(client, session_tokens['refresh_token'])
+    assert response.status_code == 200
+    rotated = response.get_json()
+
+    assert rotated['refresh_token'] != session_tokens['refresh_token']
+    assert client.get('/api/auth/me', headers=_bearer(rotated['access_token'])).status_code == 200
+    assert _refresh(client, rotated['refresh_token']).status_code == 200
+
+
+def test_reusing_a_rotated_refresh_token_revokes_the_session(client, session_tokens):
+    rotated = _refresh(client, session_tokens['refresh_token']).get_json()
+
+    assert _refresh(client, session_tokens['refresh_token']).status_code == 401
+
+    # Every token of the family is revoked, including the pair issued by the rotation
+    assert _refresh(client, rotated['refresh_token']).status_code == 401
+    assert client.get('/api/auth/me', headers=_bearer(rotated['access_token'])).status_code == 401
+    assert client.get('/api/auth/me', headers=_bearer(session_tokens['access_token'])).status_code == 401
+
+
+def test_access_tokens_cannot_refresh(client, session_tokens):
+    assert _refresh(client, session_tokens['access_token']).status_code in (401, 422)
+
+
+def test_logout_revokes_the_session(client, session_tokens):
+    headers = _bearer(session_tokens['access_token'])
+    assert client.post('/api/auth/logout', headers=headers).status_code == 200
+
+    assert client.get('/api/auth/me', headers=headers).status_code == 401
+    assert _refresh(client, session_tokens['refresh_token']).status_code == 401
+
+
+def test_other_workers_see_revocations_after_a_sync(app, client, session_tokens):
+    from flask_jwt_extended import decode_token
+
+    other_worker = create_token_service(app.config)
+    access = decode_token(session_tokens['access_token'])
+    assert not other_worker.is_revoked(access)
+
+    client.post('/api/auth/logout', headers=_bearer(session_tokens['access_token']))
+    other_worker.revocations.sync()
+
+    assert other_worker.is_revoked(access)
@@ -46,6 +46,14 @@ CREATE TABLE products (
     is_available BOOLEAN DEFAULT TRUE,
     harvest_date DATE,
     expiry_date DATE,
+    rating_sum INTEGER NOT NULL DEFAULT 0,
+    rating_count INTEGER NOT NULL DEFAULT 0,
+    rating_average DOUBLE PRECISION NOT NULL DEFAULT 0,
+    rating_1_count INTEGER NOT NULL DEFAULT 0,
+    rating_2_count INTEGER NOT NULL DEFAULT 0,
+    rating_3_count INTEGER NOT NULL DEFAULT 0,
+    rating_4_count INTEGER NOT NULL DEFAULT 0,
+    rating_5_count INTEGER NOT NULL DEFAULT 0,
     created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
     updated_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
 );
@@ -80,9 +88,22 @@ CREATE TABLE search_history (
     id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
     user_id UUID REFERENCES users(id) ON DELETE CASCADE,
     search_query VARCHAR(255) NOT NULL,
+    normalized_query VARCHAR(255) NOT NULL,
     filters JSONB DEFAULT '{}',
     results_count INTEGER DEFAULT 0,
-    created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+    search_count INTEGER NOT NULL DEFAULT 1,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+    last_searched_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+    CONSTRAINT uq_search_history_user_query UNIQUE (user_id, normalized_query)
+);
+
+-- Aggregated search query frequencies
+CREATE TABLE search_query_stats (
+    normalized_query VARCHAR(255) PRIMARY KEY,
+    search_query VARCHAR(255) NOT NULL,
+    search_count BIGINT NOT NULL DEFAULT 0,
+    results_count INTEGER DEFAULT 0,
+    last_searched_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
 );
 
 -- Product views table (for analytics)
@@ -95,6 +116,52 @@ CREATE TABLE product_views (
     created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
 );
 
+-- Per-product view totals rolled up from product_views
+CREATE TABLE product_view_counts (
+    product_id UUID PRIMARY KEY REFERENCES products(id) ON DELETE CASCADE,
+    view_count BIGINT NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Materialized producer analytics: running totals and daily net changes
+CREATE TABLE producer_stats (
+    producer_id UUID PRIMARY KEY REFERENCES users(id) ON DELETE CASCADE,
+    product_count INTEGER NOT NULL DEFAULT 0,
+    view_count BIGINT NOT NULL DEFAULT 0,
+    favorite_count INTEGER NOT NULL DEFAULT 0,
+    review_count INTEGER NOT NULL DEFAULT 0,
+    rating_sum INTEGER NOT NULL DEFAULT 0,
+    rating_count INTEGER NOT NULL DEFAULT 0,
+    order_count INTEGER NOT NULL DEFAULT 0,
+    revenue DECIMAL(12,2) NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TABLE producer_daily_stats (
+    producer_id UUID NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+    day DATE NOT NULL,
+    product_count INTEGER NOT NULL DEFAULT 0,
+    view_count BIGINT NOT NULL DEFAULT 0,
+    favorite_count INTEGER NOT NULL DEFAULT 0,
+    review_count INTEGER NOT NULL DEFAULT 0,
+    rating_sum INTEGER NOT NULL DEFAULT 0,
+    rating_count INTEGER NOT NULL DEFAULT 0,
+    order_count INTEGER NOT NULL DEFAULT 0,
+    revenue DECIMAL(12,2) NOT NULL DEFAULT 0,
+    PRIMARY KEY (producer_id, day)
+);
+
+-- Pre-aggregated time series (hour, day and month buckets per dimension key)
+CREATE TABLE analytics_buckets (
+    metric VARCHAR(20) NOT NULL,
+    granularity VARCHAR(10) NOT NULL,
+    dimension VARCHAR(20) NOT NULL,
+    dimension_key VARCHAR(100) NOT NULL,
+    bucket_start TIMESTAMP NOT NULL,
+    value DECIMAL(14,2) NOT NULL DEFAULT 0,
+    PRIMARY KEY (metric, granularity, dimension, dimension_key, bucket_start)
+);
+
 -- Orders table (for future e-commerce functionality)
 CREATE TABLE orders (
     id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
@@ -142,6 +209,52 @@ CREATE TABLE moderation_logs (
     created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
 );
 
+-- Resource versions table (ETag version counters per cache scope)
+CREATE TABLE resource_versions (
+    scope VARCHAR(100) PRIMARY KEY,
+    version BIGINT NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Map tile counts per metric and zoom level (producers, products and demand heatmaps)
+CREATE TABLE geo_tiles (
+    metric VARCHAR(20) NOT NULL,
+    zoom SMALLINT NOT NULL,
+    tile_x INTEGER NOT NULL,
+    tile_y INTEGER NOT NULL,
+    value INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (metric, zoom, tile_x, tile_y)
+);
+
+-- Top-N neighbors per product for item-to-item recommendations (flask refresh-recommendations)
+CREATE TABLE product_similarities (
+    product_id UUID NOT NULL REFERENCES products(id) ON DELETE CASCADE,
+    similar_product_id UUID NOT NULL REFERENCES products(id) ON DELETE CASCADE,
+    rank SMALLINT NOT NULL,
+    score DOUBLE PRECISION NOT NULL,
+    computed_at TIMESTAMP NOT NULL,
+    PRIMARY KEY (product_id, similar_product_id)
+);
+
+-- LLM completions keyed by a SHA-256 of model, prompt and parameters (identical prompts are generated once)
+CREATE TABLE llm_insights (
+    content_hash CHAR(64) PRIMARY KEY,
+    model VARCHAR(100) NOT NULL,
+    status VARCHAR(10) NOT NULL DEFAULT 'pending',
+    response TEXT,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    completed_at TIMESTAMP
+);
+
+-- Revoked token ids and token families (until the tokens they cover expire)
+CREATE TABLE revoked_tokens (
+    key VARCHAR(80) PRIMARY KEY,
+    user_id UUID,
+    reason VARCHAR(20) NOT NULL,
+    expires_at TIMESTAMP NOT NULL,
+    revoked_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+
 -- Indexes for better performance
 CREATE INDEX idx_users_email ON users(email);
 CREATE INDEX idx_users_role ON users(role);
@@ -149,14 +262,26 @@ CREATE INDEX idx_users_region ON users(region);
 CREATE INDEX idx_products_producer ON products(producer_id);
 CREATE INDEX idx_products_category ON products(category);
 CREATE INDEX idx_products_available ON products(is_available);
+CREATE INDEX idx_products_created_at_id ON products(created_at, id);
+CREATE INDEX idx_products_price_id ON products(price, id);
+CREATE INDEX idx_products_rating_average_id ON products(rating_average, id);
 CREATE INDEX idx_reviews_product ON reviews(product_id);
 CREATE INDEX idx_reviews_user ON reviews(user_id);
 CREATE INDEX idx_favorites_user ON favorites(user_id);
 CREATE INDEX idx_search_history_user ON search_history(user_id);
+CREATE INDEX idx_search_history_user_last_searched ON search_history(user_id, last_searched_at);
+CREATE INDEX idx_search_query_stats_count ON search_query_stats(search_count);
 CREATE INDEX idx_product_views_product ON product_views(product_id);
+CREATE INDEX idx_analytics_buckets_range ON analytics_buckets(metric, granularity, dimension, bucket_start);
+CREATE INDEX idx_revoked_tokens_expires ON revoked_tokens(expires_at);
+CREATE INDEX idx_revoked_tokens_revoked ON revoked_tokens(revoked_at);
 CREATE INDEX idx_orders_consumer ON orders(consumer_id);
 CREATE INDEX idx_orders_producer ON orders(producer_id);
 CREATE INDEX idx_ai_predictions_user ON ai_predictions(user_id);
+CREATE INDEX idx_ai_predictions_user_type ON ai_predictions(user_id, prediction_type, created_at);
+CREATE INDEX idx_ai_predictions_type ON ai_predictions(prediction_type, created_at);
+CREATE INDEX idx_product_similarities_rank ON product_similarities(product_id, rank);
+CREATE INDEX idx_product_similarities_similar ON product_similarities(similar_product_id);
 
 -- Full-text search indexes
 CREATE INDEX idx_products_search ON products USING gin(to_tsvector('english', name || ' ' || description));
@@ -83,11 +83,12 @@ export const AuthProvider: React.FC<AuthProviderProps> = ({ children }) => {
   const login = async (email: string, password: string) => {
     try {
       const response = await api.post("/auth/login", { email, password });
-      const { access_token, user: userData } = response.data;
+      const { access_token, refresh_token, user: userData } = response.data;
 
       setToken(access_token);
       setUser(userData);
       localStorage.setItem("token", access_token);
+      localStorage.setItem("refresh_token", refresh_token);
     } catch (error: any) {
       throw new Error(error.response?.data?.error || "Login failed");
     }
@@ -96,20 +97,26 @@ export const AuthProvider: React.FC<AuthProviderProps> = ({ children }) => {
   const register = async (userData: RegisterData) => {
     try {
       const response = await api.post("/auth/register", userData);
-      const { access_token, user: userDataResponse } = response.data;
+      const { access_token, refresh_token, user: userDataResponse } = response.data;
 
       setToken(access_token);
       setUser(userDataResponse);
       localStorage.setItem("token", access_token);
+      localStorage.setItem("refresh_token", refresh_token);
     } catch (error: any) {
       throw new Error(error.response?.data?.error || "Registration failed");
     }
   };
 
   const logout = () => {
+    // Revoke the session server-side; the local state is cleared either way
+    if (localStorage.getItem("token")) {
+      api.post("/auth/logout").catch(() => {});
+    }
     setUser(null);
     setToken(null);
     localStorage.removeItem("token");
+    localStorage.removeItem("refresh_token");
   };
 
   const value: AuthContextType = {
@@ -14,7 +14,8 @@ export const api = axios.create({
 api.interceptors.request.use(
   (config) => {
     const token = localStorage.getItem("token");
-    if (token) {
+    // Keep a token set by the caller (e.g. the refresh token for /auth/refresh)
+    if (token && !config.headers.Authorization) {
       config.headers.Authorization = `Bearer ${token}`;
     }
     return config;
@@ -24,16 +25,58 @@ api.interceptors.request.use(
   }
 );
 
+const clearSession = () => {
+  localStorage.removeItem("token");
+  localStorage.removeItem("refresh_token");
+  window.location.href = "/login";
+};
+
+// Shared by concurrent 401s: a refresh token can only be rotated once
+let refreshing: Promise<string> | null = null;
+
+const refreshAccessToken = (refreshToken: string) => {
+  if (!refreshing) {
+    refreshing = authAPI
+      .refresh(refreshToken)
+      .then((response) => {
+        const { access_token, refresh_token } = response.data;
+        localStorage.setItem("token", access_token);
+        localStorage.setItem("refresh_token", refresh_token);
+        return access_token as string;
+      })
+      .finally(() => {
+        refreshing = null;
+      });
+  }
+  return refreshing;
+};
+
 // Response interceptor to handle auth errors
 api.interceptors.response.use(
   (response) => response,
-  (error) => {
-    if (error.response?.status === 401) {
-      // Token expired or invalid, clear it
-      localStorage.removeItem("token");
-      window.location.href = "/login";
+  async (error) => {
+    const request = error.config;
+    if (error.response?.status !== 401 || !request) {
+      return Promise.reject(error);
+    }
+
+    // Try one refresh-and-retry before logging out
+    const refreshToken = localStorage.getItem("refresh_token");
+    const isAuthCall = /\/auth\/(refresh|login|logout)$/.test(request.url || "");
+    if (!refreshToken || isAuthCall || request._retried) {
+      clearSession();
+      return Promise.reject(error);
+    }
+
+    try {
+      const accessToken = await refreshAccessToken(refreshToken);
+      request._retried = true;
+      request.headers.Authorization = `Bearer ${accessToken}`;
+      return api(request);
+    } catch (refreshError) {
+      clearSession();
+      return Promise.reject(error);
     }
-    return Promise.reject(error);
   }
 );
 
@@ -43,7 +86,10 @@ export const authAPI = {
     api.post("/auth/login", data),
   register: (data: any) => api.post("/auth/register", data),
   me: () => api.get("/auth/me"),
-  refresh: () => api.post("/auth/refresh"),
+  refresh: (refreshToken: string) =>
+    api.post("/auth/refresh", null, {
+      headers: { Authorization: `Bearer ${refreshToken}` },
+    }),
   logout: () => api.post("/auth/logout"),
 };
 